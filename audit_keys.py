@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Auditoría de archivos de llaves: recalcula y verifica el KCV de cada llave.
+
+Uso:
+    python3 audit_keys.py data/dukpt/keys/test_keys_dukpt.json
+    python3 audit_keys.py bóveda.json --report discrepancias.jsonl --processes 4
+
+Para cada llave valida:
+    - keyHex en hexadecimal y del largo indicado en `bytes`
+    - Largo válido para `algorithm`
+    - Paridad impar por byte en llaves DES/3DES (se omite con --ignore-parity
+      y en llaves derivadas como la IPEK DUKPT, que no ajustan la paridad)
+    - KCV recalculado igual al declarado (se aceptan KCVs de 4 o 6 caracteres)
+
+El archivo se lee de forma incremental y los KCV se calculan en lotes, así
+que la memoria se mantiene constante aunque el archivo pese varios GB.
+Con --report, las llaves con problemas se escriben en un reporte JSON
+Lines (sin keyHex).
+"""
+
+import argparse
+import collections
+import json
+import sys
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from key_files import ALGORITHM_KEY_LENGTHS, iter_key_records
+from kcv import KCV_CHUNK_SIZE, KCV_ERROR, iter_kcvs, normalize_algorithm
+
+# Tipos de problema
+ISSUE_INVALID_HEX = "INVALID_HEX"
+ISSUE_BYTES_MISMATCH = "BYTES_MISMATCH"
+ISSUE_INVALID_LENGTH = "INVALID_LENGTH"
+ISSUE_UNKNOWN_ALGORITHM = "UNKNOWN_ALGORITHM"
+ISSUE_PARITY = "PARITY"
+ISSUE_KCV_MISMATCH = "KCV_MISMATCH"
+ISSUE_KCV_ERROR = "KCV_ERROR"
+
+MIN_KCV_LENGTH = 4  # Algunos archivos guardan solo 4 caracteres del KCV
+
+# Tipos de llave derivados (IPEK / llave inicial DUKPT, llaves de sesión):
+# salen de un cifrado, no de un generador que ajuste la paridad DES
+DERIVED_KEY_TYPE_MARKERS = ("IPEK", "INITIAL_KEY", "INITIAL KEY", "SESSION")
+
+# ========== VALIDACIONES ==========
+
+def has_odd_parity(key: bytes) -> bool:
+    """True si todos los bytes de la llave tienen paridad impar (DES)."""
+    return all(bin(b).count('1') % 2 == 1 for b in key)
+
+def is_derived_key_type(key_type: str) -> bool:
+    """True para llaves derivadas (DUKPT_IPEK, DUKPT_INITIAL_KEY, ...), sin paridad DES."""
+    key_type = key_type.upper()
+    return any(marker in key_type for marker in DERIVED_KEY_TYPE_MARKERS)
+
+def check_key_structure(record: dict, check_parity: bool = True) -> Tuple[Optional[bytes], List[str]]:
+    """
+    Valida una llave sin calcular su KCV.
+
+    Returns:
+        (llave en bytes o None si keyHex no es válido, lista de problemas)
+    """
+    issues: List[str] = []
+    algorithm = str(record.get("algorithm", ""))
+
+    try:
+        key = bytes.fromhex(str(record.get("keyHex", "")))
+    except ValueError:
+        return None, [ISSUE_INVALID_HEX]
+    if not key:
+        return None, [ISSUE_INVALID_HEX]
+
+    declared = record.get("bytes")
+    if declared is not None and declared != len(key):
+        issues.append(ISSUE_BYTES_MISMATCH)
+
+    lengths = ALGORITHM_KEY_LENGTHS.get(algorithm.upper())
+    if lengths is None or normalize_algorithm(algorithm) is None:
+        issues.append(ISSUE_UNKNOWN_ALGORITHM)
+    elif len(key) not in lengths:
+        issues.append(ISSUE_INVALID_LENGTH)
+
+    if (check_parity and normalize_algorithm(algorithm) == "TDES"
+            and not is_derived_key_type(str(record.get("keyType", ""))) and not has_odd_parity(key)):
+        issues.append(ISSUE_PARITY)
+
+    return key, issues
+
+def compare_kcv(declared: str, computed: str) -> bool:
+    """Compara el KCV declarado con el recalculado (acepta prefijos de 4+ caracteres)."""
+    declared = declared.strip().upper()
+    return len(declared) >= MIN_KCV_LENGTH and computed.startswith(declared)
+
+# ========== AUDITORÍA ==========
+
+def audit_key_file(path: str, check_parity: bool = True, processes: int = 1,
+                   chunk_size: int = KCV_CHUNK_SIZE) -> Iterator[dict]:
+    """
+    Audita un archivo de llaves y genera un resultado por llave.
+
+    Args:
+        path: Archivo de llaves (.json o .jsonl)
+        check_parity: Validar paridad impar en llaves DES/3DES
+        processes: Procesos para el cálculo de KCV
+        chunk_size: Llaves por lote de KCV
+
+    Yields:
+        {"index", "keyType", "algorithm", "kcv", "computedKcv", "issues"}
+    """
+    pending = collections.deque()
+
+    def kcv_inputs():
+        for index, record in enumerate(iter_key_records(path)):
+            key, issues = check_key_structure(record, check_parity)
+            pending.append((index, record, issues))
+            # Las llaves con hex inválido pasan igual para no desalinear resultados
+            yield key or b"", str(record.get("algorithm", ""))
+
+    for computed in iter_kcvs(kcv_inputs(), processes, chunk_size):
+        index, record, issues = pending.popleft()
+        declared = str(record.get("kcv", ""))
+        if ISSUE_INVALID_HEX not in issues:
+            if computed == KCV_ERROR:
+                issues.append(ISSUE_KCV_ERROR)
+            elif ISSUE_UNKNOWN_ALGORITHM not in issues and not compare_kcv(declared, computed):
+                issues.append(ISSUE_KCV_MISMATCH)
+        yield {
+            "index": index,
+            "keyType": record.get("keyType", ""),
+            "algorithm": record.get("algorithm", ""),
+            "kcv": declared,
+            "computedKcv": computed if ISSUE_INVALID_HEX not in issues else "",
+            "issues": issues,
+        }
+
+def run_audit(paths: Sequence[str], report_path: Optional[str] = None, check_parity: bool = True,
+              processes: int = 1) -> Dict[str, dict]:
+    """
+    Audita varios archivos y, si se indica `report_path`, escribe el reporte
+    de discrepancias.
+
+    Returns:
+        Resumen por archivo: {"keys", "ok", "issues": {tipo: cantidad}}
+    """
+    summaries: Dict[str, dict] = {}
+    report = open(report_path, "w") if report_path else None
+    try:
+        for path in paths:
+            summary = {"keys": 0, "ok": 0, "issues": {}}
+            for result in audit_key_file(path, check_parity, processes):
+                summary["keys"] += 1
+                if not result["issues"]:
+                    summary["ok"] += 1
+                    continue
+                for issue in result["issues"]:
+                    summary["issues"][issue] = summary["issues"].get(issue, 0) + 1
+                if report:
+                    report.write(json.dumps({"file": path, **result}) + "\n")
+            summaries[path] = summary
+    finally:
+        if report:
+            report.close()
+    return summaries
+
+# ========== FUNCIÓN PRINCIPAL ==========
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Auditoría de KCVs en archivos de llaves")
+    parser.add_argument("files", nargs="+", help="Archivos de llaves (.json o .jsonl)")
+    parser.add_argument("--report", help="Reporte JSON Lines de llaves con problemas (por defecto no se escribe)")
+    parser.add_argument("--processes", type=int, default=1, help="Procesos para el cálculo de KCV")
+    parser.add_argument("--ignore-parity", action="store_true", help="No validar paridad DES")
+    parser.add_argument("--json", action="store_true", help="Imprimir el resumen como JSON")
+    args = parser.parse_args(argv)
+
+    summaries = run_audit(args.files, args.report, not args.ignore_parity, args.processes)
+
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+    else:
+        print("=" * 80)
+        print("🔍 AUDITORÍA DE LLAVES")
+        print("=" * 80)
+        for path, summary in summaries.items():
+            print()
+            print(f"📄 {path}")
+            print(f"   Llaves:     {summary['keys']}")
+            print(f"   Correctas:  {summary['ok']}")
+            for issue, count in sorted(summary["issues"].items()):
+                print(f"   ⚠️  {issue:18s} {count}")
+        if args.report:
+            print()
+            print(f"📝 Reporte de discrepancias: {args.report}")
+
+    failed = any(summary["ok"] != summary["keys"] for summary in summaries.values())
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Benchmark de las rutas criptográficas y de framing de los scripts Python.
+
+Mide latencia por operación y rendimiento en bloque de:
+    - Derivación de IPEK (derive_ipek_aes / derive_ipek_3des e IpekBatchDeriver)
+    - KCV (calculate_kcv de a una y calculate_kcvs en bloque)
+    - Generación de llaves (generar_llaves_completas.generate_key_bytes / generate_key_chunk)
+    - Emisión de perfiles JSON (fleet_profiles.build_fleet_chunk)
+    - Frames Futurex: LRC, armado (format_message con los campos ya
+      armados, y el comando 02 completo con FrameEncoder), decode_frame y
+      FrameStreamParser
+
+para todos los algoritmos y tamaños de llave. Los resultados se guardan en
+JSON para comparar entre commits en la misma máquina.
+
+Uso:
+    python3 benchmark_crypto.py --json bench_$(git rev-parse --short HEAD).json
+    python3 benchmark_crypto.py --filter kcv --repeat 7
+    python3 benchmark_crypto.py --json nuevo.json --compare base.json --threshold 10
+
+Cada caso se calibra con timeit (autorange) hasta que una repetición dure
+al menos --min-time segundos; se informa la mediana y el mínimo de las
+repeticiones, por operación. Con --compare el código de salida es 1 si
+algún caso empeora más que --threshold por ciento.
+
+Los casos de a una operación vienen de a dos: `single` repite la misma
+llave (el contexto de cifrado sale de cipher_cache) y `cold` rota entre
+más llaves que las que caben en esa caché, así que cada llamada arma su
+key schedule.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import timeit
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence
+
+import fleet_profiles
+from cipher_cache import DEFAULT_CACHE_SIZE
+from frame_stream import FrameStreamParser
+from futurex import FrameEncoder, calculate_lrc, decode_frame, format_message, inject_symmetric_key_fields
+from generar_llaves_completas import KEY_SIZES, generate_key_bytes, generate_key_chunk
+from generate_dukpt_keys import IpekBatchDeriver, build_ksn, derive_ipek_3des, derive_ipek_aes
+from kcv import calculate_kcv, calculate_kcvs
+from key_index import KeyIndex
+
+BULK_SIZE = 4096  # Elementos por llamada en los casos masivos
+FLEET_TERMINALS = 256
+STREAM_FRAMES = 1000
+COLD_KEYS = DEFAULT_CACHE_SIZE * 4  # Llaves que rotan los casos `cold`
+DEFAULT_REPEAT = 5
+DEFAULT_MIN_TIME = 0.2
+DEFAULT_THRESHOLD = 10.0  # Por ciento
+
+DUKPT_TYPES = {"AES128": 16, "AES192": 24, "AES256": 32, "3DES": 16}
+BDK_ID = bytes.fromhex("FFFF987654")
+
+@dataclass
+class Case:
+    name: str
+    group: str
+    function: Callable[[], object]
+    operations: int = 1  # Operaciones por llamada (para los casos masivos)
+
+# ========== CASOS ==========
+
+def _ksns(count: int) -> List[bytes]:
+    return [build_ksn(BDK_ID, device) for device in range(count)]
+
+def ipek_cases() -> List[Case]:
+    cases = []
+    ksn = build_ksn(BDK_ID, 1)
+    ksns = _ksns(BULK_SIZE)
+    for dukpt_type, size in DUKPT_TYPES.items():
+        bdk = os.urandom(size)
+        single = derive_ipek_3des if dukpt_type == "3DES" else derive_ipek_aes
+        deriver = IpekBatchDeriver(bdk, "3DES" if dukpt_type == "3DES" else "AES")
+        cold = itertools.cycle([os.urandom(size) for _ in range(COLD_KEYS)])
+        cases.append(Case(f"ipek.single.{dukpt_type}", "ipek", lambda f=single, b=bdk: f(b, ksn)))
+        cases.append(Case(f"ipek.cold.{dukpt_type}", "ipek", lambda f=single, c=cold: f(next(c), ksn)))
+        cases.append(Case(f"ipek.bulk.{dukpt_type}", "ipek",
+                          lambda d=deriver: d.derive_many(ksns), BULK_SIZE))
+    return cases
+
+def kcv_cases() -> List[Case]:
+    cases = []
+    for algorithm, size in KEY_SIZES.items():
+        keys = generate_key_bytes(algorithm, BULK_SIZE)
+        items = [(key, algorithm) for key in keys]
+        cold = itertools.cycle(keys[:COLD_KEYS])
+        cases.append(Case(f"kcv.single.{algorithm}", "kcv", lambda k=keys[0], a=algorithm: calculate_kcv(k, a)))
+        cases.append(Case(f"kcv.cold.{algorithm}", "kcv", lambda c=cold, a=algorithm: calculate_kcv(next(c), a)))
+        cases.append(Case(f"kcv.bulk.{algorithm}", "kcv", lambda i=items: calculate_kcvs(i), BULK_SIZE))
+    return cases
+
+def keygen_cases() -> List[Case]:
+    cases = []
+    for algorithm in KEY_SIZES:
+        cases.append(Case(f"keygen.bytes.{algorithm}", "keygen",
+                          lambda a=algorithm: generate_key_bytes(a, BULK_SIZE), BULK_SIZE))
+        cases.append(Case(f"keygen.records.{algorithm}", "keygen",
+                          lambda a=algorithm: generate_key_chunk("WORKING_PIN_KEY", a, "bench", BULK_SIZE),
+                          BULK_SIZE))
+    return cases
+
+def profile_cases() -> List[Case]:
+    """Perfiles por terminal en modo bundle (IPEK, KCV y JSON de cada terminal)."""
+    cases = []
+    for dukpt_type, size in DUKPT_TYPES.items():
+        templates = fleet_profiles.resolve_templates({"templates": {"bench": {"keys": [
+            {"bdkHex": os.urandom(size).hex(), "dukptType": dukpt_type, "bdkId": BDK_ID.hex()},
+            {"keyType": "MASTER_KEY", "selectedKey": "D52453"},
+        ]}}}, KeyIndex())
+        assignments = [(f"BENCH{n:011d}", "bench", [ksn]) for n, ksn in enumerate(_ksns(FLEET_TERMINALS))]
+
+        def emit(t=templates, a=assignments):
+            fleet_profiles._init_worker(t)
+            return fleet_profiles.build_fleet_chunk(a, None, "2025-01-01T00:00:00")
+
+        cases.append(Case(f"profile.bundle.{dukpt_type}", "profile", emit, FLEET_TERMINALS))
+    return cases
+
+def frame_cases() -> List[Case]:
+    cases = []
+    data = os.urandom(1024)
+    cases.append(Case("frame.lrc.1024", "frame", lambda: calculate_lrc(data)))
+    encoder = FrameEncoder()
+    stream = bytearray()
+    for algorithm, size in KEY_SIZES.items():
+        key_hex = os.urandom(size).hex().upper()
+        fields = inject_symmetric_key_fields(1, key_hex, "ABCD", key_type="01", encryption_type="00")
+        frame = format_message("02", fields)
+        stream += frame
+        cases.append(Case(f"frame.format.{algorithm}", "frame", lambda f=fields: format_message("02", f)))
+        cases.append(Case(f"frame.command02.{algorithm}", "frame",
+                          lambda k=key_hex: encoder.inject_symmetric_key(1, k, "ABCD")))
+        cases.append(Case(f"frame.decode.{algorithm}", "frame", lambda f=frame: decode_frame(f)))
+    stream = bytes(stream) * (STREAM_FRAMES // len(KEY_SIZES))
+    frames = STREAM_FRAMES // len(KEY_SIZES) * len(KEY_SIZES)
+
+    def parse_stream():
+        parser = FrameStreamParser()
+        for start in range(0, len(stream), 4096):
+            for _ in parser.feed(stream[start:start + 4096]):
+                pass
+
+    cases.append(Case("frame.stream.parse", "frame", parse_stream, frames))
+    return cases
+
+CASE_GROUPS = {
+    "ipek": ipek_cases,
+    "kcv": kcv_cases,
+    "keygen": keygen_cases,
+    "profile": profile_cases,
+    "frame": frame_cases,
+}
+
+# ========== MEDICIÓN ==========
+
+def measure(case: Case, repeat: int = DEFAULT_REPEAT, min_time: float = DEFAULT_MIN_TIME) -> dict:
+    """Calibra el caso con timeit y devuelve tiempos por operación en microsegundos."""
+    timer = timeit.Timer(case.function)
+    loops, elapsed = timer.autorange()
+    if elapsed < min_time:
+        loops = max(1, int(loops * min_time / max(elapsed, 1e-9)))
+    times = [t / (loops * case.operations) for t in timer.repeat(repeat, loops)]
+    median = statistics.median(times)
+    return {
+        "name": case.name,
+        "group": case.group,
+        "operationsPerCall": case.operations,
+        "loops": loops,
+        "repeat": repeat,
+        "medianUs": round(median * 1e6, 4),
+        "minUs": round(min(times) * 1e6, 4),
+        "opsPerSecond": round(1 / median, 1) if median else 0.0,
+    }
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    import cryptography
+    return {
+        "generated": datetime.now().isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "cryptography": cryptography.__version__,
+    }
+
+def compare(results: Sequence[dict], baseline: Sequence[dict], threshold: float) -> List[dict]:
+    """Cambio porcentual de la mediana por caso (positivo = más lento)."""
+    previous = {result["name"]: result for result in baseline}
+    changes = []
+    for result in results:
+        before = previous.get(result["name"])
+        if not before or not before["medianUs"]:
+            continue
+        change = (result["medianUs"] - before["medianUs"]) / before["medianUs"] * 100
+        changes.append({"name": result["name"], "beforeUs": before["medianUs"], "afterUs": result["medianUs"],
+                        "changePercent": round(change, 1), "regression": change > threshold})
+    return changes
+
+# ========== FUNCIÓN PRINCIPAL ==========
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de derivación, KCV, generación y frames")
+    parser.add_argument("--group", nargs="+", choices=sorted(CASE_GROUPS), help="Grupos a medir (por defecto, todos)")
+    parser.add_argument("--filter", help="Solo los casos cuyo nombre contiene este texto")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Repeticiones por caso")
+    parser.add_argument("--min-time", type=float, default=DEFAULT_MIN_TIME, help="Segundos mínimos por repetición")
+    parser.add_argument("--json", help="Guardar los resultados en este JSON")
+    parser.add_argument("--compare", help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Empeoramiento (%%) que cuenta como regresión")
+    args = parser.parse_args(argv)
+
+    cases: List[Case] = []
+    for group in args.group or CASE_GROUPS:
+        cases.extend(CASE_GROUPS[group]())
+    if args.filter:
+        cases = [case for case in cases if args.filter in case.name]
+
+    print("=" * 80)
+    print("⏱️  BENCHMARK CRIPTO Y FRAMING")
+    print("=" * 80)
+    print()
+    print(f"   {'Caso':32s} {'Mediana µs':>12s} {'Mín. µs':>10s} {'Ops/s':>14s}")
+    results = []
+    for case in cases:
+        result = measure(case, args.repeat, args.min_time)
+        results.append(result)
+        print(f"   {case.name:32s} {result['medianUs']:12.3f} {result['minUs']:10.3f} {result['opsPerSecond']:14,.0f}")
+
+    report: Dict[str, object] = {"environment": environment(), "results": results}
+    failed = False
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        changes = compare(results, baseline.get("results", []), args.threshold)
+        report["comparison"] = {"baseline": baseline.get("environment", {}), "threshold": args.threshold,
+                                "changes": changes}
+        print()
+        print(f"📊 Comparación con {args.compare} (commit {baseline.get('environment', {}).get('commit', '?')})")
+        for change in changes:
+            icon = "❌" if change["regression"] else "  "
+            print(f"   {icon} {change['name']:32s} {change['beforeUs']:10.3f} -> {change['afterUs']:10.3f} µs "
+                  f"({change['changePercent']:+.1f}%)")
+        failed = any(change["regression"] for change in changes)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print()
+        print(f"📝 Resultados: {args.json}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Benchmark de inyección stop-and-wait contra envío en ventana.
+
+Levanta el simulador de KeyReceiver con un cable emulado (latencia y
+velocidad configurables) e inyecta el mismo plan con ambos modos en cada
+combinación de parámetros.
+
+Uso:
+    python3 benchmark_pipelining.py
+    python3 benchmark_pipelining.py --baud 9600 115200 --latency-ms 0 5 20 --window 5
+    python3 benchmark_pipelining.py --profile perfil.json --keys llaves.json --json resultados.json
+
+Sin --profile se usa un perfil sintético de --keys-per-device IPEK DUKPT
+AES-128 en claro (encryptionType 05), como dukpt_multikey_profile.json.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import List, Optional, Sequence, Tuple
+
+from inject_profile import (
+    PlannedFrame, build_injection_plan, inject_all, latency_summary, percentile,
+)
+from kcv import calculate_kcv
+from key_index import KeyIndex
+from keyreceiver_sim import KeyReceiverSimulator
+
+DEFAULT_KEYS_PER_DEVICE = 5
+
+# ========== PLAN ==========
+
+def synthetic_profile(keys_per_device: int) -> Tuple[dict, KeyIndex]:
+    """Perfil de IPEK DUKPT AES-128 con llaves aleatorias y su índice por KCV."""
+    keys = KeyIndex()
+    configs = []
+    for slot in range(1, keys_per_device + 1):
+        key = os.urandom(16)
+        kcv = calculate_kcv(key, "AES-128")
+        keys.add({"keyType": "DUKPT_IPEK", "algorithm": "AES-128", "keyHex": key.hex().upper(), "kcv": kcv})
+        configs.append({
+            "usage": "DUKPT",
+            "keyType": "DUKPT Initial Key (IPEK)",
+            "slot": f"{slot:02d}",
+            "selectedKey": kcv,
+            "injectionMethod": "auto",
+            "ksn": f"FFFF98765432100{slot:05X}",
+        })
+    profile = {"name": "Benchmark", "useKEK": False, "selectedKEKKcv": "", "keyConfigurations": configs}
+    return profile, keys
+
+# ========== MEDICIÓN ==========
+
+async def run_case(plan: Sequence[PlannedFrame], terminals: int, baud_rate: int, latency: float,
+                   response_delay: float, window: int, concurrency: int, timeout: float) -> dict:
+    """Inyecta el plan en un simulador nuevo con el cable emulado y resume el resultado."""
+    async with KeyReceiverSimulator(terminals, response_delay=response_delay,
+                                    link_latency=latency, baud_rate=baud_rate) as simulator:
+        started = time.perf_counter()
+        devices = await inject_all(simulator.paths, plan, concurrency, timeout=timeout, window=window)
+        seconds = time.perf_counter() - started
+    device_seconds = [device.seconds for device in devices]
+    return {
+        "window": window,
+        "devices": len(devices),
+        "ok": sum(1 for device in devices if device.ok),
+        "fallbacks": sum(1 for device in devices if device.fallback),
+        "seconds": round(seconds, 4),
+        "deviceP50Ms": round(percentile(device_seconds, 0.50) * 1000, 2),
+        "deviceP99Ms": round(percentile(device_seconds, 0.99) * 1000, 2),
+        "keyLatency": latency_summary([key.latency_ms for device in devices for key in device.keys if key.ok]),
+    }
+
+async def run_benchmark(plan: Sequence[PlannedFrame], args: argparse.Namespace) -> List[dict]:
+    results = []
+    for baud_rate in args.baud:
+        for latency_ms in args.latency_ms:
+            case = {"baudRate": baud_rate, "latencyMs": latency_ms, "responseDelayMs": args.response_delay_ms}
+            modes = []
+            for window in (1, args.window):
+                modes.append(await run_case(plan, args.terminals, baud_rate, latency_ms / 1000,
+                                            args.response_delay_ms / 1000, window,
+                                            args.concurrency, args.timeout))
+            stop_and_wait, pipelined = modes
+            case.update({
+                "stopAndWait": stop_and_wait,
+                "pipelined": pipelined,
+                "speedup": round(stop_and_wait["deviceP50Ms"] / pipelined["deviceP50Ms"], 2)
+                if pipelined["deviceP50Ms"] else 0,
+            })
+            results.append(case)
+    return results
+
+# ========== FUNCIÓN PRINCIPAL ==========
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark stop-and-wait vs. envío en ventana")
+    parser.add_argument("--profile", help="Perfil de inyección (por defecto, uno sintético)")
+    parser.add_argument("--keys", nargs="+", default=[], help="Archivos de llaves del perfil")
+    parser.add_argument("--keys-per-device", type=int, default=DEFAULT_KEYS_PER_DEVICE,
+                        help="Llaves del perfil sintético")
+    parser.add_argument("--terminals", type=int, default=8, help="Terminales simulados")
+    parser.add_argument("--baud", type=int, nargs="+", default=[115200], help="Velocidades del cable emulado")
+    parser.add_argument("--latency-ms", type=float, nargs="+", default=[0.0, 5.0, 20.0],
+                        help="Latencias del cable en cada sentido")
+    parser.add_argument("--response-delay-ms", type=float, default=10.0,
+                        help="Tiempo de proceso del receptor por llave")
+    parser.add_argument("--window", type=int, default=DEFAULT_KEYS_PER_DEVICE, help="Frames en vuelo")
+    parser.add_argument("--concurrency", type=int, default=16, help="Dispositivos a la vez")
+    parser.add_argument("--timeout", type=float, default=3.0, help="Timeout por frame (segundos)")
+    parser.add_argument("--json", help="Guardar los resultados en este JSON")
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        with open(args.profile, encoding="utf-8") as f:
+            profile = json.load(f)
+        keys = KeyIndex.from_files(args.keys)
+    else:
+        profile, keys = synthetic_profile(args.keys_per_device)
+    plan = build_injection_plan(profile, keys)
+
+    results = asyncio.run(run_benchmark(plan, args))
+
+    print("=" * 80)
+    print(f"🏁 BENCHMARK STOP-AND-WAIT vs. VENTANA ({args.window} frames, {len(plan)} por dispositivo)")
+    print("=" * 80)
+    print()
+    print(f"   {'Baud':>7s} {'Lat ms':>7s} {'S&W p50 ms':>11s} {'Vent. p50 ms':>13s} {'Mejora':>7s} {'Fallback':>9s}")
+    for case in results:
+        print(f"   {case['baudRate']:7d} {case['latencyMs']:7.1f} {case['stopAndWait']['deviceP50Ms']:11.1f} "
+              f"{case['pipelined']['deviceP50Ms']:13.1f} {case['speedup']:6.2f}x "
+              f"{case['pipelined']['fallbacks']:9d}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"keysPerDevice": len(plan), "window": args.window, "results": results}, f, indent=2)
+        print()
+        print(f"📝 Resultados: {args.json}")
+
+    failed = any(case[mode]["ok"] != case[mode]["devices"]
+                 for case in results for mode in ("stopAndWait", "pipelined"))
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
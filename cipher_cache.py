@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Caché de contextos de cifrado ECB compartida por los scripts.
+
+Crear un Cipher(...).encryptor() arma el key schedule de la llave, y eso
+cuesta tanto como cifrar el bloque de un KCV o de una IPEK. Como en ECB el
+contexto no guarda estado entre llamadas a update(), el mismo encryptor
+sirve para todas las operaciones con esa llave: las derivaciones repetidas
+con la misma BDK o KEK se saltean la preparación de la llave.
+
+Uso:
+    from cipher_cache import ecb_encrypt, ecb_decrypt, cache_info
+
+    ecb_encrypt("AES", bdk, bloque)
+    ecb_decrypt("TDES", kek, llave_cifrada)
+    cache_info()  # {"size": ..., "hits": ..., "misses": ..., "evicted": ...}
+
+Las entradas se identifican por (algoritmo, modo, dirección, huella de la
+llave); la huella es un BLAKE2b con una sal aleatoria del proceso, así que
+la caché no guarda la llave en claro como clave del diccionario. Cada
+contexto se arma sobre una copia propia de la llave (bytearray) que se
+pone en zeros al desalojar la entrada, y el contexto se finaliza para que
+OpenSSL libere y borre su key schedule.
+
+Solo se cachea ECB: CBC y los demás modos encadenados guardan estado en el
+contexto y se siguen creando por llamada. La caché no es segura entre
+hilos; los scripts reparten el trabajo en procesos y cada proceso tiene la
+suya.
+"""
+
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from cryptography.exceptions import AlreadyFinalized
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.backends import default_backend
+try:
+    from cryptography.hazmat.decrepit.ciphers.algorithms import TripleDES
+except ImportError:
+    from cryptography.hazmat.primitives.ciphers.algorithms import TripleDES
+
+DEFAULT_CACHE_SIZE = 256  # Contextos por proceso (cada llave usa uno por dirección)
+BLOCK_SIZES = {"AES": 16, "TDES": 8}
+ENCRYPT = "E"
+DECRYPT = "D"
+
+_FINGERPRINT_SALT = os.urandom(16)
+
+# ========== FUNCIONES AUXILIARES ==========
+
+def _fingerprint(key: bytes) -> bytes:
+    return hashlib.blake2b(key, key=_FINGERPRINT_SALT, digest_size=16).digest()
+
+def _key_copy(algorithm: str, key: bytes) -> bytearray:
+    """Copia de la llave para el contexto; TDES de 8/16 bytes se expande a 24 (K1K1K1 / K1K2K1)."""
+    copy = bytearray(key)
+    if algorithm == "TDES":
+        if len(copy) == 8:
+            copy *= 3
+        elif len(copy) == 16:
+            copy += copy[:8]
+    return copy
+
+def _check_blocks(algorithm: str, data: bytes):
+    # Un resto quedaría pendiente en el contexto compartido y corrompería la
+    # operación siguiente con la misma llave
+    if len(data) % BLOCK_SIZES.get(algorithm, 1):
+        raise ValueError(f"Los datos deben ser múltiplo del bloque {algorithm} ({BLOCK_SIZES[algorithm]} bytes)")
+
+def _cipher_algorithm(algorithm: str, key: bytearray):
+    if algorithm == "AES":
+        return algorithms.AES(key)
+    if algorithm == "TDES":
+        return TripleDES(key)
+    raise ValueError(f"Algoritmo no soportado por la caché de cifrado: {algorithm}")
+
+# ========== CACHÉ ==========
+
+class CipherCache:
+    """
+    Contextos ECB por llave con desalojo LRU.
+
+    Los encryptors/decryptors devueltos son compartidos: solo se debe usar
+    update() sobre ellos (nunca finalize(), que los inutiliza), y no se
+    deben guardar: al desalojar la entrada la caché los finaliza.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE):
+        if max_size < 1:
+            raise ValueError("La caché de cifrado necesita al menos una entrada")
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple[str, str, str, bytes], Tuple[object, bytearray]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def context(self, algorithm: str, key: bytes, direction: str = ENCRYPT):
+        """
+        Devuelve el contexto ECB de la llave, creándolo si no está en caché.
+
+        Args:
+            algorithm: "AES" o "TDES" (TDES acepta llaves de 8, 16 o 24 bytes)
+            key: Llave en claro
+            direction: ENCRYPT o DECRYPT
+
+        Raises:
+            ValueError: Si el algoritmo o el largo de la llave no son válidos
+        """
+        cache_key = (algorithm, "ECB", direction, _fingerprint(key))
+        entry = self._entries.get(cache_key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(cache_key)
+            return entry[0]
+
+        self.misses += 1
+        copy = _key_copy(algorithm, key)
+        try:
+            cipher = Cipher(_cipher_algorithm(algorithm, copy), modes.ECB(), backend=default_backend())
+            context = cipher.encryptor() if direction == ENCRYPT else cipher.decryptor()
+        except (ValueError, TypeError):
+            _zeroize(copy)
+            raise
+        self._entries[cache_key] = (context, copy)
+        if len(self._entries) > self.max_size:
+            _, evicted = self._entries.popitem(last=False)
+            _release(evicted)
+            self.evicted += 1
+        return context
+
+    def encryptor(self, algorithm: str, key: bytes):
+        return self.context(algorithm, key, ENCRYPT)
+
+    def decryptor(self, algorithm: str, key: bytes):
+        return self.context(algorithm, key, DECRYPT)
+
+    def encrypt(self, algorithm: str, key: bytes, data: bytes) -> bytes:
+        """Cifra en ECB; `data` debe ser múltiplo del bloque."""
+        _check_blocks(algorithm, data)
+        return self.context(algorithm, key, ENCRYPT).update(data)
+
+    def decrypt(self, algorithm: str, key: bytes, data: bytes) -> bytes:
+        """Descifra en ECB; `data` debe ser múltiplo del bloque."""
+        _check_blocks(algorithm, data)
+        return self.context(algorithm, key, DECRYPT).update(data)
+
+    def clear(self):
+        """Vacía la caché borrando el material de todas las llaves."""
+        while self._entries:
+            _release(self._entries.popitem()[1])
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "maxSize": self.max_size, "hits": self.hits,
+                "misses": self.misses, "evicted": self.evicted}
+
+def _zeroize(buffer: bytearray):
+    buffer[:] = bytes(len(buffer))
+
+def _release(entry: Tuple[object, bytearray]):
+    context, copy = entry
+    try:
+        # Con ECB y sin datos pendientes finalize() no devuelve nada; libera
+        # el contexto de OpenSSL, que borra el key schedule
+        context.finalize()
+    except (ValueError, AlreadyFinalized):
+        pass
+    _zeroize(copy)
+
+# ========== API ==========
+
+default_cache = CipherCache()
+
+def ecb_encrypt(algorithm: str, key: bytes, data: bytes) -> bytes:
+    """Cifra en ECB con el contexto cacheado de la llave (caché del proceso)."""
+    return default_cache.encrypt(algorithm, key, data)
+
+def ecb_decrypt(algorithm: str, key: bytes, data: bytes) -> bytes:
+    """Descifra en ECB con el contexto cacheado de la llave (caché del proceso)."""
+    return default_cache.decrypt(algorithm, key, data)
+
+def ecb_encryptor(algorithm: str, key: bytes):
+    """Encryptor ECB compartido de la llave; usar solo update() y no guardarlo."""
+    return default_cache.context(algorithm, key, ENCRYPT)
+
+def cache_info() -> Dict[str, int]:
+    """Tamaño y contadores (aciertos, fallos, desalojos) de la caché del proceso."""
+    return default_cache.stats()
+
+def clear_cache():
+    default_cache.clear()
@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+"""
+Análisis de logs de comunicación (CommLog, logcat y trazas seriales).
+
+Cuando una inyección se queda esperando (ANALYSIS_AISINO_LISTENING_TIMEOUT.md,
+ANALYSIS_AISINO_TX_ERROR.md) hay que reconstruir desde el log qué se envió
+y qué volvió. Este script lee logs exportados de cualquier tamaño, arma los
+frames TX y RX a partir de los bytes en hex de cada línea, empareja cada
+TX con su respuesta y resume por comando:
+
+    - Latencia ida y vuelta (histograma en buckets potencia de 2 de ms)
+    - Bytes/s enviados y recibidos
+    - Reintentos (el mismo frame TX otra vez sin respuesta) y timeouts
+    - Frames con LRC incorrecto, errores de escritura y eventos de timeout
+      o de LRC informados por la app
+
+Uso:
+    python3 comm_log_analyzer.py logcat_inyeccion.txt
+    python3 comm_log_analyzer.py logs/*.txt --processes 4 --json resumen.json --html resumen.html
+    python3 comm_log_analyzer.py commlog.jsonl --timeout 5
+
+Formatos de línea reconocidos:
+    - logcat threadtime o time:  10-17 12:34:56.789  1234  5678 I PollingService: TX POLL (12B, write=12): 0x02 0x30 ...
+    - CommLog exportado:         2025-10-17 12:34:56.789 [I] PollingService: RX 12B: 0x02 0x30 ...
+    - CommLogEntry en JSON Lines: {"timestampMs": ..., "level": "I", "tag": "...", "message": "..."}
+    - Traza de KeyReceiver:      RX [1760700000000]: HEX(0230...) ASCII('...')
+
+Cada archivo se procesa línea por línea con un parser de frames por tag y
+dirección (FrameStreamParser) y una cola acotada de TX sin respuesta, así
+que la memoria no depende del tamaño del log. Con --processes los archivos
+se reparten en un pool de procesos y los resúmenes se combinan al final.
+"""
+
+import argparse
+import collections
+import functools
+import html
+import json
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from multiprocessing import Pool
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+from frame_stream import FrameStreamParser, _percentile
+
+DEFAULT_TIMEOUT = 3.0  # FuturexProtocol / PollingService: segundos de espera de respuesta
+MAX_PENDING = 64  # TX sin respuesta que se recuerdan por tag
+TX = "TX"
+RX = "RX"
+
+# ========== PARSEO DE LÍNEAS ==========
+
+_LOG_LINE = re.compile(
+    r"(?:(\d{4})-)?(\d\d)-(\d\d)\s+(\d\d):(\d\d):(\d\d)\.(\d{3})\s+"  # [año-]mes-día hora
+    r"(?:\d+\s+\d+\s+)?"  # PID y TID (logcat threadtime)
+    r"\[?([VDIWEF])\]?[\s/]+"  # Nivel: "I ", "I/" o "[I] "
+    r"([^:]*?)\s*(?:\(\s*\d+\))?:\s(.*)")  # Tag (con PID en formato time) y mensaje
+_TRACE_LINE = re.compile(r"(TX|RX) \[(\d+)\]:\s(.*)")
+_DIRECTION = re.compile(r"\b(TX|RX|RAW_SERIAL_OUT|Enviado|recibidos)\b")
+_HEX_DATA = re.compile(r"(?:[:\-]\s|HEX\()((?:0x)?[0-9A-Fa-f]{2}(?:\s?(?:0x)?[0-9A-Fa-f]{2})*)(?=\s*(?:[()]|$))")
+_WRITE_RESULT = re.compile(r"write(?:\(\))?=(-?\d+)")
+_TIMEOUT_EVENT = re.compile(r"timeout", re.IGNORECASE)
+_LRC_EVENT = re.compile(r"Error de LRC|LRC (?:inválido|incorrecto)", re.IGNORECASE)
+
+DIRECTIONS = {"TX": TX, "RAW_SERIAL_OUT": TX, "Enviado": TX, "RX": RX, "recibidos": RX}
+
+@dataclass
+class LogLine:
+    timestamp_ms: int
+    level: str
+    tag: str
+    message: str
+
+@functools.lru_cache(maxsize=64)
+def _day_start_ms(year: int, month: int, day: int) -> int:
+    return int(datetime(year, month, day).timestamp() * 1000)
+
+def parse_log_line(line: str, year: Optional[int] = None) -> Optional[LogLine]:
+    """
+    Interpreta una línea de log en cualquiera de los formatos reconocidos.
+
+    Args:
+        line: Línea del log (sin importar el fin de línea)
+        year: Año para los formatos de logcat que no lo incluyen (por defecto, el actual)
+
+    Returns:
+        LogLine, o None si la línea no tiene un formato reconocido
+    """
+    line = line.rstrip("\r\n")
+    if line.startswith("{"):
+        try:
+            entry = json.loads(line)
+            return LogLine(int(entry["timestampMs"]), str(entry.get("level", "")),
+                           str(entry.get("tag", "")), str(entry.get("message", "")))
+        except (ValueError, KeyError, TypeError):
+            return None
+    match = _LOG_LINE.match(line)
+    if match:
+        y, mo, d, h, mi, s, ms, level, tag, message = match.groups()
+        start = _day_start_ms(int(y) if y else (year or datetime.now().year), int(mo), int(d))
+        timestamp = start + ((int(h) * 60 + int(mi)) * 60 + int(s)) * 1000 + int(ms)
+        return LogLine(timestamp, level, tag.strip(), message)
+    match = _TRACE_LINE.match(line)
+    if match:
+        direction, timestamp, message = match.groups()
+        return LogLine(int(timestamp), "I", "trace", f"{direction}: {message}")
+    return None
+
+def traffic_data(message: str) -> Optional[Tuple[str, bytes]]:
+    """
+    Dirección y bytes de un mensaje de tráfico ("TX POLL (12B, write=12): 0x02 0x30 ...").
+
+    Returns:
+        (TX o RX, bytes), o None si el mensaje no lleva bytes en hex
+    """
+    direction = _DIRECTION.search(message)
+    if direction is None:
+        return None
+    data = _HEX_DATA.search(message, direction.end())
+    if data is None:
+        return None
+    return DIRECTIONS[direction.group(1)], bytes.fromhex(data.group(1).replace("0x", "").replace(" ", ""))
+
+def frame_command(payload: bytes) -> str:
+    """Código de comando del payload: COMMAND(4)|... en Legacy, 2 caracteres en Futurex."""
+    if payload[4:5] == b"|":
+        return str(payload[:4], "ascii", "replace")
+    return str(payload[:2], "ascii", "replace")
+
+# ========== ESTADÍSTICAS ==========
+
+@dataclass
+class CommandStats:
+    requests: int = 0
+    responses: int = 0
+    timeouts: int = 0
+    retries: int = 0
+    bad_lrc: int = 0  # Respuestas con LRC incorrecto
+    tx_bytes: int = 0
+    rx_bytes: int = 0
+    latency_total_ms: int = 0
+    latency_max_ms: int = 0
+    histogram: collections.Counter = field(default_factory=collections.Counter)  # {< ms: cantidad}
+
+    def add_latency(self, latency_ms: int):
+        self.responses += 1
+        self.latency_total_ms += latency_ms
+        self.latency_max_ms = max(self.latency_max_ms, latency_ms)
+        self.histogram[1 << latency_ms.bit_length()] += 1
+
+    def merge(self, other: "CommandStats"):
+        for name in ("requests", "responses", "timeouts", "retries", "bad_lrc", "tx_bytes", "rx_bytes",
+                     "latency_total_ms"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.latency_max_ms = max(self.latency_max_ms, other.latency_max_ms)
+        self.histogram.update(other.histogram)
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "responses": self.responses,
+            "timeouts": self.timeouts,
+            "retries": self.retries,
+            "badLrc": self.bad_lrc,
+            "txBytes": self.tx_bytes,
+            "rxBytes": self.rx_bytes,
+            "latencyMeanMs": round(self.latency_total_ms / self.responses, 3) if self.responses else 0,
+            "latencyP50Ms": _percentile(self.histogram, 0.50),
+            "latencyP99Ms": _percentile(self.histogram, 0.99),
+            "latencyMaxMs": self.latency_max_ms,
+            "histogram": {str(bucket): count for bucket, count in sorted(self.histogram.items())},
+        }
+
+@dataclass
+class LogAnalysis:
+    files: int = 0
+    lines: int = 0
+    parsed_lines: int = 0
+    tx_frames: int = 0
+    rx_frames: int = 0
+    tx_bytes: int = 0
+    rx_bytes: int = 0
+    bad_lrc_tx: int = 0
+    bad_lrc_rx: int = 0
+    lrc_events: int = 0
+    timeout_events: int = 0
+    write_errors: int = 0
+    unpaired_responses: int = 0
+    unanswered: int = 0
+    span_ms: int = 0  # Suma de la duración de cada archivo (primera a última línea)
+    commands: Dict[str, CommandStats] = field(default_factory=dict)
+
+    def command(self, name: str) -> CommandStats:
+        stats = self.commands.get(name)
+        if stats is None:
+            stats = self.commands[name] = CommandStats()
+        return stats
+
+    def merge(self, other: "LogAnalysis"):
+        for name in ("files", "lines", "parsed_lines", "tx_frames", "rx_frames", "tx_bytes", "rx_bytes",
+                     "bad_lrc_tx", "bad_lrc_rx", "lrc_events", "timeout_events", "write_errors",
+                     "unpaired_responses", "unanswered", "span_ms"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for name, stats in other.commands.items():
+            self.command(name).merge(stats)
+
+    def as_dict(self) -> dict:
+        seconds = self.span_ms / 1000
+        frames = self.tx_frames + self.rx_frames
+        return {
+            "files": self.files,
+            "lines": self.lines,
+            "parsedLines": self.parsed_lines,
+            "txFrames": self.tx_frames,
+            "rxFrames": self.rx_frames,
+            "txBytes": self.tx_bytes,
+            "rxBytes": self.rx_bytes,
+            "txBytesPerSecond": round(self.tx_bytes / seconds, 1) if seconds else 0,
+            "rxBytesPerSecond": round(self.rx_bytes / seconds, 1) if seconds else 0,
+            "badLrcTx": self.bad_lrc_tx,
+            "badLrcRx": self.bad_lrc_rx,
+            "lrcFailureRate": round((self.bad_lrc_tx + self.bad_lrc_rx) / frames, 6) if frames else 0,
+            "lrcEvents": self.lrc_events,
+            "timeoutEvents": self.timeout_events,
+            "writeErrors": self.write_errors,
+            "unpairedResponses": self.unpaired_responses,
+            "unanswered": self.unanswered,
+            "spanSeconds": round(seconds, 3),
+            "commands": {name: stats.as_dict() for name, stats in sorted(self.commands.items())},
+        }
+
+# ========== ANÁLISIS ==========
+
+@dataclass
+class _PendingRequest:
+    command: str
+    payload: bytes
+    sent_ms: int
+
+class _Channel:
+    """Tráfico de un tag: un parser por dirección y los TX que esperan respuesta."""
+
+    def __init__(self):
+        self.now_ms = 0
+        clock = lambda: self.now_ms * 1_000_000  # noqa: E731 - los frames llevan la hora de la línea
+        self.parsers = {TX: FrameStreamParser(include_invalid=True, clock=clock),
+                        RX: FrameStreamParser(include_invalid=True, clock=clock)}
+        self.pending: "collections.deque[_PendingRequest]" = collections.deque()
+
+class LogAnalyzer:
+    """
+    Empareja los frames TX y RX de un log y acumula las estadísticas.
+
+    Cada respuesta se asigna al TX pendiente más antiguo del mismo tag; los
+    TX que llevan más de `timeout` segundos sin respuesta cuentan como
+    timeout, y un TX idéntico al último pendiente cuenta como reintento.
+    """
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT, year: Optional[int] = None):
+        self.timeout_ms = int(timeout * 1000)
+        self.year = year
+        self.analysis = LogAnalysis()
+        self._channels: Dict[str, _Channel] = {}
+        self._first_ms: Optional[int] = None
+        self._last_ms = 0
+
+    def feed_line(self, line: str):
+        analysis = self.analysis
+        analysis.lines += 1
+        entry = parse_log_line(line, self.year)
+        if entry is None:
+            return
+        analysis.parsed_lines += 1
+        if self._first_ms is None:
+            self._first_ms = entry.timestamp_ms
+        self._last_ms = max(self._last_ms, entry.timestamp_ms)
+
+        traffic = traffic_data(entry.message)
+        if traffic is None:
+            if entry.level in ("W", "E") and _TIMEOUT_EVENT.search(entry.message):
+                analysis.timeout_events += 1
+            elif _LRC_EVENT.search(entry.message):
+                analysis.lrc_events += 1
+            return
+
+        direction, data = traffic
+        written = _WRITE_RESULT.search(entry.message)
+        if written and int(written.group(1)) < 0:
+            analysis.write_errors += 1
+        channel = self._channels.get(entry.tag)
+        if channel is None:
+            channel = self._channels[entry.tag] = _Channel()
+        channel.now_ms = entry.timestamp_ms
+        self._expire(channel, entry.timestamp_ms)
+        for frame in channel.parsers[direction].feed(data):
+            if direction == RX:
+                self._on_response(channel, frame_command(frame.payload), frame.size, frame.lrc_ok,
+                                  entry.timestamp_ms)
+            elif frame.lrc_ok:
+                self._on_request(channel, bytes(frame.payload), frame.size, entry.timestamp_ms)
+            else:
+                analysis.bad_lrc_tx += 1
+
+    def _expire(self, channel: _Channel, now_ms: int):
+        pending = channel.pending
+        while pending and now_ms - pending[0].sent_ms > self.timeout_ms:
+            self.analysis.command(pending.popleft().command).timeouts += 1
+
+    def _on_request(self, channel: _Channel, payload: bytes, size: int, now_ms: int):
+        analysis = self.analysis
+        command = frame_command(payload)
+        stats = analysis.command(command)
+        analysis.tx_frames += 1
+        analysis.tx_bytes += size
+        stats.requests += 1
+        stats.tx_bytes += size
+        pending = channel.pending
+        if pending and pending[-1].payload == payload:
+            # El mismo frame otra vez sin respuesta: la latencia se mide desde el reintento
+            stats.retries += 1
+            pending.pop()
+        elif len(pending) == MAX_PENDING:
+            analysis.command(pending.popleft().command).timeouts += 1
+        pending.append(_PendingRequest(command, payload, now_ms))
+
+    def _on_response(self, channel: _Channel, command: str, size: int, lrc_ok: bool, now_ms: int):
+        analysis = self.analysis
+        pending = channel.pending
+        if not lrc_ok:
+            # La respuesta llegó dañada: el TX queda sin respuesta válida
+            analysis.bad_lrc_rx += 1
+            if pending:
+                stats = analysis.command(pending.popleft().command)
+                stats.bad_lrc += 1
+                stats.rx_bytes += size
+            return
+        analysis.rx_frames += 1
+        analysis.rx_bytes += size
+        if not pending:
+            analysis.unpaired_responses += 1
+            analysis.command(command).rx_bytes += size
+            return
+        # Las respuestas Futurex repiten el comando: los TX anteriores al que
+        # coincide se quedaron sin respuesta. Si ninguno coincide (Legacy
+        # responde 0110 a 0100) se toma el más antiguo.
+        index = next((i for i, request in enumerate(pending) if request.command == command), 0)
+        for _ in range(index):
+            analysis.command(pending.popleft().command).timeouts += 1
+        request = pending.popleft()
+        stats = analysis.command(request.command)
+        stats.rx_bytes += size
+        stats.add_latency(now_ms - request.sent_ms)
+
+    def finish(self) -> LogAnalysis:
+        """Cierra el análisis: los TX pendientes cuentan como timeout o sin respuesta."""
+        for channel in self._channels.values():
+            self._expire(channel, self._last_ms)
+            self.analysis.unanswered += len(channel.pending)
+            channel.pending.clear()
+        if self._first_ms is not None:
+            self.analysis.span_ms += self._last_ms - self._first_ms
+        self.analysis.files += 1
+        return self.analysis
+
+def analyze_log_file(path: str, timeout: float = DEFAULT_TIMEOUT, year: Optional[int] = None) -> LogAnalysis:
+    """Analiza un archivo de log línea por línea (memoria constante)."""
+    analyzer = LogAnalyzer(timeout, year)
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            analyzer.feed_line(line)
+    return analyzer.finish()
+
+def analyze_logs(paths: Sequence[str], processes: int = 1, timeout: float = DEFAULT_TIMEOUT,
+                 year: Optional[int] = None) -> Iterator[Tuple[str, LogAnalysis]]:
+    """
+    Analiza varios archivos, en un pool de procesos si processes > 1.
+
+    Yields:
+        (archivo, análisis) en el orden de entrada
+    """
+    analyze = functools.partial(analyze_log_file, timeout=timeout, year=year)
+    if processes <= 1 or len(paths) <= 1:
+        for path in paths:
+            yield path, analyze(path)
+        return
+    with Pool(min(processes, len(paths))) as pool:
+        yield from zip(paths, pool.imap(analyze, paths))
+
+# ========== REPORTE HTML ==========
+
+_HTML_STYLE = """
+body { font-family: sans-serif; margin: 2em; color: #222; }
+table { border-collapse: collapse; margin-bottom: 1.5em; }
+th, td { border: 1px solid #ccc; padding: 4px 8px; text-align: right; }
+th:first-child, td:first-child { text-align: left; }
+.bar { background: #3b7dd8; height: 12px; }
+.warn { color: #b00020; font-weight: bold; }
+"""
+
+def _html_histogram(histogram: Dict[str, int]) -> str:
+    if not histogram:
+        return "<p>Sin respuestas.</p>"
+    peak = max(histogram.values())
+    rows = "".join(
+        f"<tr><td>&lt; {bucket} ms</td><td>{count}</td>"
+        f"<td style=\"width:300px;text-align:left\"><div class=\"bar\" style=\"width:{count * 100 // peak}%\"></div></td></tr>"
+        for bucket, count in histogram.items())
+    return f"<table><tr><th>Latencia</th><th>Respuestas</th><th></th></tr>{rows}</table>"
+
+def render_html(summary: dict) -> str:
+    """Reporte HTML autocontenido (sin scripts ni recursos externos) del resumen JSON."""
+    total = summary["total"]
+    general = "".join(
+        f"<tr><td>{html.escape(name)}</td><td>{value}</td></tr>"
+        for name, value in total.items() if name != "commands")
+    commands = []
+    for name, stats in total["commands"].items():
+        problems = " class=\"warn\"" if stats["timeouts"] or stats["retries"] or stats["badLrc"] else ""
+        commands.append(
+            f"<tr{problems}><td>{html.escape(name)}</td><td>{stats['requests']}</td><td>{stats['responses']}</td>"
+            f"<td>{stats['timeouts']}</td><td>{stats['retries']}</td><td>{stats['badLrc']}</td>"
+            f"<td>{stats['latencyMeanMs']}</td>"
+            f"<td>{stats['latencyP50Ms']}</td><td>{stats['latencyP99Ms']}</td><td>{stats['latencyMaxMs']}</td>"
+            f"<td>{stats['txBytes']}</td><td>{stats['rxBytes']}</td></tr>")
+    histograms = "".join(
+        f"<h3>Comando {html.escape(name)}</h3>{_html_histogram(stats['histogram'])}"
+        for name, stats in total["commands"].items())
+    files = "".join(
+        f"<tr><td>{html.escape(path)}</td><td>{stats['lines']}</td><td>{stats['txFrames']}</td>"
+        f"<td>{stats['rxFrames']}</td><td>{stats['badLrcTx'] + stats['badLrcRx']}</td>"
+        f"<td>{sum(c['timeouts'] for c in stats['commands'].values())}</td></tr>"
+        for path, stats in summary["files"].items())
+    return f"""<!DOCTYPE html>
+<html lang="es"><head><meta charset="utf-8"><title>Análisis de logs de comunicación</title>
+<style>{_HTML_STYLE}</style></head><body>
+<h1>Análisis de logs de comunicación</h1>
+<p>Generado: {html.escape(summary['generated'])} - timeout: {summary['timeoutSeconds']} s</p>
+<h2>Resumen</h2><table>{general}</table>
+<h2>Por comando</h2>
+<table><tr><th>Comando</th><th>TX</th><th>Respuestas</th><th>Timeouts</th><th>Reintentos</th><th>LRC</th><th>Media ms</th>
+<th>p50 &lt; ms</th><th>p99 &lt; ms</th><th>Máx. ms</th><th>Bytes TX</th><th>Bytes RX</th></tr>{''.join(commands)}</table>
+<h2>Histogramas de latencia</h2>{histograms}
+<h2>Por archivo</h2>
+<table><tr><th>Archivo</th><th>Líneas</th><th>TX</th><th>RX</th><th>LRC incorrecto</th><th>Timeouts</th></tr>{files}</table>
+</body></html>
+"""
+
+# ========== FUNCIÓN PRINCIPAL ==========
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Latencias, reintentos y errores de LRC desde logs de comunicación")
+    parser.add_argument("logs", nargs="+", help="Logs exportados (logcat, CommLog o JSON Lines)")
+    parser.add_argument("--processes", type=int, default=1, help="Procesos (un archivo por proceso)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="Segundos sin respuesta para contar un timeout")
+    parser.add_argument("--year", type=int, help="Año de los logs de logcat (que no lo incluyen)")
+    parser.add_argument("--json", help="Guardar el resumen en este JSON")
+    parser.add_argument("--html", help="Guardar el reporte en este HTML")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    total = LogAnalysis()
+    files: Dict[str, dict] = {}
+    try:
+        for path, analysis in analyze_logs(args.logs, args.processes, args.timeout, args.year):
+            files[path] = analysis.as_dict()
+            total.merge(analysis)
+    except OSError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - started
+    summary = {
+        "generated": datetime.now().isoformat(),
+        "timeoutSeconds": args.timeout,
+        "analysisSeconds": round(elapsed, 3),
+        "total": total.as_dict(),
+        "files": files,
+    }
+    result = summary["total"]
+
+    print("=" * 80)
+    print("📡 ANÁLISIS DE LOGS DE COMUNICACIÓN")
+    print("=" * 80)
+    print()
+    print(f"📄 {result['files']} archivo(s), {result['lines']} líneas ({result['parsedLines']} reconocidas)"
+          f" en {elapsed:.2f} s")
+    print(f"   Frames TX / RX:      {result['txFrames']} / {result['rxFrames']}")
+    print(f"   Bytes/s TX / RX:     {result['txBytesPerSecond']} / {result['rxBytesPerSecond']}")
+    print(f"   LRC incorrecto:      {result['badLrcTx']} TX, {result['badLrcRx']} RX"
+          f" ({result['lrcFailureRate'] * 100:.3f}%)")
+    print(f"   Errores de escritura: {result['writeErrors']}")
+    print(f"   Timeouts informados: {result['timeoutEvents']}")
+    print(f"   RX sin TX / TX sin respuesta al final: {result['unpairedResponses']} / {result['unanswered']}")
+    print()
+    print(f"   {'Comando':10s} {'TX':>8s} {'Resp.':>8s} {'Timeout':>8s} {'Reint.':>8s} {'LRC':>6s}"
+          f" {'Media ms':>10s} {'p50<ms':>8s} {'p99<ms':>8s} {'Máx. ms':>8s}")
+    for name, stats in result["commands"].items():
+        icon = "⚠️ " if stats["timeouts"] or stats["retries"] or stats["badLrc"] else "   "
+        print(f"{icon}{name:10s} {stats['requests']:8d} {stats['responses']:8d} {stats['timeouts']:8d}"
+              f" {stats['retries']:8d} {stats['badLrc']:6d} {stats['latencyMeanMs']:10.1f} {stats['latencyP50Ms']:8d}"
+              f" {stats['latencyP99Ms']:8d} {stats['latencyMaxMs']:8d}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        print()
+        print(f"📝 Resumen JSON: {args.json}")
+    if args.html:
+        with open(args.html, "w", encoding="utf-8") as f:
+            f.write(render_html(summary))
+        print(f"📝 Reporte HTML: {args.html}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
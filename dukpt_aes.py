@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Motor DUKPT AES (ANSI X9.24-3) del lado host.
+
+Deriva las llaves de trabajo (PIN, MAC, datos) de cualquier transacción a
+partir de la IPEK inyectada y del KSN que reporta el terminal.
+
+Uso:
+    python3 dukpt_aes.py --ipek <hex> --ksn <hex>
+    python3 dukpt_aes.py --bdk <hex> --ksn <hex> --usage PIN
+
+Notas:
+    - Con --bdk la llave inicial se deriva según X9.24-3 (derive_initial_key,
+      uso "Initial Key" sobre el Initial Key ID), igual que las IPEK AES de
+      generate_dukpt_keys.py.
+    - El KSN AES tiene 12 bytes: Initial Key ID (8) + contador (4). Un KSN
+      Futurex de 10 bytes (BDK ID | Device ID | contador de 21 bits) se
+      convierte explícitamente con futurex_ksn_to_aes: los 59 bits de BDK ID
+      y Device ID pasan al Initial Key ID y el contador de 21 bits al
+      contador, así ningún bit del dispositivo cae en el contador.
+    - Las llaves intermedias del árbol de contadores se guardan en un cache
+      LRU, de modo que transacciones consecutivas de un mismo terminal
+      reutilizan casi todo el camino de derivación.
+"""
+
+import argparse
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from cipher_cache import ecb_encrypt
+from generate_dukpt_keys import bytes_to_hex, hex_to_bytes
+from kcv import calculate_kcv
+
+# ========== CONSTANTES X9.24-3 ==========
+
+KSN_LENGTH = 12
+FUTUREX_KSN_LENGTH = 10
+FUTUREX_COUNTER_BITS = 21  # Contador del KSN Futurex (generate_dukpt_keys.KSN_COUNTER_BITS)
+COUNTER_BITS = 32
+MAX_COUNTER_ONE_BITS = 16  # Un contador válido no tiene más de 16 bits en 1
+DEFAULT_CACHE_SIZE = 4096
+
+# Tipos de llave: (indicador de algoritmo, longitud en bits)
+KEY_TYPES: Dict[str, Tuple[int, int]] = {
+    "2TDEA": (0x0000, 128),
+    "3TDEA": (0x0001, 192),
+    "AES128": (0x0002, 128),
+    "AES192": (0x0003, 192),
+    "AES256": (0x0004, 256),
+}
+
+# Usos de llave (Key Usage Indicator)
+KEY_USAGES: Dict[str, int] = {
+    "KEK": 0x0002,
+    "PIN": 0x1000,
+    "MAC_GEN": 0x2000,
+    "MAC_VERIFY": 0x2001,
+    "MAC": 0x2002,
+    "DATA_ENCRYPT": 0x3000,
+    "DATA_DECRYPT": 0x3001,
+    "DATA": 0x3002,
+    "KEY_DERIVATION": 0x8000,
+    "INITIAL_KEY": 0x8001,
+}
+
+# ========== FUNCIONES AUXILIARES ==========
+
+def key_type_for_length(key: bytes) -> str:
+    """Devuelve el tipo de llave AES que corresponde a la longitud de la llave."""
+    types = {16: "AES128", 24: "AES192", 32: "AES256"}
+    if len(key) not in types:
+        raise ValueError(f"Longitud de llave AES no soportada: {len(key)} bytes")
+    return types[len(key)]
+
+def futurex_ksn_to_aes(ksn: bytes) -> bytes:
+    """
+    Convierte un KSN Futurex de 10 bytes al formato de 12 bytes de X9.24-3.
+
+    BDK ID y Device ID (los 59 bits altos) forman el Initial Key ID de 8
+    bytes y el contador de 21 bits queda en el contador de 4 bytes.
+    """
+    if len(ksn) != FUTUREX_KSN_LENGTH:
+        raise ValueError(f"KSN Futurex inválido: {len(ksn)} bytes (se esperan 10)")
+    value = int.from_bytes(ksn, 'big')
+    counter = value & ((1 << FUTUREX_COUNTER_BITS) - 1)
+    return (value >> FUTUREX_COUNTER_BITS).to_bytes(8, 'big') + counter.to_bytes(4, 'big')
+
+def normalize_ksn(ksn: bytes) -> bytes:
+    """
+    Normaliza un KSN al formato de 12 bytes de X9.24-3.
+
+    Args:
+        ksn: KSN de 12 bytes, o de 10 bytes (formato Futurex, ver futurex_ksn_to_aes)
+
+    Returns:
+        KSN de 12 bytes
+    """
+    if len(ksn) == KSN_LENGTH:
+        return ksn
+    if len(ksn) == FUTUREX_KSN_LENGTH:
+        return futurex_ksn_to_aes(ksn)
+    raise ValueError(f"KSN inválido: {len(ksn)} bytes (se esperan 10 o 12)")
+
+def split_ksn(ksn: bytes) -> Tuple[bytes, int]:
+    """
+    Separa un KSN en Initial Key ID y contador de transacciones.
+
+    Returns:
+        (Initial Key ID de 8 bytes, contador)
+    """
+    ksn = normalize_ksn(ksn)
+    return ksn[:8], int.from_bytes(ksn[8:], 'big')
+
+def create_derivation_data(key_usage: int, key_type: str, initial_key_id: bytes,
+                           counter: Optional[int] = None) -> bytearray:
+    """
+    Arma el bloque de datos de derivación (16 bytes) de X9.24-3.
+
+    Args:
+        key_usage: Indicador de uso de la llave derivada
+        key_type: Tipo de la llave derivada (AES128, AES192, ...)
+        initial_key_id: Initial Key ID (8 bytes)
+        counter: Contador de transacciones; None para derivar la llave inicial
+    """
+    algorithm_indicator, length_bits = KEY_TYPES[key_type]
+    data = bytearray(16)
+    data[0] = 0x01  # Versión
+    data[1] = 0x01  # Contador de bloque (se ajusta en derive_key)
+    data[2:4] = key_usage.to_bytes(2, 'big')
+    data[4:6] = algorithm_indicator.to_bytes(2, 'big')
+    data[6:8] = length_bits.to_bytes(2, 'big')
+    if counter is None:
+        data[8:16] = initial_key_id[:8]
+    else:
+        data[8:12] = initial_key_id[4:8]
+        data[12:16] = counter.to_bytes(4, 'big')
+    return data
+
+def derive_key(derivation_key: bytes, key_type: str, derivation_data: bytearray) -> bytes:
+    """
+    Deriva una llave cifrando los datos de derivación con la llave derivadora.
+
+    Se cifra un bloque por cada 128 bits de la llave resultante, variando el
+    contador de bloque (byte 1 de los datos de derivación).
+    """
+    length = KEY_TYPES[key_type][1] // 8
+    blocks = (length + 15) // 16
+
+    data = bytearray(derivation_data)
+    plaintext = bytearray()
+    for block in range(1, blocks + 1):
+        data[1] = block
+        plaintext += data
+
+    return ecb_encrypt("AES", derivation_key, bytes(plaintext))[:length]
+
+def derive_initial_key(bdk: bytes, initial_key_id: bytes, key_type: Optional[str] = None) -> bytes:
+    """
+    Deriva la llave inicial según X9.24-3 (sección "Derive Initial Key").
+
+    Args:
+        bdk: Base Derivation Key AES
+        initial_key_id: Initial Key ID (8 bytes)
+        key_type: Tipo de la llave inicial (por defecto, el de la BDK)
+    """
+    return derive_initial_keys(bdk, [initial_key_id], key_type)[0]
+
+def derive_initial_keys(bdk: bytes, initial_key_ids: Sequence[bytes],
+                        key_type: Optional[str] = None) -> List[bytes]:
+    """
+    Deriva las llaves iniciales de varios Initial Key ID con la misma BDK.
+
+    Los bloques de derivación de todo el lote se cifran con una sola
+    llamada (ver derive_key); el resultado es el mismo que llamar a
+    derive_initial_key por cada ID.
+    """
+    key_type = key_type or key_type_for_length(bdk)
+    length = KEY_TYPES[key_type][1] // 8
+    blocks = (length + 15) // 16
+    plaintext = bytearray()
+    for initial_key_id in initial_key_ids:
+        data = create_derivation_data(KEY_USAGES["INITIAL_KEY"], key_type, initial_key_id)
+        for block in range(1, blocks + 1):
+            data[1] = block
+            plaintext += data
+    if not plaintext:
+        return []
+    encrypted = ecb_encrypt("AES", bdk, bytes(plaintext))
+    step = blocks * 16
+    return [encrypted[i:i + length] for i in range(0, len(encrypted), step)]
+
+# ========== MOTOR DUKPT ==========
+
+class AesDukptEngine:
+    """
+    Deriva llaves de trabajo DUKPT AES para un terminal (una IPEK).
+
+    Las llaves intermedias se indexan por el prefijo del contador (los bits en
+    1 más significativos) y se guardan en un cache LRU acotado. Para derivar
+    la llave de un contador se parte del prefijo más largo ya presente en el
+    cache, así que contadores consecutivos cuestan una o dos operaciones AES.
+    """
+
+    def __init__(self, initial_key: bytes, initial_key_id: bytes,
+                 cache_size: int = DEFAULT_CACHE_SIZE):
+        """
+        Args:
+            initial_key: IPEK inyectada en el terminal
+            initial_key_id: Initial Key ID (8 bytes) o KSN inicial (10/12 bytes)
+            cache_size: Máximo de llaves intermedias en cache
+        """
+        if len(initial_key_id) != 8:
+            initial_key_id, _ = split_ksn(initial_key_id)
+        self.initial_key = initial_key
+        self.initial_key_id = initial_key_id
+        self.key_type = key_type_for_length(initial_key)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[int, bytes]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.aes_operations = 0
+
+    @classmethod
+    def from_bdk(cls, bdk: bytes, ksn: bytes, cache_size: int = DEFAULT_CACHE_SIZE) -> "AesDukptEngine":
+        """
+        Crea el motor derivando la llave inicial desde la BDK (X9.24-3).
+
+        Args:
+            bdk: Base Derivation Key AES
+            ksn: KSN del terminal (12 bytes, o 10 en formato Futurex; cualquier contador)
+        """
+        initial_key_id, _ = split_ksn(ksn)
+        return cls(derive_initial_key(bdk, initial_key_id), initial_key_id, cache_size)
+
+    def _cache_get(self, counter: int) -> Optional[bytes]:
+        key = self._cache.get(counter)
+        if key is not None:
+            self._cache.move_to_end(counter)
+        return key
+
+    def _cache_put(self, counter: int, key: bytes):
+        self._cache[counter] = key
+        self._cache.move_to_end(counter)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def derivation_key(self, counter: int) -> bytes:
+        """
+        Devuelve la llave intermedia correspondiente a un contador.
+
+        Recorre solo los bits en 1 del contador, desde el más significativo.
+        """
+        if not 0 <= counter < (1 << COUNTER_BITS):
+            raise ValueError(f"Contador fuera de rango: {counter:#x}")
+        if bin(counter).count('1') > MAX_COUNTER_ONE_BITS:
+            raise ValueError(f"Contador inválido (más de {MAX_COUNTER_ONE_BITS} bits en 1): {counter:#x}")
+
+        # Prefijos del contador: cada uno agrega el siguiente bit en 1
+        prefixes: List[int] = []
+        prefix = 0
+        mask = 1 << (COUNTER_BITS - 1)
+        while mask:
+            if counter & mask:
+                prefix |= mask
+                prefixes.append(prefix)
+            mask >>= 1
+
+        # Buscar el prefijo más largo ya derivado
+        key = self.initial_key
+        start = 0
+        for index in range(len(prefixes) - 1, -1, -1):
+            cached = self._cache_get(prefixes[index])
+            if cached is not None:
+                self.hits += 1
+                key = cached
+                start = index + 1
+                break
+        else:
+            if prefixes:
+                self.misses += 1
+
+        for prefix in prefixes[start:]:
+            data = create_derivation_data(KEY_USAGES["KEY_DERIVATION"], self.key_type,
+                                          self.initial_key_id, prefix)
+            key = derive_key(key, self.key_type, data)
+            self.aes_operations += 1
+            self._cache_put(prefix, key)
+
+        return key
+
+    def working_key(self, ksn_or_counter, usage: str = "PIN",
+                    working_key_type: Optional[str] = None) -> bytes:
+        """
+        Deriva una llave de trabajo.
+
+        Args:
+            ksn_or_counter: KSN de la transacción (10/12 bytes) o contador
+            usage: PIN, MAC_GEN, MAC_VERIFY, MAC, DATA_ENCRYPT, DATA_DECRYPT, DATA o KEK
+            working_key_type: Tipo de la llave de trabajo (por defecto, el de la IPEK)
+
+        Returns:
+            Llave de trabajo
+        """
+        if isinstance(ksn_or_counter, int):
+            counter = ksn_or_counter
+        else:
+            initial_key_id, counter = split_ksn(ksn_or_counter)
+            if initial_key_id != self.initial_key_id:
+                raise ValueError("El KSN no pertenece a este terminal (Initial Key ID distinto)")
+
+        if usage not in KEY_USAGES:
+            raise ValueError(f"Uso de llave no soportado: {usage}")
+        working_key_type = working_key_type or self.key_type
+
+        derivation_key = self.derivation_key(counter)
+        data = create_derivation_data(KEY_USAGES[usage], working_key_type,
+                                      self.initial_key_id, counter)
+        self.aes_operations += 1
+        return derive_key(derivation_key, working_key_type, data)
+
+    def pin_key(self, ksn_or_counter) -> bytes:
+        return self.working_key(ksn_or_counter, "PIN")
+
+    def mac_key(self, ksn_or_counter, verify: bool = False) -> bytes:
+        return self.working_key(ksn_or_counter, "MAC_VERIFY" if verify else "MAC_GEN")
+
+    def data_key(self, ksn_or_counter, decrypt: bool = False) -> bytes:
+        return self.working_key(ksn_or_counter, "DATA_DECRYPT" if decrypt else "DATA_ENCRYPT")
+
+    def cache_info(self) -> Dict[str, int]:
+        """Estadísticas del cache de llaves intermedias."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._cache),
+            "maxSize": self.cache_size,
+            "aesOperations": self.aes_operations,
+        }
+
+    def clear_cache(self):
+        self._cache.clear()
+
+# ========== FUNCIÓN PRINCIPAL ==========
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="Derivación de llaves de trabajo DUKPT AES (X9.24-3)")
+    parser.add_argument("--ipek", help="IPEK en hex")
+    parser.add_argument("--bdk", help="BDK en hex (la llave inicial se deriva según X9.24-3)")
+    parser.add_argument("--initial-ksn", help="KSN inicial inyectado (por defecto, --ksn)")
+    parser.add_argument("--ksn", required=True, help="KSN de la transacción (20 o 24 caracteres hex)")
+    parser.add_argument("--usage", choices=sorted(KEY_USAGES), help="Uso a derivar (por defecto, todos)")
+    args = parser.parse_args(argv)
+
+    ksn = hex_to_bytes(args.ksn)
+    initial_ksn = hex_to_bytes(args.initial_ksn) if args.initial_ksn else ksn
+
+    if args.bdk:
+        engine = AesDukptEngine.from_bdk(hex_to_bytes(args.bdk), initial_ksn)
+    elif args.ipek:
+        engine = AesDukptEngine(hex_to_bytes(args.ipek), initial_ksn)
+    else:
+        parser.error("Se requiere --ipek o --bdk")
+
+    print(f"🔑 IPEK: {bytes_to_hex(engine.initial_key)} (KCV {calculate_kcv(engine.initial_key)})")
+    print(f"   KSN:  {bytes_to_hex(normalize_ksn(ksn))}")
+    print()
+    usages = [args.usage] if args.usage else ["PIN", "MAC_GEN", "MAC_VERIFY", "DATA_ENCRYPT", "DATA_DECRYPT"]
+    for usage in usages:
+        key = engine.working_key(ksn, usage)
+        print(f"   {usage:13s} {bytes_to_hex(key)}  KCV {calculate_kcv(key)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,563 @@
+#!/usr/bin/env python3
+"""
+DUKPT TDES (ANSI X9.24-1, 2TDEA) del lado host y del terminal.
+
+Incluye:
+    - Generación no reversible de llaves (NRKGP)
+    - Registros de llaves futuras del terminal (TdesDukptOriginator)
+    - Derivación de llaves de sesión en el host recorriendo solo los bits en 1
+      del contador, con cache LRU de llaves intermedias (TdesDukptEngine)
+    - Variantes PIN, MAC y datos (request/response)
+    - Verificación masiva de PIN blocks desde un CSV, con opción de repartir
+      el archivo por BDK ID entre varios procesos
+
+Uso:
+    python3 dukpt_tdes.py keys --bdk <hex> --ksn <hex>
+    python3 dukpt_tdes.py verify --input transacciones.csv --bdk FFFF987654=<hex> --processes 8
+    python3 dukpt_tdes.py sample --bdk FFFF987654=<hex> --devices 100 --transactions 1000 --output tx.csv
+
+Formato del CSV de verificación (con encabezado):
+    ksn,pinBlock[,pan][,pin]
+"""
+
+import argparse
+import contextlib
+import csv
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from multiprocessing import Pool
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from cipher_cache import ecb_decrypt, ecb_encrypt
+from generate_dukpt_keys import (
+    KSN_COUNTER_BITS, KSN_COUNTER_MASK, TDES_KEY_MASK,
+    bytes_to_hex, hex_to_bytes, derive_ipek_3des,
+)
+from kcv import calculate_kcv
+from pin_block import decode_pin_block, encode_pin_block
+
+# ========== CONSTANTES X9.24-1 ==========
+
+NUM_FUTURE_KEYS = KSN_COUNTER_BITS  # Un registro por bit del contador
+MAX_COUNTER_ONE_BITS = 10  # El terminal salta contadores con más de 10 bits en 1
+BDK_ID_LENGTH = 5  # Bytes del KSN que identifican la BDK
+DEFAULT_CACHE_SIZE = 256
+ENGINE_CACHE_SIZE = 10000  # Terminales con motor activo por proceso
+
+# Variantes aplicadas a la llave futura para obtener la llave de sesión
+KEY_VARIANTS: Dict[str, bytes] = {
+    "PIN": bytes.fromhex("00000000000000FF00000000000000FF"),
+    "MAC_REQUEST": bytes.fromhex("000000000000FF00000000000000FF00"),
+    "MAC_RESPONSE": bytes.fromhex("00000000FF00000000000000FF000000"),
+    "DATA_REQUEST": bytes.fromhex("0000000000FF00000000000000FF0000"),
+    "DATA_RESPONSE": bytes.fromhex("000000FF00000000000000FF00000000"),
+}
+
+_TDES_KEY_MASK_INT = int.from_bytes(TDES_KEY_MASK, 'big')
+
+# Estados de verificación
+STATUS_OK = "OK"
+STATUS_MISMATCH = "MISMATCH"
+STATUS_INVALID_PIN_BLOCK = "INVALID_PIN_BLOCK"
+STATUS_INVALID_KSN = "INVALID_KSN"
+STATUS_UNKNOWN_BDK = "UNKNOWN_BDK"
+RESULT_FIELDS = ["line", "ksn", "status", "pin"]
+
+# ========== PRIMITIVAS ==========
+
+def _des_encrypt(key: int, block: int) -> int:
+    """DES simple (TripleDES con llave de 8 bytes) sobre enteros de 64 bits."""
+    encrypted = ecb_encrypt("TDES", key.to_bytes(8, 'big'), block.to_bytes(8, 'big'))
+    return int.from_bytes(encrypted, 'big')
+
+def non_reversible_key_generation(key: bytes, ksn_register: int) -> bytes:
+    """
+    Proceso de generación no reversible de llaves (NRKGP) de X9.24-1.
+
+    Args:
+        key: Llave actual (16 bytes)
+        ksn_register: 64 bits más a la derecha del KSN (con el bit del contador ya en 1)
+
+    Returns:
+        Nueva llave (16 bytes)
+    """
+    key_int = int.from_bytes(key, 'big')
+
+    def half(k: int) -> int:
+        left, right = k >> 64, k & 0xFFFFFFFFFFFFFFFF
+        return _des_encrypt(left, ksn_register ^ right) ^ right
+
+    right_half = half(key_int)
+    left_half = half(key_int ^ _TDES_KEY_MASK_INT)
+    return ((left_half << 64) | right_half).to_bytes(16, 'big')
+
+def apply_variant(future_key: bytes, usage: str = "PIN") -> bytes:
+    """
+    Convierte una llave futura en llave de sesión para un uso.
+
+    Para las llaves de datos se aplica además la función de un solo sentido
+    (cada mitad se cifra con la propia llave con variante).
+    """
+    if usage not in KEY_VARIANTS:
+        raise ValueError(f"Uso de llave no soportado: {usage}")
+    key = bytes(a ^ b for a, b in zip(future_key, KEY_VARIANTS[usage]))
+    if usage.startswith("DATA"):
+        key = ecb_encrypt("TDES", key, key)
+    return key
+
+def split_ksn(ksn: bytes) -> Tuple[int, int]:
+    """
+    Separa un KSN de 10 bytes.
+
+    Returns:
+        (registro KSN de 64 bits con el contador en 0, contador de 21 bits)
+    """
+    if len(ksn) != 10:
+        raise ValueError(f"KSN inválido: {len(ksn)} bytes (se esperan 10)")
+    register = int.from_bytes(ksn[2:], 'big')
+    return register & ~KSN_COUNTER_MASK, register & KSN_COUNTER_MASK
+
+def initial_ksn(ksn: bytes) -> bytes:
+    """KSN con el contador de transacciones en 0."""
+    return (int.from_bytes(ksn, 'big') & ~KSN_COUNTER_MASK).to_bytes(10, 'big')
+
+# ========== TERMINAL (ORIGINADOR) ==========
+
+class TdesDukptOriginator:
+    """
+    Simula el lado terminal de DUKPT TDES con sus 21 registros de llaves futuras.
+
+    Sirve para generar transacciones de prueba y validar el motor del host.
+    """
+
+    def __init__(self, ipek: bytes, ksn: bytes):
+        """
+        Args:
+            ipek: IPEK inyectada (16 bytes)
+            ksn: KSN inicial (10 bytes)
+        """
+        self.ksn_prefix = ksn[:2]
+        self.ksn_register, _ = split_ksn(ksn)
+        self.future_keys: List[Optional[bytes]] = [None] * NUM_FUTURE_KEYS
+        self.counter = 0
+
+        # Cargar llave inicial: se generan los 21 registros y la IPEK se descarta
+        self._generate_future_keys(ipek, 1 << (NUM_FUTURE_KEYS - 1))
+        self.counter = 1
+
+    @staticmethod
+    def _register_index(shift: int) -> int:
+        """Registro #1 = bit más significativo del contador (índice 0)."""
+        return NUM_FUTURE_KEYS - shift.bit_length()
+
+    def _generate_future_keys(self, key: bytes, shift: int):
+        while shift:
+            register = self.ksn_register | self.counter | shift
+            self.future_keys[self._register_index(shift)] = non_reversible_key_generation(key, register)
+            shift >>= 1
+
+    def current_ksn(self) -> bytes:
+        return self.ksn_prefix + (self.ksn_register | self.counter).to_bytes(8, 'big')
+
+    def next_transaction(self, usage: str = "PIN") -> Tuple[bytes, bytes]:
+        """
+        Toma la llave de la transacción actual y avanza el contador.
+
+        Returns:
+            (KSN de la transacción, llave de sesión)
+        """
+        if self.counter > KSN_COUNTER_MASK:
+            raise RuntimeError("Contador DUKPT agotado: se requiere una nueva IPEK")
+
+        shift = self.counter & -self.counter
+        index = self._register_index(shift)
+        future_key = self.future_keys[index]
+        ksn = self.current_ksn()
+
+        if bin(self.counter).count('1') < MAX_COUNTER_ONE_BITS:
+            self._generate_future_keys(future_key, shift >> 1)
+            self.counter += 1
+        else:
+            self.counter += shift
+        self.future_keys[index] = None
+
+        return ksn, apply_variant(future_key, usage)
+
+    def encrypt_pin(self, pin: str, pan: Optional[str] = None, pin_format: int = 0) -> Tuple[bytes, bytes]:
+        """
+        Cifra un PIN con la llave de la transacción actual.
+
+        Returns:
+            (KSN, PIN block cifrado)
+        """
+        ksn, key = self.next_transaction("PIN")
+        block = encode_pin_block(pin, pin_format, pan)
+        return ksn, ecb_encrypt("TDES", key, block)
+
+# ========== HOST ==========
+
+class TdesDukptEngine:
+    """
+    Deriva llaves de sesión DUKPT TDES en el host para un terminal.
+
+    La llave futura de un contador se obtiene aplicando NRKGP una vez por cada
+    bit en 1, empezando por el más significativo. Los resultados intermedios se
+    guardan en un cache LRU por prefijo del contador, así que transacciones
+    consecutivas solo derivan los últimos bits.
+    """
+
+    def __init__(self, ipek: bytes, ksn: bytes, cache_size: int = DEFAULT_CACHE_SIZE):
+        """
+        Args:
+            ipek: IPEK inyectada (16 bytes)
+            ksn: KSN del terminal (10 bytes, cualquier contador)
+            cache_size: Máximo de llaves intermedias en cache
+        """
+        self.ipek = ipek
+        self.initial_ksn = initial_ksn(ksn)
+        self.ksn_register, _ = split_ksn(ksn)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[int, bytes]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.nrkgp_operations = 0
+
+    @classmethod
+    def from_bdk(cls, bdk: bytes, ksn: bytes, cache_size: int = DEFAULT_CACHE_SIZE) -> "TdesDukptEngine":
+        """Crea el motor derivando la IPEK con derive_ipek_3des()."""
+        return cls(derive_ipek_3des(bdk, ksn), ksn, cache_size)
+
+    def future_key(self, counter: int) -> bytes:
+        """Llave futura (sin variante) correspondiente a un contador."""
+        if not 0 <= counter <= KSN_COUNTER_MASK:
+            raise ValueError(f"Contador fuera de rango: {counter:#x}")
+
+        prefixes: List[int] = []
+        prefix = 0
+        mask = 1 << (KSN_COUNTER_BITS - 1)
+        while mask:
+            if counter & mask:
+                prefix |= mask
+                prefixes.append(prefix)
+            mask >>= 1
+
+        key = self.ipek
+        start = 0
+        for index in range(len(prefixes) - 1, -1, -1):
+            cached = self._cache.get(prefixes[index])
+            if cached is not None:
+                self._cache.move_to_end(prefixes[index])
+                self.hits += 1
+                key = cached
+                start = index + 1
+                break
+        else:
+            if prefixes:
+                self.misses += 1
+
+        for prefix in prefixes[start:]:
+            key = non_reversible_key_generation(key, self.ksn_register | prefix)
+            self.nrkgp_operations += 1
+            self._cache[prefix] = key
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return key
+
+    def _counter(self, ksn_or_counter) -> int:
+        if isinstance(ksn_or_counter, int):
+            return ksn_or_counter
+        if initial_ksn(ksn_or_counter) != self.initial_ksn:
+            raise ValueError("El KSN no pertenece a este terminal")
+        return split_ksn(ksn_or_counter)[1]
+
+    def session_key(self, ksn_or_counter, usage: str = "PIN") -> bytes:
+        """
+        Llave de sesión para un KSN (o contador) y un uso.
+
+        Args:
+            ksn_or_counter: KSN de la transacción (10 bytes) o contador
+            usage: PIN, MAC_REQUEST, MAC_RESPONSE, DATA_REQUEST o DATA_RESPONSE
+        """
+        return apply_variant(self.future_key(self._counter(ksn_or_counter)), usage)
+
+    def pin_key(self, ksn_or_counter) -> bytes:
+        return self.session_key(ksn_or_counter, "PIN")
+
+    def mac_key(self, ksn_or_counter, response: bool = False) -> bytes:
+        return self.session_key(ksn_or_counter, "MAC_RESPONSE" if response else "MAC_REQUEST")
+
+    def data_key(self, ksn_or_counter, response: bool = False) -> bytes:
+        return self.session_key(ksn_or_counter, "DATA_RESPONSE" if response else "DATA_REQUEST")
+
+    def decrypt_pin_block(self, ksn: bytes, pin_block: bytes) -> bytes:
+        """Descifra un PIN block con la llave de sesión PIN del KSN."""
+        return ecb_decrypt("TDES", self.pin_key(ksn), pin_block)
+
+    def cache_info(self) -> Dict[str, int]:
+        """Estadísticas del cache de llaves intermedias."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._cache),
+            "maxSize": self.cache_size,
+            "nrkgpOperations": self.nrkgp_operations,
+        }
+
+# ========== VERIFICACIÓN MASIVA ==========
+
+class PinBlockVerifier:
+    """
+    Verifica PIN blocks de muchos terminales que comparten un conjunto de BDKs.
+
+    Mantiene un motor por terminal (KSN inicial) en un LRU acotado, de modo que
+    las transacciones de un mismo terminal aprovechan su cache de llaves.
+    """
+
+    def __init__(self, bdks: Dict[str, bytes], engine_cache_size: int = ENGINE_CACHE_SIZE):
+        """
+        Args:
+            bdks: BDK ID (10 caracteres hex) → BDK
+            engine_cache_size: Máximo de terminales con motor activo
+        """
+        self.bdks = {bdk_id.upper(): bdk for bdk_id, bdk in bdks.items()}
+        self.engine_cache_size = engine_cache_size
+        self._engines: "OrderedDict[bytes, TdesDukptEngine]" = OrderedDict()
+
+    def _engine(self, ksn: bytes, bdk: bytes) -> TdesDukptEngine:
+        key = initial_ksn(ksn)
+        engine = self._engines.get(key)
+        if engine is None:
+            engine = TdesDukptEngine.from_bdk(bdk, ksn)
+            self._engines[key] = engine
+            if len(self._engines) > self.engine_cache_size:
+                self._engines.popitem(last=False)
+        else:
+            self._engines.move_to_end(key)
+        return engine
+
+    def verify(self, ksn_hex: str, pin_block_hex: str, pan: Optional[str] = None,
+               expected_pin: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Verifica un PIN block.
+
+        Returns:
+            (estado, PIN descifrado o vacío)
+        """
+        try:
+            ksn = hex_to_bytes(ksn_hex)
+            pin_block = hex_to_bytes(pin_block_hex)
+            if len(ksn) != 10 or len(pin_block) != 8:
+                raise ValueError
+        except ValueError:
+            return STATUS_INVALID_KSN, ""
+
+        bdk = self.bdks.get(ksn_hex[:BDK_ID_LENGTH * 2].upper())
+        if bdk is None:
+            return STATUS_UNKNOWN_BDK, ""
+
+        clear = self._engine(ksn, bdk).decrypt_pin_block(ksn, pin_block)
+        try:
+            pin = decode_pin_block(clear, pan or None)
+        except ValueError:
+            return STATUS_INVALID_PIN_BLOCK, ""
+        if expected_pin and pin != expected_pin:
+            return STATUS_MISMATCH, pin
+        return STATUS_OK, pin
+
+def _verify_rows(rows: Iterable[Tuple[int, dict]], verifier: PinBlockVerifier,
+                 writer: "csv.writer", summary: Dict[str, int]):
+    for line, row in rows:
+        status, pin = verifier.verify(row.get('ksn', ''), row.get('pinBlock', ''),
+                                      row.get('pan'), row.get('pin'))
+        writer.writerow([line, row.get('ksn', ''), status, pin])
+        summary[status] = summary.get(status, 0) + 1
+
+def _numbered_rows(csv_path: str) -> Iterator[Tuple[int, dict]]:
+    with open(csv_path, newline='') as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            yield int(row.pop('line', line) or line), row
+
+def _verify_partition(task: Tuple[str, str, bytes, str]) -> Dict[str, int]:
+    """Trabajo de un proceso: verifica el archivo de una BDK."""
+    input_path, bdk_id, bdk, output_path = task
+    verifier = PinBlockVerifier({bdk_id: bdk})
+    summary: Dict[str, int] = {}
+    with open(output_path, 'w', newline='') as f:
+        _verify_rows(_numbered_rows(input_path), verifier, csv.writer(f), summary)
+    return summary
+
+def _merge_summaries(summaries: Iterable[Dict[str, int]]) -> Dict[str, int]:
+    total: Dict[str, int] = {}
+    for summary in summaries:
+        for status, count in summary.items():
+            total[status] = total.get(status, 0) + count
+    return total
+
+def verify_pin_block_file(input_path: str, output_path: str, bdks: Dict[str, bytes],
+                          processes: int = 1) -> Dict[str, int]:
+    """
+    Verifica todos los PIN blocks de un CSV y escribe un resultado por fila.
+
+    Con processes > 1 el archivo se reparte por BDK ID en archivos temporales
+    y cada BDK se verifica en un proceso distinto; el resultado conserva el
+    número de línea original para poder cruzarlo con la entrada.
+
+    Args:
+        input_path: CSV con columnas ksn, pinBlock y opcionalmente pan, pin
+        output_path: CSV de resultados (line, ksn, status, pin)
+        bdks: BDK ID (10 caracteres hex) → BDK
+        processes: Procesos de trabajo
+
+    Returns:
+        Cantidad de filas por estado
+    """
+    bdks = {bdk_id.upper(): bdk for bdk_id, bdk in bdks.items()}
+
+    if processes <= 1 or len(bdks) <= 1:
+        summary: Dict[str, int] = {}
+        with open(output_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(RESULT_FIELDS)
+            _verify_rows(_numbered_rows(input_path), PinBlockVerifier(bdks), writer, summary)
+        return summary
+
+    workdir = tempfile.mkdtemp(prefix="dukpt_verify_")
+    try:
+        # 1. Repartir la entrada por BDK ID
+        partitions: Dict[str, Tuple[str, "csv.writer"]] = {}
+        unknown: Dict[str, int] = {}
+        # Los archivos de las particiones se cierran aunque falle la lectura
+        with contextlib.ExitStack() as stack:
+            out = stack.enter_context(open(output_path, 'w', newline=''))
+            result_writer = csv.writer(out)
+            result_writer.writerow(RESULT_FIELDS)
+            for line, row in _numbered_rows(input_path):
+                bdk_id = row.get('ksn', '')[:BDK_ID_LENGTH * 2].upper()
+                if bdk_id not in bdks:
+                    result_writer.writerow([line, row.get('ksn', ''), STATUS_UNKNOWN_BDK, ""])
+                    unknown[STATUS_UNKNOWN_BDK] = unknown.get(STATUS_UNKNOWN_BDK, 0) + 1
+                    continue
+                if bdk_id not in partitions:
+                    path = os.path.join(workdir, f"{bdk_id}.csv")
+                    writer = csv.writer(stack.enter_context(open(path, 'w', newline='')))
+                    writer.writerow(["line", "ksn", "pinBlock", "pan", "pin"])
+                    partitions[bdk_id] = (path, writer)
+                partitions[bdk_id][1].writerow([line, row.get('ksn', ''), row.get('pinBlock', ''),
+                                                row.get('pan', ''), row.get('pin', '')])
+
+        # 2. Verificar cada BDK en su propio proceso
+        tasks = [(path, bdk_id, bdks[bdk_id], path + ".out")
+                 for bdk_id, (path, _) in partitions.items()]
+        with Pool(min(processes, len(tasks) or 1)) as pool:
+            summaries = pool.map(_verify_partition, tasks)
+
+        # 3. Unir resultados
+        with open(output_path, 'a', newline='') as out:
+            for _, _, _, partial in tasks:
+                with open(partial, newline='') as f:
+                    shutil.copyfileobj(f, out)
+        return _merge_summaries([unknown] + summaries)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def write_sample_transactions(output_path: str, bdks: Dict[str, bytes], devices: int,
+                              transactions: int, pan: str = "4012345678909") -> int:
+    """
+    Genera un CSV de transacciones de prueba simulando terminales reales.
+
+    Returns:
+        Cantidad de filas escritas
+    """
+    total = 0
+    with open(output_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["ksn", "pinBlock", "pan", "pin"])
+        for bdk_id, bdk in bdks.items():
+            for device in range(devices):
+                ksn = (int(bdk_id, 16) << 40 | (device + 1) << KSN_COUNTER_BITS).to_bytes(10, 'big')
+                originator = TdesDukptOriginator(derive_ipek_3des(bdk, ksn), ksn)
+                for transaction in range(transactions):
+                    pin = f"{(device * 7919 + transaction) % 10000:04d}"
+                    tx_ksn, block = originator.encrypt_pin(pin, pan)
+                    writer.writerow([bytes_to_hex(tx_ksn), bytes_to_hex(block), pan, pin])
+                    total += 1
+    return total
+
+# ========== FUNCIÓN PRINCIPAL ==========
+
+def _parse_bdks(values: Sequence[str], bdk_file: Optional[str]) -> Dict[str, bytes]:
+    bdks: Dict[str, bytes] = {}
+    if bdk_file:
+        with open(bdk_file) as f:
+            bdks.update({k: hex_to_bytes(v) for k, v in json.load(f).items()})
+    for value in values or []:
+        bdk_id, _, bdk_hex = value.partition("=")
+        bdks[bdk_id] = hex_to_bytes(bdk_hex)
+    return bdks
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="DUKPT TDES (ANSI X9.24-1)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    keys = sub.add_parser("keys", help="Mostrar las llaves de sesión de un KSN")
+    keys.add_argument("--bdk", help="BDK en hex")
+    keys.add_argument("--ipek", help="IPEK en hex")
+    keys.add_argument("--ksn", required=True, help="KSN de la transacción (20 caracteres hex)")
+
+    verify = sub.add_parser("verify", help="Verificar un CSV de PIN blocks")
+    verify.add_argument("--input", required=True)
+    verify.add_argument("--output", default="verificacion_pin_blocks.csv")
+    verify.add_argument("--bdk", action="append", help="BDK_ID=BDK (repetible)")
+    verify.add_argument("--bdk-file", help="JSON {BDK_ID: BDK}")
+    verify.add_argument("--processes", type=int, default=1)
+
+    sample = sub.add_parser("sample", help="Generar transacciones de prueba")
+    sample.add_argument("--bdk", action="append", help="BDK_ID=BDK (repetible)")
+    sample.add_argument("--bdk-file", help="JSON {BDK_ID: BDK}")
+    sample.add_argument("--devices", type=int, default=10)
+    sample.add_argument("--transactions", type=int, default=100)
+    sample.add_argument("--output", default="transacciones_dukpt.csv")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "keys":
+        ksn = hex_to_bytes(args.ksn)
+        if args.bdk:
+            engine = TdesDukptEngine.from_bdk(hex_to_bytes(args.bdk), ksn)
+        elif args.ipek:
+            engine = TdesDukptEngine(hex_to_bytes(args.ipek), ksn)
+        else:
+            parser.error("Se requiere --ipek o --bdk")
+        print(f"🔑 IPEK: {bytes_to_hex(engine.ipek)} (KCV {calculate_kcv(engine.ipek, '3DES')})")
+        print(f"   KSN:  {args.ksn.upper()}")
+        print()
+        for usage in KEY_VARIANTS:
+            key = engine.session_key(ksn, usage)
+            print(f"   {usage:13s} {bytes_to_hex(key)}  KCV {calculate_kcv(key, '3DES')}")
+        return
+
+    bdks = _parse_bdks(args.bdk, args.bdk_file)
+    if not bdks:
+        parser.error("Se requiere al menos una BDK (--bdk o --bdk-file)")
+
+    if args.command == "sample":
+        total = write_sample_transactions(args.output, bdks, args.devices, args.transactions)
+        print(f"✅ {total} transacciones guardadas en: {args.output}")
+        return
+
+    start = time.perf_counter()
+    summary = verify_pin_block_file(args.input, args.output, bdks, args.processes)
+    elapsed = time.perf_counter() - start
+    total = sum(summary.values())
+    print(f"✅ {total} PIN blocks verificados en {elapsed:.1f} s ({total / max(elapsed, 1e-9):.0f}/s)")
+    for status, count in sorted(summary.items()):
+        print(f"   {status:18s} {count}")
+    print(f"   Resultados: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Perfiles de inyección por terminal a partir de un manifiesto de flota.
+
+Lee un manifiesto (CSV o JSON Lines con `serialNumber` y `template`) y un
+archivo de plantillas, y por cada terminal arma un perfil con su propio
+KSN y su propia IPEK (derivada de la BDK de la plantilla con
+generate_dukpt_keys.IpekBatchDeriver), junto con el archivo de llaves que
+contiene esas IPEK.
+
+Uso:
+    python3 fleet_profiles.py flota.csv plantillas.json llaves.json --bundle flota.jsonl
+    python3 fleet_profiles.py flota.jsonl plantillas.json llaves.kvlt --output-dir perfiles/ --processes 8
+
+Plantillas:
+    {"templates": {
+        "retail-aes": {
+            "applicationType": "Retail",
+            "useKEK": false,
+            "keys": [
+                {"bdkKcv": "2EC772", "bdkId": "FFFF987654", "deviceIdStart": 0},
+                {"bdkHex": "0123...", "dukptType": "AES128", "bdkId": "FFFF000001", "slot": "05"},
+                {"keyType": "MASTER_KEY", "selectedKey": "D52453"}
+            ]
+        }
+    }}
+
+    Las entradas con bdkKcv (BDK buscada en los archivos de llaves) o bdkHex
+    son DUKPT: cada terminal recibe el siguiente Device ID libre de ese BDK
+    ID, su KSN (BDK ID | Device ID | contador en 0) y la IPEK derivada. Los
+    Device IDs se reservan en el log de ksn_allocator.py (--ksn-log), así
+    que una corrida nueva nunca repite los KSN de una anterior. El
+    resto se copia tal cual en cada perfil. Los slots que no se indican se
+    asignan en orden (01, 02, ...), en decimal, que es como los interpreta
+    el KeyReceiver.
+
+Salida:
+    --bundle: JSON Lines, una línea por terminal {"serialNumber", "profile", "keys"}
+    --output-dir: perfil_<serie>.json y llaves_<serie>.json por terminal
+
+El manifiesto se lee en flujo, los lotes de terminales se reparten en un
+pool de procesos (IPEK y KCV de todo el lote de una vez) y la salida se
+escribe en el orden del manifiesto.
+"""
+
+import argparse
+import collections
+import csv
+import itertools
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from multiprocessing import Pool
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from generate_dukpt_keys import IpekBatchDeriver, build_ksn, bytes_to_hex, dukpt_type_params
+from inject_profile import parse_slot
+from kcv import calculate_kcvs
+from key_files import write_keys_json
+from key_index import KeyIndex, KeyLookupError
+from ksn_allocator import DEFAULT_LOG_PATH, KsnAllocator
+
+FLEET_CHUNK_SIZE = 1024  # Terminales por tarea del pool
+IPEK_KEY_TYPE = "DUKPT_IPEK"
+PROFILE_DUKPT_KEY_TYPE = "DUKPT Initial Key (IPEK)"
+SERIAL_PATTERN = re.compile(r"[A-Za-z0-9_-]+")  # La serie forma parte de nombres de archivo
+
+# ========== PLANTILLAS ==========
+
+def dukpt_type_for(algorithm: str, key_length: int) -> str:
+    """Tipo DUKPT (AES128/AES192/AES256/3DES) para la BDK de un archivo de llaves."""
+    if "AES" in algorithm.upper():
+        return f"AES{key_length * 8}"
+    return "3DES"
+
+def ipek_algorithm_name(algorithm: str, ipek: bytes) -> str:
+    """Nombre de algoritmo de la IPEK, como en data/dukpt/keys (AES-128, DES_DOUBLE)."""
+    return f"AES-{len(ipek) * 8}" if algorithm == "AES" else "DES_DOUBLE"
+
+def _format_slot(slot: int) -> str:
+    return f"{slot:02d}"
+
+def resolve_templates(templates: dict, index: KeyIndex) -> Dict[str, dict]:
+    """
+    Valida las plantillas y resuelve sus BDK.
+
+    Returns:
+        {nombre: {"base": campos del perfil, "entries": [...]}} donde cada
+        entrada es ("dukpt", slot, bdk, algoritmo, bdkId, deviceIdStart) o
+        ("static", config)
+
+    Raises:
+        ValueError: si falta una BDK, su tipo DUKPT no es válido o un slot se repite
+    """
+    resolved = {}
+    for name, template in templates.get("templates", templates).items():
+        base = {
+            "applicationType": template.get("applicationType", "Retail"),
+            "useKEK": template.get("useKEK", template.get("useKTK", False)),
+            "selectedKEKKcv": template.get("selectedKEKKcv", template.get("selectedKTKKcv", "")),
+        }
+        entries = []
+        used_slots = set()
+        next_slot = 1
+        for number, entry in enumerate(template.get("keys", []), 1):
+            where = f"Plantilla '{name}', llave {number}"
+            if "slot" in entry:
+                slot = parse_slot(entry["slot"])
+            else:
+                while next_slot in used_slots:
+                    next_slot += 1
+                slot = next_slot
+            if slot in used_slots:
+                raise ValueError(f"{where}: slot {slot} repetido")
+            used_slots.add(slot)
+
+            if "bdkKcv" in entry or "bdkHex" in entry:
+                if "bdkHex" in entry:
+                    bdk = bytes.fromhex(entry["bdkHex"])
+                    dukpt_type = entry.get("dukptType", "AES128")
+                else:
+                    try:
+                        record = index.resolve(entry["bdkKcv"], "DUKPT_BDK")
+                    except KeyLookupError as e:
+                        raise ValueError(f"{where}: {e}") from None
+                    bdk = bytes.fromhex(record["keyHex"])
+                    dukpt_type = entry.get("dukptType") or dukpt_type_for(str(record.get("algorithm", "")), len(bdk))
+                key_size, algorithm = dukpt_type_params(dukpt_type)
+                if len(bdk) != key_size:
+                    raise ValueError(f"{where}: la BDK debe tener {key_size} bytes para {dukpt_type}")
+                bdk_id = bytes.fromhex(entry.get("bdkId", ""))
+                if len(bdk_id) != 5:
+                    raise ValueError(f"{where}: bdkId debe tener 10 caracteres hex")
+                entries.append(("dukpt", slot, bdk, algorithm, bdk_id, int(entry.get("deviceIdStart", 0))))
+            else:
+                config = {
+                    "usage": entry.get("usage", "UNKNOWN"),
+                    "keyType": entry.get("keyType", ""),
+                    "slot": _format_slot(slot),
+                    "selectedKey": entry.get("selectedKey", ""),
+                    "injectionMethod": entry.get("injectionMethod", "auto"),
+                    "ksn": entry.get("ksn", ""),
+                }
+                entries.append(("static", config))
+        resolved[name] = {"base": base, "entries": entries}
+    return resolved
+
+# ========== MANIFIESTO ==========
+
+def check_serial(serial: str) -> str:
+    """
+    Valida un número de serie (letras, dígitos, '_' y '-').
+
+    Raises:
+        ValueError: si tiene otros caracteres (p. ej. '/' o '..')
+    """
+    if not SERIAL_PATTERN.fullmatch(serial):
+        raise ValueError(f"Número de serie inválido: {serial!r} (solo letras, dígitos, '_' y '-')")
+    return serial
+
+def iter_manifest(path: str) -> Iterator[Tuple[str, str]]:
+    """
+    (número de serie, plantilla) por terminal, desde CSV o JSON Lines.
+
+    Raises:
+        ValueError: si falta un campo o el número de serie no es válido
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".jsonl"):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for number, row in enumerate(rows, 1):
+            serial = str(row.get("serialNumber") or row.get("serial") or "").strip()
+            template = str(row.get("template") or "").strip()
+            if not serial or not template:
+                raise ValueError(f"Manifiesto, fila {number}: faltan serialNumber o template")
+            try:
+                check_serial(serial)
+            except ValueError as e:
+                raise ValueError(f"Manifiesto, fila {number}: {e}") from None
+            yield serial, template
+
+def iter_assignments(manifest: Iterator[Tuple[str, str]], templates: Dict[str, dict],
+                     allocator: KsnAllocator) -> Iterator[Tuple[str, str, List[bytes]]]:
+    """
+    Asigna los KSN de cada terminal en el orden del manifiesto.
+
+    Yields:
+        (serie, plantilla, KSN de cada entrada DUKPT de la plantilla)
+    """
+    seen = set()
+    for serial, name in manifest:
+        template = templates.get(name)
+        if template is None:
+            raise ValueError(f"Terminal {serial}: plantilla desconocida '{name}'")
+        if serial in seen:
+            raise ValueError(f"Terminal {serial} repetido en el manifiesto")
+        seen.add(serial)
+        ksns = [build_ksn(entry[4], allocator.allocate(entry[4], entry[5]))
+                for entry in template["entries"] if entry[0] == "dukpt"]
+        yield serial, name, ksns
+
+# ========== GENERACIÓN (PROCESOS DE TRABAJO) ==========
+
+_templates: Dict[str, dict] = {}
+_derivers: Dict[Tuple[bytes, str], IpekBatchDeriver] = {}
+
+def _init_worker(templates: Dict[str, dict]):
+    global _templates
+    _templates = templates
+    _derivers.clear()
+
+def _deriver(bdk: bytes, algorithm: str) -> IpekBatchDeriver:
+    deriver = _derivers.get((bdk, algorithm))
+    if deriver is None:
+        deriver = _derivers[(bdk, algorithm)] = IpekBatchDeriver(bdk, algorithm)
+    return deriver
+
+def build_fleet_chunk(assignments: List[Tuple[str, str, List[bytes]]], output_dir: Optional[str],
+                      generated: str) -> List[str]:
+    """
+    Arma los perfiles y llaves de un lote de terminales.
+
+    Las IPEK se derivan agrupadas por BDK y los KCV se calculan para todo
+    el lote de una vez.
+
+    Returns:
+        Líneas del bundle (vacío si se escribió un archivo por terminal en output_dir)
+    """
+    # Agrupar los KSN del lote por BDK para derivar con una sola llamada por grupo
+    groups: Dict[Tuple[bytes, str], List[Tuple[int, int, bytes]]] = collections.defaultdict(list)
+    for row, (_, name, ksns) in enumerate(assignments):
+        dukpt_entries = [entry for entry in _templates[name]["entries"] if entry[0] == "dukpt"]
+        for position, (entry, ksn) in enumerate(zip(dukpt_entries, ksns)):
+            groups[(entry[2], entry[3])].append((row, position, ksn))
+
+    ipeks: Dict[Tuple[int, int], bytes] = {}
+    kcv_inputs = []
+    for (bdk, algorithm), items in groups.items():
+        for (row, position, _), ipek in zip(items, _deriver(bdk, algorithm).derive_many([k for _, _, k in items])):
+            ipeks[(row, position)] = ipek
+            kcv_inputs.append((ipek, algorithm))
+    kcvs = dict(zip(ipeks, calculate_kcvs(kcv_inputs)))
+
+    lines = []
+    for row, (serial, name, ksns) in enumerate(assignments):
+        template = _templates[name]
+        configs, keys = [], []
+        position = 0
+        for entry in template["entries"]:
+            if entry[0] == "static":
+                configs.append(dict(entry[1]))
+                continue
+            _, slot, _, algorithm, _, _ = entry
+            ipek = ipeks[(row, position)]
+            kcv = kcvs[(row, position)]
+            ksn_hex = bytes_to_hex(ksns[position])
+            configs.append({
+                "usage": "DUKPT",
+                "keyType": PROFILE_DUKPT_KEY_TYPE,
+                "slot": _format_slot(slot),
+                "selectedKey": kcv,
+                "injectionMethod": "auto",
+                "ksn": ksn_hex,
+            })
+            keys.append({
+                "keyType": IPEK_KEY_TYPE,
+                "algorithm": ipek_algorithm_name(algorithm, ipek),
+                "keyHex": bytes_to_hex(ipek),
+                "kcv": kcv,
+                "bytes": len(ipek),
+                "ksn": ksn_hex,
+                "description": f"IPEK de {serial} (slot {_format_slot(slot)})",
+            })
+            position += 1
+        profile = {
+            "name": f"{name} - {serial}",
+            "description": f"Perfil de flota para el terminal {serial}",
+            **template["base"],
+            "keyConfigurations": configs,
+        }
+        if output_dir:
+            check_serial(serial)
+            with open(os.path.join(output_dir, f"perfil_{serial}.json"), "w", encoding="utf-8") as f:
+                json.dump(profile, f, indent=2, ensure_ascii=False)
+            with open(os.path.join(output_dir, f"llaves_{serial}.json"), "w", encoding="utf-8") as f:
+                header = {"generated": generated, "description": f"IPEKs del terminal {serial}",
+                          "totalKeys": len(keys)}
+                write_keys_json(f, (json.dumps(key, ensure_ascii=False) for key in keys), header)
+        else:
+            lines.append(json.dumps({"serialNumber": serial, "profile": profile, "keys": keys},
+                                    ensure_ascii=False))
+    return lines
+
+# ========== FUNCIÓN PRINCIPAL ==========
+
+def _chunked(items: Iterator, size: int) -> Iterator[list]:
+    while True:
+        chunk = list(itertools.islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+def generate_fleet(manifest_path: str, templates: Dict[str, dict], bundle: Optional[str] = None,
+                   output_dir: Optional[str] = None, processes: int = 1,
+                   chunk_size: int = FLEET_CHUNK_SIZE, allocator: Optional[KsnAllocator] = None) -> int:
+    """
+    Genera los perfiles de toda la flota.
+
+    Con processes > 1 los lotes se reparten en un pool con unos pocos en
+    vuelo a la vez, así que la memoria no depende del tamaño del manifiesto.
+    Sin `allocator` los Device IDs solo son únicos dentro de la corrida.
+
+    Returns:
+        Cantidad de terminales generados
+    """
+    generated = datetime.now().isoformat()
+    assignments = iter_assignments(iter_manifest(manifest_path), templates, allocator or KsnAllocator(None))
+    chunks = _chunked(assignments, chunk_size)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    out = open(bundle, "w", encoding="utf-8") if bundle else None
+    total = 0
+
+    def emit(lines: List[str], count: int):
+        nonlocal total
+        if out:
+            out.writelines(line + "\n" for line in lines)
+        total += count
+
+    try:
+        if processes <= 1:
+            _init_worker(templates)
+            for chunk in chunks:
+                emit(build_fleet_chunk(chunk, output_dir, generated), len(chunk))
+            return total
+
+        with Pool(processes, _init_worker, (templates,)) as pool:
+            pending = collections.deque()
+            for chunk in chunks:
+                pending.append((pool.apply_async(build_fleet_chunk, (chunk, output_dir, generated)), len(chunk)))
+                if len(pending) >= processes * 2:
+                    result, count = pending.popleft()
+                    emit(result.get(), count)
+            while pending:
+                result, count = pending.popleft()
+                emit(result.get(), count)
+        return total
+    finally:
+        if out:
+            out.close()
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Perfiles de inyección por terminal desde un manifiesto de flota")
+    parser.add_argument("manifest", help="Manifiesto (.csv o .jsonl) con serialNumber y template")
+    parser.add_argument("templates", help="Plantillas de perfil (JSON)")
+    parser.add_argument("keys", nargs="*", help="Archivos de llaves con las BDK (.json, .jsonl, .kvlt)")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--bundle", help="Escribir todos los terminales en este JSON Lines")
+    output.add_argument("--output-dir", help="Escribir perfil y llaves de cada terminal en este directorio")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Procesos de trabajo")
+    parser.add_argument("--chunk-size", type=int, default=FLEET_CHUNK_SIZE, help="Terminales por lote")
+    parser.add_argument("--ksn-log", default=DEFAULT_LOG_PATH, help="Log de reservas de Device IDs (ksn_allocator.py)")
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.templates, encoding="utf-8") as f:
+            templates = resolve_templates(json.load(f), KeyIndex.from_files(args.keys))
+        started = time.perf_counter()
+        with KsnAllocator(args.ksn_log) as allocator:
+            total = generate_fleet(args.manifest, templates, args.bundle, args.output_dir,
+                                   args.processes, args.chunk_size, allocator)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    seconds = time.perf_counter() - started
+
+    print("=" * 80)
+    print("🏭 PERFILES DE FLOTA")
+    print("=" * 80)
+    print()
+    print(f"   Terminales: {total}")
+    print(f"   Plantillas: {', '.join(templates)}")
+    print(f"   Reservas:   {allocator.reservations} bloques de Device IDs en {args.ksn_log}")
+    print(f"   Tiempo:     {seconds:.2f} s ({total / seconds:,.0f} terminales/s)" if seconds else "")
+    print(f"📝 Salida: {args.bundle or args.output_dir}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+Parser incremental de frames STX/ETX/LRC (Futurex y Legacy) sobre un flujo de bytes.
+
+Los frames llegan partidos en lecturas USB/serial de cualquier tamaño. El
+parser acumula los bytes en un buffer circular de capacidad fija y entrega
+cada frame completo apenas llega su LRC:
+
+    parser = FrameStreamParser()
+    for chunk in lecturas:
+        for frame in parser.feed(chunk):
+            message = frame.message()
+
+- Si el LRC no coincide, se descarta solo el STX y se resincroniza en el
+  siguiente STX. Un frame truncado (aparece otro STX antes de su ETX) se
+  descarta sin llevarse al siguiente por delante.
+- Los bytes antes de un STX y los frames más largos que max_frame_size se
+  descartan y se cuentan en las estadísticas.
+- Cada frame informa su latencia: desde que llegó su STX hasta que se
+  entregó.
+
+Uso:
+    python3 frame_stream.py captura.bin
+    python3 frame_stream.py captura.txt --hex --chunk-size 64 --random-chunks
+    python3 frame_stream.py captura.bin --protocol legacy --report frames.jsonl
+"""
+
+import argparse
+import collections
+import json
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional, Sequence
+
+from futurex import ETX, STX, Buffer, ParseError, calculate_lrc, format_message, parse_payload
+
+DEFAULT_CAPACITY = 1 << 16  # 64 KiB
+MAX_FRAME_SIZE = 4096  # Un comando 02 con la llave más larga ocupa ~200 bytes
+READ_CHUNK_SIZE = 1 << 16
+
+LEGACY_SEPARATOR = "|"
+
+# ========== LEGACY ==========
+
+@dataclass
+class LegacyMessage:
+    command: str
+    fields: List[str]
+
+def parse_legacy_payload(payload: Buffer) -> LegacyMessage:
+    """
+    Interpreta un payload Legacy: COMMAND(4)|DATA|DATA... (LegacyMessageParser.kt).
+
+    Raises:
+        ValueError: si el payload no tiene el formato esperado
+    """
+    content = str(payload, "ascii")
+    parts = content.split(LEGACY_SEPARATOR, 1)
+    if len(parts) < 2 or len(parts[0]) != 4:
+        raise ValueError(f"Formato inválido: se esperaba COMMAND(4)|DATA. Recibido: '{content}'")
+    fields = parts[1].split(LEGACY_SEPARATOR) if parts[1] else []
+    return LegacyMessage(parts[0], fields)
+
+def format_legacy_message(command: str, fields: Sequence[str] = ()) -> bytes:
+    """
+    Arma un frame Legacy: STX COMMAND(4)|DATA|... ETX LRC (LegacyMessageFormatter.kt).
+
+    Raises:
+        ValueError: si el comando no tiene 4 caracteres
+    """
+    if len(command) != 4:
+        raise ValueError(f"El comando para el protocolo Legacy debe tener 4 caracteres: '{command}'")
+    return format_message(command, (LEGACY_SEPARATOR + LEGACY_SEPARATOR.join(fields),))
+
+PAYLOAD_PARSERS = {
+    "futurex": parse_payload,
+    "legacy": parse_legacy_payload,
+}
+
+# ========== PARSER ==========
+
+@dataclass
+class StreamFrame:
+    """
+    Frame extraído del flujo.
+
+    `payload` es un memoryview sobre el buffer del parser: solo es válido
+    hasta la siguiente llamada a feed() (usar bytes(frame.payload) para
+    guardarlo).
+    """
+    payload: memoryview
+    offset: int  # Posición del STX en el flujo
+    lrc_ok: bool
+    latency_ns: int
+    protocol: str = "futurex"
+
+    @property
+    def size(self) -> int:
+        return len(self.payload) + 3
+
+    def message(self):
+        """Decodifica el payload con el parser del protocolo."""
+        return PAYLOAD_PARSERS[self.protocol](self.payload)
+
+@dataclass
+class StreamStats:
+    bytes_in: int = 0
+    frames: int = 0
+    bad_lrc: int = 0
+    truncated: int = 0
+    discarded_bytes: int = 0
+    oversized: int = 0
+    latency_total_ns: int = 0
+    latency_max_ns: int = 0
+
+    def as_dict(self) -> dict:
+        mean = self.latency_total_ns / self.frames if self.frames else 0
+        return {
+            "bytesIn": self.bytes_in,
+            "frames": self.frames,
+            "badLrc": self.bad_lrc,
+            "truncated": self.truncated,
+            "discardedBytes": self.discarded_bytes,
+            "oversized": self.oversized,
+            "latencyMeanUs": round(mean / 1000, 3),
+            "latencyMaxUs": round(self.latency_max_ns / 1000, 3),
+        }
+
+class FrameStreamParser:
+    """
+    Parser incremental de frames STX + payload + ETX + LRC.
+
+    El buffer tiene capacidad fija: los bytes nuevos se escriben a
+    continuación de los pendientes y, cuando no queda espacio al final, solo
+    el frame incompleto (como mucho max_frame_size bytes) se mueve al
+    inicio. Nunca se concatenan bytes en objetos nuevos.
+    """
+
+    def __init__(self, protocol: str = "futurex", capacity: int = DEFAULT_CAPACITY,
+                 max_frame_size: int = MAX_FRAME_SIZE, include_invalid: bool = False,
+                 clock: Callable[[], int] = time.perf_counter_ns):
+        """
+        Args:
+            protocol: "futurex" o "legacy" (define cómo se decodifica el payload)
+            capacity: Tamaño del buffer en bytes
+            max_frame_size: Frames más largos se descartan
+            include_invalid: Entregar también los frames con LRC incorrecto
+            clock: Reloj en nanosegundos (para medir latencias)
+        """
+        if protocol not in PAYLOAD_PARSERS:
+            raise ValueError(f"Protocolo no soportado: {protocol}")
+        if capacity < 2 * max_frame_size:
+            raise ValueError("La capacidad debe ser al menos el doble de max_frame_size")
+        self.protocol = protocol
+        self.max_frame_size = max_frame_size
+        self.include_invalid = include_invalid
+        self.stats = StreamStats()
+        self._clock = clock
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+        self._start = 0  # Primer byte sin consumir
+        self._end = 0  # Fin de los datos
+        self._scan = 0  # Hasta dónde ya se buscó el ETX del frame actual
+        self._base = 0  # Posición en el flujo de _buffer[0]
+        self._arrivals = collections.deque()  # (fin en el flujo, instante de llegada)
+
+    @property
+    def pending(self) -> int:
+        """Bytes recibidos que todavía no forman un frame completo."""
+        return self._end - self._start
+
+    def reset(self):
+        """Descarta los datos pendientes (por ejemplo, al reabrir el puerto)."""
+        self.stats.discarded_bytes += self.pending
+        self._base += self._end
+        self._start = self._end = self._scan = 0
+        self._arrivals.clear()
+
+    def feed(self, data: Buffer) -> List[StreamFrame]:
+        """
+        Agrega bytes al buffer y devuelve los frames completos.
+
+        Todos los bytes se consumen en la llamada, se usen o no los frames
+        devueltos.
+
+        Args:
+            data: Bytes recibidos (cualquier tamaño)
+
+        Returns:
+            StreamFrame por cada frame completo (solo los de LRC válido,
+            salvo include_invalid), en orden de llegada
+        """
+        now = self._clock()
+        data = memoryview(data)
+        self.stats.bytes_in += len(data)
+        capacity = len(self._buffer)
+        frames: List[StreamFrame] = []
+        position = 0
+        while position < len(data):
+            if self._end == capacity:
+                # Los frames ya extraídos apuntan a bytes que se van a pisar
+                for frame in frames:
+                    frame.payload = memoryview(bytes(frame.payload))
+                self._compact()
+            count = min(capacity - self._end, len(data) - position)
+            self._view[self._end:self._end + count] = data[position:position + count]
+            self._end += count
+            position += count
+            self._arrivals.append((self._base + self._end, now))
+            self._drain(frames)
+        return frames
+
+    def _compact(self):
+        """Mueve los bytes pendientes al inicio del buffer."""
+        shift = self._start
+        self._buffer[0:self._end - shift] = self._buffer[shift:self._end]
+        self._base += shift
+        self._end -= shift
+        self._scan = max(self._scan - shift, 0)
+        self._start = 0
+        self._forget_arrivals(self._base)
+
+    def _forget_arrivals(self, position: int):
+        """Olvida las llegadas que terminan antes de `position` (se conserva la última)."""
+        arrivals = self._arrivals
+        while len(arrivals) > 1 and arrivals[0][0] <= position:
+            arrivals.popleft()
+
+    def _arrival(self, position: int) -> int:
+        """Instante en que llegó el byte en `position` (posición en el flujo)."""
+        self._forget_arrivals(position)
+        return self._arrivals[0][1]
+
+    def _discard_to(self, index: int):
+        self.stats.discarded_bytes += index - self._start
+        self._start = index
+        self._scan = 0
+        # Sin esto un flujo sin frames válidos (ruido, baudios incorrectos)
+        # acumula una llegada por feed()
+        self._forget_arrivals(self._base + index)
+
+    def _drain(self, frames: List[StreamFrame]):
+        buffer, stats = self._buffer, self.stats
+        while self._start < self._end:
+            stx_index = buffer.find(STX, self._start, self._end)
+            if stx_index == -1:
+                self._discard_to(self._end)
+                return
+            if stx_index > self._start:
+                self._discard_to(stx_index)
+
+            etx_index = buffer.find(ETX, max(self._scan, stx_index + 1), self._end)
+            if etx_index == -1 or etx_index + 1 >= self._end:
+                if self._end - stx_index > self.max_frame_size:
+                    # Frame demasiado largo: resincronizar en el siguiente STX
+                    stats.oversized += 1
+                    self._discard_to(stx_index + 1)
+                    continue
+                self._scan = self._end if etx_index == -1 else etx_index
+                return
+
+            # El payload es ASCII: otro STX antes del ETX indica un frame
+            # truncado, que se descarta sin mirar el LRC
+            inner_stx = buffer.find(STX, stx_index + 1, etx_index)
+            if inner_stx != -1:
+                stats.truncated += 1
+                self._discard_to(inner_stx)
+                continue
+
+            lrc_ok = calculate_lrc(self._view[stx_index + 1:etx_index + 1]) == buffer[etx_index + 1]
+            if lrc_ok:
+                frame_end = etx_index + 2
+            else:
+                # Se descarta solo el STX: el siguiente frame puede empezar
+                # dentro de los bytes dañados
+                stats.bad_lrc += 1
+                frame_end = stx_index + 1
+
+            if lrc_ok or self.include_invalid:
+                offset = self._base + stx_index
+                latency = self._clock() - self._arrival(offset)
+                if lrc_ok:
+                    stats.frames += 1
+                    stats.latency_total_ns += latency
+                    stats.latency_max_ns = max(stats.latency_max_ns, latency)
+                frame = StreamFrame(self._view[stx_index + 1:etx_index], offset, lrc_ok,
+                                    latency, self.protocol)
+                self._start, self._scan = frame_end, 0
+                self._forget_arrivals(self._base + frame_end)
+                frames.append(frame)
+            else:
+                self._discard_to(frame_end)
+
+# ========== REPRODUCCIÓN DE CAPTURAS ==========
+
+def iter_capture_chunks(path: str, hex_text: bool = False, chunk_size: int = READ_CHUNK_SIZE,
+                        random_chunks: bool = False, seed: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Lee una captura del puerto serial en bloques.
+
+    Args:
+        path: Archivo binario crudo, o texto con bytes en hex (hex_text)
+        hex_text: El archivo es un volcado hex ("02 30 32 ..." o "023032...")
+        chunk_size: Tamaño de cada bloque (máximo si random_chunks)
+        random_chunks: Bloques de tamaño aleatorio entre 1 y chunk_size,
+            como las lecturas de un puerto USB
+        seed: Semilla para random_chunks
+    """
+    rng = random.Random(seed)
+    if hex_text:
+        with open(path, encoding="utf-8") as f:
+            data = bytes.fromhex("".join(f.read().split()))
+        chunks = (data[i:i + chunk_size] for i in range(0, len(data), chunk_size))
+        if not random_chunks:
+            yield from chunks
+            return
+        position = 0
+        while position < len(data):
+            size = rng.randint(1, chunk_size)
+            yield data[position:position + size]
+            position += size
+        return
+
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(rng.randint(1, chunk_size) if random_chunks else chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+def _percentile(histogram: collections.Counter, fraction: float) -> int:
+    """Percentil aproximado de un histograma {bucket potencia de 2: cantidad}."""
+    total = sum(histogram.values())
+    if not total:
+        return 0
+    target = fraction * total
+    seen = 0
+    for bucket in sorted(histogram):
+        seen += histogram[bucket]
+        if seen >= target:
+            return bucket
+    return max(histogram)
+
+def replay_capture(chunks: Iterator[bytes], protocol: str = "futurex",
+                   report_path: Optional[str] = None, decode: bool = False) -> dict:
+    """
+    Pasa una captura por el parser y resume el resultado.
+
+    Args:
+        chunks: Bloques de la captura
+        protocol: "futurex" o "legacy"
+        report_path: JSON Lines opcional con un registro por frame
+        decode: Decodificar cada payload (además de validar el LRC)
+
+    Returns:
+        Estadísticas del parser más duración, MB/s y percentiles de latencia
+    """
+    parser = FrameStreamParser(protocol, include_invalid=report_path is not None)
+    histogram = collections.Counter()
+    parse_errors = 0
+    report = open(report_path, "w") if report_path else None
+    started = time.perf_counter()
+    try:
+        for chunk in chunks:
+            for frame in parser.feed(chunk):
+                if frame.lrc_ok:
+                    histogram[1 << max(frame.latency_ns, 1).bit_length()] += 1
+                message = None
+                if decode or report:
+                    try:
+                        message = frame.message() if frame.lrc_ok else None
+                    except ValueError:
+                        parse_errors += 1
+                    if isinstance(message, ParseError):
+                        parse_errors += 1
+                if report:
+                    report.write(json.dumps({
+                        "offset": frame.offset,
+                        "size": frame.size,
+                        "lrcOk": frame.lrc_ok,
+                        "command": str(frame.payload[:2], "ascii", "replace"),
+                        "type": type(message).__name__ if message is not None else "",
+                        "latencyUs": round(frame.latency_ns / 1000, 3),
+                    }) + "\n")
+    finally:
+        if report:
+            report.close()
+    elapsed = time.perf_counter() - started
+
+    summary = parser.stats.as_dict()
+    summary.update({
+        "pendingBytes": parser.pending,
+        "parseErrors": parse_errors,
+        "seconds": round(elapsed, 6),
+        "mbPerSecond": round(parser.stats.bytes_in / elapsed / 1e6, 2) if elapsed else 0,
+        "framesPerSecond": round(parser.stats.frames / elapsed) if elapsed else 0,
+        "latencyP50Us": _percentile(histogram, 0.50) / 1000,
+        "latencyP99Us": _percentile(histogram, 0.99) / 1000,
+    })
+    return summary
+
+# ========== FUNCIÓN PRINCIPAL ==========
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Reproduce capturas seriales por el parser de frames")
+    parser.add_argument("capture", help="Captura del puerto (binaria, o texto hex con --hex)")
+    parser.add_argument("--hex", action="store_true", help="La captura es un volcado hex en texto")
+    parser.add_argument("--protocol", choices=sorted(PAYLOAD_PARSERS), default="futurex")
+    parser.add_argument("--chunk-size", type=int, default=READ_CHUNK_SIZE, help="Bytes por lectura")
+    parser.add_argument("--random-chunks", action="store_true",
+                        help="Lecturas de tamaño aleatorio (1..chunk-size)")
+    parser.add_argument("--seed", type=int, help="Semilla para --random-chunks")
+    parser.add_argument("--decode", action="store_true", help="Decodificar cada payload")
+    parser.add_argument("--report", help="JSON Lines con un registro por frame (incluye LRC inválidos)")
+    parser.add_argument("--json", action="store_true", help="Imprimir el resumen como JSON")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.capture):
+        print(f"❌ No existe el archivo: {args.capture}")
+        return 1
+
+    chunks = iter_capture_chunks(args.capture, args.hex, args.chunk_size, args.random_chunks, args.seed)
+    summary = replay_capture(chunks, args.protocol, args.report, args.decode)
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return 0
+
+    print("=" * 80)
+    print("📡 REPRODUCCIÓN DE CAPTURA SERIAL")
+    print("=" * 80)
+    print()
+    print(f"📄 {args.capture} ({args.protocol})")
+    print(f"   Bytes:              {summary['bytesIn']}")
+    print(f"   Frames válidos:     {summary['frames']}")
+    print(f"   LRC incorrecto:     {summary['badLrc']}")
+    print(f"   Frames truncados:   {summary['truncated']}")
+    print(f"   Bytes descartados:  {summary['discardedBytes']}")
+    print(f"   Frames muy largos:  {summary['oversized']}")
+    print(f"   Bytes pendientes:   {summary['pendingBytes']}")
+    if args.decode:
+        print(f"   Errores de parseo:  {summary['parseErrors']}")
+    print()
+    print(f"⏱️  {summary['seconds']:.3f} s - {summary['mbPerSecond']} MB/s - {summary['framesPerSecond']} frames/s")
+    print(f"   Latencia p50: {summary['latencyP50Us']} µs  p99: {summary['latencyP99Us']} µs"
+          f"  máx: {summary['latencyMaxUs']} µs")
+    if args.report:
+        print()
+        print(f"📝 Reporte por frame: {args.report}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
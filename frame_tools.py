@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Subcomando frame de injector_tools.py: armar, decodificar o reproducir
+frames Futurex.
+
+Uso:
+    python3 frame_tools.py build 03 01
+    python3 frame_tools.py decode 02303330310301
+    python3 frame_tools.py replay captura.bin --decode
+
+futurex y frame_stream se importan al cargar el módulo, para que
+`injector_tools.py --timing frame ...` los cuente en la importación.
+"""
+
+import argparse
+import json
+import sys
+from typing import Optional, Sequence
+
+from frame_stream import main as replay_main
+from futurex import FrameError, decode_frame, format_message
+
+def _camel_case(name: str) -> str:
+    first, *rest = name.split("_")
+    return first + "".join(part.capitalize() for part in rest)
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Subcomando frame: build / decode con futurex, replay con frame_stream."""
+    parser = argparse.ArgumentParser(prog="injector_tools.py frame", description="Frames Futurex")
+    actions = parser.add_subparsers(dest="action", required=True)
+    build = actions.add_parser("build", help="Armar un frame (STX, payload, ETX, LRC) y mostrarlo en hex")
+    build.add_argument("command", help="Código de comando (02, 03, ...)")
+    build.add_argument("fields", nargs="*", help="Campos del payload, ya formateados")
+    decode = actions.add_parser("decode", help="Decodificar un frame en hex")
+    decode.add_argument("frame", help="Frame completo en hex")
+    decode.add_argument("--no-lrc", action="store_true", help="No validar el LRC")
+    actions.add_parser("replay", help="Reproducir una captura serial (frame_stream.py)", add_help=False)
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] == "replay":
+        return replay_main(argv[1:])
+    args = parser.parse_args(argv)
+
+    try:
+        if args.action == "build":
+            print(format_message(args.command, args.fields).hex().upper())
+            return 0
+        message = decode_frame(bytes.fromhex(args.frame), check_lrc=not args.no_lrc)
+    except (FrameError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    decoded = {"message": type(message).__name__, "commandCode": message.command_code}
+    for name, value in vars(message).items():
+        if name != "raw_payload":
+            decoded[_camel_case(name)] = str(value, "ascii") if isinstance(value, memoryview) else value
+    decoded["payload"] = message.payload
+    print(json.dumps(decoded, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
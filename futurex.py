@@ -0,0 +1,617 @@
+#!/usr/bin/env python3
+"""
+Codec del protocolo Futurex (comandos 02, 03 y 04 y sus respuestas).
+
+Replica en Python a FuturexMessageFormatter.kt y FuturexMessageParser.kt
+(módulo format) para armar y verificar frames desde el host.
+
+Frame:
+    STX (0x02) + payload ASCII + ETX (0x03) + LRC
+
+    LRC = XOR de todos los bytes del payload más el ETX (sin el STX),
+    igual que FormatUtils.calculateLrc.
+
+Uso:
+    from futurex import FrameEncoder, decode_frame
+
+    encoder = FrameEncoder()
+    frame = encoder.inject_symmetric_key(key_slot=1, key_hex="AABB...", key_checksum="AABB")
+    message = decode_frame(frame)
+
+Los frames se escriben en un bytearray preasignado (FrameEncoder reutiliza
+el suyo) y los mensajes decodificados guardan memoryviews sobre el buffer
+recibido en lugar de copias. Mientras un mensaje esté en uso, el buffer de
+origen no debe modificarse.
+"""
+
+from dataclasses import dataclass
+from typing import Optional, Sequence, Tuple, Union
+
+STX = 0x02
+ETX = 0x03
+FRAME_OVERHEAD = 3  # STX + ETX + LRC
+
+# El parser de Kotlin distingue respuesta de comando "02" por el largo
+RESPONSE_MAX_LENGTH = 60
+
+DEFAULT_VERSION = "01"
+COMMAND_VERSIONS = (DEFAULT_VERSION,)  # Versiones que manda el inyector en los comandos
+EMPTY_KSN = "0" * 20
+EMPTY_CHECKSUM = "0000"
+SERIAL_NUMBER_LENGTH = 16
+
+# Códigos de respuesta (FuturexErrorCode.kt)
+ERROR_CODES = {
+    "00": "Successful",
+    "01": "Invalid command",
+    "02": "Invalid command version",
+    "03": "Invalid length",
+    "04": "Unsupported characters",
+    "05": "Device is busy",
+    "06": "Not in injection mode",
+    "07": "Device is in tamper",
+    "08": "Bad LRC",
+    "09": "Duplicate key",
+    "0A": "Duplicate KSN",
+    "0B": "Key deletion failed",
+    "0C": "Invalid key slot",
+    "0D": "Invalid KTK slot",
+    "0E": "Missing KTK",
+    "0F": "Key slot not empty",
+    "10": "Invalid key type",
+    "11": "Invalid key encryption type",
+    "12": "Invalid key checksum",
+    "13": "Invalid KTK checksum",
+    "14": "Invalid KSN",
+    "15": "Invalid key length",
+    "16": "Invalid KTK length",
+    "17": "Invalid TR-31 version",
+    "18": "Invalid key usage",
+    "19": "Invalid algorithm",
+    "1A": "Invalid mode of use",
+    "1B": "MAC verification failed",
+    "1C": "Decryption failed",
+    "1D": "Invalid message format or data",
+    "2A": "Device brand does not match the injection profile",
+}
+
+SUCCESSFUL = "00"
+INVALID_COMMAND = "01"
+INVALID_COMMAND_VERSION = "02"
+INVALID_LENGTH = "03"
+UNSUPPORTED_CHARACTERS = "04"
+DEVICE_IS_BUSY = "05"
+BAD_LRC = "08"
+INVALID_KEY_SLOT = "0C"
+INVALID_KTK_SLOT = "0D"
+MISSING_KTK = "0E"
+INVALID_KEY_TYPE = "10"
+INVALID_KEY_ENCRYPTION_TYPE = "11"
+INVALID_KEY_CHECKSUM = "12"
+INVALID_KTK_CHECKSUM = "13"
+INVALID_KSN = "14"
+INVALID_KEY_LENGTH = "15"
+INVALID_KTK_LENGTH = "16"
+INVALID_ALGORITHM = "19"
+DECRYPTION_FAILED = "1C"
+INVALID_FORMAT = "1D"
+
+# Campo keyAlgorithm del comando 02 (MainViewModel.mapAlgorithmCodeToGeneric)
+KEY_ALGORITHMS = {
+    "00": ("DES_DOUBLE", 16),  # 3DES-112
+    "01": ("DES_TRIPLE", 24),  # 3DES-168
+    "02": ("AES_128", 16),
+    "03": ("AES_192", 24),
+    "04": ("AES_256", 32),
+}
+
+# Campo keyType del comando 02 (MainViewModel.mapFuturexKeyTypeToGeneric)
+MASTER_KEY_TYPES = ("01", "0F")
+TRANSPORT_KEY_TYPES = ("06",)
+WORKING_KEY_TYPES = ("05", "04", "0C")  # El tipo concreto lo define keySubType
+DUKPT_KEY_TYPES = ("02", "03", "08", "0B", "10")
+WORKING_KEY_SUB_TYPES = {
+    "01": "WORKING_PIN_KEY",
+    "02": "WORKING_MAC_KEY",
+    "03": "WORKING_DATA_KEY",
+}
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+class FrameError(ValueError):
+    """Frame mal formado (sin STX/ETX, incompleto o con LRC incorrecto)."""
+
+# ========== LRC ==========
+
+def calculate_lrc(data: Buffer, initial: int = 0) -> int:
+    """
+    Calcula el LRC (XOR de todos los bytes) en una sola pasada.
+
+    Los bytes se leen como un único entero y se pliegan por mitades, así el
+    XOR lo hace el intérprete en C en lugar de un ciclo byte a byte.
+
+    Args:
+        data: Bytes a incluir (payload + ETX)
+        initial: Valor inicial del XOR
+
+    Returns:
+        LRC (0-255)
+    """
+    length = len(data)
+    value = int.from_bytes(data, "little")
+    while length > 1:
+        half = (length + 1) // 2
+        bits = half * 8
+        value = (value & ((1 << bits) - 1)) ^ (value >> bits)
+        length = half
+    return (value ^ initial) & 0xFF
+
+# ========== TIPOS Y ALGORITMOS ==========
+
+def key_algorithm_code(algorithm: str, key_length: int) -> str:
+    """
+    Código keyAlgorithm para una llave (KeyInjectionViewModel.detectKeyAlgorithmFromEntity).
+
+    Args:
+        algorithm: Nombre del algoritmo (AES-128, AES256, 3DES, DES_TRIPLE, ...)
+        key_length: Largo de la llave en bytes
+
+    Raises:
+        ValueError: si el algoritmo o el largo no tienen código
+    """
+    name = algorithm.upper()
+    if "AES" in name:
+        codes = {16: "02", 24: "03", 32: "04"}
+    elif "DES" in name:
+        codes = {16: "00", 24: "01"}
+    else:
+        # Sin algoritmo conocido se decide por largo (detectKeyAlgorithmByLength)
+        codes = {16: "00", 24: "01", 32: "04"}
+    if key_length not in codes:
+        raise ValueError(f"Sin código de algoritmo Futurex para {algorithm} de {key_length} bytes")
+    return codes[key_length]
+
+def key_type_code(profile_key_type: str) -> str:
+    """
+    Código keyType para el tipo de llave de un perfil
+    (KeyInjectionViewModel.mapKeyTypeToFuturex).
+    """
+    name = profile_key_type.upper()
+    if "PIN" in name:
+        return "05"
+    if "MAC" in name:
+        return "04"
+    if "DATA" in name:
+        return "0C"
+    if "DUKPT" in name or "IPEK" in name:
+        if "IPEK" in name:
+            return "0B" if "AES" in name else "03"
+        return "10" if "AES" in name else "08"
+    return "01"  # Master Session Key
+
+def key_sub_type_code(profile_key_type: str) -> str:
+    """Código keySubType (KeyInjectionViewModel.detectKeySubType)."""
+    name = profile_key_type.upper()
+    if "WORKING" in name:
+        for usage, code in (("PIN", "01"), ("MAC", "02"), ("DATA", "03")):
+            if usage in name:
+                return code
+    if "DUKPT" in name:
+        return "04"
+    return "00"
+
+def generic_key_type(key_type: str, key_sub_type: str = "00") -> Optional[str]:
+    """
+    Tipo genérico con el que el KeyReceiver guarda la llave, o None si el
+    keyType no está soportado.
+    """
+    if key_type in MASTER_KEY_TYPES:
+        return "MASTER_KEY"
+    if key_type in TRANSPORT_KEY_TYPES:
+        return "TRANSPORT_KEY"
+    if key_type in WORKING_KEY_TYPES:
+        return WORKING_KEY_SUB_TYPES.get(key_sub_type, "MASTER_KEY")
+    if key_type in DUKPT_KEY_TYPES:
+        return "DUKPT_INITIAL_KEY"
+    return None
+
+# ========== CIFRADO CON KTK ==========
+
+def _kek_algorithm(kek: bytes) -> Tuple[str, int]:
+    """Algoritmo y bloque de la KTK: 3DES para 16/24 bytes, AES para 32 (TripleDESCrypto)."""
+    if len(kek) in (16, 24):
+        return "TDES", 8
+    if len(kek) == 32:
+        return "AES", 16
+    raise ValueError(f"KEK/KTK debe ser de 16, 24 o 32 bytes, recibido: {len(kek)}")
+
+def encrypt_with_kek(key: bytes, kek: bytes) -> bytes:
+    """
+    Cifra una llave con la KTK para enviarla con encryptionType 02
+    (TripleDESCrypto.encryptKeyForTransmission: ECB, relleno con ceros).
+
+    El contexto de la KTK se toma de la caché de cifrado, así que una
+    inyección con muchas llaves bajo la misma KTK la prepara una sola vez.
+    """
+    from cipher_cache import ecb_encrypt  # Los frames no necesitan importar `cryptography`
+
+    algorithm, block_size = _kek_algorithm(kek)
+    padding = -len(key) % block_size
+    return ecb_encrypt(algorithm, kek, key + b"\x00" * padding)
+
+def decrypt_with_kek(data: bytes, kek: bytes, key_length: Optional[int] = None) -> bytes:
+    """
+    Descifra una llave recibida cifrada con la KTK.
+
+    Args:
+        data: Llave cifrada (múltiplo del bloque)
+        kek: KTK en claro
+        key_length: Largo original; descarta el relleno de ceros
+    """
+    from cipher_cache import ecb_decrypt
+
+    algorithm, block_size = _kek_algorithm(kek)
+    if len(data) % block_size:
+        raise ValueError(f"La llave cifrada debe ser múltiplo de {block_size} bytes")
+    key = ecb_decrypt(algorithm, kek, data)
+    return key[:key_length] if key_length else key
+
+# ========== MENSAJES ==========
+
+def _text(view: memoryview) -> str:
+    return str(view, "ascii")
+
+@dataclass
+class FuturexMessage:
+    raw_payload: memoryview
+
+    @property
+    def command_code(self) -> str:
+        return _text(self.raw_payload[:2])
+
+    @property
+    def payload(self) -> str:
+        return _text(self.raw_payload)
+
+@dataclass
+class FuturexResponse(FuturexMessage):
+    response_code: str
+
+    @property
+    def is_successful(self) -> bool:
+        return self.response_code == SUCCESSFUL
+
+    @property
+    def description(self) -> str:
+        return ERROR_CODES.get(self.response_code, f"Unknown code {self.response_code}")
+
+@dataclass
+class InjectSymmetricKeyCommand(FuturexMessage):
+    version: str
+    key_slot: int
+    ktk_slot: int
+    key_type: str
+    encryption_type: str
+    key_algorithm: str
+    key_sub_type: str
+    key_checksum: str
+    ktk_checksum: str
+    ksn: str
+    key_data: memoryview  # keyHex en ASCII, sin copiar
+    total_keys: int = 0
+    current_key_index: int = 0
+
+    @property
+    def key_hex(self) -> str:
+        return _text(self.key_data)
+
+    def key_bytes(self) -> bytes:
+        return bytes.fromhex(self.key_hex)
+
+@dataclass
+class InjectSymmetricKeyResponse(FuturexResponse):
+    key_checksum: str
+    device_serial: str = ""
+    device_model: str = ""
+
+@dataclass
+class ReadSerialCommand(FuturexMessage):
+    version: str
+
+@dataclass
+class ReadSerialResponse(FuturexResponse):
+    serial_number: str = ""
+
+@dataclass
+class WriteSerialCommand(FuturexMessage):
+    version: str
+    serial_number: str
+
+@dataclass
+class WriteSerialResponse(FuturexResponse):
+    pass
+
+@dataclass
+class UnknownCommand(FuturexMessage):
+    pass
+
+@dataclass
+class ParseError(FuturexMessage):
+    error: str
+
+# ========== CODIFICACIÓN ==========
+
+def format_key_length(length_in_bytes: int) -> str:
+    """Longitud de llave en ASCII HEX de 3 dígitos (16 bytes -> "010")."""
+    if not 0 < length_in_bytes <= 0xFFF:
+        raise ValueError(f"Longitud de llave fuera de rango: {length_in_bytes}")
+    return f"{length_in_bytes:03X}"
+
+def _check_field(name: str, value: str, length: int) -> str:
+    if len(value) != length:
+        raise ValueError(f"{name} debe tener {length} caracteres: '{value}'")
+    return value
+
+def _format_slot(name: str, slot: int) -> str:
+    if not 0 <= slot <= 99:
+        raise ValueError(f"{name} fuera de rango (0-99): {slot}")
+    return f"{slot:02d}"
+
+def inject_symmetric_key_fields(key_slot: int, key_hex: str, key_checksum: str,
+                                ktk_slot: int = 0, key_type: str = "01", encryption_type: str = "00",
+                                key_algorithm: str = "00", key_sub_type: str = "00",
+                                ktk_checksum: str = EMPTY_CHECKSUM, ksn: str = EMPTY_KSN,
+                                version: str = DEFAULT_VERSION, total_keys: int = 0,
+                                current_key_index: int = 0) -> Tuple[str, ...]:
+    """
+    Arma los campos del comando 02 (sin el código de comando).
+
+    Args:
+        key_slot: Slot destino (0-99, decimal)
+        key_hex: Datos de la llave (en claro o cifrados con la KTK)
+        key_checksum: KCV de la llave (se usan los primeros 4 caracteres)
+        ktk_slot: Slot de la KTK (0-99, decimal)
+        key_type, encryption_type, key_algorithm, key_sub_type: Códigos de 2 caracteres
+        ktk_checksum: KCV de la KTK (4 caracteres)
+        ksn: KSN de 20 caracteres (solo DUKPT)
+        version: Versión del comando
+        total_keys, current_key_index: Información opcional de la inyección
+            (se agregan solo si total_keys > 0)
+
+    Returns:
+        Tupla de campos en el orden del protocolo
+    """
+    if len(key_hex) % 2:
+        raise ValueError("keyHex debe tener una cantidad par de caracteres")
+    fields = (
+        _check_field("version", version, 2),
+        _format_slot("keySlot", key_slot),
+        _format_slot("ktkSlot", ktk_slot),
+        _check_field("keyType", key_type, 2),
+        _check_field("encryptionType", encryption_type, 2),
+        _check_field("keyAlgorithm", key_algorithm, 2),
+        _check_field("keySubType", key_sub_type, 2),
+        _check_field("keyChecksum", key_checksum[:4].upper(), 4),
+        _check_field("ktkChecksum", ktk_checksum[:4].upper(), 4),
+        _check_field("ksn", ksn.upper(), 20),
+        format_key_length(len(key_hex) // 2),
+        key_hex.upper(),
+    )
+    if total_keys > 0:
+        fields += (f"{total_keys:03d}", f"{current_key_index:03d}")
+    return fields
+
+def encode_frame_into(buffer: bytearray, command: str, fields: Sequence[str] = (), offset: int = 0) -> int:
+    """
+    Escribe un frame completo en un buffer preasignado.
+
+    Args:
+        buffer: Buffer de destino
+        command: Código de comando ("02", "03", ...)
+        fields: Campos del payload, ya formateados
+        offset: Posición del STX dentro del buffer
+
+    Returns:
+        Largo del frame escrito
+
+    Raises:
+        ValueError: si el frame no entra en el buffer o el payload no es ASCII
+    """
+    payload = (command + "".join(fields)).encode("ascii")
+    etx_index = offset + 1 + len(payload)
+    if etx_index + 2 > len(buffer):
+        raise ValueError(f"El frame ({len(payload) + FRAME_OVERHEAD} bytes) no entra en el buffer")
+
+    buffer[offset] = STX
+    buffer[offset + 1:etx_index] = payload
+    buffer[etx_index] = ETX
+    with memoryview(buffer) as view:
+        buffer[etx_index + 1] = calculate_lrc(view[offset + 1:etx_index + 1])
+    return len(payload) + FRAME_OVERHEAD
+
+def format_message(command: str, fields: Sequence[str] = ()) -> bytes:
+    """Equivalente a FuturexMessageFormatter.format: devuelve el frame como bytes."""
+    payload = (command + "".join(fields)).encode("ascii")
+    buffer = bytearray(len(payload) + FRAME_OVERHEAD)
+    encode_frame_into(buffer, command, fields)
+    return bytes(buffer)
+
+class FrameEncoder:
+    """
+    Arma frames reutilizando un único buffer.
+
+    Cada método devuelve un memoryview del frame dentro del buffer interno,
+    válido hasta la siguiente codificación (usar bytes(frame) para guardarlo).
+    """
+
+    def __init__(self, size: int = 512):
+        self._buffer = bytearray(size)
+
+    def encode(self, command: str, fields: Sequence[str] = ()) -> memoryview:
+        needed = len(command) + sum(len(field) for field in fields) + FRAME_OVERHEAD
+        if needed > len(self._buffer):
+            self._buffer = bytearray(max(needed, len(self._buffer) * 2))
+        length = encode_frame_into(self._buffer, command, fields)
+        return memoryview(self._buffer)[:length]
+
+    def inject_symmetric_key(self, key_slot: int, key_hex: str, key_checksum: str, **options) -> memoryview:
+        """Comando 02. Los argumentos opcionales son los de inject_symmetric_key_fields."""
+        return self.encode("02", inject_symmetric_key_fields(key_slot, key_hex, key_checksum, **options))
+
+    def inject_symmetric_key_response(self, response_code: str, key_checksum: str,
+                                      device_serial: str = "", device_model: str = "") -> memoryview:
+        return self.encode("02", (response_code, key_checksum[:4], device_serial, device_model))
+
+    def read_serial(self, version: str = DEFAULT_VERSION) -> memoryview:
+        """Comando 03."""
+        return self.encode("03", (version,))
+
+    def read_serial_response(self, response_code: str, serial_number: str = "") -> memoryview:
+        return self.encode("03", (response_code, serial_number))
+
+    def write_serial(self, serial_number: str, version: str = DEFAULT_VERSION) -> memoryview:
+        """Comando 04."""
+        return self.encode("04", (version, _check_field("serialNumber", serial_number, SERIAL_NUMBER_LENGTH)))
+
+    def write_serial_response(self, response_code: str) -> memoryview:
+        return self.encode("04", (response_code,))
+
+# ========== DECODIFICACIÓN ==========
+
+def find_frame(data: Union[bytes, bytearray], start: int = 0) -> Optional[Tuple[int, int, bool]]:
+    """
+    Busca el siguiente frame a partir de `start`.
+
+    Returns:
+        (índice del STX, índice siguiente al LRC, LRC correcto) o None si no
+        hay un frame completo
+    """
+    stx_index = data.find(STX, start)
+    if stx_index == -1:
+        return None
+    etx_index = data.find(ETX, stx_index + 1)
+    if etx_index == -1 or etx_index + 1 >= len(data):
+        return None
+    with memoryview(data) as view:
+        lrc_ok = calculate_lrc(view[stx_index + 1:etx_index + 1]) == data[etx_index + 1]
+    return stx_index, etx_index + 2, lrc_ok
+
+def _is_response(payload: memoryview, max_length: int) -> bool:
+    return len(payload) <= max_length and len(payload) >= 4 and _text(payload[2:4]) in ERROR_CODES
+
+class _PayloadReader:
+    """Lee campos de ancho fijo de un payload, como PayloadReader en Kotlin."""
+
+    __slots__ = ("payload", "cursor")
+
+    def __init__(self, payload: memoryview, cursor: int = 2):
+        self.payload = payload
+        self.cursor = cursor
+
+    def view(self, length: int) -> memoryview:
+        if self.cursor + length > len(self.payload):
+            raise ValueError("Fin de payload inesperado.")
+        field = self.payload[self.cursor:self.cursor + length]
+        self.cursor += length
+        return field
+
+    def read(self, length: int) -> str:
+        return _text(self.view(length))
+
+    def read_remaining(self) -> str:
+        field = _text(self.payload[self.cursor:])
+        self.cursor = len(self.payload)
+        return field
+
+    def has_more(self, length: int = 1) -> bool:
+        return self.cursor + length <= len(self.payload)
+
+def _parse_inject_symmetric_key_command(payload: memoryview) -> InjectSymmetricKeyCommand:
+    reader = _PayloadReader(payload)
+    version = reader.read(2)
+    key_slot = int(reader.read(2), 10)
+    ktk_slot = int(reader.read(2), 10)
+    key_type = reader.read(2)
+    encryption_type = reader.read(2)
+    key_algorithm = reader.read(2)
+    key_sub_type = reader.read(2)
+    key_checksum = reader.read(4)
+    ktk_checksum = reader.read(4)
+    ksn = reader.read(20)
+    key_data = reader.view(int(reader.read(3), 16) * 2)
+
+    # Campos opcionales (totalKeys y currentKeyIndex); ignorados si no son válidos
+    total_keys = current_key_index = 0
+    if reader.has_more(6):
+        try:
+            total_keys, current_key_index = int(reader.read(3), 10), int(reader.read(3), 10)
+        except ValueError:
+            total_keys = current_key_index = 0
+
+    return InjectSymmetricKeyCommand(payload, version, key_slot, ktk_slot, key_type, encryption_type,
+                                     key_algorithm, key_sub_type, key_checksum, ktk_checksum, ksn,
+                                     key_data, total_keys, current_key_index)
+
+def _parse_inject_symmetric_key_response(payload: memoryview) -> InjectSymmetricKeyResponse:
+    reader = _PayloadReader(payload)
+    response_code = reader.read(2)
+    key_checksum = reader.read(4)
+    device_serial = reader.read(16) if reader.has_more(16) else ""
+    device_model = reader.read_remaining() if reader.has_more() else ""
+    return InjectSymmetricKeyResponse(payload, response_code, key_checksum, device_serial, device_model)
+
+def _parse_read_serial(payload: memoryview) -> FuturexMessage:
+    # Comando: 03 + versión; respuesta: 03 + código + serial (que puede venir
+    # vacío, y entonces mide lo mismo que el comando). Decide el campo después
+    # del código de comando: una versión es un comando; otro código de
+    # respuesta conocido es una respuesta
+    reader = _PayloadReader(payload)
+    field = reader.read(2)
+    if len(payload) > 4 or (field in ERROR_CODES and field not in COMMAND_VERSIONS):
+        return ReadSerialResponse(payload, field, reader.read_remaining())
+    return ReadSerialCommand(payload, field)
+
+def _parse_write_serial(payload: memoryview) -> FuturexMessage:
+    # Comando: 04 + versión + serial; respuesta: 04 + código
+    reader = _PayloadReader(payload)
+    if len(payload) == 4:
+        return WriteSerialResponse(payload, reader.read(2))
+    return WriteSerialCommand(payload, reader.read(2), reader.read(SERIAL_NUMBER_LENGTH))
+
+def parse_payload(payload: Buffer) -> FuturexMessage:
+    """
+    Interpreta un payload (sin STX/ETX/LRC), igual que FuturexMessageParser.
+
+    Los errores de estructura no se lanzan: se devuelven como ParseError, y
+    los comandos no soportados como UnknownCommand.
+    """
+    payload = memoryview(payload)
+    command_code = _text(payload[:2]) if len(payload) >= 2 else ""
+    try:
+        if command_code == "02":
+            if _is_response(payload, RESPONSE_MAX_LENGTH):
+                return _parse_inject_symmetric_key_response(payload)
+            return _parse_inject_symmetric_key_command(payload)
+        if command_code == "03":
+            return _parse_read_serial(payload)
+        if command_code == "04":
+            return _parse_write_serial(payload)
+        return UnknownCommand(payload)
+    except (ValueError, UnicodeDecodeError) as e:
+        return ParseError(payload, str(e))
+
+def decode_frame(frame: Buffer, check_lrc: bool = True) -> FuturexMessage:
+    """
+    Decodifica un frame completo (STX ... ETX LRC).
+
+    Raises:
+        FrameError: si el frame no está delimitado o el LRC no coincide
+    """
+    view = memoryview(frame)
+    if len(view) < FRAME_OVERHEAD or view[0] != STX or view[-2] != ETX:
+        raise FrameError("Frame sin STX/ETX")
+    if check_lrc:
+        expected = calculate_lrc(view[1:-1])
+        if expected != view[-1]:
+            raise FrameError(f"LRC incorrecto: recibido 0x{view[-1]:02X}, calculado 0x{expected:02X}")
+    return parse_payload(view[1:-2])
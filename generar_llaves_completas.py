@@ -1,26 +1,54 @@
+"""
+Generador de llaves maestras en texto plano para importación.
+
+Uso:
+    python3 generar_llaves_completas.py
+    python3 generar_llaves_completas.py --spec ceremonia.json --output llaves.jsonl --processes 8
+
+    python3 generar_llaves_completas.py --spec ceremonia.json --wrap-kek llaves_kek.json --output envueltas.jsonl
+
+Sin --spec genera el juego fijo de siempre (KEK + llaves maestras + BDK).
+Con --spec genera en volumen a partir de un archivo como:
+
+    {"description": "Ceremonia HSM", "keys": [
+        {"keyType": "MASTER_KEY", "algorithm": "3DES-16", "count": 200000},
+        {"keyType": "DUKPT_BDK", "algorithm": "AES-256", "count": 5000, "description": "BDK"}
+    ]}
+
+En ese modo las llaves se generan por lotes en un pool de procesos (bytes
+aleatorios, paridad DES y KCV de todo el lote de una vez) y se escriben a
+medida que salen, en JSON (mismo formato que el modo normal) o JSON Lines,
+así que la memoria no depende de la cantidad de llaves.
+
+Con --wrap-kek las llaves no se escriben en claro: cada lote se envuelve
+con la KEK_STORAGE del archivo indicado (AES Key Wrap, key_wrap.py) en una
+sola pasada, y cada registro lleva wrappedKeyHex, wrapAlgorithm y kekKcv
+en lugar de keyHex. La KEK no se incluye en el archivo generado.
+"""
+
+import argparse
+import collections
+import itertools
 import json
 import os
+import sys
 from datetime import datetime
-from Crypto.Cipher import AES, DES3
-from Crypto.Random import get_random_bytes
-
-# --- Función de Ayuda Criptográfica ---
-
-def calculate_kcv(key_bytes, algorithm):
-    """Calcula el Key Check Value (KCV) para una llave dada."""
-    try:
-        if 'DES' in algorithm:
-            cipher = DES3.new(key_bytes, DES3.MODE_ECB)
-            kcv = cipher.encrypt(b'\x00' * 8)
-        elif 'AES' in algorithm:
-            cipher = AES.new(key_bytes, AES.MODE_ECB)
-            kcv = cipher.encrypt(b'\x00' * 16)
-        else:
-            return "000000"
-        return kcv[:3].hex().upper()
-    except Exception as e:
-        print(f"Error calculando KCV para {algorithm}: {e}")
-        return "ERROR"
+from multiprocessing import Pool
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from kcv import calculate_kcv, calculate_kcvs
+from key_files import write_keys_json, write_keys_jsonl
+from key_wrap import KEK_KEY_TYPE, aes_key_wrap_many, load_kek, wrapped_fields
+
+KEY_SIZES = {
+    "3DES-16": 16, "3DES-24": 24,
+    "AES-128": 16, "AES-192": 24, "AES-256": 32
+}
+FUTUREX_CODE = "00"  # Código de ejemplo, ajustar si es necesario
+GENERATION_CHUNK_SIZE = 4096  # Llaves por tarea del pool
+
+# Byte con el bit menos significativo ajustado para paridad impar (DES)
+ODD_PARITY = bytes(b ^ (bin(b).count("1") % 2 == 0) for b in range(256))
 
 # --- Generador de Llaves ---
 
@@ -30,20 +58,17 @@ def generate_key(key_type, algorithm, description):
         "keyType": key_type,
         "algorithm": algorithm,
         "description": description,
-        "futurexCode": "00" # Código de ejemplo, ajustar si es necesario
-    }
-    
-    size_map = {
-        "3DES-16": 16, "3DES-24": 24,
-        "AES-128": 16, "AES-192": 24, "AES-256": 32
+        "futurexCode": FUTUREX_CODE
     }
     
-    if algorithm not in size_map:
+    if algorithm not in KEY_SIZES:
         raise ValueError(f"Algoritmo no soportado: {algorithm}")
         
-    key_bytes = get_random_bytes(size_map[algorithm])
+    key_bytes = os.urandom(KEY_SIZES[algorithm])
     
     if "DES" in algorithm:
+        # PyCryptodome se importa solo al generar llaves DES (no para --help)
+        from Crypto.Cipher import DES3
         key_bytes = DES3.adjust_key_parity(key_bytes)
 
     key_hex = key_bytes.hex().upper()
@@ -54,10 +79,205 @@ def generate_key(key_type, algorithm, description):
         
     return key_info
 
+# --- Generación en volumen ---
+
+def _is_degenerate(key: bytes) -> bool:
+    """True si las mitades 3DES se repiten (la llave equivale a DES simple)."""
+    parts = [key[i:i + 8] for i in range(0, len(key), 8)]
+    return parts[0] == parts[1] or parts[-1] == parts[-2]
+
+def generate_key_bytes(algorithm: str, count: int) -> List[bytes]:
+    """
+    Genera `count` llaves aleatorias de un algoritmo; las DES salen con
+    paridad impar, ajustada sobre todo el bloque de bytes de una vez.
+    """
+    size = KEY_SIZES[algorithm]
+    is_des = "DES" in algorithm
+    data = os.urandom(size * count)
+    if is_des:
+        data = data.translate(ODD_PARITY)
+    keys = [data[i:i + size] for i in range(0, len(data), size)]
+    if is_des:
+        for index, key in enumerate(keys):
+            # Equivalente a lo que rechaza DES3.adjust_key_parity
+            while _is_degenerate(key):
+                key = os.urandom(size).translate(ODD_PARITY)
+            keys[index] = key
+    return keys
+
+def generate_key_chunk(key_type: str, algorithm: str, description: str, count: int,
+                       kek: Optional[Tuple[bytes, str]] = None) -> List[str]:
+    """
+    Genera un lote de llaves con sus KCV.
+
+    Args:
+        kek: (KEK, KCV) para exportar el lote envuelto en lugar de en claro
+
+    Returns:
+        Registros ya serializados (una línea JSON por llave), para que la
+        serialización también se reparta entre los procesos
+    """
+    keys = generate_key_bytes(algorithm, count)
+    kcvs = calculate_kcvs(zip(keys, itertools.repeat(algorithm)), chunk_size=count)
+    size = KEY_SIZES[algorithm]
+    if kek:
+        material = [wrapped_fields(wrapped, kek[1]) for wrapped in aes_key_wrap_many(kek[0], keys)]
+    else:
+        material = [{"keyHex": key.hex().upper()} for key in keys]
+    records = []
+    for fields, kcv in zip(material, kcvs):
+        records.append(json.dumps({
+            "keyType": key_type,
+            "algorithm": algorithm,
+            "description": description,
+            "futurexCode": FUTUREX_CODE,
+            **fields,
+            "kcv": kcv,
+            "bytes": size,
+        }, ensure_ascii=False))
+    return records
+
+def load_spec(path: str) -> Tuple[str, List[Tuple[str, str, str, int]]]:
+    """
+    Lee el archivo de especificación.
+
+    Returns:
+        (descripción del archivo, [(keyType, algoritmo, descripción, cantidad)])
+
+    Raises:
+        ValueError: si una entrada tiene un algoritmo no soportado o una cantidad inválida
+    """
+    with open(path, encoding="utf-8") as f:
+        spec = json.load(f)
+    entries = spec if isinstance(spec, list) else spec.get("keys", [])
+    description = "" if isinstance(spec, list) else spec.get("description", "")
+    items = []
+    for index, entry in enumerate(entries, 1):
+        key_type = entry["keyType"]
+        algorithm = entry["algorithm"]
+        count = int(entry.get("count", 1))
+        if algorithm not in KEY_SIZES:
+            raise ValueError(f"Entrada {index}: algoritmo no soportado: {algorithm}")
+        if count < 0:
+            raise ValueError(f"Entrada {index}: cantidad inválida: {count}")
+        items.append((key_type, algorithm, entry.get("description", f"{key_type} ({algorithm})"), count))
+    return description, items
+
+def _generation_tasks(items: Sequence[Tuple[str, str, str, int]], chunk_size: int,
+                      kek: Optional[Tuple[bytes, str]] = None) -> Iterator[tuple]:
+    for key_type, algorithm, description, count in items:
+        for start in range(0, count, chunk_size):
+            yield key_type, algorithm, description, min(chunk_size, count - start), kek
+
+def iter_generated_records(items: Sequence[Tuple[str, str, str, int]], processes: int = 1,
+                           chunk_size: int = GENERATION_CHUNK_SIZE,
+                           kek: Optional[Tuple[bytes, str]] = None) -> Iterator[str]:
+    """
+    Genera los registros de la especificación en orden, por lotes.
+
+    Con processes > 1 los lotes se reparten en un pool y solo hay unos
+    pocos en vuelo a la vez (igual que kcv.iter_kcvs). Con `kek` cada lote
+    sale envuelto; cada proceso prepara la KEK una sola vez (cipher_cache).
+
+    Yields:
+        Un registro JSON serializado por llave
+    """
+    tasks = _generation_tasks(items, chunk_size, kek)
+    if processes <= 1:
+        for task in tasks:
+            yield from generate_key_chunk(*task)
+        return
+
+    with Pool(processes) as pool:
+        pending = collections.deque()
+        for task in tasks:
+            pending.append(pool.apply_async(generate_key_chunk, task))
+            if len(pending) >= processes * 2:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+def generate_from_spec(spec_path: str, output: str, processes: int = 1,
+                       chunk_size: int = GENERATION_CHUNK_SIZE,
+                       kek: Optional[Tuple[bytes, str]] = None) -> int:
+    """
+    Genera las llaves de una especificación y las escribe en `output`
+    (JSON Lines si termina en .jsonl, JSON de importación si no), en claro
+    o envueltas con `kek` ((KEK, KCV)).
+
+    Returns:
+        Cantidad de llaves escritas
+    """
+    description, items = load_spec(spec_path)
+    total = sum(count for _, _, _, count in items)
+    records = iter_generated_records(items, processes, chunk_size, kek)
+    with open(output, "w", encoding="utf-8") as f:
+        if output.lower().endswith(".jsonl"):
+            return write_keys_jsonl(f, records)
+        header = {
+            "generated": datetime.now().isoformat(),
+            "description": description or _file_description(kek),
+            "totalKeys": total,
+        }
+        if kek:
+            header["kekKcv"] = kek[1]
+        return write_keys_json(f, records, header)
+
+def _replace_key_hex(record: dict, fields: dict) -> dict:
+    """Copia del registro con `fields` en el lugar de keyHex."""
+    replaced = {}
+    for name, value in record.items():
+        if name == "keyHex":
+            replaced.update(fields)
+        else:
+            replaced[name] = value
+    return replaced
+
+def _file_description(kek: Optional[Tuple[bytes, str]]) -> str:
+    if kek:
+        return f"Archivo de llaves maestras envueltas con la {KEK_KEY_TYPE} {kek[1]} (AES Key Wrap) para importación."
+    return "Archivo de llaves maestras (todas en texto plano) para importación."
+
 # --- Script Principal ---
 
-def main():
+def main(argv: Optional[Sequence[str]] = None) -> int:
     """Función principal para generar el archivo de llaves en texto plano."""
+    parser = argparse.ArgumentParser(description="Generador de llaves maestras en texto plano")
+    parser.add_argument("--spec", help="Especificación de llaves a generar (keyType, algorithm, count)")
+    parser.add_argument("--output", help="Archivo de salida (.json o .jsonl)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="Procesos de generación (solo con --spec)")
+    parser.add_argument("--chunk-size", type=int, default=GENERATION_CHUNK_SIZE,
+                        help="Llaves por lote (solo con --spec)")
+    parser.add_argument("--wrap-kek", action="append", metavar="ARCHIVO",
+                        help="Envolver las llaves con la KEK_STORAGE de este archivo de llaves (AES Key Wrap, repetible)")
+    args = parser.parse_args(argv)
+
+    kek = None
+    if args.wrap_kek:
+        try:
+            kek = load_kek(args.wrap_kek)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"KEK inválida: {e}", file=sys.stderr)
+            return 1
+    kind = "envueltas" if kek else "plaintext"
+    content = f"envueltas con la KEK {kek[1]}" if kek else "en texto plano"
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    if args.spec:
+        filename = args.output or f"llaves_maestras_{kind}_{timestamp}.json"
+        started = datetime.now()
+        try:
+            total = generate_from_spec(args.spec, filename, args.processes, args.chunk_size, kek)
+        except (ValueError, KeyError) as e:
+            print(f"Especificación inválida: {e}", file=sys.stderr)
+            return 1
+        seconds = (datetime.now() - started).total_seconds()
+        print(f"\nArchivo de llaves maestras {content} generado exitosamente: {filename}")
+        print(f"Total de llaves en el archivo: {total}")
+        if seconds > 0:
+            print(f"Tiempo: {seconds:.2f} s ({total / seconds:,.0f} llaves/s)")
+        return 0
     
     # Modificado para generar solo llaves maestras y la KEK
     keys_to_generate = [
@@ -70,6 +290,10 @@ def main():
         ("DUKPT_BDK", "3DES-16", "BDK para derivación de llaves DUKPT (Master)"),
     ]
 
+    if kek:
+        # La KEK ya existe: no se genera otra ni se escribe en el archivo
+        keys_to_generate = [item for item in keys_to_generate if item[0] != KEK_KEY_TYPE]
+
     generated_keys = []
     for key_type, algorithm, description in keys_to_generate:
         try:
@@ -78,21 +302,28 @@ def main():
         except ValueError as e:
             print(f"Omitiendo llave debido a un error: {e}")
 
+    if kek:
+        wrapped = aes_key_wrap_many(kek[0], [bytes.fromhex(key["keyHex"]) for key in generated_keys])
+        generated_keys = [_replace_key_hex(key, wrapped_fields(value, kek[1]))
+                          for key, value in zip(generated_keys, wrapped)]
+
     output_data = {
         "generated": datetime.now().isoformat(),
-        "description": "Archivo de llaves maestras (todas en texto plano) para importación.",
+        "description": _file_description(kek),
         "totalKeys": len(generated_keys),
         "keys": generated_keys
     }
+    if kek:
+        output_data["kekKcv"] = kek[1]
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"llaves_maestras_plaintext_{timestamp}.json"
+    filename = args.output or f"llaves_maestras_{kind}_{timestamp}.json"
     
     with open(filename, 'w') as f:
         json.dump(output_data, f, indent=2)
 
-    print(f"\nArchivo de llaves maestras en texto plano generado exitosamente: {filename}")
+    print(f"\nArchivo de llaves maestras {content} generado exitosamente: {filename}")
     print(f"Total de llaves en el archivo: {len(generated_keys)}")
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
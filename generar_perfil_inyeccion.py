@@ -1,8 +1,12 @@
 
+import argparse
 import json
+import os
 import sys
 from datetime import datetime
 
+from key_index import KeyIndex
+
 # --- Mapeo de Tipos de Llave a Usos del Perfil ---
 # Esto se puede personalizar según la lógica de la aplicación.
 USAGE_MAPPING = {
@@ -13,30 +17,22 @@ USAGE_MAPPING = {
     "GENERIC": "MASTER" # Asumiendo que las genéricas se usan como maestras
 }
 
-def create_injection_profile(keys_filepath):
-    """Crea un JSON de perfil de inyección a partir de un archivo de llaves."""
-    try:
-        with open(keys_filepath, 'r') as f:
-            keys_data = json.load(f)
-    except FileNotFoundError:
-        print(f"Error: El archivo de llaves '{keys_filepath}' no fue encontrado.")
-        sys.exit(1)
-    except json.JSONDecodeError:
-        print(f"Error: El archivo '{keys_filepath}' no es un JSON válido.")
-        sys.exit(1)
+MAX_COLLISION_WARNINGS = 10
 
-    # 1. Encontrar la KEK y su KCV
-    kek = next((key for key in keys_data['keys'] if key['keyType'] == 'KEK_STORAGE'), None)
-    if not kek:
-        print("Error: No se encontró una 'KEK_STORAGE' en el archivo de llaves.")
-        sys.exit(1)
-    
-    kek_kcv = kek['kcv']
+def build_profile(keys, kek_kcv, source):
+    """
+    Arma el perfil: usa la KEK para desencriptar las demás llaves y agrega
+    una configuración por llave (menos la KEK), en el orden recibido.
 
+    Args:
+        keys: Registros de llave (keyType, kcv)
+        kek_kcv: KCV de la KEK_STORAGE
+        source: Origen de las llaves, para la descripción del perfil
+    """
     # 2. Inicializar la estructura del perfil
     profile = {
         "name": f"Perfil de Inyección - {datetime.now().strftime('%Y%m%d')}",
-        "description": f"Perfil generado automáticamente desde {os.path.basename(keys_filepath)}",
+        "description": f"Perfil generado automáticamente desde {source}",
         "applicationType": "Retail",
         "useKEK": True, # Usamos la KEK para desencriptar las demás llaves
         "selectedKEKKcv": kek_kcv,
@@ -45,7 +41,7 @@ def create_injection_profile(keys_filepath):
 
     # 3. Iterar sobre las llaves de trabajo y crear sus configuraciones
     slot_counter = 1
-    for key in keys_data['keys']:
+    for key in keys:
         if key['keyType'] == 'KEK_STORAGE':
             continue # No incluimos la KEK en la lista de inyección directa
 
@@ -66,10 +62,51 @@ def create_injection_profile(keys_filepath):
 
         profile["keyConfigurations"].append(key_config)
         slot_counter += 1
+    return profile
+
+def create_injection_profile(keys_filepath, output_filename=None):
+    """
+    Crea un JSON de perfil de inyección a partir de un archivo de llaves.
+
+    Args:
+        keys_filepath: Archivo de llaves (.json, .jsonl o .kvlt)
+        output_filename: Archivo de salida (por defecto perfil_inyeccion_<fecha>.json)
+    """
+    try:
+        index = KeyIndex.from_files([keys_filepath])
+    except FileNotFoundError:
+        print(f"Error: El archivo de llaves '{keys_filepath}' no fue encontrado.")
+        sys.exit(1)
+    except ValueError:
+        # json.JSONDecodeError y VaultError son ValueError
+        print(f"Error: El archivo '{keys_filepath}' no es un archivo de llaves válido.")
+        sys.exit(1)
+
+    # 1. Encontrar la KEK y su KCV
+    kek = index.first_of_type('KEK_STORAGE')
+    if not kek:
+        print("Error: No se encontró una 'KEK_STORAGE' en el archivo de llaves.")
+        sys.exit(1)
+    
+    kek_kcv = kek['kcv']
+
+    # Los perfiles referencian las llaves solo por KCV: un KCV compartido por
+    # llaves distintas deja la configuración ambigua
+    collisions = index.collisions()
+    for kcv, colliding in list(collisions.items())[:MAX_COLLISION_WARNINGS]:
+        types = ", ".join(f"{key['keyType']}/{key['algorithm']}" for key in colliding)
+        print(f"Advertencia: el KCV {kcv} lo comparten {len(colliding)} llaves distintas ({types})")
+    if len(collisions) > MAX_COLLISION_WARNINGS:
+        print(f"Advertencia: ... y {len(collisions) - MAX_COLLISION_WARNINGS} KCV más en colisión "
+              f"(ver python3 key_index.py --collisions {keys_filepath})")
+
+    # 2 y 3. Perfil con una configuración por llave de trabajo
+    profile = build_profile(index.records, kek_kcv, os.path.basename(keys_filepath))
 
     # 4. Guardar el nuevo perfil en un archivo JSON
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_filename = f"perfil_inyeccion_{timestamp}.json"
+    if not output_filename:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_filename = f"perfil_inyeccion_{timestamp}.json"
     
     with open(output_filename, 'w') as f:
         json.dump(profile, f, indent=2)
@@ -77,16 +114,15 @@ def create_injection_profile(keys_filepath):
     print(f"Perfil de inyección generado exitosamente: {output_filename}")
     print(f"Total de configuraciones de llave: {len(profile['keyConfigurations'])}")
 
-def main():
-    if len(sys.argv) < 2:
-        print("Uso: python generar_perfil_inyeccion.py <ruta_al_archivo_de_llaves.json>")
-        sys.exit(1)
-    
-    keys_filepath = sys.argv[1]
-    create_injection_profile(keys_filepath)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera un perfil de inyección desde un archivo de llaves")
+    parser.add_argument("keys", help="Archivo de llaves (.json, .jsonl o .kvlt)")
+    parser.add_argument("--output", help="Archivo del perfil (por defecto perfil_inyeccion_<fecha>.json)")
+    args = parser.parse_args(argv)
+
+    create_injection_profile(args.keys, args.output)
+    return 0
 
 if __name__ == "__main__":
-    # Necesario para obtener el nombre del archivo base
-    import os
-    main()
+    sys.exit(main())
 
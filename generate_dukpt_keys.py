@@ -4,25 +4,47 @@ Script para generar llaves DUKPT (IPEK) a partir de BDK.
 
 Uso:
     python3 generate_dukpt_keys.py
+    python3 generate_dukpt_keys.py --type 3DES --ksn-prefix FFFF9876543210
+    python3 generate_dukpt_keys.py --bdk <hex> --ksn-start <hex> --count 50000 --output ipeks.jsonl
+    python3 generate_dukpt_keys.py --bdk <hex> --devices dispositivos.csv --output ipeks.csv
+    python3 generate_dukpt_keys.py --bdk <hex> --bdk-id FFFF987654 --count 5000 --ksn-log ksn_allocations.log
+    python3 generate_dukpt_keys.py --bdk <hex> --ksn-start <hex> --count 50000 --wrap-kek llaves_kek.json
 
 Genera:
     - BDK (Base Derivation Key) AES-128/192/256
     - IPEK (Initial PIN Encryption Key) derivada de BDK
     - KSN (Key Serial Number) inicial
     - KCV (Key Check Value) para cada llave
+    - En modo masivo: una IPEK por dispositivo a partir de una BDK, en claro
+      o envuelta con la KEK_STORAGE (--wrap-kek, AES Key Wrap)
 """
 
 import os
+import sys
+import csv
+import json
+import argparse
+import itertools
 import hashlib
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.backends import default_backend
-from typing import Tuple
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from cipher_cache import ecb_encrypt
+from futurex import format_message, inject_symmetric_key_fields, key_algorithm_code
+from kcv import calculate_kcv, calculate_kcvs
+from key_wrap import WRAP_ALGORITHM, WRAPPED_FIELDS, aes_key_wrap_many, load_kek
 
 # ========== CONFIGURACIÓN ==========
-# Cambia estos valores según tus necesidades
+# Valores por defecto de --type y --ksn-prefix
 DUKPT_TYPE = "AES128"  # Opciones: AES128, AES192, AES256, 3DES
 KSN_PREFIX = "FFFF9876543210"  # Primeros 14 dígitos hex (7 bytes)
 
+# Derivación masiva
+KSN_COUNTER_BITS = 21  # Bits del contador de transacciones (ANSI X9.24)
+KSN_COUNTER_MASK = (1 << KSN_COUNTER_BITS) - 1
+KSN_DEVICE_ID_BITS = 19  # Bits del Device ID entre el BDK ID y el contador
+BATCH_CHUNK_SIZE = 4096  # KSNs cifrados por llamada a update()
+TDES_KEY_MASK = bytes.fromhex("C0C0C0C000000000C0C0C0C000000000")
+
 # ========== FUNCIONES AUXILIARES ==========
 
 def bytes_to_hex(data: bytes) -> str:
@@ -33,36 +55,6 @@ def hex_to_bytes(hex_str: str) -> bytes:
     """Convierte string hexadecimal a bytes"""
     return bytes.fromhex(hex_str)
 
-def calculate_kcv(key: bytes, algorithm: str = "AES") -> str:
-    """
-    Calcula el KCV (Key Check Value) de una llave.
-
-    KCV = primeros 6 caracteres hex del cifrado de zeros con la llave
-    """
-    if algorithm.startswith("AES"):
-        # Para AES: cifrar 16 bytes de zeros
-        cipher = Cipher(
-            algorithms.AES(key),
-            modes.ECB(),
-            backend=default_backend()
-        )
-        encryptor = cipher.encryptor()
-        plaintext = b'\x00' * 16
-        ciphertext = encryptor.update(plaintext) + encryptor.finalize()
-        return bytes_to_hex(ciphertext)[:6]
-    else:
-        # Para 3DES: cifrar 8 bytes de zeros
-        from cryptography.hazmat.primitives.ciphers import algorithms as alg
-        cipher = Cipher(
-            alg.TripleDES(key),
-            modes.ECB(),
-            backend=default_backend()
-        )
-        encryptor = cipher.encryptor()
-        plaintext = b'\x00' * 8
-        ciphertext = encryptor.update(plaintext) + encryptor.finalize()
-        return bytes_to_hex(ciphertext)[:6]
-
 def generate_bdk(key_size: int) -> bytes:
     """
     Genera una BDK (Base Derivation Key) aleatoria.
@@ -75,82 +67,127 @@ def generate_bdk(key_size: int) -> bytes:
     """
     return os.urandom(key_size)
 
+def _triple_des(key: bytes):
+    """
+    Devuelve el algoritmo TripleDES de `cryptography` (movido a `decrepit` en
+    versiones nuevas). Las llaves de 8 y 16 bytes se expanden a 24 bytes
+    (K1K1K1 / K1K2K1), que es equivalente y evita las advertencias de obsolescencia.
+    """
+    try:
+        from cryptography.hazmat.decrepit.ciphers.algorithms import TripleDES
+    except ImportError:
+        from cryptography.hazmat.primitives.ciphers.algorithms import TripleDES
+    if len(key) == 8:
+        key = key * 3
+    elif len(key) == 16:
+        key = key + key[:8]
+    return TripleDES(key)
+
+def _ipek_plaintext(ksn: bytes, block_size: int) -> bytes:
+    """
+    Construye el bloque a cifrar para derivar la IPEK 3DES de un KSN.
+
+    Toma el KSN completo (10 bytes), limpia los 21 bits del contador de
+    transacciones y se queda con los primeros 8 bytes (KSN inicial), rellenando
+    con zeros hasta el tamaño de bloque del algoritmo.
+    """
+    ksn_initial = (int.from_bytes(ksn[:10], 'big') & ~KSN_COUNTER_MASK) >> 16
+    return ksn_initial.to_bytes(8, 'big') + b'\x00' * (block_size - 8)
+
+class IpekBatchDeriver:
+    """
+    Deriva IPEKs en bloque a partir de una única BDK.
+
+    Los encryptors ECB salen de la caché de cifrado (cipher_cache) en cada
+    lote: los bloques de un lote se cifran con una sola llamada a update(),
+    y los lotes y derivaciones sueltas con la misma BDK no vuelven a
+    preparar la llave.
+    Para AES la IPEK es la llave inicial de X9.24-3 (dukpt_aes.derive_initial_keys),
+    del largo de la BDK, sobre el Initial Key ID del KSN Futurex
+    (dukpt_aes.futurex_ksn_to_aes); es la misma que deriva el host con
+    AesDukptEngine.from_bdk. Para 3DES (ANSI X9.24-1) la mitad derecha se
+    cifra con la BDK modificada por la máscara C0C0C0C000000000C0C0C0C000000000.
+    """
+
+    def __init__(self, bdk: bytes, algorithm: str = "AES"):
+        """
+        Args:
+            bdk: Base Derivation Key
+            algorithm: "AES" o "3DES"
+        """
+        self.algorithm = "AES" if algorithm.startswith("AES") else "3DES"
+        self.bdk = bdk
+        if self.algorithm == "AES":
+            # dukpt_aes importa este módulo: se importa recién al usarlo
+            from dukpt_aes import key_type_for_length
+            self.key_type = key_type_for_length(bdk)
+            self._keys = (("AES", bdk),)
+        else:
+            if len(bdk) != 16:
+                raise ValueError("DUKPT 3DES (X9.24-1) requiere una BDK de 16 bytes (2TDEA)")
+            self.block_size = 8
+            bdk_right = bytes(a ^ b for a, b in zip(bdk, TDES_KEY_MASK))
+            self._keys = (("TDES", bdk), ("TDES", bdk_right))
+        for cipher_algorithm, key in self._keys:
+            ecb_encrypt(cipher_algorithm, key, b'')  # Valida la llave y deja el contexto en caché
+
+    def derive_many(self, ksns: Sequence[bytes]) -> List[bytes]:
+        """
+        Deriva la IPEK de cada KSN del lote.
+
+        Args:
+            ksns: Secuencia de KSN (10 bytes cada uno)
+
+        Returns:
+            Lista de IPEKs en el mismo orden que los KSN
+        """
+        if not ksns:
+            return []
+
+        if self.algorithm == "AES":
+            from dukpt_aes import derive_initial_keys, split_ksn
+            return derive_initial_keys(self.bdk, [split_ksn(ksn)[0] for ksn in ksns], self.key_type)
+
+        size = self.block_size
+        plaintext = b''.join(_ipek_plaintext(ksn, size) for ksn in ksns)
+        left = ecb_encrypt(*self._keys[0], plaintext)
+        right = ecb_encrypt(*self._keys[1], plaintext)
+        return [left[i:i + size] + right[i:i + size] for i in range(0, len(left), size)]
+
 def derive_ipek_aes(bdk: bytes, ksn: bytes) -> bytes:
     """
-    Deriva la IPEK (Initial PIN Encryption Key) desde BDK usando KSN.
+    Deriva la IPEK AES desde la BDK según ANSI X9.24-3.
 
-    Algoritmo DUKPT estándar para AES:
-    1. Tomar primeros 8 bytes del KSN
-    2. Limpiar los últimos 21 bits (poner en 0)
-    3. Cifrar el KSN modificado con BDK
-    4. XOR del resultado con BDK
+    1. Pasar el KSN Futurex al formato de X9.24-3 y tomar el Initial Key ID
+       (BDK ID y Device ID; el contador se descarta)
+    2. Derivar la llave inicial (uso "Initial Key") cifrando los datos de
+       derivación con la BDK (dukpt_aes.derive_initial_key)
 
     Args:
         bdk: Base Derivation Key (16/24/32 bytes)
         ksn: Key Serial Number (10 bytes)
 
     Returns:
-        IPEK (mismo tamaño que BDK)
+        IPEK del mismo largo que la BDK
     """
-    # Tomar primeros 8 bytes del KSN
-    ksn_partial = ksn[:8]
-
-    # Limpiar últimos 21 bits (poner últimos 3 bytes en 0 excepto primeros 3 bits)
-    ksn_modified = bytearray(ksn_partial)
-    ksn_modified[5] &= 0xE0  # Limpiar últimos 5 bits del byte 5
-    ksn_modified[6] = 0x00   # Byte 6 a cero
-    ksn_modified[7] = 0x00   # Byte 7 a cero
-
-    # Pad con zeros hasta llegar al tamaño del bloque AES (16 bytes)
-    plaintext = bytes(ksn_modified) + b'\x00' * (16 - len(ksn_modified))
-
-    # Cifrar con BDK
-    cipher = Cipher(
-        algorithms.AES(bdk),
-        modes.ECB(),
-        backend=default_backend()
-    )
-    encryptor = cipher.encryptor()
-    encrypted = encryptor.update(plaintext[:16]) + encryptor.finalize()
-
-    # XOR del resultado con BDK
-    ipek = bytes(a ^ b for a, b in zip(encrypted[:len(bdk)], bdk))
-
-    return ipek
+    return IpekBatchDeriver(bdk, "AES").derive_many([ksn])[0]
 
 def derive_ipek_3des(bdk: bytes, ksn: bytes) -> bytes:
     """
-    Deriva la IPEK para 3DES (algoritmo diferente a AES).
+    Deriva la IPEK para 3DES según ANSI X9.24-1.
+
+    1. Limpiar los 21 bits del contador y tomar los primeros 8 bytes del KSN
+    2. Mitad izquierda: cifrar con la BDK
+    3. Mitad derecha: cifrar con BDK XOR C0C0C0C000000000C0C0C0C000000000
 
     Args:
-        bdk: Base Derivation Key (16 o 24 bytes para 3DES)
+        bdk: Base Derivation Key (16 bytes, 2TDEA)
         ksn: Key Serial Number (10 bytes)
 
     Returns:
-        IPEK (16 o 24 bytes)
-    """
-    from cryptography.hazmat.primitives.ciphers import algorithms as alg
-
-    # Tomar primeros 8 bytes del KSN y limpiar últimos 21 bits
-    ksn_partial = ksn[:8]
-    ksn_modified = bytearray(ksn_partial)
-    ksn_modified[5] &= 0xE0
-    ksn_modified[6] = 0x00
-    ksn_modified[7] = 0x00
-
-    # Cifrar con 3DES
-    cipher = Cipher(
-        alg.TripleDES(bdk),
-        modes.ECB(),
-        backend=default_backend()
-    )
-    encryptor = cipher.encryptor()
-    encrypted = encryptor.update(bytes(ksn_modified)) + encryptor.finalize()
-
-    # XOR con BDK
-    ipek = bytes(a ^ b for a, b in zip(encrypted[:len(bdk)], bdk))
-
-    return ipek
+        IPEK (16 bytes)
+    """
+    return IpekBatchDeriver(bdk, "3DES").derive_many([ksn])[0]
 
 def generate_ksn(prefix: str = None) -> Tuple[bytes, str]:
     """
@@ -185,15 +222,219 @@ def generate_ksn(prefix: str = None) -> Tuple[bytes, str]:
     ksn_bytes = hex_to_bytes(ksn_hex)
     return ksn_bytes, ksn_hex
 
+# ========== DERIVACIÓN MASIVA (FLOTAS) ==========
+
+def dukpt_type_params(dukpt_type: str) -> Tuple[int, str]:
+    """
+    Devuelve (tamaño de llave en bytes, algoritmo) para un tipo DUKPT.
+
+    Args:
+        dukpt_type: Tipo de DUKPT (AES128, AES192, AES256, 3DES)
+    """
+    if dukpt_type == "AES128":
+        return 16, "AES"
+    elif dukpt_type == "AES192":
+        return 24, "AES"
+    elif dukpt_type == "AES256":
+        return 32, "AES"
+    elif dukpt_type == "3DES":
+        return 16, "3DES"  # DUKPT X9.24-1 usa llaves de doble longitud
+    raise ValueError(f"Tipo DUKPT no soportado: {dukpt_type}")
+
+def build_ksn(bdk_id: bytes, device_id: int) -> bytes:
+    """
+    Arma un KSN inicial (contador en 0) a partir de BDK ID y Device ID.
+
+    Formato (80 bits): BDK ID (40 bits) | Device ID (19 bits) | Contador (21 bits)
+
+    Args:
+        bdk_id: BDK ID (5 bytes)
+        device_id: Número de dispositivo (0 .. 2^19 - 1)
+
+    Returns:
+        KSN de 10 bytes
+    """
+    if len(bdk_id) != 5:
+        raise ValueError("BDK ID debe tener exactamente 5 bytes (10 caracteres hex)")
+    if not 0 <= device_id < (1 << KSN_DEVICE_ID_BITS):
+        raise ValueError(f"Device ID fuera de rango: {device_id}")
+    ksn = (int.from_bytes(bdk_id, 'big') << 40) | (device_id << KSN_COUNTER_BITS)
+    return ksn.to_bytes(10, 'big')
+
+def iter_ksn_range(start_ksn: bytes, count: int,
+                   step: int = 1 << KSN_COUNTER_BITS) -> Iterator[bytes]:
+    """
+    Genera `count` KSN consecutivos a partir de `start_ksn`.
+
+    Por defecto avanza de a un Device ID (2^21), con el contador en 0.
+
+    Args:
+        start_ksn: Primer KSN (10 bytes)
+        count: Cantidad de KSN a generar
+        step: Incremento entre KSN consecutivos
+    """
+    start = int.from_bytes(start_ksn, 'big')
+    last = start + (count - 1) * step
+    if count > 0 and last >= 1 << 80:
+        raise ValueError("El rango de KSN excede los 10 bytes")
+    for value in range(start, start + count * step, step):
+        yield value.to_bytes(10, 'big')
+
+def iter_device_csv(csv_path: str, bdk_id: Optional[bytes] = None) -> Iterator[Tuple[str, bytes]]:
+    """
+    Lee un CSV de dispositivos y genera (deviceId, KSN) por fila.
+
+    El CSV debe tener una columna `ksn` (20 caracteres hex) o una columna
+    `deviceId` (decimal o hex con prefijo 0x); en el segundo caso el KSN se
+    arma con `bdk_id`.
+
+    Args:
+        csv_path: Ruta al archivo CSV con encabezado
+        bdk_id: BDK ID (5 bytes) para armar el KSN desde deviceId
+    """
+    with open(csv_path, newline='') as f:
+        for row in csv.DictReader(f):
+            device_id = (row.get('deviceId') or row.get('device_id') or '').strip()
+            ksn_hex = (row.get('ksn') or '').strip()
+            if ksn_hex:
+                ksn = hex_to_bytes(ksn_hex)
+                if len(ksn) != 10:
+                    raise ValueError(f"KSN inválido para dispositivo '{device_id}': {ksn_hex}")
+            elif device_id:
+                if bdk_id is None:
+                    raise ValueError("Se requiere BDK ID para armar KSN desde deviceId")
+                ksn = build_ksn(bdk_id, int(device_id, 0))
+            else:
+                raise ValueError(f"Fila sin 'ksn' ni 'deviceId': {row}")
+            yield device_id or bytes_to_hex(ksn), ksn
+
+def _chunked(items: Iterable, size: int) -> Iterator[list]:
+    """Agrupa un iterable en listas de hasta `size` elementos."""
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def derive_ipek_batch(bdk: bytes, algorithm: str, ksns: Iterable[bytes],
+                      chunk_size: int = BATCH_CHUNK_SIZE) -> Iterator[Tuple[bytes, bytes]]:
+    """
+    Deriva IPEKs para un flujo de KSN, procesando lotes de `chunk_size`.
+
+    Solo mantiene en memoria un lote a la vez, de modo que sirve para rangos
+    de cualquier tamaño.
+
+    Args:
+        bdk: Base Derivation Key
+        algorithm: "AES" o "3DES"
+        ksns: Iterable de KSN (10 bytes)
+        chunk_size: KSNs por llamada al cifrador
+
+    Yields:
+        (KSN, IPEK)
+    """
+    deriver = IpekBatchDeriver(bdk, algorithm)
+    for chunk in _chunked(ksns, chunk_size):
+        yield from zip(chunk, deriver.derive_many(chunk))
+
+def write_ipek_batch(bdk: bytes, dukpt_type: str, devices: Iterable[Tuple[str, bytes]],
+                     output_file: str, chunk_size: int = BATCH_CHUNK_SIZE,
+                     kek: Optional[Tuple[bytes, str]] = None) -> int:
+    """
+    Deriva y escribe en disco las IPEKs de una flota a medida que se generan.
+
+    El formato de salida se elige por extensión: `.csv` o JSON Lines (resto).
+
+    Args:
+        bdk: Base Derivation Key
+        dukpt_type: Tipo de DUKPT (AES128, AES192, AES256, 3DES)
+        devices: Iterable de (deviceId, KSN)
+        output_file: Archivo de salida
+        chunk_size: KSNs por lote
+        kek: (KEK, KCV) para escribir las IPEKs envueltas (wrappedKeyHex,
+            wrapAlgorithm, kekKcv) en lugar de keyHex; cada lote se envuelve
+            en una sola pasada
+
+    Returns:
+        Cantidad de IPEKs escritas
+    """
+    _, algorithm = dukpt_type_params(dukpt_type)
+    deriver = IpekBatchDeriver(bdk, algorithm)
+    fields = ["deviceId", "ksn", *(WRAPPED_FIELDS if kek else ["keyHex"]), "kcv"]
+    as_csv = output_file.lower().endswith('.csv')
+
+    total = 0
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.writer(f) if as_csv else None
+        if writer:
+            writer.writerow(fields)
+        for chunk in _chunked(devices, chunk_size):
+            ipeks = deriver.derive_many([ksn for _, ksn in chunk])
+            kcvs = calculate_kcvs((ipek, algorithm) for ipek in ipeks)
+            if kek:
+                material = [[bytes_to_hex(wrapped), WRAP_ALGORITHM, kek[1]]
+                            for wrapped in aes_key_wrap_many(kek[0], ipeks)]
+            else:
+                material = [[bytes_to_hex(ipek)] for ipek in ipeks]
+            rows = [
+                [device_id, bytes_to_hex(ksn), *key, kcv]
+                for (device_id, ksn), key, kcv in zip(chunk, material, kcvs)
+            ]
+            if writer:
+                writer.writerows(rows)
+            else:
+                f.writelines(json.dumps(dict(zip(fields, row))) + "\n" for row in rows)
+            total += len(rows)
+    return total
+
+# ========== COMANDO FUTUREX ==========
+
+def ipek_injection_fields(ipek: bytes, ipek_kcv: str, ksn_hex: str, algorithm: str,
+                          key_slot: int = 1) -> Tuple[str, ...]:
+    """
+    Campos del comando 02 para inyectar una IPEK en claro (EncryptionType 05).
+
+    El código de algoritmo y el KeyLength salen del largo de la IPEK que
+    se envía, no del tipo DUKPT pedido.
+
+    Args:
+        ipek: IPEK a inyectar
+        ipek_kcv: KCV de la IPEK (se envían los primeros 4 caracteres)
+        ksn_hex: KSN inicial (20 caracteres)
+        algorithm: "AES" o "3DES"
+        key_slot: Slot del KeyReceiver
+    """
+    # KeyAlgorithm con los códigos que entiende el KeyReceiver
+    # (02/03/04 = AES-128/192/256, 00 = 3DES de 16 bytes)
+    key_algorithm = key_algorithm_code(algorithm, len(ipek))
+
+    # KeyLength va en ASCII HEX de 3 dígitos (16 bytes -> "010") y el LRC
+    # se calcula sobre los bytes ASCII del payload más el ETX (ver futurex.py)
+    return inject_symmetric_key_fields(
+        key_slot=key_slot,           # KeySlot
+        key_hex=bytes_to_hex(ipek),  # KeyHex (datos de la llave)
+        key_checksum=ipek_kcv[:4],   # KeyChecksum (4 caracteres)
+        ktk_slot=0,                  # KtkSlot (no usado para DUKPT plaintext)
+        key_type="05",               # KeyType: 05 = DUKPT IPEK
+        encryption_type="05",        # EncryptionType: 05 = DUKPT Plaintext
+        key_algorithm=key_algorithm,
+        key_sub_type="00",
+        ksn=ksn_hex,                 # KSN (20 caracteres)
+    )
+
 # ========== FUNCIÓN PRINCIPAL ==========
 
-def generate_dukpt_keys(dukpt_type: str = "AES128", ksn_prefix: str = None):
+def generate_dukpt_keys(dukpt_type: str = "AES128", ksn_prefix: str = None, allocator=None):
     """
     Genera un conjunto completo de llaves DUKPT.
 
     Args:
         dukpt_type: Tipo de DUKPT (AES128, AES192, AES256, 3DES)
         ksn_prefix: Prefijo opcional para KSN (14 caracteres hex)
+        allocator: KsnAllocator (ksn_allocator.py); si se indica, el KSN usa
+            el siguiente Device ID libre del BDK ID (primeros 10 caracteres
+            del prefijo) en lugar del prefijo fijo
     """
     print("=" * 80)
     print("🔐 GENERADOR DE LLAVES DUKPT")
@@ -201,20 +442,7 @@ def generate_dukpt_keys(dukpt_type: str = "AES128", ksn_prefix: str = None):
     print()
 
     # Determinar tamaño de llave
-    if dukpt_type == "AES128":
-        key_size = 16
-        algorithm = "AES"
-    elif dukpt_type == "AES192":
-        key_size = 24
-        algorithm = "AES"
-    elif dukpt_type == "AES256":
-        key_size = 32
-        algorithm = "AES"
-    elif dukpt_type == "3DES":
-        key_size = 24  # 3DES 3-key
-        algorithm = "3DES"
-    else:
-        raise ValueError(f"Tipo DUKPT no soportado: {dukpt_type}")
+    key_size, algorithm = dukpt_type_params(dukpt_type)
 
     print(f"📊 Configuración:")
     print(f"   - Tipo DUKPT: {dukpt_type}")
@@ -234,7 +462,11 @@ def generate_dukpt_keys(dukpt_type: str = "AES128", ksn_prefix: str = None):
 
     # 2. Generar KSN
     print("2️⃣  Generando KSN (Key Serial Number)...")
-    ksn_bytes, ksn_hex = generate_ksn(ksn_prefix)
+    if allocator is not None:
+        ksn_bytes = allocator.allocate_ksn(hex_to_bytes((ksn_prefix or KSN_PREFIX)[:10]))
+        ksn_hex = bytes_to_hex(ksn_bytes)
+    else:
+        ksn_bytes, ksn_hex = generate_ksn(ksn_prefix)
     print(f"   ✓ KSN generado:")
     print(f"     Hex: {ksn_hex} ({len(ksn_hex)} caracteres)")
     print(f"     Bytes: {ksn_bytes.hex().upper()}")
@@ -301,46 +533,15 @@ def generate_dukpt_keys(dukpt_type: str = "AES128", ksn_prefix: str = None):
     print("=" * 80)
     print()
 
-    # Calcular longitud de la llave en caracteres hex
-    key_length_hex = f"{key_size:03d}"  # 3 dígitos: 016, 024, 032
-
-    # Construir comando
-    payload = "02"  # Comando: Inyección de llave simétrica
-    payload += "01"  # Versión
-    payload += "01"  # KeySlot (ejemplo: slot 1)
-    payload += "00"  # KtkSlot (no usado para DUKPT plaintext)
-    payload += "05"  # KeyType: 05 = DUKPT IPEK
-    payload += "05"  # EncryptionType: 05 = DUKPT Plaintext (NUEVO)
-
-    # Determinar KeyAlgorithm
-    if dukpt_type == "AES128":
-        key_algorithm = "04"  # AES-128
-    elif dukpt_type == "AES192":
-        key_algorithm = "05"  # AES-192
-    elif dukpt_type == "AES256":
-        key_algorithm = "06"  # AES-256
-    else:  # 3DES
-        key_algorithm = "02"  # DES_TRIPLE
-
-    payload += key_algorithm  # KeyAlgorithm
-    payload += "00"  # KeySubType
-    payload += ipek_kcv[:4]  # KeyChecksum (4 caracteres)
-    payload += "0000"  # KtkChecksum (no usado)
-    payload += ksn_hex  # KSN (20 caracteres)
-    payload += key_length_hex  # KeyLength (3 dígitos)
-    payload += ipek_hex  # KeyHex (datos de la llave)
+    fields = ipek_injection_fields(ipek, ipek_kcv, ksn_hex, algorithm)
+    payload = "02" + "".join(fields)
+    frame_bytes = format_message("02", fields)
+    frame = frame_bytes.hex().upper()
 
     print(f"Payload completo:")
     print(f"{payload}")
     print()
-    print(f"Frame completo (con STX/ETX):")
-    # Calcular LRC (XOR de todos los bytes del payload)
-    lrc = 0
-    for i in range(0, len(payload), 2):
-        lrc ^= int(payload[i:i+2], 16)
-    lrc_hex = f"{lrc:02X}"
-
-    frame = f"02{payload}03{lrc_hex}"
+    print(f"Frame completo (hex, con STX/ETX/LRC):")
     print(f"{frame}")
     print()
 
@@ -373,8 +574,77 @@ def generate_dukpt_keys(dukpt_type: str = "AES128", ksn_prefix: str = None):
     print("   1. Inyectar IPEK en el PED usando EncryptionType '05'")
     print("   2. Verificar que el KCV coincida")
     print("   3. Probar derivación de llaves de sesión con transacciones")
+    if algorithm == "AES":
+        print(f"      (llaves esperadas: python3 dukpt_aes.py --ipek {ipek_hex} --ksn <KSN de la transacción>)")
     print()
 
+def generate_ipek_batch(args: argparse.Namespace, allocator=None):
+    """
+    Modo masivo: deriva una IPEK por dispositivo a partir de una sola BDK.
+
+    Con `allocator` y sin --ksn-start ni --devices, los --count KSN salen
+    del log de reservas (un bloque de Device IDs de --bdk-id).
+    """
+    bdk = hex_to_bytes(args.bdk)
+    key_size, _ = dukpt_type_params(args.type)
+    if len(bdk) != key_size:
+        raise ValueError(f"La BDK debe tener {key_size} bytes para {args.type}")
+
+    if args.devices:
+        bdk_id = hex_to_bytes(args.bdk_id) if args.bdk_id else None
+        devices = iter_device_csv(args.devices, bdk_id)
+    elif allocator is not None:
+        ksns = allocator.allocate_ksns(hex_to_bytes(args.bdk_id), args.count)
+        devices = ((bytes_to_hex(ksn), ksn) for ksn in ksns)
+    else:
+        start_ksn = hex_to_bytes(args.ksn_start)
+        if len(start_ksn) != 10:
+            raise ValueError("El KSN inicial debe tener 20 caracteres hex (10 bytes)")
+        devices = ((bytes_to_hex(ksn), ksn) for ksn in iter_ksn_range(start_ksn, args.count))
+
+    kek = load_kek(args.wrap_kek) if args.wrap_kek else None
+    print(f"🔐 Derivando IPEKs {args.type} (KCV BDK: {calculate_kcv(bdk, args.type)})...")
+    total = write_ipek_batch(bdk, args.type, devices, args.output, args.chunk_size, kek)
+    wrapped = f" (envueltas con la KEK {kek[1]})" if kek else ""
+    print(f"✅ {total} IPEKs guardadas en: {args.output}{wrapped}")
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generador de llaves DUKPT (IPEK)")
+    parser.add_argument("--type", default=DUKPT_TYPE, choices=["AES128", "AES192", "AES256", "3DES"],
+                        help="Tipo de DUKPT")
+    parser.add_argument("--ksn-prefix", default=KSN_PREFIX,
+                        help="Prefijo del KSN de ejemplo (14 caracteres hex, sin --bdk)")
+    parser.add_argument("--bdk", help="BDK en hex; activa el modo masivo")
+    parser.add_argument("--ksn-start", help="Primer KSN del rango (20 caracteres hex)")
+    parser.add_argument("--count", type=int, default=1, help="Cantidad de dispositivos del rango")
+    parser.add_argument("--devices", help="CSV con columna 'deviceId' o 'ksn'")
+    parser.add_argument("--bdk-id", help="BDK ID (10 caracteres hex) para armar KSN desde deviceId")
+    parser.add_argument("--output", default="ipeks_dukpt.jsonl", help="Archivo de salida (.jsonl o .csv)")
+    parser.add_argument("--chunk-size", type=int, default=BATCH_CHUNK_SIZE, help="KSNs por lote")
+    parser.add_argument("--ksn-log", help="Tomar los KSN del log de reservas de ksn_allocator.py")
+    parser.add_argument("--wrap-kek", action="append", metavar="ARCHIVO",
+                        help="Envolver las IPEKs con la KEK_STORAGE de este archivo de llaves (AES Key Wrap, repetible)")
+    args = parser.parse_args(argv)
+    if args.bdk and not (args.ksn_start or args.devices or (args.ksn_log and args.bdk_id)):
+        parser.error("El modo masivo requiere --ksn-start, --devices o --ksn-log con --bdk-id")
+    return args
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    allocator = None
+    if args.ksn_log:
+        from ksn_allocator import KsnAllocator
+        allocator = KsnAllocator(args.ksn_log)
+    try:
+        if args.bdk:
+            generate_ipek_batch(args, allocator)
+        else:
+            # Un juego de ejemplo (BDK, IPEK y KSN)
+            generate_dukpt_keys(args.type, args.ksn_prefix, allocator)
+    finally:
+        if allocator is not None:
+            allocator.close()
+    return 0
+
 if __name__ == "__main__":
-    # Ejecutar generador con configuración por defecto
-    generate_dukpt_keys(DUKPT_TYPE, KSN_PREFIX)
+    sys.exit(main())
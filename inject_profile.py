@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+"""
+Inyección por lotes de un perfil en muchos KeyReceiver a la vez.
+
+Toma un perfil (generar_perfil_inyeccion.py o data/dukpt/profiles), el
+archivo de llaves de donde salen los KCV del perfil y una lista de puertos
+seriales (reales o pty del simulador), arma los frames del comando 02 una
+sola vez y los envía a todos los puertos en paralelo.
+
+Uso:
+    python3 inject_profile.py perfil.json llaves.json --port /dev/ttyUSB0 --port /dev/ttyUSB1
+    python3 inject_profile.py perfil.json llaves.json --endpoints endpoints.json --concurrency 32
+
+Igual que KeyInjectionViewModel:
+    - Si el perfil usa KTK, primero se envía la KTK en claro al slot 00
+      (keyType 06) y el resto de las llaves va cifrado con ella (encryptionType 02)
+    - Las IPEK DUKPT con KSN de 20 caracteres van en claro (encryptionType 05)
+    - Un dispositivo se detiene en la primera llave rechazada
+
+Cada frame tiene su timeout y se reintenta si no hay respuesta, si llega
+con LRC incorrecto o si el receptor responde 08 (LRC) o 05 (ocupado).
+Con --window N se mantienen hasta N frames en vuelo por dispositivo y las
+respuestas se asignan por comando y slot; si el receptor no lo soporta se
+vuelve a stop-and-wait.
+Al final se informan percentiles de latencia por dispositivo y por llave.
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+from futurex import (
+    BAD_LRC, DEVICE_IS_BUSY, EMPTY_CHECKSUM, EMPTY_KSN, InjectSymmetricKeyResponse, encrypt_with_kek,
+    format_message, inject_symmetric_key_fields, key_algorithm_code, key_sub_type_code, key_type_code,
+)
+from key_index import KeyIndex, KeyLookupError
+from keyreceiver_sim import raise_fd_limit
+from serial_link import DEFAULT_BAUD_RATE, DEFAULT_TIMEOUT, SerialLink
+
+KTK_SLOT = 0
+KTK_KEY_TYPE = "06"  # Transport Key
+DUKPT_PLAINTEXT_ENCRYPTION = "05"
+KTK_ENCRYPTION = "02"
+RETRY_CODES = (BAD_LRC, DEVICE_IS_BUSY)
+DEFAULT_RETRIES = 2
+DEFAULT_CONCURRENCY = 16
+
+# ========== PLAN DE INYECCIÓN ==========
+
+@dataclass
+class PlannedFrame:
+    """Frame del comando 02 listo para enviar."""
+    label: str
+    slot: int
+    key_type: str
+    kcv: str
+    frame: bytes
+
+def parse_slot(slot) -> int:
+    """
+    Slot de un perfil como entero.
+
+    El receptor interpreta el slot en decimal, pero generar_perfil_inyeccion.py
+    lo escribe en hexadecimal ("0A" para el décimo); se aceptan ambos.
+    """
+    text = str(slot).strip()
+    return int(text) if text.isdigit() else int(text, 16)
+
+def profile_ksn(config: dict, kcv: str, slot: int) -> str:
+    """KSN del perfil o, si no tiene 20 caracteres, el derivado de KCV + slot (generateKsn)."""
+    ksn = str(config.get("ksn") or "").strip().upper()
+    if len(ksn) == 20:
+        return ksn
+    return kcv.upper().ljust(16, "0")[:16] + f"{slot:04X}"
+
+def is_dukpt_plaintext(config: dict) -> bool:
+    """IPEK DUKPT con KSN propio: se inyecta en claro con encryptionType 05."""
+    key_type = str(config.get("keyType", "")).upper()
+    ksn = str(config.get("ksn") or "")
+    if "DUKPT" not in key_type or "IPEK" not in key_type or len(ksn) != 20:
+        return False
+    try:
+        bytes.fromhex(ksn)
+    except ValueError:
+        return False
+    return True
+
+def _find_key(keys: KeyIndex, kcv: str, what: str, key_type: Optional[str] = None) -> dict:
+    try:
+        return keys.resolve(kcv, key_type)
+    except KeyLookupError as e:
+        raise ValueError(f"{what}: {e}") from None
+
+def build_injection_plan(profile: dict, keys: KeyIndex) -> List[PlannedFrame]:
+    """
+    Arma los frames del perfil, en el orden en que se envían.
+
+    Args:
+        profile: Perfil de inyección (acepta useKTK/selectedKTKKcv y useKEK/selectedKEKKcv)
+        keys: Índice de llaves por KCV (KeyIndex.from_files)
+
+    Returns:
+        Frames: la KTK (si el perfil la usa) y una llave por keyConfiguration
+
+    Raises:
+        ValueError: si falta una llave o su KCV es ambiguo, la KTK es
+            obligatoria y no está, o un campo no se puede codificar
+    """
+    configs = profile.get("keyConfigurations", [])
+    use_ktk = profile.get("useKTK", profile.get("useKEK", False))
+    ktk_kcv = profile.get("selectedKTKKcv") or profile.get("selectedKEKKcv") or ""
+    plan: List[PlannedFrame] = []
+
+    ktk: Optional[bytes] = None
+    ktk_checksum = EMPTY_CHECKSUM
+    if use_ktk and ktk_kcv:
+        record = _find_key(keys, ktk_kcv, "La KTK")
+        ktk = bytes.fromhex(record["keyHex"])
+        if len(ktk) not in (16, 24, 32):
+            raise ValueError(f"La KTK debe ser de 16, 24 o 32 bytes, tiene {len(ktk)}")
+        ktk_checksum = ktk_kcv[:4].upper()
+        fields = inject_symmetric_key_fields(
+            key_slot=KTK_SLOT, key_hex=ktk.hex(), key_checksum=ktk_checksum,
+            key_type=KTK_KEY_TYPE, encryption_type="00",
+            key_algorithm=key_algorithm_code(str(record.get("algorithm", "")), len(ktk)),
+        )
+        plan.append(PlannedFrame("KTK", KTK_SLOT, KTK_KEY_TYPE, ktk_kcv.upper(), format_message("02", fields)))
+
+    for index, config in enumerate(configs, 1):
+        kcv = str(config.get("selectedKey", ""))
+        profile_key_type = str(config.get("keyType", ""))
+        record = _find_key(keys, kcv, f"La llave {index}", profile_key_type)
+        key = bytes.fromhex(record["keyHex"])
+        slot = parse_slot(config.get("slot", "00"))
+        key_type = key_type_code(profile_key_type)
+        options = dict(
+            key_slot=slot,
+            key_checksum=kcv[:4],
+            key_type=key_type,
+            key_algorithm=key_algorithm_code(str(record.get("algorithm", "")), len(key)),
+            key_sub_type=key_sub_type_code(profile_key_type),
+            ksn=profile_ksn(config, kcv, slot) if "DUKPT" in profile_key_type.upper() else EMPTY_KSN,
+            total_keys=len(configs),
+            current_key_index=index,
+        )
+        if is_dukpt_plaintext(config):
+            fields = inject_symmetric_key_fields(
+                key_hex=key.hex(), encryption_type=DUKPT_PLAINTEXT_ENCRYPTION, **options)
+        elif ktk is not None:
+            fields = inject_symmetric_key_fields(
+                key_hex=encrypt_with_kek(key, ktk).hex(), encryption_type=KTK_ENCRYPTION,
+                ktk_slot=KTK_SLOT, ktk_checksum=ktk_checksum, **options)
+        else:
+            raise ValueError(f"La KTK es obligatoria para la llave {index} ({profile_key_type}, slot {slot})")
+        plan.append(PlannedFrame(f"{slot:02d}:{profile_key_type}", slot, key_type, kcv.upper(),
+                                 format_message("02", fields)))
+    return plan
+
+# ========== INYECCIÓN ==========
+
+@dataclass
+class KeyResult:
+    label: str
+    response_code: str = ""
+    attempts: int = 0
+    latency_ms: float = 0.0
+    serial_number: str = ""
+    error: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return not self.error
+
+@dataclass
+class DeviceResult:
+    path: str
+    serial_number: str = ""
+    keys: List[KeyResult] = field(default_factory=list)
+    seconds: float = 0.0
+    fallback: bool = False  # La ventana se abandonó y se siguió en stop-and-wait
+    error: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return not self.error
+
+def match_response(planned: PlannedFrame, message) -> bool:
+    """
+    True si el mensaje es la respuesta 02 de este frame. La respuesta no
+    trae el slot: se correlaciona por el checksum de la llave, que el
+    receptor devuelve tal cual (0000 en los errores de formato/LRC).
+    """
+    return (isinstance(message, InjectSymmetricKeyResponse)
+            and message.key_checksum.upper() in (planned.kcv[:4], EMPTY_CHECKSUM))
+
+def _apply_response(result: KeyResult, message: InjectSymmetricKeyResponse, latency_ns: int):
+    result.latency_ms = latency_ns / 1e6
+    result.response_code = message.response_code
+    if message.is_successful:
+        result.error = ""
+        result.serial_number = message.device_serial
+    else:
+        result.error = f"{message.response_code}: {message.description}"
+
+async def send_with_retry(link: SerialLink, planned: PlannedFrame, timeout: float,
+                          retries: int) -> KeyResult:
+    """
+    Envía un frame y espera su respuesta (stop-and-wait), reintentando ante
+    timeout, LRC incorrecto o respuestas 08/05.
+
+    Las respuestas tardías de otros frames se ignoran. La latencia
+    informada es la del intento que obtuvo respuesta.
+    """
+    loop = asyncio.get_running_loop()
+    result = KeyResult(planned.label)
+    for attempt in range(1, retries + 2):
+        result.attempts = attempt
+        started = time.perf_counter_ns()
+        deadline = loop.time() + timeout
+        link.discard_pending()
+        await link.write(planned.frame)
+        try:
+            while True:
+                received = await link.read_frame(max(0.0, deadline - loop.time()))
+                if not received.lrc_ok:
+                    break
+                message = received.message()
+                if match_response(planned, message):
+                    break
+        except asyncio.TimeoutError:
+            result.error = f"Sin respuesta en {timeout:g} s"
+            continue
+        if not received.lrc_ok:
+            result.error = "Respuesta con LRC incorrecto"
+            continue
+        _apply_response(result, message, received.received_ns - started)
+        if result.ok or message.response_code not in RETRY_CODES:
+            break
+    return result
+
+async def send_pipelined(link: SerialLink, plan: Sequence[PlannedFrame], window: int,
+                         timeout: float) -> Tuple[List[KeyResult], Optional[int]]:
+    """
+    Envía el plan con hasta `window` frames sin respuesta a la vez.
+
+    Cada respuesta se asigna al frame en vuelo con el mismo comando y
+    checksum de llave (es decir, el mismo slot del plan). Ante cualquier
+    cosa que no sea un 00 correlacionado (timeout, LRC incorrecto,
+    respuesta sin dueño, rechazo u 05 por receptor ocupado) se deja de
+    enviar y quien llama sigue en stop-and-wait desde la primera llave
+    sin confirmar. El receptor puede haber recibido hasta window - 1
+    llaves posteriores a esa; reenviarlas solo vuelve a escribir el slot.
+
+    Returns:
+        (resultados de las llaves confirmadas en orden, índice desde el que
+        seguir en stop-and-wait o None si se confirmó todo el plan)
+    """
+    confirmed: Dict[int, KeyResult] = {}
+    in_flight: Deque[Tuple[int, int]] = collections.deque()  # (índice en el plan, envío en ns)
+    next_index = 0
+    link.discard_pending()
+    while next_index < len(plan) or in_flight:
+        while next_index < len(plan) and len(in_flight) < window:
+            in_flight.append((next_index, time.perf_counter_ns()))
+            await link.write(plan[next_index].frame)
+            next_index += 1
+        try:
+            received = await link.read_frame(timeout)
+        except asyncio.TimeoutError:
+            break
+        message = received.message() if received.lrc_ok else None
+        position = next((position for position, (index, _) in enumerate(in_flight)
+                         if match_response(plan[index], message)), None)
+        if position is None or not message.is_successful:
+            break
+        index, sent_ns = in_flight[position]
+        del in_flight[position]
+        result = KeyResult(plan[index].label, attempts=1)
+        _apply_response(result, message, received.received_ns - sent_ns)
+        confirmed[index] = result
+
+    resume = next((index for index in range(len(plan)) if index not in confirmed), None)
+    done = len(plan) if resume is None else resume
+    return [confirmed[index] for index in range(done)], resume
+
+async def inject_device(path: str, plan: Sequence[PlannedFrame], baud_rate: int = DEFAULT_BAUD_RATE,
+                        timeout: float = DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES,
+                        window: int = 1) -> DeviceResult:
+    """
+    Inyecta el plan completo en un dispositivo; se detiene en la primera llave rechazada.
+
+    Con window > 1 se envía en ventana (send_pipelined) y, si el receptor
+    no lo soporta o algo falla, se sigue en stop-and-wait.
+    """
+    device = DeviceResult(path)
+    started = time.perf_counter()
+    try:
+        async with SerialLink(path, baud_rate) as link:
+            remaining = plan
+            if window > 1:
+                device.keys, resume = await send_pipelined(link, plan, window, timeout)
+                device.fallback = resume is not None
+                remaining = plan[resume:] if resume is not None else ()
+            for planned in remaining:
+                result = await send_with_retry(link, planned, timeout, retries)
+                device.keys.append(result)
+                if not result.ok:
+                    device.error = f"{planned.label}: {result.error}"
+                    break
+    except OSError as e:
+        device.error = f"No se pudo abrir el puerto: {e}"
+    device.serial_number = next((key.serial_number for key in device.keys if key.serial_number), "")
+    device.seconds = time.perf_counter() - started
+    return device
+
+async def inject_all(paths: Sequence[str], plan: Sequence[PlannedFrame], concurrency: int = DEFAULT_CONCURRENCY,
+                     **options) -> List[DeviceResult]:
+    """Inyecta el plan en todos los puertos con a lo sumo `concurrency` a la vez."""
+    raise_fd_limit(len(paths) + 64)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def bounded(path: str) -> DeviceResult:
+        async with semaphore:
+            return await inject_device(path, plan, **options)
+
+    return await asyncio.gather(*(bounded(path) for path in paths))
+
+# ========== REPORTE ==========
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """Percentil por rango más cercano."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def latency_summary(values: Sequence[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50Ms": round(percentile(values, 0.50), 3),
+        "p90Ms": round(percentile(values, 0.90), 3),
+        "p99Ms": round(percentile(values, 0.99), 3),
+        "maxMs": round(max(values), 3) if values else 0.0,
+    }
+
+def build_report(devices: Sequence[DeviceResult], plan: Sequence[PlannedFrame], seconds: float) -> dict:
+    per_key: Dict[str, List[float]] = {planned.label: [] for planned in plan}
+    retried = 0
+    for device in devices:
+        for key in device.keys:
+            if key.ok:
+                per_key[key.label].append(key.latency_ms)
+            retried += key.attempts - 1
+    ok = sum(1 for device in devices if device.ok)
+    return {
+        "devices": len(devices),
+        "ok": ok,
+        "failed": len(devices) - ok,
+        "keysPerDevice": len(plan),
+        "retries": retried,
+        "fallbacks": sum(1 for device in devices if device.fallback),
+        "seconds": round(seconds, 3),
+        "devicesPerMinute": round(len(devices) / seconds * 60, 1) if seconds else 0,
+        "perKey": {label: latency_summary(values) for label, values in per_key.items()},
+        "perDevice": [
+            {
+                "path": device.path,
+                "serialNumber": device.serial_number,
+                "ok": device.ok,
+                "error": device.error,
+                "seconds": round(device.seconds, 3),
+                "fallback": device.fallback,
+                "latency": latency_summary([key.latency_ms for key in device.keys if key.ok]),
+                "keys": [
+                    {"label": key.label, "responseCode": key.response_code, "attempts": key.attempts,
+                     "latencyMs": round(key.latency_ms, 3), "error": key.error}
+                    for key in device.keys
+                ],
+            }
+            for device in devices
+        ],
+    }
+
+# ========== FUNCIÓN PRINCIPAL ==========
+
+def load_endpoints(path: str) -> List[str]:
+    """Puertos de un JSON: ["/dev/ttyUSB0", ...] o endpoints del simulador [{"path": ...}]."""
+    with open(path) as f:
+        data = json.load(f)
+    return [entry["path"] if isinstance(entry, dict) else str(entry) for entry in data]
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Inyección de un perfil en varios KeyReceiver en paralelo")
+    parser.add_argument("profile", help="Perfil de inyección (JSON)")
+    parser.add_argument("keys", nargs="+", help="Archivos de llaves con los KCV del perfil (.json, .jsonl, .kvlt)")
+    parser.add_argument("--port", action="append", default=[], help="Puerto serial (se puede repetir)")
+    parser.add_argument("--endpoints", help="JSON con la lista de puertos (p. ej. del simulador)")
+    parser.add_argument("--baud", type=int, default=DEFAULT_BAUD_RATE, help="Velocidad del puerto")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Dispositivos inyectados a la vez")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Timeout por frame (segundos)")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help="Reintentos por frame")
+    parser.add_argument("--window", type=int, default=1,
+                        help="Frames en vuelo por dispositivo (1 = stop-and-wait)")
+    parser.add_argument("--report", help="Guardar el reporte completo en este JSON")
+    parser.add_argument("--json", action="store_true", help="Imprimir el reporte como JSON")
+    args = parser.parse_args(argv)
+
+    paths = list(args.port)
+    if args.endpoints:
+        paths += load_endpoints(args.endpoints)
+    if not paths:
+        parser.error("Indicar al menos un puerto con --port o --endpoints")
+
+    with open(args.profile, encoding="utf-8") as f:
+        profile = json.load(f)
+    try:
+        plan = build_injection_plan(profile, KeyIndex.from_files(args.keys))
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+
+    started = time.perf_counter()
+    devices = asyncio.run(inject_all(paths, plan, args.concurrency, baud_rate=args.baud,
+                                     timeout=args.timeout, retries=args.retries,
+                                     window=args.window))
+    report = build_report(devices, plan, time.perf_counter() - started)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print("=" * 80)
+        print(f"💉 INYECCIÓN DE PERFIL: {profile.get('name', args.profile)}")
+        print("=" * 80)
+        print()
+        print(f"   Dispositivos: {report['devices']}  ✅ {report['ok']}  ❌ {report['failed']}")
+        print(f"   Llaves por dispositivo: {report['keysPerDevice']}  Reintentos: {report['retries']}"
+              f"  Vuelta a stop-and-wait: {report['fallbacks']}")
+        print(f"   Tiempo total: {report['seconds']} s ({report['devicesPerMinute']} dispositivos/min)")
+        print()
+        print("⏱️  Latencia por llave (ms):")
+        for label, summary in report["perKey"].items():
+            print(f"   {label:40s} p50 {summary['p50Ms']:8.2f}  p90 {summary['p90Ms']:8.2f}  "
+                  f"p99 {summary['p99Ms']:8.2f}")
+        failed = [device for device in report["perDevice"] if not device["ok"]]
+        if failed:
+            print()
+            print("❌ Dispositivos con error:")
+            for device in failed:
+                print(f"   {device['path']}: {device['error']}")
+        if args.report:
+            print()
+            print(f"📝 Reporte: {args.report}")
+
+    return 0 if report["failed"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+CLI única (injector-tools) para los scripts de llaves, perfiles y frames.
+
+Uso:
+    python3 injector_tools.py gen-keys --spec ceremonia.json --output llaves.jsonl
+    python3 injector_tools.py gen-dukpt --type 3DES --ksn-prefix FFFF9876543210
+    python3 injector_tools.py gen-profile llaves.json --output perfil.json
+    python3 injector_tools.py gen-fleet terminales.csv plantillas.json llaves.json --bundle flota.jsonl
+    python3 injector_tools.py audit llaves.json --processes 4
+    python3 injector_tools.py frame build 03 01
+    python3 injector_tools.py frame decode 02303330310301
+    python3 injector_tools.py frame replay captura.bin --decode
+    python3 injector_tools.py simulate --terminals 8 --link-dir /tmp/kr
+    python3 injector_tools.py analyze-log logcat.txt --json resumen.json --html resumen.html
+    python3 injector_tools.py capture replay campo.scap --from 120000 --speed 10
+    python3 injector_tools.py link --device /tmp/kr/kr000 --link /tmp/kr/lento --baud 9600
+    python3 injector_tools.py probe "/dev/ttyUSB*" --endpoints endpoints.json
+    python3 injector_tools.py pipeline --devices 10000 --endpoints endpoints.json --stats-interval 5
+    python3 injector_tools.py --timing frame build 03 01
+
+Cada subcomando delega en el main() del script correspondiente, que se
+importa recién al despachar: la ayuda general y los subcomandos de frames
+no importan `cryptography` ni PyCryptodome. Con --timing se informa por
+stderr cuánto tardó la importación del subcomando y la ejecución completa
+(sin contar el arranque del intérprete); para el detalle por módulo:
+
+    python3 -X importtime injector_tools.py frame build 03 01
+"""
+
+import argparse
+import importlib
+import sys
+import time
+from typing import Callable, Optional, Sequence
+
+_STARTED = time.perf_counter()
+
+# Subcomando -> (módulo, ayuda). El módulo se importa solo al usarlo.
+COMMANDS = {
+    "gen-keys": ("generar_llaves_completas", "Llaves maestras en claro o envueltas con --wrap-kek (juego fijo o --spec en volumen)"),
+    "gen-dukpt": ("generate_dukpt_keys", "BDK/IPEK/KSN de ejemplo o IPEKs en volumen (--bdk)"),
+    "gen-profile": ("generar_perfil_inyeccion", "Perfil de inyección desde un archivo de llaves"),
+    "gen-fleet": ("fleet_profiles", "Perfiles por terminal desde un manifiesto de flota"),
+    "audit": ("audit_keys", "Auditoría de KCVs en archivos de llaves"),
+    "frame": ("frame_tools", "Armar, decodificar o reproducir frames Futurex"),
+    "simulate": ("keyreceiver_sim", "Simulador de KeyReceiver sobre pty"),
+    "analyze-log": ("comm_log_analyzer", "Latencias TX/RX, reintentos y errores de LRC desde logs"),
+    "capture": ("serial_capture", "Capturas indexadas: convertir logs, buscar y reproducir en un pty"),
+    "link": ("link_emulator", "Emulador de enlace (baudios, latencia, jitter, pérdida) entre pty"),
+    "probe": ("port_prober", "Detección en paralelo de puertos, velocidad y protocolo (caché por ruta USB)"),
+    "pipeline": ("provisioning_pipeline", "Aprovisionamiento en flujo: llaves, KCV, envoltura, perfil, frames e inyección"),
+}
+
+# ========== FUNCIÓN PRINCIPAL ==========
+
+def _command_main(command: str) -> Callable[[Sequence[str]], Optional[int]]:
+    module_name, _ = COMMANDS[command]
+    return importlib.import_module(module_name).main
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    if argv is None:
+        argv = sys.argv[1:]
+    argv = list(argv)
+    # Las opciones generales van antes del subcomando; lo que sigue se pasa
+    # tal cual al script (incluido -h)
+    position = next((i for i, arg in enumerate(argv) if arg in COMMANDS), len(argv))
+    commands = "\n".join(f"  {name:12s} {help_text}" for name, (_, help_text) in COMMANDS.items())
+    parser = argparse.ArgumentParser(
+        prog="injector_tools.py", usage="%(prog)s [--timing] COMANDO [argumentos ...]",
+        description="Herramientas de llaves, perfiles y frames del inyector",
+        epilog=f"comandos:\n{commands}\n\nAyuda de cada comando: %(prog)s COMANDO -h",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--timing", action="store_true", help="Informar tiempos de importación y ejecución por stderr")
+    args = parser.parse_args(argv[:position])
+    if position == len(argv):
+        parser.error("falta el comando")
+    command, command_argv = argv[position], argv[position + 1:]
+
+    loading = time.perf_counter()
+    command_main = _command_main(command)
+    loaded = time.perf_counter()
+    # Para que el uso y los errores de cada script muestren "injector_tools.py COMANDO"
+    sys.argv = [f"{sys.argv[0]} {command}", *command_argv]
+    try:
+        result = command_main(command_argv)
+    finally:
+        if args.timing:
+            print(f"⏱️  {command}: importación {(loaded - loading) * 1000:.1f} ms, "
+                  f"total {(time.perf_counter() - _STARTED) * 1000:.1f} ms", file=sys.stderr)
+    return result or 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Cálculo de KCV (Key Check Value) compartido por los scripts de generación.
+
+KCV = primeros 3 bytes (6 caracteres hex) del cifrado de un bloque de zeros
+con la llave.
+
+Uso:
+    from kcv import calculate_kcv, calculate_kcvs
+
+    calculate_kcv(key_bytes, "AES-256")
+    calculate_kcvs([(key1, "AES-128"), (key2, "3DES-16")], processes=4)
+
+calculate_kcv toma el contexto de la llave de cipher_cache (con el backend
+`cryptography`), así que verificar varias veces la misma llave no vuelve a
+prepararla. Para cálculos masivos las llaves se agrupan por algoritmo y
+cada grupo se procesa con los objetos del backend ya resueltos; como en
+bloque las llaves suelen ser todas distintas, ese camino no pasa por la
+caché. Con processes > 1 los lotes se reparten entre procesos. Los
+resultados siempre vuelven en el orden de entrada.
+
+Backend: `cryptography` si está instalado; si no, PyCryptodome.
+"""
+
+import collections
+import itertools
+from multiprocessing import Pool
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    from cryptography.hazmat.backends import default_backend
+    try:
+        from cryptography.hazmat.decrepit.ciphers.algorithms import TripleDES
+    except ImportError:
+        from cryptography.hazmat.primitives.ciphers.algorithms import TripleDES
+    from cipher_cache import BLOCK_SIZES, ecb_encrypt
+    KCV_BACKEND = "cryptography"
+except ImportError:
+    from Crypto.Cipher import AES, DES3
+    KCV_BACKEND = "pycryptodome"
+
+KCV_LENGTH = 3  # Bytes del KCV
+KCV_ERROR = "ERROR"  # Llave inválida para el algoritmo
+KCV_UNKNOWN = "000000"  # Algoritmo no reconocido
+KCV_CHUNK_SIZE = 8192  # Llaves por lote (y por tarea del pool de procesos)
+
+# ========== FUNCIONES AUXILIARES ==========
+
+def normalize_algorithm(algorithm: str) -> Optional[str]:
+    """
+    Reduce los nombres de algoritmo usados en el repo a "AES" o "TDES".
+
+    Acepta, por ejemplo: AES, AES128, AES-256, 3DES, 3DES-16, DES_DOUBLE,
+    DES_TRIPLE. Devuelve None si el algoritmo no es reconocido.
+    """
+    name = algorithm.upper()
+    if "AES" in name:
+        return "AES"
+    if "DES" in name:
+        return "TDES"
+    return None
+
+def _expand_tdes_key(key: bytes) -> bytes:
+    """Expande llaves TDES de 8/16 bytes a 24 bytes (K1K1K1 / K1K2K1)."""
+    if len(key) == 8:
+        return key * 3
+    if len(key) == 16:
+        return key + key[:8]
+    return key
+
+def _group_encryptor(algorithm: str) -> Tuple[Callable[[bytes], bytes], bytes]:
+    """
+    Resuelve una vez, para todo un grupo, la función que cifra el bloque de
+    zeros con una llave y el bloque a cifrar.
+    """
+    if KCV_BACKEND == "cryptography":
+        backend = default_backend()
+        ecb = modes.ECB()
+        if algorithm == "AES":
+            aes = algorithms.AES
+            return (lambda key, zeros: Cipher(aes(key), ecb, backend).encryptor().update(zeros)), b'\x00' * 16
+        return (lambda key, zeros: Cipher(TripleDES(_expand_tdes_key(key)), ecb, backend)
+                .encryptor().update(zeros)), b'\x00' * 8
+
+    if algorithm == "AES":
+        new, mode = AES.new, AES.MODE_ECB
+        return (lambda key, zeros: new(key, mode).encrypt(zeros)), b'\x00' * 16
+    new, mode = DES3.new, DES3.MODE_ECB
+    return (lambda key, zeros: new(key, mode).encrypt(zeros)), b'\x00' * 8
+
+def _kcv_group(keys: List[bytes], algorithm: str) -> List[str]:
+    """Calcula los KCV de un grupo de llaves del mismo algoritmo."""
+    encrypt, zeros = _group_encryptor(algorithm)
+    results = []
+    for key in keys:
+        try:
+            results.append(encrypt(key, zeros)[:KCV_LENGTH].hex().upper())
+        except (ValueError, TypeError):
+            results.append(KCV_ERROR)
+    return results
+
+def _kcv_chunk(items: List[Tuple[bytes, str]]) -> List[str]:
+    """
+    Calcula los KCV de un lote: agrupa por algoritmo y devuelve los
+    resultados en el orden del lote.
+    """
+    results = [KCV_UNKNOWN] * len(items)
+    groups: Dict[str, List[int]] = {}
+    for index, (_, algorithm) in enumerate(items):
+        normalized = normalize_algorithm(algorithm)
+        if normalized is not None:
+            groups.setdefault(normalized, []).append(index)
+
+    for algorithm, indexes in groups.items():
+        kcvs = _kcv_group([items[i][0] for i in indexes], algorithm)
+        for index, value in zip(indexes, kcvs):
+            results[index] = value
+    return results
+
+def _chunked(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+# ========== API ==========
+
+def calculate_kcv(key: bytes, algorithm: str = "AES") -> str:
+    """
+    Calcula el KCV (Key Check Value) de una llave.
+
+    Args:
+        key: Llave en bytes
+        algorithm: Nombre del algoritmo (AES, AES-128, 3DES, DES_TRIPLE, ...)
+
+    Returns:
+        KCV de 6 caracteres hex, KCV_ERROR si la llave es inválida o
+        KCV_UNKNOWN si el algoritmo no es reconocido
+    """
+    normalized = normalize_algorithm(algorithm)
+    if normalized is None:
+        return KCV_UNKNOWN
+    if KCV_BACKEND != "cryptography":
+        return _kcv_group([key], normalized)[0]
+    # Una llave suelta (la KTK, una BDK) se suele verificar varias veces:
+    # su contexto queda en la caché de cifrado
+    try:
+        return ecb_encrypt(normalized, key, bytes(BLOCK_SIZES[normalized]))[:KCV_LENGTH].hex().upper()
+    except (ValueError, TypeError):
+        return KCV_ERROR
+
+def iter_kcvs(items: Iterable[Tuple[bytes, str]], processes: int = 1,
+              chunk_size: int = KCV_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Calcula KCVs en lotes a medida que se consume el iterable de entrada.
+
+    Solo mantiene en memoria unos pocos lotes a la vez, así que sirve para
+    exportaciones de cualquier tamaño.
+
+    Args:
+        items: Iterable de (llave, algoritmo)
+        processes: Procesos de trabajo (1 = en el proceso actual)
+        chunk_size: Llaves por lote
+
+    Yields:
+        KCV de cada llave, en el orden de entrada
+    """
+    chunks = _chunked(items, chunk_size)
+    if processes <= 1:
+        for chunk in chunks:
+            yield from _kcv_chunk(chunk)
+        return
+
+    # Se limita la cantidad de lotes en vuelo para no adelantar la lectura
+    # de la entrada (Pool.imap la consumiría completa)
+    with Pool(processes) as pool:
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(_kcv_chunk, (chunk,)))
+            if len(pending) >= processes * 2:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+def calculate_kcvs(items: Iterable[Tuple[bytes, str]], processes: int = 1,
+                   chunk_size: int = KCV_CHUNK_SIZE) -> List[str]:
+    """
+    Calcula los KCV de una lista o iterador de (llave, algoritmo).
+
+    Returns:
+        Lista de KCVs en el orden de entrada
+    """
+    return list(iter_kcvs(items, processes, chunk_size))
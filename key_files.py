@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Lectura incremental de archivos de llaves.
+
+Soporta:
+    - JSON de importación (TestKeysImporter.kt): {"generated": ..., "keys": [...]}
+    - Un arreglo JSON de llaves: [{...}, {...}]
+    - JSON Lines: una llave por línea (.jsonl)
+
+Los registros se leen de a uno con un parser incremental, así que la memoria
+no depende del tamaño del archivo. La escritura también es incremental.
+"""
+
+import json
+from typing import Dict, Iterable, Iterator, Optional, Set, TextIO
+
+READ_CHUNK_SIZE = 1 << 16
+
+# Longitudes válidas (bytes) para los nombres de algoritmo usados en los
+# archivos de llaves y en la app
+ALGORITHM_KEY_LENGTHS: Dict[str, Set[int]] = {
+    "3DES-16": {16},
+    "3DES-24": {24},
+    "DES_SINGLE": {8},
+    "DES_DOUBLE": {16},
+    "DES_TRIPLE": {16, 24},  # DUKPT 3TDEA usa 16 bytes (ANSI X9.24-1)
+    "3DES": {16, 24},
+    "AES-128": {16},
+    "AES-192": {24},
+    "AES-256": {32},
+    "AES_128": {16},
+    "AES_192": {24},
+    "AES_256": {32},
+    "AES128": {16},
+    "AES192": {24},
+    "AES256": {32},
+}
+
+# ========== PARSER INCREMENTAL ==========
+
+class JsonStreamReader:
+    """
+    Lector JSON incremental sobre un archivo de texto.
+
+    Mantiene solo la porción del archivo que todavía no se consumió y
+    decodifica un valor a la vez con JSONDecoder.raw_decode.
+    """
+
+    WHITESPACE = " \t\r\n"
+
+    def __init__(self, f: TextIO, chunk_size: int = READ_CHUNK_SIZE):
+        self._file = f
+        self._chunk_size = chunk_size
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        """Lee el siguiente bloque del archivo; False si ya no hay datos."""
+        if self._eof:
+            return False
+        data = self._file.read(self._chunk_size)
+        if not data:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + data
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Devuelve el siguiente carácter significativo sin consumirlo ('' al final)."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in self.WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"JSON inválido: se esperaba '{char}' y se encontró '{found or 'EOF'}'")
+        self._pos += 1
+
+    def value(self):
+        """Decodifica el siguiente valor JSON completo."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # Un número al final del buffer podría estar cortado
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def iter_array(self) -> Iterator:
+        """Recorre los elementos de un arreglo JSON, de a uno."""
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self.value()
+            separator = self.peek()
+            self._pos += 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise ValueError(f"JSON inválido: separador inesperado '{separator or 'EOF'}'")
+
+    def iter_object_members(self) -> Iterator[str]:
+        """
+        Recorre las claves de un objeto JSON. Quien llama debe consumir el
+        valor de cada clave (con value() o iter_array()) antes de avanzar.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            separator = self.peek()
+            self._pos += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise ValueError(f"JSON inválido: separador inesperado '{separator or 'EOF'}'")
+
+# ========== API ==========
+
+def iter_key_records(path: str, header: Optional[dict] = None) -> Iterator[dict]:
+    """
+    Recorre las llaves de un archivo de llaves sin cargarlo completo.
+
+    Args:
+        path: Archivo .json o .jsonl
+        header: Si se pasa un dict, se completa con los campos del archivo
+            que no son la lista de llaves (generated, description, ...)
+
+    Yields:
+        Un dict por llave (keyType, algorithm, keyHex, kcv, bytes, ...)
+    """
+    with open(path, encoding="utf-8") as f:
+        if path.lower().endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        reader = JsonStreamReader(f)
+        if reader.peek() == "[":
+            yield from reader.iter_array()
+            return
+
+        for key in reader.iter_object_members():
+            if key == "keys":
+                yield from reader.iter_array()
+            else:
+                value = reader.value()
+                if header is not None:
+                    header[key] = value
+
+def write_keys_json(f: TextIO, records: Iterable[str], header: dict) -> int:
+    """
+    Escribe un JSON de importación ({"generated", ..., "keys": [...]})
+    registro a registro.
+
+    Args:
+        f: Archivo de salida
+        records: Registros ya serializados (json.dumps de cada llave)
+        header: Campos del archivo que van antes de "keys"
+
+    Returns:
+        Cantidad de registros escritos
+    """
+    if header:
+        f.write(json.dumps(header, indent=2, ensure_ascii=False)[:-2] + ',\n  "keys": [')
+    else:
+        f.write('{\n  "keys": [')
+    written = 0
+    for record in records:
+        f.write(("," if written else "") + "\n    " + record)
+        written += 1
+    f.write("\n  ]\n}\n")
+    return written
+
+def write_keys_jsonl(f: TextIO, records: Iterable[str]) -> int:
+    """Escribe un registro serializado por línea (JSON Lines)."""
+    written = 0
+    for record in records:
+        f.write(record + "\n")
+        written += 1
+    return written
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Índice de llaves por KCV para resolver perfiles de inyección.
+
+Los perfiles referencian cada llave solo por su KCV (`selectedKey`), que
+tiene 3 bytes: con bóvedas grandes dos llaves distintas pueden compartirlo.
+KeyIndex recorre los archivos de llaves una vez, arma un mapa
+KCV -> llaves (y KCV + tipo + algoritmo -> llave), marca las colisiones y
+resuelve cada keyConfiguration en O(1).
+
+Uso:
+    python3 key_index.py perfil.json llaves.json [más llaves .json/.jsonl/.kvlt]
+    python3 key_index.py --collisions llaves.json
+
+    index = KeyIndex.from_files(["llaves.json"])
+    record = index.resolve("9ABBDA", key_type="MASTER_KEY")
+
+Se distingue entre colisiones (mismo KCV, distinta llave) y duplicados
+(la misma llave repetida, que no generan ambigüedad).
+"""
+
+import argparse
+import json
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from key_files import iter_key_records
+
+# Tipos de problema al resolver un perfil
+ISSUE_NOT_FOUND = "NOT_FOUND"
+ISSUE_AMBIGUOUS = "AMBIGUOUS"
+ISSUE_COLLISION = "COLLISION"
+
+class KeyLookupError(KeyError):
+    """No hay llave para el KCV, o hay más de una distinta y no se puede elegir."""
+
+    def __init__(self, kcv: str, issue: str, candidates: Sequence[dict] = ()):
+        self.kcv = kcv
+        self.issue = issue
+        self.candidates = list(candidates)
+        if issue == ISSUE_NOT_FOUND:
+            message = f"No hay llave con KCV {kcv}"
+        else:
+            types = ", ".join(f"{c.get('keyType', '')}/{c.get('algorithm', '')}" for c in self.candidates)
+            message = f"KCV {kcv} ambiguo: {len(self.candidates)} llaves distintas ({types})"
+        super().__init__(message)
+
+    def __str__(self) -> str:
+        return self.args[0]
+
+def _kcv_key(kcv) -> str:
+    return str(kcv or "").strip().upper()
+
+def iter_key_sources(paths: Iterable[str]) -> Iterable[dict]:
+    """Registros de archivos .json/.jsonl o de contenedores .kvlt (key_vault.py)."""
+    for path in paths:
+        if path.lower().endswith(".kvlt"):
+            from key_vault import KeyVault
+            with KeyVault(path) as vault:
+                for key in vault:
+                    yield key.as_record()
+        else:
+            yield from iter_key_records(path)
+
+# ========== ÍNDICE ==========
+
+class KeyIndex:
+    """
+    Mapa KCV -> registros de llave.
+
+    Los registros se guardan una sola vez; los mapas apuntan a su posición.
+    """
+
+    def __init__(self, records: Iterable[dict] = ()):
+        self.records: List[dict] = []
+        self._by_kcv: Dict[str, List[int]] = {}
+        self._by_identity: Dict[Tuple[str, str, str], List[int]] = {}
+        self._by_type: Dict[str, List[int]] = {}
+        for record in records:
+            self.add(record)
+
+    @classmethod
+    def from_files(cls, paths: Iterable[str]) -> "KeyIndex":
+        return cls(iter_key_sources(paths))
+
+    def add(self, record: dict):
+        position = len(self.records)
+        self.records.append(record)
+        kcv = _kcv_key(record.get("kcv"))
+        key_type = str(record.get("keyType", ""))
+        identity = (kcv, key_type.upper(), str(record.get("algorithm", "")).upper())
+        self._by_kcv.setdefault(kcv, []).append(position)
+        self._by_identity.setdefault(identity, []).append(position)
+        self._by_type.setdefault(key_type, []).append(position)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __contains__(self, kcv: str) -> bool:
+        return _kcv_key(kcv) in self._by_kcv
+
+    @staticmethod
+    def _distinct(records: Iterable[dict]) -> List[dict]:
+        """Una llave por material distinto (los duplicados exactos cuentan una vez)."""
+        seen: Dict[str, dict] = {}
+        for record in records:
+            seen.setdefault(str(record.get("keyHex", "")).upper(), record)
+        return list(seen.values())
+
+    def candidates(self, kcv: str) -> List[dict]:
+        """Todas las llaves con ese KCV, en el orden de los archivos."""
+        return [self.records[p] for p in self._by_kcv.get(_kcv_key(kcv), ())]
+
+    def first_of_type(self, key_type: str) -> Optional[dict]:
+        """Primera llave de un tipo (p. ej. la KEK_STORAGE del archivo)."""
+        positions = self._by_type.get(key_type)
+        return self.records[positions[0]] if positions else None
+
+    def of_type(self, key_type: str) -> List[dict]:
+        return [self.records[p] for p in self._by_type.get(key_type, ())]
+
+    def resolve(self, kcv: str, key_type: Optional[str] = None, algorithm: Optional[str] = None) -> dict:
+        """
+        Llave de un KCV.
+
+        Si hay más de una llave distinta con ese KCV se filtra por tipo y
+        algoritmo (los filtros que no coinciden con ningún candidato se
+        ignoran, porque los perfiles de la app usan nombres de tipo propios).
+
+        Raises:
+            KeyLookupError: si no hay llave o la ambigüedad no se resuelve
+        """
+        kcv = _kcv_key(kcv)
+        if key_type and algorithm:
+            positions = self._by_identity.get((kcv, key_type.upper(), algorithm.upper()))
+            if positions:
+                return self._single(kcv, [self.records[p] for p in positions])
+        candidates = self.candidates(kcv)
+        if not candidates:
+            raise KeyLookupError(kcv, ISSUE_NOT_FOUND)
+        for name, value in (("keyType", key_type), ("algorithm", algorithm)):
+            if value:
+                narrowed = [c for c in candidates if str(c.get(name, "")).upper() == value.upper()]
+                candidates = narrowed or candidates
+        return self._single(kcv, candidates)
+
+    def _single(self, kcv: str, candidates: List[dict]) -> dict:
+        distinct = self._distinct(candidates)
+        if len(distinct) > 1:
+            raise KeyLookupError(kcv, ISSUE_AMBIGUOUS, distinct)
+        return distinct[0]
+
+    def collisions_for(self, kcv: str) -> List[dict]:
+        """Llaves distintas con ese KCV (más de una = colisión)."""
+        return self._distinct(self.candidates(kcv))
+
+    def collisions(self) -> Dict[str, List[dict]]:
+        """KCVs compartidos por llaves distintas: {KCV: llaves}."""
+        result = {}
+        for kcv, positions in self._by_kcv.items():
+            if len(positions) > 1:
+                distinct = self.collisions_for(kcv)
+                if len(distinct) > 1:
+                    result[kcv] = distinct
+        return result
+
+    def duplicates(self) -> int:
+        """Registros que repiten exactamente una llave ya indexada."""
+        return sum(len(positions) - len(self._distinct(self.records[p] for p in positions))
+                   for positions in self._by_kcv.values() if len(positions) > 1)
+
+# ========== PERFILES ==========
+
+@dataclass
+class ProfileResolution:
+    """Resultado de resolver un perfil completo."""
+    ktk: Optional[dict] = None
+    keys: List[Optional[dict]] = field(default_factory=list)  # Una por keyConfiguration
+    issues: List[dict] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not any(issue["issue"] != ISSUE_COLLISION for issue in self.issues)
+
+def resolve_profile(profile: dict, index: KeyIndex) -> ProfileResolution:
+    """
+    Resuelve la KTK y cada keyConfiguration de un perfil contra el índice.
+
+    Las referencias que no se encuentran o quedan ambiguas se informan en
+    `issues` (con su llave en None); las que se resuelven pero cuyo KCV
+    colisiona con otra llave se informan como COLLISION.
+    """
+    resolution = ProfileResolution()
+    ktk_kcv = profile.get("selectedKTKKcv") or profile.get("selectedKEKKcv") or ""
+
+    def lookup(where: str, kcv: str, key_type: Optional[str] = None) -> Optional[dict]:
+        try:
+            record = index.resolve(kcv, key_type)
+        except KeyLookupError as e:
+            resolution.issues.append({"entry": where, "kcv": _kcv_key(kcv), "issue": e.issue, "detail": str(e)})
+            return None
+        if len(index.collisions_for(kcv)) > 1:
+            resolution.issues.append({"entry": where, "kcv": _kcv_key(kcv), "issue": ISSUE_COLLISION,
+                                      "detail": f"El KCV {_kcv_key(kcv)} lo comparten varias llaves"})
+        return record
+
+    if profile.get("useKTK", profile.get("useKEK", False)) and ktk_kcv:
+        resolution.ktk = lookup("KTK", ktk_kcv)
+    for number, config in enumerate(profile.get("keyConfigurations", []), 1):
+        resolution.keys.append(lookup(f"keyConfigurations[{number}] slot {config.get('slot', '')}",
+                                      str(config.get("selectedKey", "")), config.get("keyType")))
+    return resolution
+
+# ========== FUNCIÓN PRINCIPAL ==========
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Valida un perfil de inyección contra archivos de llaves")
+    parser.add_argument("files", nargs="+",
+                        help="Perfil seguido de los archivos de llaves (con --collisions, solo llaves)")
+    parser.add_argument("--collisions", action="store_true",
+                        help="Solo listar los KCV que comparten llaves distintas")
+    parser.add_argument("--json", action="store_true", help="Imprimir el resultado como JSON")
+    args = parser.parse_args(argv)
+
+    if args.collisions:
+        index = KeyIndex.from_files(args.files)
+        collisions = index.collisions()
+        result = {
+            "keys": len(index),
+            "duplicates": index.duplicates(),
+            "collisions": {kcv: [{"keyType": r.get("keyType", ""), "algorithm": r.get("algorithm", "")}
+                                 for r in records] for kcv, records in collisions.items()},
+        }
+        if args.json:
+            print(json.dumps(result, indent=2))
+        else:
+            print(f"🔑 Llaves: {result['keys']}  Duplicadas: {result['duplicates']}  "
+                  f"KCV en colisión: {len(collisions)}")
+            for kcv, records in result["collisions"].items():
+                print(f"   ⚠️  {kcv}: " + ", ".join(f"{r['keyType']}/{r['algorithm']}" for r in records))
+        return 1 if collisions else 0
+
+    if len(args.files) < 2:
+        parser.error("Indicar el perfil y al menos un archivo de llaves")
+    with open(args.files[0], encoding="utf-8") as f:
+        profile = json.load(f)
+    index = KeyIndex.from_files(args.files[1:])
+    resolution = resolve_profile(profile, index)
+
+    if args.json:
+        print(json.dumps({"ok": resolution.ok, "keys": len(index), "issues": resolution.issues}, indent=2))
+    else:
+        print("=" * 80)
+        print(f"🔍 VALIDACIÓN DE PERFIL: {profile.get('name', args.files[0])}")
+        print("=" * 80)
+        print()
+        print(f"   Llaves indexadas: {len(index)}")
+        print(f"   Configuraciones:  {len(resolution.keys)}")
+        resolved = sum(1 for record in resolution.keys if record is not None)
+        print(f"   Resueltas:        {resolved}")
+        for issue in resolution.issues:
+            icon = "⚠️ " if issue["issue"] == ISSUE_COLLISION else "❌"
+            print(f"   {icon} {issue['entry']}: {issue['detail']}")
+        print()
+        print("✅ Perfil válido" if resolution.ok else "❌ El perfil tiene referencias sin resolver")
+    return 0 if resolution.ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
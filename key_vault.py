@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Contenedor binario de llaves con índice por KCV.
+
+Guarda las mismas llaves que los JSON de importación (TestKeysImporter.kt)
+en registros de tamaño fijo con la llave en bytes, y agrega al principio
+un índice ordenado por KCV. Un lector hace mmap del archivo y busca una
+llave por KCV con búsqueda binaria sobre el índice, sin leer el resto.
+
+Uso:
+    python3 key_vault.py pack llaves.json bóveda.kvlt
+    python3 key_vault.py unpack bóveda.kvlt llaves.json
+    python3 key_vault.py get bóveda.kvlt 9ABBDA
+    python3 key_vault.py info bóveda.kvlt
+
+    with KeyVault("bóveda.kvlt") as vault:
+        key = vault.find("9ABBDA")
+
+Formato (little endian):
+    Encabezado (32 bytes)
+        magic "KVLT", versión u16, tamaño de registro u16, cantidad de
+        llaves u32, tamaño de la tabla de nombres u32, tamaño de los
+        metadatos u32, reservado (12 bytes)
+    Índice: una entrada de 8 bytes por llave, ordenado por KCV
+        KCV (3 bytes), número de registro u32, reservado (1 byte)
+    Tablas de nombres: tres tablas seguidas (algoritmos, tipos de llave y
+        descripciones), cada una con cantidad u32 y cada nombre como largo
+        u16 + UTF-8, sin repetir
+    Metadatos: JSON UTF-8 con los campos del archivo original (generated,
+        description, ...)
+    Registros de 48 bytes
+        largo de la llave u8, algoritmo u8, tipo u16 (índices en su tabla
+        de nombres), KCV (3 bytes), futurexCode (2 caracteres), descripción
+        u32 (índice en su tabla de nombres), llave (32 bytes, rellena con
+        ceros), reservado (3 bytes)
+
+Un KCV que no tiene 6 caracteres hex no entra en el registro: se guarda
+el KCV calculado de la llave, y eso es lo que devuelve unpack.
+"""
+
+import argparse
+import bisect
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from kcv import calculate_kcv
+from key_files import iter_key_records, write_keys_json, write_keys_jsonl
+
+MAGIC = b"KVLT"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<4sHHIII12x")
+INDEX_ENTRY = struct.Struct("<3sIx")
+RECORD = struct.Struct("<BBH3s2sI32s3x")
+NAME_LENGTH = struct.Struct("<H")
+NAME_COUNT = struct.Struct("<I")
+MAX_KEY_LENGTH = 32
+MAX_ALGORITHM_NAMES = 0x100
+MAX_KEY_TYPE_NAMES = 0x10000
+KCV_BYTES = 3
+
+class VaultError(ValueError):
+    """Archivo que no es un contenedor válido o llave que no entra en un registro."""
+
+# ========== REGISTROS ==========
+
+@dataclass
+class VaultKey:
+    """Llave leída del contenedor."""
+    key_type: str
+    algorithm: str
+    kcv: str
+    key: bytes
+    description: str = ""
+    futurex_code: str = ""
+
+    def as_record(self) -> dict:
+        """Registro con los campos de los JSON de importación."""
+        return {
+            "keyType": self.key_type,
+            "algorithm": self.algorithm,
+            "description": self.description,
+            "futurexCode": self.futurex_code,
+            "keyHex": self.key.hex().upper(),
+            "kcv": self.kcv,
+            "bytes": len(self.key),
+        }
+
+def _kcv_bytes(record: dict, key: bytes) -> bytes:
+    """KCV declarado (6 caracteres hex) o, si no lo hay, el calculado."""
+    kcv = str(record.get("kcv", ""))
+    try:
+        value = bytes.fromhex(kcv)
+    except ValueError:
+        value = b""
+    if len(value) != KCV_BYTES:
+        try:
+            value = bytes.fromhex(calculate_kcv(key, str(record.get("algorithm", ""))))
+        except ValueError:
+            value = bytes(KCV_BYTES)  # KCV_ERROR: llave inválida para el algoritmo
+    return value
+
+class _NameTable:
+    """Nombres sin repetir, en orden de aparición."""
+
+    def __init__(self, field: str, limit: Optional[int] = None):
+        self.field = field
+        self.limit = limit
+        self.names: List[str] = []
+        self._indexes: Dict[str, int] = {}
+
+    def add(self, name: str) -> int:
+        """
+        Índice del nombre, agregándolo si es nuevo.
+
+        Raises:
+            VaultError: si el campo ya tiene tantos nombres distintos como
+                admite su índice en el registro
+        """
+        index = self._indexes.get(name)
+        if index is None:
+            if self.limit is not None and len(self.names) >= self.limit:
+                raise VaultError(f"Más de {self.limit} valores distintos de {self.field}")
+            index = self._indexes[name] = len(self.names)
+            self.names.append(name)
+        return index
+
+    def encode(self) -> bytes:
+        parts = [NAME_COUNT.pack(len(self.names))]
+        for name in self.names:
+            data = name.encode("utf-8")
+            parts.append(NAME_LENGTH.pack(len(data)))
+            parts.append(data)
+        return b"".join(parts)
+
+def _decode_names(data, position: int) -> Tuple[List[str], int]:
+    """Lee una tabla de nombres; devuelve los nombres y la posición siguiente."""
+    (total,) = NAME_COUNT.unpack_from(data, position)
+    position += NAME_COUNT.size
+    names: List[str] = []
+    for _ in range(total):
+        (length,) = NAME_LENGTH.unpack_from(data, position)
+        position += NAME_LENGTH.size
+        names.append(str(data[position:position + length], "utf-8"))
+        position += length
+    return names, position
+
+# ========== ESCRITURA ==========
+
+def write_vault(path: str, records: Iterator[dict], metadata: Optional[dict] = None) -> int:
+    """
+    Escribe un contenedor a partir de registros de llaves.
+
+    Los registros se vuelcan a un temporal a medida que llegan; en memoria
+    quedan solo el índice (8 bytes por llave) y las tablas de nombres.
+
+    Args:
+        path: Archivo de salida
+        records: Llaves (keyType, algorithm, keyHex, kcv, description, futurexCode)
+        metadata: Campos del archivo a conservar (generated, description, ...)
+
+    Returns:
+        Cantidad de llaves escritas
+
+    Raises:
+        VaultError: si una llave no es hexadecimal o supera los 32 bytes, o
+            si hay más de 256 algoritmos o 65536 tipos de llave distintos
+    """
+    algorithms = _NameTable("algorithm", MAX_ALGORITHM_NAMES)
+    key_types = _NameTable("keyType", MAX_KEY_TYPE_NAMES)
+    descriptions = _NameTable("description")
+    index: List[Tuple[bytes, int]] = []
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.TemporaryFile(dir=directory) as spill:
+        for number, record in enumerate(records):
+            try:
+                key = bytes.fromhex(str(record.get("keyHex", "")))
+            except ValueError:
+                raise VaultError(f"Llave {number}: keyHex no es hexadecimal") from None
+            if not key or len(key) > MAX_KEY_LENGTH:
+                raise VaultError(f"Llave {number}: largo {len(key)} fuera de rango (1-{MAX_KEY_LENGTH})")
+            try:
+                algorithm = algorithms.add(str(record.get("algorithm", "")))
+                key_type = key_types.add(str(record.get("keyType", "")))
+            except VaultError as e:
+                raise VaultError(f"Llave {number}: {e}") from None
+            kcv = _kcv_bytes(record, key)
+            futurex_code = str(record.get("futurexCode", "")).encode("ascii", "replace")[:2].ljust(2)
+            description = descriptions.add(str(record.get("description", "")))
+            spill.write(RECORD.pack(len(key), algorithm, key_type, kcv, futurex_code, description, key))
+            index.append((kcv, number))
+
+        index.sort()
+        name_table = algorithms.encode() + key_types.encode() + descriptions.encode()
+        metadata_bytes = json.dumps(metadata or {}, ensure_ascii=False).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, RECORD.size, len(index),
+                                len(name_table), len(metadata_bytes)))
+            f.write(b"".join(INDEX_ENTRY.pack(kcv, number) for kcv, number in index))
+            f.write(name_table)
+            f.write(metadata_bytes)
+            spill.seek(0)
+            shutil.copyfileobj(spill, f)
+    return len(index)
+
+# ========== LECTURA ==========
+
+class _KcvColumn:
+    """Vista de los KCV del índice como secuencia, para bisect."""
+
+    def __init__(self, data: mmap.mmap, offset: int, count: int):
+        self._data = data
+        self._offset = offset
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, position: int) -> bytes:
+        start = self._offset + position * INDEX_ENTRY.size
+        return self._data[start:start + KCV_BYTES]
+
+class KeyVault:
+    """
+    Lector de un contenedor por mmap.
+
+    Solo se decodifican el encabezado y las tablas de nombres; el índice y
+    los registros se leen del mapa a demanda.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise VaultError(f"{path}: archivo vacío") from None
+        try:
+            self._parse_header()
+        except (VaultError, struct.error, UnicodeDecodeError, ValueError) as e:
+            self.close()
+            raise VaultError(f"{path}: {e}") from None
+
+    def _parse_header(self):
+        data = self._data
+        if len(data) < HEADER.size:
+            raise VaultError("archivo demasiado corto")
+        magic, version, record_size, count, names_size, metadata_size = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise VaultError("no es un contenedor de llaves")
+        if version != FORMAT_VERSION or record_size != RECORD.size:
+            raise VaultError(f"versión {version} no soportada")
+        self.count = count
+        self._index_offset = HEADER.size
+        names_offset = self._index_offset + count * INDEX_ENTRY.size
+        metadata_offset = names_offset + names_size
+        self._records_offset = metadata_offset + metadata_size
+        if self._records_offset + count * RECORD.size > len(data):
+            raise VaultError("archivo truncado")
+
+        self._algorithms, position = _decode_names(data, names_offset)
+        self._key_types, position = _decode_names(data, position)
+        self._descriptions, _ = _decode_names(data, position)
+        self.metadata: dict = json.loads(data[metadata_offset:self._records_offset] or b"{}")
+        self._kcvs = _KcvColumn(data, self._index_offset, count)
+
+    def close(self):
+        self._data.close()
+        self._file.close()
+
+    def __enter__(self) -> "KeyVault":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def record(self, number: int) -> VaultKey:
+        """Llave por número de registro (orden del archivo original)."""
+        if not 0 <= number < self.count:
+            raise IndexError(number)
+        length, algorithm, key_type, kcv, futurex_code, description, key = RECORD.unpack_from(
+            self._data, self._records_offset + number * RECORD.size)
+        return VaultKey(self._key_types[key_type], self._algorithms[algorithm], kcv.hex().upper(),
+                        key[:length], self._descriptions[description],
+                        futurex_code.decode("ascii").strip())
+
+    def __iter__(self) -> Iterator[VaultKey]:
+        for number in range(self.count):
+            yield self.record(number)
+
+    def _range(self, kcv: str) -> Tuple[int, int]:
+        """Posiciones del índice [inicio, fin) cuyos KCV empiezan con `kcv`."""
+        try:
+            prefix = bytes.fromhex(kcv)
+        except ValueError:
+            raise VaultError(f"KCV inválido: {kcv}") from None
+        if not prefix or len(prefix) > KCV_BYTES:
+            raise VaultError(f"KCV inválido: {kcv}")
+        start = bisect.bisect_left(self._kcvs, prefix)
+        end = bisect.bisect_right(self._kcvs, prefix.ljust(KCV_BYTES, b"\xff"), start)
+        return start, end
+
+    def _number_at(self, position: int) -> int:
+        _, number = INDEX_ENTRY.unpack_from(self._data, self._index_offset + position * INDEX_ENTRY.size)
+        return number
+
+    def find_all(self, kcv: str) -> List[VaultKey]:
+        """
+        Llaves cuyo KCV empieza con `kcv` (6 caracteres, o 2/4 para
+        buscar por prefijo), en el orden del archivo original.
+        """
+        start, end = self._range(kcv)
+        return [self.record(number) for number in sorted(self._number_at(p) for p in range(start, end))]
+
+    def find(self, kcv: str) -> Optional[VaultKey]:
+        """Primera llave con ese KCV, o None."""
+        start, end = self._range(kcv)
+        if start == end:
+            return None
+        return self.record(min(self._number_at(p) for p in range(start, end)))
+
+    def __contains__(self, kcv: str) -> bool:
+        start, end = self._range(kcv)
+        return start < end
+
+# ========== CONVERSIÓN ==========
+
+def json_to_vault(source: str, destination: str) -> int:
+    """Convierte un archivo de llaves (.json o .jsonl) a contenedor."""
+    # iter_key_records completa `metadata` mientras se leen las llaves y
+    # write_vault lo escribe recién después de consumirlas
+    metadata: dict = {}
+    return write_vault(destination, iter_key_records(source, metadata), metadata)
+
+def vault_to_json(source: str, destination: str) -> int:
+    """Convierte un contenedor a JSON de importación (o JSON Lines si termina en .jsonl)."""
+    with KeyVault(source) as vault, open(destination, "w", encoding="utf-8") as f:
+        records = (json.dumps(key.as_record(), ensure_ascii=False) for key in vault)
+        if destination.lower().endswith(".jsonl"):
+            return write_keys_jsonl(f, records)
+        header = {**vault.metadata, "totalKeys": len(vault)}
+        return write_keys_json(f, records, header)
+
+# ========== FUNCIÓN PRINCIPAL ==========
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Contenedor binario de llaves indexado por KCV")
+    commands = parser.add_subparsers(dest="command", required=True)
+    pack = commands.add_parser("pack", help="JSON/JSON Lines -> contenedor")
+    pack.add_argument("source")
+    pack.add_argument("destination")
+    unpack = commands.add_parser("unpack", help="Contenedor -> JSON/JSON Lines")
+    unpack.add_argument("source")
+    unpack.add_argument("destination")
+    get = commands.add_parser("get", help="Buscar llaves por KCV (o prefijo de 2/4 caracteres)")
+    get.add_argument("vault")
+    get.add_argument("kcv", nargs="+")
+    get.add_argument("--show-key", action="store_true", help="Incluir keyHex en la salida")
+    info = commands.add_parser("info", help="Resumen del contenedor")
+    info.add_argument("vault")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "pack":
+            count = json_to_vault(args.source, args.destination)
+            print(f"📦 {count} llaves -> {args.destination} ({os.path.getsize(args.destination):,} bytes)")
+        elif args.command == "unpack":
+            count = vault_to_json(args.source, args.destination)
+            print(f"📄 {count} llaves -> {args.destination}")
+        elif args.command == "get":
+            missing = 0
+            with KeyVault(args.vault) as vault:
+                for kcv in args.kcv:
+                    keys = vault.find_all(kcv)
+                    if not keys:
+                        print(f"❌ {kcv}: no encontrada")
+                        missing += 1
+                    for key in keys:
+                        record = key.as_record()
+                        if not args.show_key:
+                            del record["keyHex"]
+                        print(json.dumps(record, ensure_ascii=False))
+            return 1 if missing else 0
+        else:
+            with KeyVault(args.vault) as vault:
+                by_type: Dict[str, int] = {}
+                for key in vault:
+                    name = f"{key.key_type} {key.algorithm}"
+                    by_type[name] = by_type.get(name, 0) + 1
+                print("=" * 80)
+                print(f"🔐 {args.vault}")
+                print("=" * 80)
+                print(f"   Llaves: {len(vault)}")
+                for field_name, value in vault.metadata.items():
+                    print(f"   {field_name}: {value}")
+                for name, count in sorted(by_type.items()):
+                    print(f"   {name:40s} {count}")
+    except (OSError, VaultError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Envoltura de llaves bajo la KEK de almacenamiento (AES Key Wrap, RFC 3394).
+
+Para exportar las llaves generadas sin dejarlas en claro: cada llave se
+envuelve con la KEK_STORAGE y se guarda junto a su KCV y al KCV de la KEK.
+
+Uso:
+    from key_wrap import aes_key_wrap_many, aes_key_unwrap_many, load_kek
+
+    kek, kek_kcv = load_kek(["llaves_maestras_plaintext.json"])
+    wrapped = aes_key_wrap_many(kek, llaves)
+    llaves = aes_key_unwrap_many(kek, wrapped)
+
+    python3 key_wrap.py unwrap --kek llaves_kek.json llaves_envueltas.jsonl --output llaves.jsonl
+
+El lote se procesa en paralelo dentro de cada paso del RFC 3394: en el
+paso (j, i) se arman los bloques A || R[i] de todas las llaves del mismo
+largo en un solo buffer y se cifran con una sola llamada a update() del
+contexto ECB de la KEK (cipher_cache), así que miles de llaves cuestan un
+key schedule y 6·n llamadas al cifrador, no 6·n por llave. El XOR con el
+contador t se aplica a la columna de bytes de A de todo el lote a la vez.
+"""
+
+import argparse
+import functools
+import itertools
+import json
+import sys
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from cipher_cache import ecb_decrypt, ecb_encrypt
+from kcv import calculate_kcv
+
+WRAP_ALGORITHM = "AES-KW"  # RFC 3394 / NIST SP 800-38F KW
+DEFAULT_IV = bytes.fromhex("A6A6A6A6A6A6A6A6")
+SEMIBLOCK = 8
+KEK_KEY_TYPE = "KEK_STORAGE"
+WRAPPED_FIELDS = ("wrappedKeyHex", "wrapAlgorithm", "kekKcv")
+
+class KeyWrapError(ValueError):
+    """Llave envuelta inválida o que no corresponde a la KEK."""
+
+# ========== FUNCIONES AUXILIARES ==========
+
+def _check_kek(kek: bytes):
+    if len(kek) not in (16, 24, 32):
+        raise KeyWrapError(f"La KEK debe ser AES de 16, 24 o 32 bytes, recibido: {len(kek)}")
+
+def _group_by_length(items: Sequence[bytes]) -> Dict[int, List[int]]:
+    lengths = set(map(len, items))
+    if len(lengths) == 1:
+        # Lo habitual: todo el lote es del mismo algoritmo
+        return {lengths.pop(): range(len(items))}
+    groups: Dict[int, List[int]] = {}
+    for index, item in enumerate(items):
+        groups.setdefault(len(item), []).append(index)
+    return groups
+
+@functools.lru_cache(maxsize=None)
+def _xor_table(value: int) -> bytes:
+    return bytes(b ^ value for b in range(256))
+
+def _xor_counter(buffer: bytearray, t: int):
+    """
+    XOR del contador t con el semibloque A de cada bloque del buffer.
+
+    t cambia solo algunos bytes (casi siempre el último de A), así que se
+    traduce esa columna de bytes de todo el lote de una vez.
+    """
+    for position, value in enumerate(t.to_bytes(SEMIBLOCK, "big")):
+        if value:
+            column = slice(position, None, 2 * SEMIBLOCK)
+            buffer[column] = buffer[column].translate(_xor_table(value))
+
+def _wrap_group(kek: bytes, keys: List[bytes]) -> List[bytes]:
+    count, n = len(keys), len(keys[0]) // SEMIBLOCK
+    registers = bytearray(b"".join(keys))
+    r = memoryview(registers).cast("Q")  # r[i::n] = R[i] de todas las llaves
+    block = bytearray(DEFAULT_IV + bytes(SEMIBLOCK)) * count
+    b = memoryview(block).cast("Q")  # b[0::2] = A, b[1::2] = R[i]
+    for j in range(6):
+        for i in range(n):
+            b[1::2] = r[i::n]
+            out = bytearray(ecb_encrypt("AES", kek, block))
+            _xor_counter(out, n * j + i + 1)
+            o = memoryview(out).cast("Q")
+            b[0::2] = o[0::2]
+            r[i::n] = o[1::2]
+
+    wrapped = bytearray(SEMIBLOCK * (n + 1) * count)
+    w = memoryview(wrapped).cast("Q")
+    w[0::n + 1] = b[0::2]
+    for i in range(n):
+        w[i + 1::n + 1] = r[i::n]
+    data, step = bytes(wrapped), SEMIBLOCK * (n + 1)
+    return [data[k:k + step] for k in range(0, len(data), step)]
+
+def _unwrap_group(kek: bytes, items: List[bytes]) -> List[bytes]:
+    count, n = len(items), len(items[0]) // SEMIBLOCK - 1
+    wrapped = memoryview(b"".join(items)).cast("Q")
+    registers = bytearray(SEMIBLOCK * n * count)
+    r = memoryview(registers).cast("Q")
+    for i in range(n):
+        r[i::n] = wrapped[i + 1::n + 1]
+    block = bytearray(2 * SEMIBLOCK * count)
+    b = memoryview(block).cast("Q")
+    b[0::2] = wrapped[0::n + 1]
+    for j in range(5, -1, -1):
+        for i in range(n - 1, -1, -1):
+            b[1::2] = r[i::n]
+            _xor_counter(block, n * j + i + 1)
+            o = memoryview(ecb_decrypt("AES", kek, block)).cast("Q")
+            b[0::2] = o[0::2]
+            r[i::n] = o[1::2]
+
+    ivs = b[0::2].tobytes()
+    if ivs != DEFAULT_IV * count:
+        bad = next(k for k in range(count) if ivs[k * SEMIBLOCK:(k + 1) * SEMIBLOCK] != DEFAULT_IV)
+        raise KeyWrapError(f"Llave envuelta {bad + 1} del lote: integridad inválida (KEK incorrecta o datos alterados)")
+    data, step = bytes(registers), SEMIBLOCK * n
+    return [data[k:k + step] for k in range(0, len(data), step)]
+
+# ========== API ==========
+
+def aes_key_wrap_many(kek: bytes, keys: Sequence[bytes]) -> List[bytes]:
+    """
+    Envuelve un lote de llaves con AES Key Wrap (RFC 3394).
+
+    Args:
+        kek: KEK AES (16, 24 o 32 bytes)
+        keys: Llaves de 16 bytes o más, múltiplos de 8 (AES, 3DES de 16/24)
+
+    Returns:
+        Llaves envueltas (8 bytes más largas), en el orden de entrada
+
+    Raises:
+        KeyWrapError: si la KEK o alguna llave tiene un largo inválido
+    """
+    _check_kek(kek)
+    groups = _group_by_length(keys)
+    for length in groups:
+        if length < 2 * SEMIBLOCK or length % SEMIBLOCK:
+            raise KeyWrapError(f"AES Key Wrap requiere llaves de 16 bytes o más y múltiplos de 8, recibido: {length}")
+    if len(groups) == 1:
+        return _wrap_group(kek, list(keys)) if keys else []
+    results: List[Optional[bytes]] = [None] * len(keys)
+    for indexes in groups.values():
+        for index, wrapped in zip(indexes, _wrap_group(kek, [keys[i] for i in indexes])):
+            results[index] = wrapped
+    return results
+
+def aes_key_unwrap_many(kek: bytes, wrapped: Sequence[bytes]) -> List[bytes]:
+    """
+    Desenvuelve un lote de llaves envueltas con aes_key_wrap_many.
+
+    Raises:
+        KeyWrapError: si algún largo es inválido o falla la verificación de integridad
+    """
+    _check_kek(kek)
+    groups = _group_by_length(wrapped)
+    for length in groups:
+        if length < 3 * SEMIBLOCK or length % SEMIBLOCK:
+            raise KeyWrapError(f"Largo de llave envuelta inválido: {length}")
+    if len(groups) == 1:
+        return _unwrap_group(kek, list(wrapped)) if wrapped else []
+    results: List[Optional[bytes]] = [None] * len(wrapped)
+    for indexes in groups.values():
+        for index, key in zip(indexes, _unwrap_group(kek, [wrapped[i] for i in indexes])):
+            results[index] = key
+    return results
+
+def load_kek(paths: Iterable[str]) -> Tuple[bytes, str]:
+    """
+    Busca la KEK_STORAGE en archivos de llaves (.json, .jsonl, .kvlt).
+
+    Returns:
+        (KEK en bytes, KCV)
+
+    Raises:
+        KeyWrapError: si no hay KEK_STORAGE o no es AES
+    """
+    from key_index import KeyIndex
+
+    record = KeyIndex.from_files(paths).first_of_type(KEK_KEY_TYPE)
+    if record is None:
+        raise KeyWrapError(f"No se encontró una '{KEK_KEY_TYPE}' en los archivos de llaves")
+    kek = bytes.fromhex(record["keyHex"])
+    _check_kek(kek)
+    return kek, record.get("kcv") or calculate_kcv(kek, "AES")
+
+def wrapped_fields(wrapped: bytes, kek_kcv: str) -> dict:
+    """Campos que reemplazan a keyHex en un registro exportado envuelto."""
+    return {"wrappedKeyHex": wrapped.hex().upper(), "wrapAlgorithm": WRAP_ALGORITHM, "kekKcv": kek_kcv}
+
+# ========== FUNCIÓN PRINCIPAL ==========
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="AES Key Wrap de llaves bajo la KEK_STORAGE")
+    commands = parser.add_subparsers(dest="command", required=True)
+    unwrap = commands.add_parser("unwrap", help="Exportación envuelta -> llaves en claro (JSON Lines)")
+    unwrap.add_argument("input", help="Archivo de llaves envueltas (.json o .jsonl)")
+    unwrap.add_argument("--kek", action="append", required=True, metavar="ARCHIVO",
+                        help="Archivo de llaves con la KEK_STORAGE (repetible)")
+    unwrap.add_argument("--output", required=True, help="JSON Lines de salida")
+    unwrap.add_argument("--chunk-size", type=int, default=4096, help="Llaves por lote")
+    args = parser.parse_args(argv)
+
+    from key_files import iter_key_records
+
+    try:
+        kek, kek_kcv = load_kek(args.kek)
+        total = 0
+        records = iter_key_records(args.input)
+        with open(args.output, "w", encoding="utf-8") as f:
+            while True:
+                chunk = list(itertools.islice(records, args.chunk_size))
+                if not chunk:
+                    break
+                for item in chunk:
+                    if item.get("kekKcv", kek_kcv) != kek_kcv:
+                        raise KeyWrapError(f"La llave {item.get('kcv')} está envuelta con la KEK {item['kekKcv']}")
+                keys = aes_key_unwrap_many(kek, [bytes.fromhex(item["wrappedKeyHex"]) for item in chunk])
+                for item, key in zip(chunk, keys):
+                    plain = {}
+                    for name, value in item.items():
+                        if name == "wrappedKeyHex":
+                            plain["keyHex"] = key.hex().upper()
+                        elif name not in WRAPPED_FIELDS:
+                            plain[name] = value
+                    f.write(json.dumps(plain, ensure_ascii=False) + "\n")
+                total += len(chunk)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    print(f"✅ {total} llaves desenvueltas con la KEK {kek_kcv}: {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
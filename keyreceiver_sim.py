@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+"""
+Simulador de KeyReceiver sobre pseudo-terminales (pty).
+
+Cada terminal virtual abre un par pty y responde como la app KeyReceiver
+a los comandos Futurex 02 (inyección de llave), 03 (leer N/S) y 04
+(escribir N/S). El lado esclavo del pty (/dev/pts/N) se usa como si fuera
+el puerto serial del cable CH340.
+
+Uso:
+    python3 keyreceiver_sim.py --terminals 200 --endpoints endpoints.json
+    python3 keyreceiver_sim.py --terminals 4 --link-dir /tmp/kr --response-delay-ms 80
+    python3 keyreceiver_sim.py --terminals 8 --baud 115200 --link-latency-ms 15 --response-delay-ms 40
+
+Validaciones del comando 02 (en el orden de MainViewModel.handleFuturexInjectKey):
+    - Versión, slot, keyType y keyAlgorithm conocidos
+    - EncryptionType 00 (claro, no se aceptan llaves de trabajo), 01/02
+      (cifrada con la KTK del slot ktkSlot, cuyo KCV debe coincidir) o 05
+      (DUKPT en claro, con KSN distinto de cero)
+    - Largo de la llave según el algoritmo
+    - KCV de la llave (en claro o ya descifrada) igual a keyChecksum
+
+Cada validación que falla responde con su código de FuturexErrorCode.kt (la
+app real responde 10 para casi todos los errores). Un frame con LRC
+incorrecto se responde con 08.
+
+Todos los terminales corren en un único event loop de asyncio, así que un
+proceso puede simular cientos de terminales.
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import os
+import resource
+import signal
+import sys
+import time
+import tty
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from frame_stream import FrameStreamParser
+from futurex import (
+    BAD_LRC, DECRYPTION_FAILED, DEFAULT_VERSION, INVALID_ALGORITHM,
+    INVALID_COMMAND, INVALID_COMMAND_VERSION, INVALID_FORMAT, INVALID_KEY_CHECKSUM,
+    INVALID_KEY_ENCRYPTION_TYPE, INVALID_KEY_LENGTH, INVALID_KEY_SLOT, INVALID_KEY_TYPE,
+    INVALID_KSN, INVALID_KTK_CHECKSUM, KEY_ALGORITHMS, MISSING_KTK, SERIAL_NUMBER_LENGTH,
+    SUCCESSFUL, UNSUPPORTED_CHARACTERS, EMPTY_KSN, FrameEncoder, InjectSymmetricKeyCommand,
+    ParseError, ReadSerialCommand, WriteSerialCommand, decrypt_with_kek, generic_key_type,
+)
+from kcv import calculate_kcv
+
+DEFAULT_MODEL = "VIRTUAL_KEYRECEIVER"
+MAX_SLOT = 99
+READ_SIZE = 4096
+
+# ========== ESTADO DEL RECEPTOR ==========
+
+@dataclass
+class SlotKey:
+    key_type: str  # Tipo genérico (MASTER_KEY, TRANSPORT_KEY, WORKING_PIN_KEY, ...)
+    algorithm: str  # DES_DOUBLE, DES_TRIPLE, AES_128, ...
+    kcv: str
+    key: bytes
+    ksn: str = ""
+
+    def as_dict(self) -> dict:
+        """Estado sin material de llave."""
+        return {"keyType": self.key_type, "algorithm": self.algorithm, "kcv": self.kcv, "ksn": self.ksn}
+
+class VirtualKeyReceiver:
+    """
+    Lógica de un KeyReceiver, sin E/S: recibe mensajes decodificados y
+    devuelve el frame de respuesta.
+    """
+
+    def __init__(self, serial_number: str, model: str = DEFAULT_MODEL, max_slot: int = MAX_SLOT):
+        self.serial_number = serial_number[:SERIAL_NUMBER_LENGTH].ljust(SERIAL_NUMBER_LENGTH, "0")
+        self.model = model.replace(" ", "_")
+        self.max_slot = max_slot
+        # Como injectedKeyRepository: una llave por (slot, tipo)
+        self.slots: Dict[Tuple[int, str], SlotKey] = {}
+        self.responses = collections.Counter()
+        self._encoder = FrameEncoder()
+
+    def find_ktk(self, slot: int) -> Optional[SlotKey]:
+        """KTK del slot: TRANSPORT_KEY y, si no hay, MASTER_KEY (igual que la app)."""
+        return self.slots.get((slot, "TRANSPORT_KEY")) or self.slots.get((slot, "MASTER_KEY"))
+
+    def inject(self, command: InjectSymmetricKeyCommand) -> str:
+        """
+        Valida y guarda la llave de un comando 02.
+
+        Returns:
+            Código de respuesta Futurex
+        """
+        if command.version != DEFAULT_VERSION:
+            return INVALID_COMMAND_VERSION
+        if not 0 <= command.key_slot <= self.max_slot:
+            return INVALID_KEY_SLOT
+        key_type = generic_key_type(command.key_type, command.key_sub_type)
+        if key_type is None:
+            return INVALID_KEY_TYPE
+        if command.key_algorithm not in KEY_ALGORITHMS:
+            return INVALID_ALGORITHM
+        algorithm, key_length = KEY_ALGORITHMS[command.key_algorithm]
+        try:
+            data = command.key_bytes()
+        except ValueError:
+            return UNSUPPORTED_CHARACTERS
+
+        encryption_type = command.encryption_type
+        ksn = ""
+        if encryption_type == "00":
+            if key_type.startswith("WORKING_"):
+                # Las llaves de trabajo deben venir cifradas
+                return INVALID_KEY_ENCRYPTION_TYPE
+            key = data
+            if key_type == "DUKPT_INITIAL_KEY":
+                ksn = command.ksn
+        elif encryption_type in ("01", "02"):
+            ktk = self.find_ktk(command.ktk_slot)
+            if ktk is None:
+                return MISSING_KTK
+            if ktk.kcv[:4].upper() != command.ktk_checksum[:4].upper():
+                return INVALID_KTK_CHECKSUM
+            if len(data) < key_length:
+                return INVALID_KEY_LENGTH
+            try:
+                key = decrypt_with_kek(data, ktk.key, key_length)
+            except ValueError:
+                return DECRYPTION_FAILED
+        elif encryption_type == "05":
+            if command.ksn == EMPTY_KSN:
+                return INVALID_KSN
+            # DUKPT 3DES (2TDEA y 3TDEA) siempre usa IPEK de 16 bytes
+            if algorithm.startswith("DES"):
+                key_length = 16
+            key = data
+            key_type = "DUKPT_INITIAL_KEY"
+            ksn = command.ksn
+        else:
+            return INVALID_KEY_ENCRYPTION_TYPE
+
+        if len(key) != key_length:
+            return INVALID_KEY_LENGTH
+        kcv = calculate_kcv(key, algorithm)
+        if kcv[:4] != command.key_checksum[:4].upper():
+            return INVALID_KEY_CHECKSUM
+
+        self.slots[(command.key_slot, key_type)] = SlotKey(key_type, algorithm, kcv, key, ksn)
+        return SUCCESSFUL
+
+    def handle(self, message) -> memoryview:
+        """
+        Procesa un mensaje decodificado.
+
+        Returns:
+            Frame de respuesta (memoryview válido hasta la siguiente respuesta)
+        """
+        encoder = self._encoder
+        if isinstance(message, InjectSymmetricKeyCommand):
+            code = self.inject(message)
+            self.responses[code] += 1
+            return encoder.inject_symmetric_key_response(code, message.key_checksum,
+                                                         self.serial_number, self.model)
+        if isinstance(message, ReadSerialCommand):
+            self.responses[SUCCESSFUL] += 1
+            return encoder.read_serial_response(SUCCESSFUL, self.serial_number)
+        if isinstance(message, WriteSerialCommand):
+            self.serial_number = message.serial_number
+            self.responses[SUCCESSFUL] += 1
+            return encoder.write_serial_response(SUCCESSFUL)
+        if isinstance(message, ParseError):
+            return self.error_response(message.command_code, INVALID_FORMAT)
+        # Respuestas recibidas o comandos no soportados
+        return self.error_response(message.command_code, INVALID_COMMAND)
+
+    def error_response(self, command_code: str, code: str) -> memoryview:
+        """
+        Respuesta de error para cualquier comando. La del 02 lleva checksum
+        vacío y la del 03 un N/S en ceros, para que mantengan su largo.
+        """
+        self.responses[code] += 1
+        if command_code == "02":
+            return self._encoder.inject_symmetric_key_response(code, "0000")
+        if command_code == "03":
+            return self._encoder.read_serial_response(code, "0" * SERIAL_NUMBER_LENGTH)
+        return self._encoder.encode(command_code or "00", (code,))
+
+    def state(self) -> dict:
+        return {
+            "serialNumber": self.serial_number,
+            "model": self.model,
+            "slots": [
+                {"slot": slot, **key.as_dict()}
+                for (slot, _), key in sorted(self.slots.items())
+            ],
+            "responses": dict(self.responses),
+        }
+
+# ========== TERMINAL SOBRE PTY ==========
+
+class PtyTerminal:
+    """
+    Terminal virtual: un par pty atendido por el event loop.
+
+    El simulador mantiene abierto el lado esclavo para que el maestro no
+    reciba EIO cuando el cliente cierra y vuelve a abrir el puerto.
+
+    Con link_latency o baud_rate se emula el cable: cada frame tarda
+    10 bits por byte a baud_rate en cada sentido más la latencia, el
+    receptor procesa de a un frame y las respuestas salen en orden.
+    """
+
+    def __init__(self, receiver: VirtualKeyReceiver, response_delay: float = 0.0,
+                 link_latency: float = 0.0, baud_rate: int = 0):
+        self.receiver = receiver
+        self.response_delay = response_delay
+        self.link_latency = link_latency
+        self.baud_rate = baud_rate
+        self.path = ""
+        self.parser = FrameStreamParser(include_invalid=True)
+        self.bytes_out = 0
+        self._master = -1
+        self._slave = -1
+        self._pending = bytearray()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Instantes (loop.time) en que se liberan el cable de ida, el receptor y el de vuelta
+        self._rx_free = self._busy_until = self._tx_free = 0.0
+
+    def open(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)  # Sin eco ni traducción de fin de línea
+        os.set_blocking(self._master, False)
+        self.path = os.ttyname(self._slave)
+        loop.add_reader(self._master, self._on_readable)
+
+    def close(self):
+        if self._master < 0:
+            return
+        self._loop.remove_reader(self._master)
+        self._loop.remove_writer(self._master)
+        os.close(self._master)
+        os.close(self._slave)
+        self._master = self._slave = -1
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._master, READ_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            return
+        emulate_link = self.link_latency > 0 or self.baud_rate > 0
+        for frame in self.parser.feed(data):
+            if frame.lrc_ok:
+                response = self.receiver.handle(frame.message())
+            else:
+                command_code = str(frame.payload[:2], "ascii", "replace")
+                response = self.receiver.error_response(command_code, BAD_LRC)
+            if emulate_link:
+                self._loop.call_at(self._delivery_time(frame.size, len(response)), self._write, bytes(response))
+            elif self.response_delay > 0:
+                self._loop.call_later(self.response_delay, self._write, bytes(response))
+            else:
+                self._write(response)
+
+    def _wire_time(self, size: int) -> float:
+        return size * 10 / self.baud_rate if self.baud_rate > 0 else 0.0
+
+    def _delivery_time(self, request_size: int, response_size: int) -> float:
+        """Instante en que la respuesta termina de llegar al host."""
+        now = self._loop.time()
+        self._rx_free = max(now, self._rx_free) + self._wire_time(request_size)
+        arrival = self._rx_free + self.link_latency
+        self._busy_until = max(arrival, self._busy_until) + self.response_delay
+        self._tx_free = max(self._busy_until, self._tx_free) + self._wire_time(response_size)
+        return self._tx_free + self.link_latency
+
+    def _write(self, data):
+        if self._master < 0:
+            return
+        if self._pending:
+            self._pending += data
+            return
+        try:
+            written = os.write(self._master, data)
+        except BlockingIOError:
+            written = 0
+        self.bytes_out += written
+        if written < len(data):
+            self._pending += data[written:]
+            self._loop.add_writer(self._master, self._flush)
+
+    def _flush(self):
+        try:
+            written = os.write(self._master, self._pending)
+        except BlockingIOError:
+            return
+        self.bytes_out += written
+        del self._pending[:written]
+        if not self._pending:
+            self._loop.remove_writer(self._master)
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            **self.parser.stats.as_dict(),
+            "bytesOut": self.bytes_out,
+            **self.receiver.state(),
+        }
+
+class KeyReceiverSimulator:
+    """
+    Conjunto de terminales virtuales en el event loop actual.
+
+    Uso:
+        async with KeyReceiverSimulator(100) as simulator:
+            print(simulator.paths)
+    """
+
+    def __init__(self, terminals: int, serial_prefix: str = "SIM", model: str = DEFAULT_MODEL,
+                 response_delay: float = 0.0, link_dir: Optional[str] = None,
+                 link_latency: float = 0.0, baud_rate: int = 0):
+        self.terminals: List[PtyTerminal] = [
+            PtyTerminal(VirtualKeyReceiver(f"{serial_prefix}{i:0{SERIAL_NUMBER_LENGTH - len(serial_prefix)}d}", model),
+                        response_delay, link_latency, baud_rate)
+            for i in range(terminals)
+        ]
+        self.link_dir = link_dir
+        self._links: List[str] = []
+
+    @property
+    def paths(self) -> List[str]:
+        return self._links or [terminal.path for terminal in self.terminals]
+
+    def start(self):
+        raise_fd_limit(len(self.terminals) * 2 + 64)
+        loop = asyncio.get_running_loop()
+        for terminal in self.terminals:
+            terminal.open(loop)
+        if self.link_dir:
+            os.makedirs(self.link_dir, exist_ok=True)
+            for index, terminal in enumerate(self.terminals):
+                link = os.path.join(self.link_dir, f"kr{index:03d}")
+                if os.path.islink(link):
+                    os.unlink(link)
+                os.symlink(terminal.path, link)
+                self._links.append(link)
+
+    def stop(self):
+        for terminal in self.terminals:
+            terminal.close()
+        for link in self._links:
+            if os.path.islink(link):
+                os.unlink(link)
+
+    async def __aenter__(self) -> "KeyReceiverSimulator":
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.stop()
+
+    def endpoints(self) -> List[dict]:
+        return [
+            {"path": path, "serialNumber": terminal.receiver.serial_number}
+            for path, terminal in zip(self.paths, self.terminals)
+        ]
+
+    def summary(self) -> dict:
+        responses = collections.Counter()
+        frames = bad_lrc = 0
+        for terminal in self.terminals:
+            responses.update(terminal.receiver.responses)
+            frames += terminal.parser.stats.frames
+            bad_lrc += terminal.parser.stats.bad_lrc
+        return {"terminals": len(self.terminals), "frames": frames, "badLrc": bad_lrc,
+                "responses": dict(sorted(responses.items()))}
+
+def raise_fd_limit(needed: int):
+    """Sube el límite de descriptores abiertos si hace falta (cada terminal usa 2)."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+# ========== FUNCIÓN PRINCIPAL ==========
+
+async def run_simulator(args: argparse.Namespace):
+    simulator = KeyReceiverSimulator(args.terminals, args.serial_prefix, args.model,
+                                     args.response_delay_ms / 1000, args.link_dir,
+                                     args.link_latency_ms / 1000, args.baud)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    async with simulator:
+        if args.endpoints:
+            with open(args.endpoints, "w") as f:
+                json.dump(simulator.endpoints(), f, indent=2)
+
+        print("=" * 80)
+        print("📟 SIMULADOR DE KEYRECEIVER")
+        print("=" * 80)
+        print()
+        print(f"   Terminales: {args.terminals}")
+        for endpoint in simulator.endpoints()[:args.show]:
+            print(f"   {endpoint['path']}  N/S {endpoint['serialNumber']}")
+        if args.terminals > args.show:
+            print(f"   ... ({args.terminals - args.show} más)")
+        if args.endpoints:
+            print(f"📝 Endpoints: {args.endpoints}")
+        print()
+        print("⏳ Esperando comandos (Ctrl+C para terminar)...")
+
+        started = time.monotonic()
+        while not stop.is_set():
+            timeout = args.stats_interval or None
+            if args.duration:
+                remaining = args.duration - (time.monotonic() - started)
+                if remaining <= 0:
+                    break
+                timeout = min(timeout or remaining, remaining)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout)
+            except asyncio.TimeoutError:
+                if args.stats_interval:
+                    print(f"📊 {json.dumps(simulator.summary())}")
+
+        print()
+        print(f"📊 {json.dumps(simulator.summary())}")
+        if args.state:
+            with open(args.state, "w") as f:
+                json.dump([terminal.stats() for terminal in simulator.terminals], f, indent=2)
+            print(f"📝 Estado final: {args.state}")
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Simulador de KeyReceiver sobre pty")
+    parser.add_argument("--terminals", type=int, default=1, help="Cantidad de terminales virtuales")
+    parser.add_argument("--serial-prefix", default="SIM", help="Prefijo de los números de serie")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Modelo informado en las respuestas")
+    parser.add_argument("--response-delay-ms", type=float, default=0.0,
+                        help="Demora antes de responder (escritura en el PED)")
+    parser.add_argument("--link-latency-ms", type=float, default=0.0,
+                        help="Latencia del cable en cada sentido (emulada)")
+    parser.add_argument("--baud", type=int, default=0,
+                        help="Velocidad del cable emulado (0 = sin demora por byte)")
+    parser.add_argument("--link-dir", help="Crear enlaces kr000, kr001, ... a los pty en este directorio")
+    parser.add_argument("--endpoints", help="Guardar la lista de puertos en este JSON")
+    parser.add_argument("--state", help="Guardar el estado final de cada terminal en este JSON")
+    parser.add_argument("--duration", type=float, default=0, help="Segundos de ejecución (0 = sin límite)")
+    parser.add_argument("--stats-interval", type=float, default=0, help="Imprimir estadísticas cada N segundos")
+    parser.add_argument("--show", type=int, default=10, help="Puertos a listar por pantalla")
+    args = parser.parse_args(argv)
+
+    asyncio.run(run_simulator(args))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
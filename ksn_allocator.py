@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Asignación persistente de KSN por BDK ID.
+
+Cada KSN inicial es BDK ID (40 bits) | Device ID (19 bits) | contador en 0
+(ver generate_dukpt_keys.build_ksn), así que no repetir KSN equivale a no
+repetir Device ID dentro de un BDK ID. KsnAllocator reserva bloques de
+Device IDs en un log de solo agregado y los entrega desde memoria: el
+disco se toca (write + fsync) una vez por bloque, no por KSN.
+
+Uso:
+    python3 ksn_allocator.py ksn_allocations.log allocate --bdk-id FFFF987654 --count 1000
+    python3 ksn_allocator.py ksn_allocations.log status
+
+    with KsnAllocator("ksn_allocations.log") as allocator:
+        ksn = allocator.allocate_ksn(bytes.fromhex("FFFF987654"))
+
+Log (JSON Lines, una operación por línea):
+    {"op": "reserve", "bdkId": "FFFF987654", "start": 0, "end": 1024, "time": "..."}
+    {"op": "release", "bdkId": "FFFF987654", "start": 37, "end": 1024, "time": "..."}
+
+Garantías:
+    - Un bloque se escribe y se sincroniza (fsync) antes de entregar el
+      primer Device ID que contiene. Tras una caída, la carga continúa
+      después del último bloque reservado: los IDs que quedaron sin usar
+      se pierden, pero ninguno se repite.
+    - Al cerrar sin errores se devuelve la cola sin usar del último bloque
+      (release), siempre que nadie haya reservado después.
+    - Varios procesos pueden compartir el log: cada reserva se hace con un
+      lock exclusivo (flock) y relee lo que otros agregaron antes.
+    - Una línea cortada al final (caída durante el write) nunca llegó a
+      sincronizarse ni a entregarse, así que se descarta.
+"""
+
+import argparse
+import contextlib
+import fcntl
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from generate_dukpt_keys import KSN_DEVICE_ID_BITS, build_ksn, bytes_to_hex
+
+DEFAULT_LOG_PATH = "ksn_allocations.log"
+DEFAULT_BLOCK_SIZE = 1024
+DEVICE_ID_LIMIT = 1 << KSN_DEVICE_ID_BITS
+
+OP_RESERVE = "reserve"
+OP_RELEASE = "release"
+
+class KsnAllocationError(ValueError):
+    """No quedan Device IDs para un BDK ID, o el log no se puede interpretar."""
+
+def _bdk_id_hex(bdk_id: bytes) -> str:
+    if len(bdk_id) != 5:
+        raise ValueError("BDK ID debe tener exactamente 5 bytes (10 caracteres hex)")
+    return bytes_to_hex(bdk_id)
+
+# ========== ASIGNADOR ==========
+
+class KsnAllocator:
+    """
+    Device IDs por BDK ID, reservados por bloques en un log de solo agregado.
+
+    Con path=None no hay persistencia: los IDs solo son únicos dentro del
+    proceso (útil para pruebas y simulaciones).
+
+    Args:
+        path: Log de reservas (se crea si no existe)
+        block_size: Device IDs por reserva
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_LOG_PATH, block_size: int = DEFAULT_BLOCK_SIZE):
+        if block_size < 1:
+            raise ValueError("block_size debe ser al menos 1")
+        self.path = path
+        self.block_size = block_size
+        self.reservations = 0
+        self._high: Dict[str, int] = {}      # Fin de lo reservado en el log, por BDK ID
+        self._ranges: Dict[str, List[int]] = {}  # [siguiente, fin) en memoria, por BDK ID
+        self._fd: Optional[int] = None
+        self._offset = 0
+        if path is not None:
+            self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o600)
+            with self._locked():
+                pass
+            _fsync_directory(path)
+
+    def __enter__(self) -> "KsnAllocator":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(release=exc_type is None)
+
+    # ---------- Log ----------
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Lock exclusivo del log, con lo que otros procesos agregaron ya aplicado."""
+        if self._fd is None:
+            yield
+            return
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            self._load()
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _load(self):
+        """Aplica las líneas agregadas al log desde la última lectura."""
+        size = os.fstat(self._fd).st_size
+        if size <= self._offset:
+            return
+        data = os.pread(self._fd, size - self._offset, self._offset)
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                self._apply(entry["op"], entry["bdkId"], int(entry["start"]), int(entry["end"]))
+            except (ValueError, KeyError, TypeError) as e:
+                raise KsnAllocationError(f"{self.path}: línea inválida después del byte {self._offset}: {e}")
+        if end < len(data):
+            # Línea cortada por una caída: nunca se sincronizó ni se entregó
+            os.ftruncate(self._fd, self._offset + end)
+        self._offset += end
+
+    def _apply(self, op: str, bdk_id: str, start: int, end: int):
+        high = self._high.get(bdk_id, 0)
+        if op == OP_RESERVE:
+            self._high[bdk_id] = max(high, end)
+        elif op == OP_RELEASE:
+            if high == end:
+                self._high[bdk_id] = start
+        else:
+            raise KeyError(f"operación desconocida '{op}'")
+
+    def _append(self, entries: List[dict]):
+        data = "".join(json.dumps(entry) + "\n" for entry in entries).encode()
+        written = os.write(self._fd, data)
+        if written != len(data):
+            raise OSError(f"{self.path}: escritura incompleta ({written} de {len(data)} bytes)")
+        os.fsync(self._fd)
+        self._offset += len(data)
+
+    # ---------- Reservas ----------
+
+    def reserve(self, counts: Dict[bytes, int], start: Optional[Dict[bytes, int]] = None):
+        """
+        Garantiza al menos `count` Device IDs en memoria para cada BDK ID.
+
+        Todos los bloques que falten se escriben juntos con un solo fsync.
+
+        Args:
+            counts: {BDK ID: cantidad de Device IDs}
+            start: {BDK ID: primer Device ID aceptable} (deviceIdStart de las plantillas)
+
+        Raises:
+            KsnAllocationError: si el espacio de Device IDs de un BDK ID se agota
+        """
+        start = start or {}
+        needed = {}
+        for bdk_id, count in counts.items():
+            key = _bdk_id_hex(bdk_id)
+            current = self._ranges.get(key)
+            minimum = start.get(bdk_id, 0)
+            available = current[1] - max(current[0], minimum) if current else 0
+            if available < count:
+                needed[key] = (count, minimum)
+        if not needed:
+            return
+
+        with self._locked():
+            now = datetime.now().isoformat()
+            blocks = {}
+            for key, (count, minimum) in needed.items():
+                first = max(self._high.get(key, 0), minimum)
+                last = min(first + max(count, self.block_size), DEVICE_ID_LIMIT)
+                if last - first < count:
+                    raise KsnAllocationError(
+                        f"No quedan Device IDs para el BDK ID {key}: "
+                        f"se piden {count}, quedan {max(DEVICE_ID_LIMIT - first, 0)}")
+                blocks[key] = (first, last)
+            if self._fd is not None:
+                self._append([{"op": OP_RESERVE, "bdkId": key, "start": first, "end": last, "time": now}
+                              for key, (first, last) in blocks.items()])
+            for key, (first, last) in blocks.items():
+                self._apply(OP_RESERVE, key, first, last)
+                current = self._ranges.get(key)
+                if current and current[1] == first:
+                    current[1] = last  # Bloque contiguo: se conserva lo que quedaba
+                else:
+                    self._ranges[key] = [first, last]
+            self.reservations += len(blocks)
+
+    def allocate(self, bdk_id: bytes, start: int = 0) -> int:
+        """
+        Siguiente Device ID libre de un BDK ID (no menor que `start`).
+
+        Raises:
+            KsnAllocationError: si el espacio de Device IDs se agota
+        """
+        current = self._ranges.get(bytes_to_hex(bdk_id))
+        if current is None or max(current[0], start) >= current[1]:
+            self.reserve({bdk_id: 1}, {bdk_id: start})
+            current = self._ranges[_bdk_id_hex(bdk_id)]
+        device_id = max(current[0], start)
+        current[0] = device_id + 1
+        return device_id
+
+    def allocate_many(self, bdk_id: bytes, count: int, start: int = 0) -> range:
+        """Bloque contiguo de `count` Device IDs (una sola reserva si no alcanza lo que hay en memoria)."""
+        current = self._ranges.get(bytes_to_hex(bdk_id))
+        if current is None or current[1] - max(current[0], start) < count:
+            self.reserve({bdk_id: count}, {bdk_id: start})
+            current = self._ranges[_bdk_id_hex(bdk_id)]
+        first = max(current[0], start)
+        current[0] = first + count
+        return range(first, first + count)
+
+    def allocate_ksn(self, bdk_id: bytes, start: int = 0) -> bytes:
+        """KSN inicial (10 bytes) con el siguiente Device ID libre."""
+        return build_ksn(bdk_id, self.allocate(bdk_id, start))
+
+    def allocate_ksns(self, bdk_id: bytes, count: int, start: int = 0) -> List[bytes]:
+        return [build_ksn(bdk_id, device_id) for device_id in self.allocate_many(bdk_id, count, start)]
+
+    def status(self) -> Dict[str, dict]:
+        """Por BDK ID: fin de lo reservado en el log y lo que queda en memoria."""
+        with self._locked():
+            pass
+        result = {}
+        for key in sorted(set(self._high) | set(self._ranges)):
+            current = self._ranges.get(key)
+            result[key] = {
+                "reserved": self._high.get(key, 0),
+                "free": DEVICE_ID_LIMIT - self._high.get(key, 0),
+                "inMemory": current[1] - current[0] if current else 0,
+            }
+        return result
+
+    def close(self, release: bool = True):
+        """
+        Cierra el log. Con release=True devuelve la cola sin usar de cada
+        bloque en memoria, si sigue siendo lo último reservado de su BDK ID.
+        """
+        if self._fd is None:
+            self._ranges.clear()
+            return
+        try:
+            if release:
+                with self._locked():
+                    now = datetime.now().isoformat()
+                    entries = [{"op": OP_RELEASE, "bdkId": key, "start": first, "end": last, "time": now}
+                               for key, (first, last) in self._ranges.items()
+                               if first < last and self._high.get(key) == last]
+                    if entries:
+                        self._append(entries)
+                        for entry in entries:
+                            self._apply(OP_RELEASE, entry["bdkId"], entry["start"], entry["end"])
+        finally:
+            self._ranges.clear()
+            os.close(self._fd)
+            self._fd = None
+
+def _fsync_directory(path: str):
+    """Sincroniza el directorio para que un log recién creado sobreviva a una caída."""
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+# ========== FUNCIÓN PRINCIPAL ==========
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Asignación persistente de KSN por BDK ID")
+    parser.add_argument("log", help=f"Log de reservas (p. ej. {DEFAULT_LOG_PATH})")
+    parser.add_argument("--json", action="store_true", help="Imprimir el resultado como JSON")
+    commands = parser.add_subparsers(dest="command", required=True)
+    allocate = commands.add_parser("allocate", help="Entregar KSN nuevos")
+    allocate.add_argument("--bdk-id", required=True, help="BDK ID (10 caracteres hex)")
+    allocate.add_argument("--count", type=int, default=1, help="Cantidad de KSN")
+    allocate.add_argument("--start", type=int, default=0, help="Primer Device ID aceptable")
+    commands.add_parser("status", help="Reservas por BDK ID")
+    args = parser.parse_args(argv)
+
+    try:
+        with KsnAllocator(args.log) as allocator:
+            if args.command == "allocate":
+                ksns = allocator.allocate_ksns(bytes.fromhex(args.bdk_id), args.count, args.start)
+                if args.json:
+                    print(json.dumps([bytes_to_hex(ksn) for ksn in ksns]))
+                else:
+                    for ksn in ksns:
+                        print(bytes_to_hex(ksn))
+                return 0
+            status = allocator.status()
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    if args.json:
+        print(json.dumps(status, indent=2))
+        return 0
+    print("=" * 80)
+    print(f"🔢 RESERVAS DE KSN: {args.log}")
+    print("=" * 80)
+    print()
+    print(f"   {'BDK ID':12s} {'Reservados':>11s} {'Libres':>9s}")
+    for bdk_id, entry in status.items():
+        print(f"   {bdk_id:12s} {entry['reserved']:11d} {entry['free']:9d}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Emulador de enlace serial entre dos puertos (pty o dispositivo real).
+
+Los timeouts de AisinoComController/UrovoComController se ajustan contra
+cables reales. Este proxy se pone en el medio de dos extremos y reenvía
+los bytes imponiendo las condiciones del cable, para medir el flujo
+Futurex a 9600 o a 115200 baudios, o con un CH340 que pierde bytes, sin
+hardware:
+
+    host (inject_profile.py, serial_link.py, ...)  <->  pty A  <->  [emulador]  <->  B (pty, simulador o /dev/ttyUSB0)
+
+Uso:
+    python3 keyreceiver_sim.py --terminals 1 --link-dir /tmp/kr &
+    python3 link_emulator.py --device /tmp/kr/kr000 --link /tmp/kr/lento --baud 9600 --latency-ms 5
+    python3 link_emulator.py --device /tmp/kr/kr000 --link /tmp/kr/ch340 --drop-rate 0.001 --fragment 8 --jitter-ms 3
+    python3 link_emulator.py --link /tmp/a --peer-link /tmp/b --baud 115200 --stats enlace.json
+
+    async with LinkEmulator(LinkProfile(baud_rate=9600), device="/tmp/kr/kr000") as link:
+        async with SerialLink(link.path) as port:
+            ...
+
+Condiciones (iguales en los dos sentidos, cada uno con su propio cable):
+    - Ancho de banda: 10 bits por byte (8N1) a --baud; los bytes de un
+      sentido salen de a uno por vez, así que una ráfaga se encola
+    - Latencia por bloque (--latency-ms) y por byte (--byte-latency-us,
+      además del tiempo de línea), más un jitter uniforme (--jitter-ms)
+      que nunca reordena bytes
+    - Pérdida de bytes con probabilidad --drop-rate por byte
+    - Fragmentación: cada bloque se entrega en pedazos de 1 a --fragment
+      bytes, como las lecturas de un puerto USB
+
+Se cuentan por sentido los bytes y bloques recibidos y entregados, los
+bytes descartados, la demora media y máxima y el máximo de bytes en vuelo.
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import math
+import os
+import random
+import signal
+import sys
+import termios
+import time
+import tty
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+READ_SIZE = 4096
+BITS_PER_BYTE = 10  # 8N1: start + 8 datos + stop
+
+# ========== CONDICIONES DEL ENLACE ==========
+
+@dataclass
+class LinkProfile:
+    baud_rate: int = 0  # 0 = sin límite de ancho de banda
+    latency: float = 0.0  # Segundos por bloque
+    byte_latency: float = 0.0  # Segundos por byte, además del tiempo de línea
+    jitter: float = 0.0  # Segundos (uniforme entre 0 y jitter)
+    drop_rate: float = 0.0  # Probabilidad de perder cada byte
+    fragment_size: int = 0  # Máximo de bytes por entrega (0 = el bloque entero)
+
+    def __post_init__(self):
+        if not 0 <= self.drop_rate < 1:
+            raise ValueError("drop_rate debe estar entre 0 y 1")
+        if min(self.baud_rate, self.latency, self.byte_latency, self.jitter, self.fragment_size) < 0:
+            raise ValueError("Las condiciones del enlace no pueden ser negativas")
+
+    def wire_time(self, size: int) -> float:
+        """Tiempo que ocupa `size` bytes en el cable."""
+        line = size * BITS_PER_BYTE / self.baud_rate if self.baud_rate else 0.0
+        return line + size * self.byte_latency
+
+    def as_dict(self) -> dict:
+        return {
+            "baudRate": self.baud_rate,
+            "latencyMs": self.latency * 1000,
+            "byteLatencyUs": self.byte_latency * 1e6,
+            "jitterMs": self.jitter * 1000,
+            "dropRate": self.drop_rate,
+            "fragmentSize": self.fragment_size,
+        }
+
+@dataclass
+class DirectionStats:
+    bytes_in: int = 0
+    bytes_out: int = 0
+    dropped_bytes: int = 0
+    chunks_in: int = 0
+    chunks_out: int = 0
+    delay_total: float = 0.0  # Suma de demoras por entrega (s)
+    delay_max: float = 0.0
+    in_flight: int = 0
+    in_flight_max: int = 0
+
+    def as_dict(self, seconds: float) -> dict:
+        return {
+            "bytesIn": self.bytes_in,
+            "bytesOut": self.bytes_out,
+            "droppedBytes": self.dropped_bytes,
+            "chunksIn": self.chunks_in,
+            "chunksOut": self.chunks_out,
+            "inFlightBytes": self.in_flight,
+            "inFlightMaxBytes": self.in_flight_max,
+            "delayMeanMs": round(self.delay_total / self.chunks_out * 1000, 3) if self.chunks_out else 0,
+            "delayMaxMs": round(self.delay_max * 1000, 3),
+            "bytesPerSecond": round(self.bytes_out / seconds, 1) if seconds else 0,
+        }
+
+# ========== EXTREMOS ==========
+
+class _Endpoint:
+    """
+    Un extremo del enlace: el maestro de un pty propio o un puerto abierto.
+
+    De un pty propio se mantiene abierto también el esclavo, para que el
+    maestro no reciba EIO cuando el cliente cierra y vuelve a abrir el puerto.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, on_data: Callable[[bytes], None],
+                 device: Optional[str] = None, device_baud: int = 0):
+        self._loop = loop
+        self._on_data = on_data
+        self._pending = bytearray()
+        self._slave = -1
+        if device:
+            self._fd = os.open(device, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+            try:
+                if device_baud:
+                    from serial_link import configure_port
+                    configure_port(self._fd, device_baud)
+                else:
+                    tty.setraw(self._fd)
+            except (termios.error, OSError, ValueError):
+                os.close(self._fd)
+                raise
+            self.path = device
+        else:
+            self._fd, self._slave = os.openpty()
+            tty.setraw(self._slave)  # Sin eco ni traducción de fin de línea
+            os.set_blocking(self._fd, False)
+            self.path = os.ttyname(self._slave)
+        loop.add_reader(self._fd, self._on_readable)
+
+    def close(self):
+        if self._fd < 0:
+            return
+        self._loop.remove_reader(self._fd)
+        self._loop.remove_writer(self._fd)
+        os.close(self._fd)
+        if self._slave >= 0:
+            os.close(self._slave)
+        self._fd = self._slave = -1
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._fd, READ_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            # El dispositivo desapareció (cable desconectado)
+            self._loop.remove_reader(self._fd)
+            return
+        if data:
+            self._on_data(data)
+
+    def write(self, data: bytes):
+        if self._fd < 0:
+            return
+        if self._pending:
+            self._pending += data
+            return
+        try:
+            written = os.write(self._fd, data)
+        except BlockingIOError:
+            written = 0
+        if written < len(data):
+            self._pending += data[written:]
+            self._loop.add_writer(self._fd, self._flush)
+
+    def _flush(self):
+        try:
+            written = os.write(self._fd, self._pending)
+        except BlockingIOError:
+            return
+        del self._pending[:written]
+        if not self._pending:
+            self._loop.remove_writer(self._fd)
+
+# ========== SENTIDO DEL ENLACE ==========
+
+class _Direction:
+    """Cable de un sentido: encola, demora, pierde y fragmenta lo que le llega."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, profile: LinkProfile, rng: random.Random):
+        self.profile = profile
+        self.stats = DirectionStats()
+        self.target: Optional[_Endpoint] = None
+        self._loop = loop
+        self._rng = rng
+        self._wire_free = 0.0  # Instante (loop.time) en que el cable queda libre
+        self._last_delivery = 0.0
+        self._until_drop = self._next_drop()
+        # Entregas pendientes en orden (instante, bytes, demora): un solo timer
+        # para la primera, así dos entregas con el mismo instante no se reordenan
+        self._queue: "collections.deque[tuple]" = collections.deque()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _next_drop(self) -> int:
+        """Bytes que pasan antes del próximo descartado (distribución geométrica)."""
+        if not self.profile.drop_rate:
+            return -1
+        return int(math.log(1.0 - self._rng.random()) / math.log(1.0 - self.profile.drop_rate))
+
+    def _drop(self, data: bytes) -> bytes:
+        if self._until_drop < 0 or self._until_drop >= len(data):
+            if self._until_drop >= 0:
+                self._until_drop -= len(data)
+            return data
+        kept = bytearray()
+        position = 0
+        while 0 <= self._until_drop < len(data) - position:
+            kept += data[position:position + self._until_drop]
+            position += self._until_drop + 1
+            self.stats.dropped_bytes += 1
+            self._until_drop = self._next_drop()
+        kept += data[position:]
+        self._until_drop -= len(data) - position
+        return bytes(kept)
+
+    def feed(self, data: bytes):
+        profile, stats = self.profile, self.stats
+        now = self._loop.time()
+        stats.bytes_in += len(data)
+        stats.chunks_in += 1
+        data = self._drop(data)
+        position = 0
+        while position < len(data):
+            size = len(data) - position
+            if profile.fragment_size:
+                size = min(size, self._rng.randint(1, profile.fragment_size))
+            piece = data[position:position + size]
+            position += size
+            # Los bytes de un sentido salen en orden: el jitter nunca adelanta una entrega
+            self._wire_free = max(now, self._wire_free) + profile.wire_time(size)
+            jitter = self._rng.uniform(0, profile.jitter) if profile.jitter else 0.0
+            delivery = max(self._wire_free + profile.latency + jitter, self._last_delivery)
+            self._last_delivery = delivery
+            stats.in_flight += size
+            stats.in_flight_max = max(stats.in_flight_max, stats.in_flight)
+            self._queue.append((delivery, piece, delivery - now))
+        if self._queue and self._timer is None:
+            self._timer = self._loop.call_at(self._queue[0][0], self._deliver)
+
+    def _deliver(self):
+        stats, queue = self.stats, self._queue
+        now = self._loop.time()
+        while queue and queue[0][0] <= now:
+            _, piece, delay = queue.popleft()
+            stats.in_flight -= len(piece)
+            stats.bytes_out += len(piece)
+            stats.chunks_out += 1
+            stats.delay_total += delay
+            stats.delay_max = max(stats.delay_max, delay)
+            if self.target is not None:
+                self.target.write(piece)
+        self._timer = self._loop.call_at(queue[0][0], self._deliver) if queue else None
+
+    def cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+# ========== EMULADOR ==========
+
+class LinkEmulator:
+    """
+    Proxy entre un pty propio (lado host, `path`) y otro extremo (`peer_path`).
+
+    El otro extremo es `device` (el pty de keyreceiver_sim.py o un puerto
+    real) o, sin device, un segundo pty propio.
+    """
+
+    def __init__(self, profile: LinkProfile, device: Optional[str] = None, device_baud: int = 0,
+                 link: Optional[str] = None, peer_link: Optional[str] = None, seed: Optional[int] = None):
+        self.profile = profile
+        self.device = device
+        self.device_baud = device_baud
+        self.link = link
+        self.peer_link = peer_link
+        self.seed = seed
+        self.path = ""
+        self.peer_path = ""
+        self._endpoints: List[_Endpoint] = []
+        self._directions: Dict[str, _Direction] = {}
+        self._links: List[str] = []
+        self._started = 0.0
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        rng = random.Random(self.seed)
+        to_peer = _Direction(loop, self.profile, random.Random(rng.random()))
+        to_host = _Direction(loop, self.profile, random.Random(rng.random()))
+        self._directions = {"hostToPeer": to_peer, "peerToHost": to_host}
+        host = _Endpoint(loop, to_peer.feed)
+        self._endpoints.append(host)
+        peer = _Endpoint(loop, to_host.feed, self.device, self.device_baud)
+        self._endpoints.append(peer)
+        to_peer.target, to_host.target = peer, host
+        self.path, self.peer_path = host.path, peer.path
+        for link, path in ((self.link, host.path), (None if self.device else self.peer_link, peer.path)):
+            if link:
+                if os.path.islink(link):
+                    os.unlink(link)
+                os.symlink(path, link)
+                self._links.append(link)
+        self._started = time.monotonic()
+
+    def stop(self):
+        for direction in self._directions.values():
+            direction.cancel()
+        for endpoint in self._endpoints:
+            endpoint.close()
+        self._endpoints.clear()
+        for link in self._links:
+            if os.path.islink(link):
+                os.unlink(link)
+        self._links.clear()
+
+    async def __aenter__(self) -> "LinkEmulator":
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.stop()
+
+    def stats(self) -> dict:
+        seconds = time.monotonic() - self._started if self._started else 0.0
+        return {
+            "profile": self.profile.as_dict(),
+            "seconds": round(seconds, 3),
+            **{name: direction.stats.as_dict(seconds) for name, direction in self._directions.items()},
+        }
+
+# ========== FUNCIÓN PRINCIPAL ==========
+
+async def run_emulator(args: argparse.Namespace):
+    profile = LinkProfile(args.baud, args.latency_ms / 1000, args.byte_latency_us / 1e6, args.jitter_ms / 1000,
+                          args.drop_rate, args.fragment)
+    emulator = LinkEmulator(profile, args.device, args.device_baud, args.link, args.peer_link, args.seed)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    async with emulator:
+        print("=" * 80)
+        print("🔌 EMULADOR DE ENLACE SERIAL")
+        print("=" * 80)
+        print()
+        print(f"   Host:   {args.link or emulator.path}")
+        print(f"   Equipo: {args.device or args.peer_link or emulator.peer_path}")
+        print(f"   Enlace: {json.dumps(profile.as_dict())}")
+        print()
+        print("⏳ Reenviando (Ctrl+C para terminar)...")
+
+        started = time.monotonic()
+        while not stop.is_set():
+            timeout = args.stats_interval or None
+            if args.duration:
+                remaining = args.duration - (time.monotonic() - started)
+                if remaining <= 0:
+                    break
+                timeout = min(timeout or remaining, remaining)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout)
+            except asyncio.TimeoutError:
+                if args.stats_interval:
+                    print(f"📊 {json.dumps(emulator.stats())}")
+
+        print()
+        print(f"📊 {json.dumps(emulator.stats())}")
+        if args.stats:
+            with open(args.stats, "w") as f:
+                json.dump(emulator.stats(), f, indent=2)
+            print(f"📝 Estadísticas: {args.stats}")
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Emulador de enlace serial (baudios, latencia, pérdida) entre pty")
+    parser.add_argument("--device", help="Extremo del equipo: pty del simulador o puerto real (sin esto, otro pty)")
+    parser.add_argument("--device-baud", type=int, default=0,
+                        help="Velocidad a configurar en --device si es un puerto real")
+    parser.add_argument("--link", help="Symlink al pty del lado host")
+    parser.add_argument("--peer-link", help="Symlink al segundo pty (sin --device)")
+    parser.add_argument("--baud", type=int, default=0, help="Velocidad emulada (0 = sin límite)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latencia por bloque, en cada sentido")
+    parser.add_argument("--byte-latency-us", type=float, default=0.0, help="Latencia adicional por byte")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Jitter máximo por bloque")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Probabilidad de perder cada byte")
+    parser.add_argument("--fragment", type=int, default=0, help="Máximo de bytes por entrega (0 = sin fragmentar)")
+    parser.add_argument("--seed", type=int, help="Semilla para jitter, pérdidas y fragmentación")
+    parser.add_argument("--duration", type=float, default=0, help="Segundos de ejecución (0 = sin límite)")
+    parser.add_argument("--stats-interval", type=float, default=0, help="Imprimir estadísticas cada N segundos")
+    parser.add_argument("--stats", help="Guardar las estadísticas finales en este JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(run_emulator(args))
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
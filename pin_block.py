@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+PIN blocks ISO 9564 (formatos 0, 1, 3 y 4).
+
+Formatos 0, 1 y 3: arma y decodifica el bloque en claro de 8 bytes. El
+cifrado/descifrado con la llave de sesión lo hace quien llama (ver
+dukpt_tdes.py).
+
+Formato 4 (AES, 16 bytes): el PAN se combina entre dos cifrados, así que
+el bloque no existe en claro fuera del cifrado; encrypt_pin_block_format4
+y decrypt_pin_block_format4 reciben la llave AES.
+"""
+
+import os
+from typing import Optional
+
+from cipher_cache import ecb_decrypt, ecb_encrypt
+
+PIN_BLOCK_FORMATS = (0, 1, 3)
+PIN_BLOCK_FORMAT_4 = 4
+
+# ========== FUNCIONES AUXILIARES ==========
+
+def pan_block(pan: str) -> bytes:
+    """
+    Arma el bloque de PAN: 0000 + 12 dígitos más a la derecha sin el dígito verificador.
+    """
+    digits = ''.join(c for c in pan if c.isdigit())
+    if len(digits) < 13:
+        raise ValueError("El PAN debe tener al menos 13 dígitos")
+    return bytes.fromhex("0000" + digits[-13:-1])
+
+def _fill_nibbles(count: int, pin_format: int) -> str:
+    """Relleno del bloque: F (formato 0), aleatorio (1) o aleatorio A-F (3)."""
+    if pin_format == 0:
+        return "F" * count
+    random = os.urandom(count)
+    if pin_format == 1:
+        return ''.join(f"{b & 0x0F:X}" for b in random)
+    return ''.join("ABCDEF"[b % 6] for b in random)
+
+# ========== CODIFICACIÓN ==========
+
+def encode_pin_block(pin: str, pin_format: int = 0, pan: Optional[str] = None) -> bytes:
+    """
+    Arma un PIN block en claro.
+
+    Args:
+        pin: PIN de 4 a 12 dígitos
+        pin_format: 0, 1 o 3
+        pan: PAN (requerido para formatos 0 y 3)
+
+    Returns:
+        PIN block en claro (8 bytes)
+    """
+    if pin_format not in PIN_BLOCK_FORMATS:
+        raise ValueError(f"Formato de PIN block no soportado: {pin_format}")
+    if not (pin.isdigit() and 4 <= len(pin) <= 12):
+        raise ValueError("El PIN debe tener entre 4 y 12 dígitos")
+
+    field = f"{pin_format:X}{len(pin):X}{pin}"
+    field += _fill_nibbles(16 - len(field), pin_format)
+    block = bytes.fromhex(field)
+
+    if pin_format == 1:
+        return block
+    if pan is None:
+        raise ValueError(f"El formato {pin_format} requiere PAN")
+    return bytes(a ^ b for a, b in zip(block, pan_block(pan)))
+
+def decode_pin_block(block: bytes, pan: Optional[str] = None) -> str:
+    """
+    Extrae el PIN de un PIN block en claro, validando su estructura.
+
+    Args:
+        block: PIN block en claro (8 bytes)
+        pan: PAN (requerido para formatos 0 y 3)
+
+    Returns:
+        PIN
+
+    Raises:
+        ValueError: si el bloque no es un PIN block válido
+    """
+    if len(block) != 8:
+        raise ValueError("El PIN block debe tener 8 bytes")
+
+    pin_format = block[0] >> 4
+    if pin_format not in PIN_BLOCK_FORMATS:
+        raise ValueError(f"Formato de PIN block no soportado: {pin_format}")
+    if pin_format != 1:
+        if pan is None:
+            raise ValueError(f"El formato {pin_format} requiere PAN")
+        block = bytes(a ^ b for a, b in zip(block, pan_block(pan)))
+
+    field = block.hex().upper()
+    length = int(field[1], 16)
+    if not 4 <= length <= 12:
+        raise ValueError(f"Longitud de PIN inválida: {length}")
+
+    pin = field[2:2 + length]
+    fill = field[2 + length:]
+    if not pin.isdigit():
+        raise ValueError("El PIN contiene caracteres no numéricos")
+    if pin_format == 0 and fill != "F" * len(fill):
+        raise ValueError("Relleno inválido para formato 0")
+    if pin_format == 3 and any(c not in "ABCDEF" for c in fill):
+        raise ValueError("Relleno inválido para formato 3")
+    return pin
+
+# ========== FORMATO 4 (AES) ==========
+
+def pan_field_format4(pan: str) -> bytes:
+    """
+    Campo de PAN del formato 4 (16 bytes): largo del PAN menos 12 en el
+    primer nibble, el PAN completo y ceros a la derecha.
+    """
+    digits = ''.join(c for c in pan if c.isdigit())
+    if not 12 <= len(digits) <= 19:
+        raise ValueError("El PAN debe tener entre 12 y 19 dígitos")
+    return bytes.fromhex(f"{len(digits) - 12:X}{digits}".ljust(32, "0"))
+
+def pin_field_format4(pin: str) -> bytes:
+    """
+    Campo de PIN del formato 4 (16 bytes): 4, largo, PIN, relleno A hasta
+    el byte 8 y 8 bytes aleatorios.
+    """
+    if not (pin.isdigit() and 4 <= len(pin) <= 12):
+        raise ValueError("El PIN debe tener entre 4 y 12 dígitos")
+    field = f"4{len(pin):X}{pin}".ljust(16, "A")
+    return bytes.fromhex(field) + os.urandom(8)
+
+def encrypt_pin_block_format4(key: bytes, pin: str, pan: str) -> bytes:
+    """
+    Cifra un PIN block formato 4: E(K, E(K, campo de PIN) XOR campo de PAN).
+
+    Args:
+        key: Llave AES (p. ej. la llave PIN de DUKPT AES)
+        pin: PIN de 4 a 12 dígitos
+        pan: PAN de 12 a 19 dígitos
+
+    Returns:
+        PIN block cifrado (16 bytes)
+    """
+    intermediate = ecb_encrypt("AES", key, pin_field_format4(pin))
+    return ecb_encrypt("AES", key, bytes(a ^ b for a, b in zip(intermediate, pan_field_format4(pan))))
+
+def decrypt_pin_block_format4(key: bytes, block: bytes, pan: str) -> str:
+    """
+    Descifra un PIN block formato 4 y valida su estructura.
+
+    Returns:
+        PIN
+
+    Raises:
+        ValueError: si el bloque no es un PIN block formato 4 válido
+    """
+    if len(block) != 16:
+        raise ValueError("El PIN block formato 4 debe tener 16 bytes")
+    intermediate = ecb_decrypt("AES", key, block)
+    field = ecb_decrypt("AES", key, bytes(a ^ b for a, b in zip(intermediate, pan_field_format4(pan))))
+
+    field_hex = field[:8].hex().upper()
+    if field_hex[0] != "4":
+        raise ValueError(f"Formato de PIN block no soportado: {field_hex[0]}")
+    length = int(field_hex[1], 16)
+    if not 4 <= length <= 12:
+        raise ValueError(f"Longitud de PIN inválida: {length}")
+    pin = field_hex[2:2 + length]
+    fill = field_hex[2 + length:]
+    if not pin.isdigit():
+        raise ValueError("El PIN contiene caracteres no numéricos")
+    if fill != "A" * len(fill):
+        raise ValueError("Relleno inválido para formato 4")
+    return pin
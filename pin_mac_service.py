@@ -0,0 +1,763 @@
+#!/usr/bin/env python3
+"""
+Servicio de verificación de PIN blocks y MAC con DUKPT.
+
+Para terminales inyectados con las IPEK de generate_dukpt_keys.py: recibe
+KSN + PIN block cifrado + PAN (o KSN + mensaje + MAC), deriva la llave de
+sesión desde la BDK y devuelve el PIN en claro o el resultado de la
+verificación. Se usa como librería (VerificationService) o como servidor
+TCP asyncio (JSON Lines), e incluye un generador de carga.
+
+Uso:
+    python3 pin_mac_service.py serve --bdk FFFF987654=<hex> --bdk FFFF000001=AES:<hex> --port 9100
+    python3 pin_mac_service.py load --bdk FFFF987654=<hex> --requests 20000 --connections 8
+    python3 pin_mac_service.py load --bdk-file bdks.json --host 127.0.0.1 --port 9100
+
+    service = VerificationService(load_bdks(["FFFF987654=0123..."]))
+    status, pin = service.verify_pin("FFFF9876540000200001", "8A1B...", "4012345678909")
+
+BDKs:
+    BDK_ID=HEX es DUKPT TDES (X9.24-1, PIN blocks ISO 0/1/3 de 8 bytes y
+    Retail MAC); BDK_ID=AES:HEX es DUKPT AES (X9.24-3, PIN block ISO 4 de
+    16 bytes y AES-CMAC). --bdk-file acepta un JSON {BDK_ID: "HEX" o "AES:HEX"}.
+    Los KSN van en el formato Futurex de 10 bytes (contador en los 21 bits
+    bajos). Para AES también se acepta el KSN de 12 bytes de X9.24-3
+    (Initial Key ID de 8 bytes + contador de 4); su BDK ID son los primeros
+    4 bytes, así que esas BDK se declaran con un BDK_ID de 8 caracteres.
+
+Protocolo (una línea JSON por pedido y por respuesta, en orden de llegada
+de las respuestas, correlacionadas por "id"):
+    {"id": 1, "op": "pin", "ksn": "...", "pinBlock": "...", "pan": "...", "pin": "1234"}
+    {"id": 2, "op": "mac", "ksn": "...", "data": "<hex>", "mac": "<hex>", "response": false}
+    -> {"id": 1, "status": "OK"}   ("pin" se devuelve solo si el pedido no trae el esperado)
+
+    Un pedido con campos faltantes o de otro tipo (p. ej. "pan" numérico)
+    se responde INVALID_REQUEST; si falla el lote completo, cada pedido del
+    lote se responde INTERNAL_ERROR.
+
+Los pedidos de todas las conexiones se agrupan por BDK ID en lotes
+(--batch-size / --batch-window-ms); con --processes > 1 cada BDK ID va
+siempre al mismo proceso, que conserva sus motores y su cache de llaves
+de sesión (por KSN y uso, con TTL).
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from cipher_cache import cache_info as cipher_cache_info, ecb_decrypt, ecb_encrypt
+from dukpt_aes import MAX_COUNTER_ONE_BITS as AES_MAX_COUNTER_ONE_BITS, AesDukptEngine
+from dukpt_tdes import (
+    BDK_ID_LENGTH, ENGINE_CACHE_SIZE, STATUS_INVALID_KSN, STATUS_INVALID_PIN_BLOCK, STATUS_MISMATCH,
+    STATUS_OK, STATUS_UNKNOWN_BDK, TdesDukptEngine, TdesDukptOriginator, initial_ksn,
+)
+from generate_dukpt_keys import (
+    KSN_COUNTER_BITS, KSN_COUNTER_MASK, build_ksn, bytes_to_hex, derive_ipek_3des, derive_ipek_aes,
+    hex_to_bytes,
+)
+from inject_profile import latency_summary
+from pin_block import (
+    decode_pin_block, decrypt_pin_block_format4, encode_pin_block, encrypt_pin_block_format4,
+)
+from retail_mac import message_mac, verify_mac
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 9100
+DEFAULT_SESSION_TTL = 300.0  # Segundos que una llave de sesión queda en cache
+DEFAULT_SESSION_CACHE_SIZE = 100000
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_BATCH_WINDOW = 0.002
+MAX_INFLIGHT_PER_CONNECTION = 1024
+LOAD_PAN = "4012345678909"
+
+STATUS_INVALID_REQUEST = "INVALID_REQUEST"
+STATUS_INVALID_MAC = "INVALID_MAC"
+STATUS_INTERNAL_ERROR = "INTERNAL_ERROR"
+AES_BDK_ID_LENGTH = 4  # BDK ID de un KSN X9.24-3 de 12 bytes
+AES_KSN_LENGTH = 12
+
+# Usos de llave de sesión por algoritmo: (PIN, MAC de pedido, MAC de respuesta)
+TDES_USAGES = ("PIN", "MAC_REQUEST", "MAC_RESPONSE")
+AES_USAGES = ("PIN", "MAC_GEN", "MAC_VERIFY")
+
+# ========== CONFIGURACIÓN ==========
+
+@dataclass(frozen=True)
+class BdkConfig:
+    bdk_id: str
+    key: bytes
+    algorithm: str  # "3DES" o "AES"
+
+def parse_bdk(bdk_id: str, value: str) -> BdkConfig:
+    """BDK desde "HEX" (TDES) o "AES:HEX"."""
+    algorithm, _, key_hex = value.rpartition(":")
+    algorithm = "AES" if algorithm.upper().startswith("AES") else "3DES"
+    bdk_id = bdk_id.strip().upper()
+    if len(bdk_id) != BDK_ID_LENGTH * 2 and not (algorithm == "AES" and len(bdk_id) == AES_BDK_ID_LENGTH * 2):
+        raise ValueError(f"BDK ID inválido: {bdk_id} (se esperan 10 caracteres hex, u 8 para AES X9.24-3)")
+    key = hex_to_bytes(key_hex.strip())
+    if algorithm == "3DES" and len(key) != 16:
+        raise ValueError(f"BDK {bdk_id}: DUKPT TDES requiere 16 bytes")
+    if algorithm == "AES" and len(key) not in (16, 24, 32):
+        raise ValueError(f"BDK {bdk_id}: longitud AES inválida ({len(key)} bytes)")
+    return BdkConfig(bdk_id, key, algorithm)
+
+def load_bdks(values: Sequence[str] = (), bdk_file: Optional[str] = None) -> Dict[str, BdkConfig]:
+    """BDKs de --bdk BDK_ID=[AES:]HEX y de un JSON {BDK_ID: "[AES:]HEX"}."""
+    bdks: Dict[str, BdkConfig] = {}
+    if bdk_file:
+        with open(bdk_file) as f:
+            for bdk_id, value in json.load(f).items():
+                config = parse_bdk(bdk_id, value)
+                bdks[config.bdk_id] = config
+    for value in values or []:
+        bdk_id, _, key = value.partition("=")
+        config = parse_bdk(bdk_id, key)
+        bdks[config.bdk_id] = config
+    return bdks
+
+def bdk_id_of(ksn_hex: str) -> str:
+    """BDK ID de un KSN: 10 caracteres hex de uno Futurex de 20, 8 de uno X9.24-3 de 24."""
+    if len(ksn_hex) == AES_KSN_LENGTH * 2:
+        return ksn_hex[:AES_BDK_ID_LENGTH * 2].upper()
+    return ksn_hex[:BDK_ID_LENGTH * 2].upper()
+
+def parse_ksn(ksn_hex: str) -> bytes:
+    """KSN Futurex de 10 bytes o KSN X9.24-3 de 12 bytes."""
+    ksn = hex_to_bytes(ksn_hex)
+    if len(ksn) not in (10, AES_KSN_LENGTH):
+        raise ValueError(f"KSN inválido: {ksn_hex}")
+    return ksn
+
+def _text(request: dict, name: str, default: Optional[str] = "") -> Optional[str]:
+    """Campo de texto de un pedido; ValueError si viene con otro tipo."""
+    value = request.get(name, default)
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f"El campo {name} debe ser texto")
+    return value
+
+# ========== CACHE DE LLAVES DE SESIÓN ==========
+
+class SessionKeyCache:
+    """
+    Llaves de sesión por (KSN, uso) con vencimiento y tamaño máximo.
+
+    Como todas las entradas viven lo mismo, el orden de inserción es el
+    orden de vencimiento: purge() solo mira el principio del diccionario.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_SESSION_TTL, max_size: int = DEFAULT_SESSION_CACHE_SIZE,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self._entries: "OrderedDict[Tuple[bytes, str], Tuple[float, bytes]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Tuple[bytes, str]) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > self.clock():
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+            self.expired += 1
+        self.misses += 1
+        return None
+
+    def put(self, key: Tuple[bytes, str], value: bytes):
+        self._entries.pop(key, None)
+        self._entries[key] = (self.clock() + self.ttl, value)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+
+    def purge(self) -> int:
+        """Elimina las llaves vencidas; devuelve cuántas."""
+        now = self.clock()
+        removed = 0
+        while self._entries:
+            key, (expires, _) = next(iter(self._entries.items()))
+            if expires > now:
+                break
+            del self._entries[key]
+            removed += 1
+        self.expired += removed
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "expired": self.expired, "evicted": self.evicted}
+
+# ========== VERIFICACIÓN ==========
+
+class VerificationService:
+    """
+    Verifica PIN blocks y MAC de terminales DUKPT TDES y AES.
+
+    Mantiene un motor DUKPT por terminal (KSN inicial) en un LRU acotado y
+    las llaves de sesión ya derivadas en un SessionKeyCache, así que el PIN
+    y el MAC de una misma transacción derivan la llave una sola vez.
+    """
+
+    def __init__(self, bdks: Dict[str, BdkConfig], session_ttl: float = DEFAULT_SESSION_TTL,
+                 session_cache_size: int = DEFAULT_SESSION_CACHE_SIZE,
+                 engine_cache_size: int = ENGINE_CACHE_SIZE):
+        self.bdks = bdks
+        self.sessions = SessionKeyCache(session_ttl, session_cache_size)
+        self.engine_cache_size = engine_cache_size
+        self._engines: "OrderedDict[bytes, object]" = OrderedDict()
+        self.requests = 0
+        self.batches = 0
+        self.statuses: Dict[str, int] = {}
+
+    def _engine(self, config: BdkConfig, ksn: bytes):
+        # Terminal: KSN Futurex sin contador, o Initial Key ID del KSN de 12 bytes
+        key = ksn[:8] + bytes(4) if len(ksn) == AES_KSN_LENGTH else initial_ksn(ksn)
+        engine = self._engines.get(key)
+        if engine is None:
+            if config.algorithm == "AES":
+                engine = AesDukptEngine.from_bdk(config.key, key)
+            else:
+                engine = TdesDukptEngine.from_bdk(config.key, key)
+            self._engines[key] = engine
+            if len(self._engines) > self.engine_cache_size:
+                self._engines.popitem(last=False)
+        else:
+            self._engines.move_to_end(key)
+        return engine
+
+    def session_key(self, config: BdkConfig, ksn: bytes, usage: str) -> bytes:
+        """Llave de sesión de un KSN para un uso (PIN, MAC_REQUEST/MAC_GEN, ...)."""
+        cached = self.sessions.get((ksn, usage))
+        if cached is not None:
+            return cached
+        engine = self._engine(config, ksn)
+        if config.algorithm == "AES":
+            key = engine.working_key(ksn, usage)
+        else:
+            key = engine.session_key(ksn, usage)
+        self.sessions.put((ksn, usage), key)
+        return key
+
+    def _config(self, ksn_hex: str) -> Tuple[Optional[BdkConfig], bytes]:
+        ksn = parse_ksn(ksn_hex)
+        config = self.bdks.get(bdk_id_of(bytes_to_hex(ksn)))
+        if config is not None and len(ksn) == AES_KSN_LENGTH and config.algorithm != "AES":
+            raise ValueError(f"KSN de 12 bytes para la BDK TDES {config.bdk_id}")
+        return config, ksn
+
+    def verify_pin(self, ksn_hex: str, pin_block_hex: str, pan: Optional[str] = None,
+                   expected_pin: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Descifra un PIN block y, si se indica, lo compara con el PIN esperado.
+
+        Returns:
+            (estado, PIN descifrado o vacío)
+        """
+        try:
+            config, ksn = self._config(ksn_hex)
+            pin_block = hex_to_bytes(pin_block_hex)
+        except ValueError:
+            return STATUS_INVALID_KSN, ""
+        if config is None:
+            return STATUS_UNKNOWN_BDK, ""
+        try:
+            if config.algorithm == "AES":
+                key = self.session_key(config, ksn, AES_USAGES[0])
+                pin = decrypt_pin_block_format4(key, pin_block, pan or "")
+            else:
+                if len(pin_block) != 8:
+                    raise ValueError("El PIN block TDES debe tener 8 bytes")
+                key = self.session_key(config, ksn, TDES_USAGES[0])
+                pin = decode_pin_block(ecb_decrypt("TDES", key, pin_block), pan or None)
+        except ValueError:
+            return STATUS_INVALID_PIN_BLOCK, ""
+        if expected_pin and pin != expected_pin:
+            return STATUS_MISMATCH, pin
+        return STATUS_OK, pin
+
+    def verify_mac(self, ksn_hex: str, data: bytes, mac_hex: str, response: bool = False) -> str:
+        """
+        Verifica el MAC (posiblemente truncado) de un mensaje.
+
+        Args:
+            response: True si el MAC es de una respuesta del host (variante/uso de respuesta)
+        """
+        try:
+            config, ksn = self._config(ksn_hex)
+            mac = hex_to_bytes(mac_hex)
+        except ValueError:
+            return STATUS_INVALID_KSN
+        if config is None:
+            return STATUS_UNKNOWN_BDK
+        usages = AES_USAGES if config.algorithm == "AES" else TDES_USAGES
+        try:
+            key = self.session_key(config, ksn, usages[2] if response else usages[1])
+        except ValueError:
+            return STATUS_INVALID_KSN
+        if not verify_mac(mac, message_mac(key, data, config.algorithm)):
+            return STATUS_INVALID_MAC
+        return STATUS_OK
+
+    def process(self, request: dict) -> dict:
+        """
+        Atiende un pedido del protocolo y arma la respuesta.
+
+        Cualquier error propio del pedido (campos de otro tipo, hex inválido,
+        ...) se responde INVALID_REQUEST para no tirar abajo el lote.
+        """
+        response = {"id": request.get("id")}
+        op = request.get("op")
+        try:
+            if op == "pin":
+                expected = _text(request, "pin", None)
+                status, pin = self.verify_pin(_text(request, "ksn"), _text(request, "pinBlock"),
+                                              _text(request, "pan", None), expected)
+                if pin and not expected:
+                    response["pin"] = pin
+            elif op == "mac":
+                flag = request.get("response", False)
+                if not isinstance(flag, bool):
+                    raise ValueError("El campo response debe ser booleano")
+                status = self.verify_mac(_text(request, "ksn"), hex_to_bytes(_text(request, "data")),
+                                         _text(request, "mac"), flag)
+            else:
+                status = STATUS_INVALID_REQUEST
+        except Exception:
+            status = STATUS_INVALID_REQUEST
+        response["status"] = status
+        self.requests += 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        return response
+
+    def process_batch(self, requests: Sequence[dict]) -> List[dict]:
+        """
+        Atiende un lote ordenándolo por KSN, para que las transacciones de un
+        mismo terminal reutilicen su motor y su cache de llaves intermedias.
+        Las respuestas vuelven en el orden de los pedidos.
+        """
+        self.batches += 1
+        self.sessions.purge()
+        order = sorted(range(len(requests)), key=lambda i: str(requests[i].get("ksn", "")))
+        responses: List[Optional[dict]] = [None] * len(requests)
+        for index in order:
+            responses[index] = self.process(requests[index])
+        return responses
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "statuses": dict(self.statuses),
+            "engines": len(self._engines),
+            "sessionKeys": self.sessions.stats(),
+            "cipherContexts": cipher_cache_info(),
+        }
+
+# ========== PROCESOS DE TRABAJO ==========
+
+_service: Optional[VerificationService] = None
+
+def _init_worker(bdks: Dict[str, BdkConfig], session_ttl: float, session_cache_size: int):
+    global _service
+    _service = VerificationService(bdks, session_ttl, session_cache_size)
+
+def _process_batch(requests: List[dict]) -> List[dict]:
+    return _service.process_batch(requests)
+
+def _worker_stats() -> dict:
+    return _service.stats()
+
+# ========== LOTES POR BDK ==========
+
+class BatchDispatcher:
+    """
+    Junta los pedidos de todas las conexiones por BDK ID y los atiende en lotes.
+
+    Un lote se despacha al llegar a batch_size pedidos o batch_window
+    segundos después del primero. Con processes > 1 cada BDK ID tiene un
+    proceso fijo (afinidad), así los motores y llaves de sesión de sus
+    terminales quedan en un solo lugar.
+    """
+
+    def __init__(self, bdks: Dict[str, BdkConfig], processes: int = 1,
+                 batch_size: int = DEFAULT_BATCH_SIZE, batch_window: float = DEFAULT_BATCH_WINDOW,
+                 session_ttl: float = DEFAULT_SESSION_TTL,
+                 session_cache_size: int = DEFAULT_SESSION_CACHE_SIZE):
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.service: Optional[VerificationService] = None
+        self._executors: List[ProcessPoolExecutor] = []
+        if processes > 1:
+            self._executors = [ProcessPoolExecutor(1, initializer=_init_worker,
+                                                   initargs=(bdks, session_ttl, session_cache_size))
+                               for _ in range(processes)]
+        else:
+            self.service = VerificationService(bdks, session_ttl, session_cache_size)
+        self._shards = {bdk_id: index for index, bdk_id in enumerate(sorted(bdks))}
+        self._pending: Dict[str, List[Tuple[dict, asyncio.Future]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self.batches = 0
+        self.largest_batch = 0
+
+    def submit(self, request: dict) -> asyncio.Future:
+        """Encola un pedido; el future se completa con la respuesta."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        bdk_id = bdk_id_of(str(request.get("ksn", "")))
+        group = self._pending.setdefault(bdk_id, [])
+        group.append((request, future))
+        if len(group) >= self.batch_size:
+            self._flush(bdk_id)
+        elif bdk_id not in self._timers:
+            self._timers[bdk_id] = loop.call_later(self.batch_window, self._flush, bdk_id)
+        return future
+
+    def _flush(self, bdk_id: str):
+        timer = self._timers.pop(bdk_id, None)
+        if timer:
+            timer.cancel()
+        group = self._pending.pop(bdk_id, None)
+        if not group:
+            return
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(group))
+        requests = [request for request, _ in group]
+        if self.service is not None:
+            try:
+                responses = self.service.process_batch(requests)
+            except Exception as e:
+                self._fail(group, e)
+                return
+            self._deliver(group, responses)
+            return
+        executor = self._executors[self._shards.get(bdk_id, hash(bdk_id)) % len(self._executors)]
+        result = asyncio.get_running_loop().run_in_executor(executor, _process_batch, requests)
+        result.add_done_callback(lambda done: self._deliver(group, done.result()) if not done.exception()
+                                 else self._fail(group, done.exception()))
+
+    @staticmethod
+    def _deliver(group: List[Tuple[dict, asyncio.Future]], responses: List[dict]):
+        for (_, future), response in zip(group, responses):
+            if not future.done():
+                future.set_result(response)
+
+    @staticmethod
+    def _fail(group: List[Tuple[dict, asyncio.Future]], error: BaseException):
+        for _, future in group:
+            if not future.done():
+                future.set_exception(error)
+
+    async def stats(self) -> dict:
+        result = {"batches": self.batches, "largestBatch": self.largest_batch}
+        if self.service is not None:
+            result["workers"] = [self.service.stats()]
+        else:
+            loop = asyncio.get_running_loop()
+            result["workers"] = [await loop.run_in_executor(executor, _worker_stats)
+                                 for executor in self._executors]
+        return result
+
+    def close(self):
+        for timer in self._timers.values():
+            timer.cancel()
+        for executor in self._executors:
+            executor.shutdown(cancel_futures=True)
+
+# ========== SERVIDOR TCP ==========
+
+class VerificationServer:
+    """
+    Servidor JSON Lines sobre TCP.
+
+    Uso:
+        async with VerificationServer(dispatcher, port=9100) as server:
+            await server.serve_forever()
+    """
+
+    def __init__(self, dispatcher: BatchDispatcher, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        self.dispatcher = dispatcher
+        self.host = host
+        self.port = port
+        self.connections = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers = set()
+
+    async def __aenter__(self) -> "VerificationServer":
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        self._server.close()
+        for handler in list(self._handlers):
+            handler.cancel()
+        if self._handlers:
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+        await self._server.wait_closed()
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        handler = asyncio.current_task()
+        self._handlers.add(handler)
+        inflight = asyncio.Semaphore(MAX_INFLIGHT_PER_CONNECTION)
+        tasks = set()
+
+        async def answer(request: dict, future: asyncio.Future):
+            try:
+                response = await future
+            except Exception:
+                # Falló el lote completo: igual se responde cada pedido
+                response = {"id": request.get("id"), "status": STATUS_INTERNAL_ERROR}
+            finally:
+                inflight.release()
+            writer.write(json.dumps(response).encode() + b"\n")
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                await inflight.acquire()
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError
+                except ValueError:
+                    inflight.release()
+                    writer.write(json.dumps({"id": None, "status": STATUS_INVALID_REQUEST}).encode() + b"\n")
+                    continue
+                task = asyncio.ensure_future(answer(request, self.dispatcher.submit(request)))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                if writer.transport.get_write_buffer_size() > 1 << 20:
+                    await writer.drain()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._handlers.discard(handler)
+            writer.close()
+
+# ========== GENERADOR DE CARGA ==========
+
+def _aes_counters(count: int) -> List[int]:
+    """Primeros `count` contadores válidos (a lo sumo 16 bits en 1) dentro de los 21 bits del KSN."""
+    counters = []
+    counter = 1
+    while len(counters) < count and counter < 1 << KSN_COUNTER_BITS:
+        if bin(counter).count("1") <= AES_MAX_COUNTER_ONE_BITS:
+            counters.append(counter)
+        counter += 1
+    return counters
+
+def _is_mac_request(number: int, mac_ratio: float) -> bool:
+    """Reparte los pedidos MAC en forma pareja según la fracción pedida."""
+    return int((number + 1) * mac_ratio) > int(number * mac_ratio)
+
+def build_load_requests(bdks: Dict[str, BdkConfig], total: int, terminals: int = 100,
+                        mac_ratio: float = 0.5, pan: str = LOAD_PAN) -> List[dict]:
+    """
+    Pedidos válidos de terminales simulados (PIN y MAC intercalados).
+
+    Cada terminal parte de la IPEK que le inyectaría generate_dukpt_keys.py
+    (derive_ipek_3des / derive_ipek_aes) y genera sus transacciones como lo
+    haría el PED: TdesDukptOriginator para TDES y un AesDukptEngine sobre
+    la IPEK para AES. Todas las respuestas esperadas son OK.
+    """
+    per_terminal = max(1, -(-total // (terminals * max(1, len(bdks)))))
+    requests: List[dict] = []
+    for config in bdks.values():
+        bdk_id = hex_to_bytes(config.bdk_id)
+        for device in range(terminals):
+            ksn0 = build_ksn(bdk_id, device + 1)
+            if config.algorithm == "AES":
+                engine = AesDukptEngine(derive_ipek_aes(config.key, ksn0), ksn0)
+            else:
+                originator = TdesDukptOriginator(derive_ipek_3des(config.key, ksn0), ksn0)
+            counters = _aes_counters(per_terminal) if config.algorithm == "AES" else range(per_terminal)
+            for number, counter in enumerate(counters):
+                pin = f"{(device * 7919 + number) % 10000:04d}"
+                is_mac = _is_mac_request(number, mac_ratio)
+                if config.algorithm == "AES":
+                    ksn = (int.from_bytes(ksn0, 'big') | counter).to_bytes(10, 'big')
+                    key = engine.mac_key(ksn) if is_mac else engine.pin_key(ksn)
+                else:
+                    ksn, key = originator.next_transaction(TDES_USAGES[1] if is_mac else TDES_USAGES[0])
+                request = {"id": len(requests), "ksn": bytes_to_hex(ksn)}
+                if is_mac:
+                    data = f"{bytes_to_hex(ksn)}|{pin}|{number:08d}".encode()
+                    request.update({"op": "mac", "data": data.hex().upper(),
+                                    "mac": bytes_to_hex(message_mac(key, data, config.algorithm)[:8])})
+                elif config.algorithm == "AES":
+                    request.update({"op": "pin", "pan": pan, "pin": pin,
+                                    "pinBlock": bytes_to_hex(encrypt_pin_block_format4(key, pin, pan))})
+                else:
+                    block = ecb_encrypt("TDES", key, encode_pin_block(pin, 0, pan))
+                    request.update({"op": "pin", "pan": pan, "pin": pin, "pinBlock": bytes_to_hex(block)})
+                requests.append(request)
+    # Intercalar terminales (por número de transacción), como llegan en producción
+    requests.sort(key=lambda r: (int(r["ksn"], 16) & KSN_COUNTER_MASK, r["ksn"]))
+    return requests[:total]
+
+async def run_load(host: str, port: int, requests: Sequence[dict], connections: int = 8,
+                   window: int = 64) -> dict:
+    """
+    Envía los pedidos repartidos entre `connections` conexiones, con hasta
+    `window` pedidos sin respuesta por conexión.
+
+    Returns:
+        Resumen con pedidos/s, latencias y estados
+    """
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+
+    async def client(part: Sequence[dict]):
+        reader, writer = await asyncio.open_connection(host, port)
+        sent_at: Dict[object, float] = {}
+        slots = asyncio.Semaphore(window)
+
+        async def receive():
+            for _ in range(len(part)):
+                response = json.loads(await reader.readline())
+                latencies.append((time.perf_counter() - sent_at.pop(response["id"])) * 1000)
+                statuses[response["status"]] = statuses.get(response["status"], 0) + 1
+                slots.release()
+
+        receiver = asyncio.ensure_future(receive())
+        for request in part:
+            await slots.acquire()
+            sent_at[request["id"]] = time.perf_counter()
+            writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+        await receiver
+        writer.close()
+        await writer.wait_closed()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(requests[i::connections]) for i in range(connections)))
+    seconds = time.perf_counter() - started
+    return {
+        "requests": len(requests),
+        "connections": connections,
+        "window": window,
+        "seconds": round(seconds, 4),
+        "requestsPerSecond": round(len(requests) / seconds, 1) if seconds else 0.0,
+        "latency": latency_summary(latencies),
+        "statuses": statuses,
+    }
+
+# ========== FUNCIÓN PRINCIPAL ==========
+
+async def _serve(args: argparse.Namespace, bdks: Dict[str, BdkConfig]) -> int:
+    dispatcher = BatchDispatcher(bdks, args.processes, args.batch_size, args.batch_window_ms / 1000,
+                                 args.session_ttl, args.session_cache_size)
+    try:
+        async with VerificationServer(dispatcher, args.host, args.port) as server:
+            print(f"🔐 Servicio de verificación en {server.host}:{server.port} "
+                  f"({len(bdks)} BDK, {max(args.processes, 1)} proceso(s))")
+            await server.serve_forever()
+    finally:
+        dispatcher.close()
+    return 0
+
+async def _load(args: argparse.Namespace, bdks: Dict[str, BdkConfig]) -> int:
+    print(f"⚙️  Generando {args.requests} pedidos de {args.terminals} terminales por BDK...")
+    requests = build_load_requests(bdks, args.requests, args.terminals, args.mac_ratio)
+    server_stats = None
+    if args.host:
+        result = await run_load(args.host, args.port, requests, args.connections, args.window)
+    else:
+        dispatcher = BatchDispatcher(bdks, args.processes, args.batch_size, args.batch_window_ms / 1000,
+                                     args.session_ttl, args.session_cache_size)
+        try:
+            async with VerificationServer(dispatcher, DEFAULT_HOST, 0) as server:
+                result = await run_load(DEFAULT_HOST, server.port, requests, args.connections, args.window)
+                server_stats = await dispatcher.stats()
+        finally:
+            dispatcher.close()
+
+    print("=" * 80)
+    print("🏁 CARGA DEL SERVICIO DE VERIFICACIÓN")
+    print("=" * 80)
+    print()
+    print(f"   Pedidos:      {result['requests']} ({result['connections']} conexiones, ventana {result['window']})")
+    print(f"   Tiempo:       {result['seconds']:.2f} s")
+    print(f"   Pedidos/s:    {result['requestsPerSecond']:,.0f}")
+    latency = result["latency"]
+    print(f"   Latencia ms:  p50 {latency['p50Ms']}  p90 {latency['p90Ms']}  p99 {latency['p99Ms']}  "
+          f"máx {latency['maxMs']}")
+    for status, count in sorted(result["statuses"].items()):
+        print(f"   {status:18s} {count}")
+    if server_stats:
+        result["server"] = server_stats
+        sessions = [worker["sessionKeys"] for worker in server_stats["workers"]]
+        print(f"   Lotes:        {server_stats['batches']} (máx. {server_stats['largestBatch']} pedidos)")
+        print(f"   Llaves de sesión en cache: {sum(s['size'] for s in sessions)} "
+              f"(aciertos {sum(s['hits'] for s in sessions)}, fallos {sum(s['misses'] for s in sessions)})")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"📝 Resultados: {args.json}")
+    return 0 if set(result["statuses"]) <= {STATUS_OK} else 1
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Verificación de PIN blocks y MAC DUKPT")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="Levantar el servidor TCP")
+    load = sub.add_parser("load", help="Generador de carga (contra --host, o contra un servidor propio)")
+    for command in (serve, load):
+        command.add_argument("--bdk", action="append", help="BDK_ID=HEX o BDK_ID=AES:HEX (repetible)")
+        command.add_argument("--bdk-file", help="JSON {BDK_ID: \"[AES:]HEX\"}")
+        command.add_argument("--port", type=int, default=DEFAULT_PORT)
+        command.add_argument("--processes", type=int, default=1, help="Procesos de verificación")
+        command.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Pedidos por lote")
+        command.add_argument("--batch-window-ms", type=float, default=DEFAULT_BATCH_WINDOW * 1000,
+                             help="Espera máxima para completar un lote")
+        command.add_argument("--session-ttl", type=float, default=DEFAULT_SESSION_TTL,
+                             help="Segundos que una llave de sesión queda en cache")
+        command.add_argument("--session-cache-size", type=int, default=DEFAULT_SESSION_CACHE_SIZE)
+    serve.add_argument("--host", default=DEFAULT_HOST)
+    load.add_argument("--host", help="Servidor ya levantado (por defecto se levanta uno en el proceso)")
+    load.add_argument("--requests", type=int, default=20000)
+    load.add_argument("--terminals", type=int, default=100, help="Terminales por BDK")
+    load.add_argument("--mac-ratio", type=float, default=0.5, help="Fracción de pedidos MAC")
+    load.add_argument("--connections", type=int, default=8)
+    load.add_argument("--window", type=int, default=64, help="Pedidos sin respuesta por conexión")
+    load.add_argument("--json", help="Guardar el resultado en este JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        bdks = load_bdks(args.bdk, args.bdk_file)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    if not bdks:
+        parser.error("Se requiere al menos una BDK (--bdk o --bdk-file)")
+    try:
+        return asyncio.run(_serve(args, bdks) if args.command == "serve" else _load(args, bdks))
+    except KeyboardInterrupt:
+        return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
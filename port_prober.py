@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+Detección de puertos seriales y del protocolo del equipo conectado.
+
+AisinoPortProber.kt y CH340CableDetector.kt prueban los puertos de a uno.
+En los bancos de retrabajo con 32 o más /dev/ttyUSB* eso lleva minutos,
+así que acá todos los puertos se prueban a la vez desde un único event
+loop de asyncio. En cada puerto, para cada velocidad candidata:
+
+    1. Futurex: comando 03 (leer N/S); la respuesta trae el número de serie
+    2. Legacy: POLL (0100|POLL), que el KeyReceiver responde con 0110|ACK
+
+Un puerto tiene una sola velocidad de línea a la vez, así que las
+velocidades de un mismo puerto se prueban en orden (la del caché primero)
+y el tiempo total es el de un puerto, no la suma de todos.
+
+Uso:
+    python3 port_prober.py
+    python3 port_prober.py /dev/ttyUSB0 "/dev/ttyACM*" --bauds 115200 9600 --timeout 0.3
+    python3 port_prober.py --endpoints endpoints.json --json
+    python3 port_prober.py --watch --interval 1
+
+    results = asyncio.run(probe_ports(["/dev/ttyUSB0", "/dev/ttyUSB1"]))
+    # {"/dev/ttyUSB0": ProbeResult(protocol="FUTUREX", serial_number="...", baud_rate=115200, ...), ...}
+
+Caché: los resultados se guardan por ruta USB (p. ej. "1-2.3:1.0", el
+puerto físico del hub, que no cambia aunque cambie el ttyUSBN), junto con
+la identidad del nodo /dev (número de dispositivo y ctime). Al desconectar
+y reconectar un equipo udev recrea el nodo, la identidad cambia y la
+entrada se descarta; con --watch se vigilan los puertos y se vuelven a
+probar solo los que se conectaron o cambiaron.
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import re
+import signal
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from frame_stream import format_legacy_message, parse_legacy_payload
+from futurex import DEFAULT_VERSION, ReadSerialResponse, format_message, parse_payload
+from keyreceiver_sim import raise_fd_limit
+from serial_link import SerialLink
+
+PROBE_BAUD_RATES = (115200, 9600, 19200, 38400, 57600)  # Orden de AisinoPortProber.kt
+PROBE_TIMEOUT = 0.5  # Timeout de lectura de AisinoPortProber.kt
+PORT_PATTERNS = ("/dev/ttyUSB*", "/dev/ttyACM*")
+DEFAULT_CONCURRENCY = 64
+DEFAULT_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "injector_tools", "puertos.json")
+CACHE_VERSION = 1
+
+PROTOCOL_FUTUREX = "FUTUREX"
+PROTOCOL_LEGACY = "LEGACY"
+PROTOCOLS = (PROTOCOL_FUTUREX, PROTOCOL_LEGACY)
+LEGACY_POLL = ("0100", ("POLL",))
+LEGACY_POLL_RESPONSE = "0110"
+
+# Interfaz USB en sysfs: bus-puerto[.puerto...]:configuración.interfaz
+_USB_INTERFACE = re.compile(r"^\d+-[\d.]+:\d+\.\d+$")
+
+# ========== PUERTOS E IDENTIDAD USB ==========
+
+@dataclass(frozen=True)
+class PortIdentity:
+    """
+    Identidad de un puerto presente.
+
+    usb_path es la clave del caché (la ruta física del puerto USB, o la
+    ruta real del nodo si no es USB, como un pty); device y created_ns
+    cambian cuando udev recrea el nodo al reconectar el equipo.
+    """
+    port: str
+    usb_path: str
+    device: int
+    created_ns: int
+    usb_id: str = ""
+
+    def matches(self, entry: dict) -> bool:
+        return entry.get("port") == self.port and entry.get("device") == self.device \
+            and entry.get("createdNs") == self.created_ns
+
+def _read_sysfs(path: str) -> str:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+def usb_location(port: str) -> Tuple[str, str]:
+    """
+    Ruta USB y VID:PID del adaptador de un puerto (/sys/class/tty/<nombre>/device).
+
+    Returns:
+        ("1-2.3:1.0", "1a86:7523") para un CH340; ("", "") si no es USB
+    """
+    name = os.path.basename(os.path.realpath(port))
+    device = os.path.realpath(f"/sys/class/tty/{name}/device")
+    parts = device.split(os.sep)
+    for index in range(len(parts) - 1, 0, -1):
+        if _USB_INTERFACE.match(parts[index]):
+            usb_device = os.sep.join(parts[:index])
+            vendor = _read_sysfs(os.path.join(usb_device, "idVendor"))
+            product = _read_sysfs(os.path.join(usb_device, "idProduct"))
+            return parts[index], f"{vendor}:{product}" if vendor else ""
+    return "", ""
+
+def port_identity(port: str) -> Optional[PortIdentity]:
+    """Identidad actual del puerto, o None si ya no existe."""
+    try:
+        status = os.stat(port)
+    except OSError:
+        return None
+    usb_path, usb_id = usb_location(port)
+    return PortIdentity(port, usb_path or os.path.realpath(port), status.st_rdev, status.st_ctime_ns, usb_id)
+
+def find_ports(patterns: Iterable[str] = PORT_PATTERNS) -> List[str]:
+    """Puertos que coinciden con las rutas o patrones (glob), sin repetir y en orden."""
+    ports = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        ports.extend(port for port in matches if port not in ports)
+    return ports
+
+def scan_ports(patterns: Iterable[str] = PORT_PATTERNS) -> Dict[str, PortIdentity]:
+    """Puerto -> identidad de los puertos presentes."""
+    identities = {}
+    for port in find_ports(patterns):
+        identity = port_identity(port)
+        if identity is not None:
+            identities[port] = identity
+    return identities
+
+# ========== CACHÉ ==========
+
+class ProbeCache:
+    """
+    Resultados por ruta USB en un JSON.
+
+    Solo se guardan puertos donde respondió un equipo: uno que no respondió
+    se vuelve a probar siempre (la app puede no haber estado escuchando).
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+            if data.get("version") == CACHE_VERSION:
+                self.entries = data.get("ports", {})
+
+    def get(self, identity: PortIdentity) -> Optional[dict]:
+        """Entrada vigente para el puerto; se descarta si el nodo cambió (hotplug)."""
+        entry = self.entries.get(identity.usb_path)
+        if entry is None:
+            return None
+        if not identity.matches(entry):
+            del self.entries[identity.usb_path]
+            return None
+        return entry
+
+    def preferred_baud(self, identity: PortIdentity) -> Optional[int]:
+        """Velocidad del último equipo visto en ese puerto USB, aunque la entrada ya no sea vigente."""
+        entry = self.entries.get(identity.usb_path)
+        return entry.get("baudRate") if entry else None
+
+    def store(self, identity: PortIdentity, result: "ProbeResult"):
+        if result.protocol:
+            self.entries[identity.usb_path] = {
+                **result.as_dict(), "device": identity.device, "createdNs": identity.created_ns,
+                "probedAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+        else:
+            self.entries.pop(identity.usb_path, None)
+
+    def invalidate(self, identity: PortIdentity):
+        self.entries.pop(identity.usb_path, None)
+
+    def save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "ports": self.entries}, f, indent=2)
+        os.replace(temporary, self.path)
+
+# ========== SONDEO ==========
+
+@dataclass
+class ProbeResult:
+    """Resultado de un puerto; protocol vacío si no respondió nada reconocible."""
+    port: str
+    usb_path: str = ""
+    usb_id: str = ""
+    protocol: str = ""
+    baud_rate: int = 0
+    serial_number: str = ""
+    response_code: str = ""
+    attempts: int = 0
+    elapsed_ms: float = 0.0
+    cached: bool = False
+    error: str = ""
+
+    def as_dict(self) -> dict:
+        return {
+            "port": self.port, "usbPath": self.usb_path, "usbId": self.usb_id,
+            "protocol": self.protocol, "baudRate": self.baud_rate, "serialNumber": self.serial_number,
+            "responseCode": self.response_code, "attempts": self.attempts,
+            "elapsedMs": round(self.elapsed_ms, 3), "cached": self.cached, "error": self.error,
+        }
+
+    @classmethod
+    def from_cache(cls, entry: dict) -> "ProbeResult":
+        return cls(entry["port"], entry.get("usbPath", ""), entry.get("usbId", ""), entry.get("protocol", ""),
+                   entry.get("baudRate", 0), entry.get("serialNumber", ""), entry.get("responseCode", ""),
+                   cached=True)
+
+def _recognize(protocol: str, payload: bytes) -> Optional[Tuple[str, str]]:
+    """(código de respuesta, N/S) si el payload es la respuesta esperada del protocolo."""
+    if protocol == PROTOCOL_FUTUREX:
+        message = parse_payload(payload)
+        if isinstance(message, ReadSerialResponse):
+            return message.response_code, message.serial_number.strip()
+        return None
+    try:
+        message = parse_legacy_payload(payload)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if message.command == LEGACY_POLL_RESPONSE:
+        return (message.fields[0] if message.fields else ""), ""
+    return None
+
+async def _ask(link: SerialLink, protocol: str, timeout: float) -> Optional[Tuple[str, str]]:
+    """
+    Envía la consulta del protocolo y espera la respuesta hasta `timeout`.
+
+    Los frames con LRC incorrecto o que no son la respuesta esperada (ruido
+    de una velocidad equivocada, o el eco de otro protocolo) se ignoran.
+    """
+    frame = format_message("03", (DEFAULT_VERSION,)) if protocol == PROTOCOL_FUTUREX \
+        else format_legacy_message(*LEGACY_POLL)
+    deadline = time.monotonic() + timeout
+    link.discard_pending()
+    await link.write(frame)
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        try:
+            received = await link.read_frame(remaining)
+        except asyncio.TimeoutError:
+            return None
+        if received.lrc_ok:
+            answer = _recognize(protocol, received.payload)
+            if answer is not None:
+                return answer
+
+async def probe_port(port: str, baud_rates: Sequence[int] = PROBE_BAUD_RATES,
+                     timeout: float = PROBE_TIMEOUT, protocols: Sequence[str] = PROTOCOLS,
+                     identity: Optional[PortIdentity] = None) -> ProbeResult:
+    """
+    Prueba un puerto: para cada velocidad, cada protocolo en orden.
+
+    El puerto se abre una sola vez y se reconfigura entre velocidades. Si
+    a una velocidad llegó basura (bytes sin ningún frame válido) no se
+    prueba el siguiente protocolo: la velocidad es incorrecta.
+    """
+    identity = identity or port_identity(port)
+    result = ProbeResult(port, identity.usb_path if identity else "", identity.usb_id if identity else "")
+    started = time.perf_counter()
+    link = SerialLink(port, baud_rates[0])
+    try:
+        link.open()
+        for baud_rate in baud_rates:
+            if baud_rate != link.baud_rate:
+                link.set_baud_rate(baud_rate)
+            for protocol in protocols:
+                discarded = link.parser.stats.discarded_bytes
+                result.attempts += 1
+                answer = await _ask(link, protocol, timeout)
+                if answer is not None:
+                    result.protocol, result.baud_rate = protocol, baud_rate
+                    result.response_code, result.serial_number = answer
+                    return result
+                if link.parser.stats.discarded_bytes + link.parser.pending > discarded:
+                    break
+    except (OSError, ValueError) as e:
+        result.error = str(e)
+    finally:
+        link.close()
+        result.elapsed_ms = (time.perf_counter() - started) * 1000
+    return result
+
+async def probe_ports(ports: Iterable[str], baud_rates: Sequence[int] = PROBE_BAUD_RATES,
+                      timeout: float = PROBE_TIMEOUT, protocols: Sequence[str] = PROTOCOLS,
+                      concurrency: int = DEFAULT_CONCURRENCY, cache: Optional[ProbeCache] = None,
+                      refresh: bool = False) -> Dict[str, ProbeResult]:
+    """
+    Prueba los puertos en paralelo.
+
+    Args:
+        ports: Rutas de los puertos
+        baud_rates: Velocidades candidatas, en orden de preferencia
+        timeout: Espera de respuesta por intento (segundos)
+        protocols: Protocolos a probar en cada velocidad
+        concurrency: Puertos abiertos a la vez
+        cache: Caché por ruta USB; las entradas vigentes evitan el sondeo
+        refresh: Volver a probar aunque haya entrada vigente (su velocidad va primero)
+
+    Returns:
+        Puerto -> ProbeResult, en el orden de `ports`
+    """
+    ports = list(ports)
+    raise_fd_limit(min(len(ports), concurrency) + 64)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def probe(port: str) -> ProbeResult:
+        identity = port_identity(port)
+        if identity is None:
+            return ProbeResult(port, error="El puerto no existe")
+        rates = list(baud_rates)
+        if cache is not None:
+            entry = None if refresh else cache.get(identity)
+            if entry is not None:
+                return ProbeResult.from_cache(entry)
+            preferred = cache.preferred_baud(identity)
+            if preferred in rates:
+                rates.remove(preferred)
+                rates.insert(0, preferred)
+        async with semaphore:
+            result = await probe_port(port, rates, timeout, protocols, identity)
+        if cache is not None and not result.error:
+            cache.store(identity, result)
+        return result
+
+    results = await asyncio.gather(*(probe(port) for port in ports))
+    return dict(zip(ports, results))
+
+# ========== HOTPLUG ==========
+
+class PortWatcher:
+    """
+    Detecta conexiones y desconexiones comparando los puertos presentes
+    entre sondeos (sin udev: basta con leer /dev y /sys).
+    """
+
+    def __init__(self, patterns: Iterable[str] = PORT_PATTERNS):
+        self.patterns = list(patterns)
+        self.ports: Dict[str, PortIdentity] = {}
+
+    def poll(self) -> Tuple[List[PortIdentity], List[PortIdentity]]:
+        """
+        Returns:
+            (puertos nuevos o recreados, puertos que desaparecieron o fueron recreados)
+        """
+        current = scan_ports(self.patterns)
+        added = [identity for port, identity in current.items() if self.ports.get(port) != identity]
+        removed = [identity for port, identity in self.ports.items() if current.get(port) != identity]
+        self.ports = current
+        return added, removed
+
+# ========== FUNCIÓN PRINCIPAL ==========
+
+def _describe(result: ProbeResult) -> str:
+    location = f" ({result.usb_path})" if result.usb_path and result.usb_path != os.path.realpath(result.port) else ""
+    if result.error:
+        return f"❌ {result.port}{location}: {result.error}"
+    if not result.protocol:
+        return f"⚪ {result.port}{location}: sin respuesta ({result.attempts} intentos, {result.elapsed_ms:.0f} ms)"
+    serial = f"  N/S {result.serial_number}" if result.serial_number else ""
+    origin = "caché" if result.cached else f"{result.elapsed_ms:.0f} ms"
+    return f"✅ {result.port}{location}: {result.protocol} {result.baud_rate}{serial}  [{origin}]"
+
+def _write_endpoints(path: str, results: Dict[str, ProbeResult]):
+    """Endpoints con equipo, en el formato que lee inject_profile.py --endpoints."""
+    endpoints = [
+        {"path": port, "serialNumber": result.serial_number, "protocol": result.protocol,
+         "baudRate": result.baud_rate}
+        for port, result in results.items() if result.protocol
+    ]
+    with open(path, "w") as f:
+        json.dump(endpoints, f, indent=2)
+
+async def watch_ports(args: argparse.Namespace, patterns: List[str], cache: Optional[ProbeCache]):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    watcher = PortWatcher(patterns)
+    results: Dict[str, ProbeResult] = {}
+    print("⏳ Vigilando puertos (Ctrl+C para terminar)...")
+    started = time.monotonic()
+    while not stop.is_set():
+        added, removed = watcher.poll()
+        for identity in removed:
+            if cache is not None:
+                cache.invalidate(identity)
+            if results.pop(identity.port, None) is not None and identity.port not in watcher.ports:
+                print(f"⏏️  {identity.port} desconectado")
+        if added:
+            probed = await probe_ports([identity.port for identity in added], args.bauds, args.timeout,
+                                       args.protocols, args.concurrency, cache, args.refresh)
+            results.update(probed)
+            for result in probed.values():
+                print(_describe(result))
+        if (added or removed) and cache is not None:
+            cache.save()
+        if (added or removed) and args.endpoints:
+            _write_endpoints(args.endpoints, results)
+
+        timeout = args.interval
+        if args.duration:
+            remaining = args.duration - (time.monotonic() - started)
+            if remaining <= 0:
+                break
+            timeout = min(timeout, remaining)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Detección en paralelo de puertos seriales y protocolo (Futurex/Legacy)")
+    parser.add_argument("ports", nargs="*", help=f"Puertos o patrones glob (por defecto: {' '.join(PORT_PATTERNS)})")
+    parser.add_argument("--bauds", type=int, nargs="+", default=list(PROBE_BAUD_RATES),
+                        help="Velocidades candidatas, en orden")
+    parser.add_argument("--timeout", type=float, default=PROBE_TIMEOUT, help="Espera de respuesta por intento (segundos)")
+    parser.add_argument("--protocols", nargs="+", type=str.upper, choices=PROTOCOLS, default=list(PROTOCOLS),
+                        help="Protocolos a probar en cada velocidad")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Puertos abiertos a la vez")
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help="Archivo de caché por ruta USB")
+    parser.add_argument("--no-cache", action="store_true", help="No leer ni guardar el caché")
+    parser.add_argument("--refresh", action="store_true", help="Volver a probar los puertos que están en el caché")
+    parser.add_argument("--endpoints", help="Guardar los puertos con equipo en este JSON (para inject_profile.py)")
+    parser.add_argument("--json", action="store_true", help="Imprimir el resultado como JSON")
+    parser.add_argument("--watch", action="store_true", help="Seguir vigilando conexiones y desconexiones")
+    parser.add_argument("--interval", type=float, default=1.0, help="Segundos entre revisiones con --watch")
+    parser.add_argument("--duration", type=float, default=0, help="Segundos de --watch (0 = sin límite)")
+    args = parser.parse_args(argv)
+
+    patterns = args.ports or list(PORT_PATTERNS)
+    cache = None if args.no_cache else ProbeCache(args.cache)
+    try:
+        if args.watch:
+            asyncio.run(watch_ports(args, patterns, cache))
+            return 0
+        started = time.perf_counter()
+        results = asyncio.run(probe_ports(find_ports(patterns), args.bauds, args.timeout, args.protocols,
+                                          args.concurrency, cache, args.refresh))
+        if cache is not None:
+            cache.save()
+        if args.endpoints:
+            _write_endpoints(args.endpoints, results)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps({port: result.as_dict() for port, result in results.items()}, indent=2))
+    else:
+        found = sum(1 for result in results.values() if result.protocol)
+        print("=" * 80)
+        print("🔌 DETECCIÓN DE PUERTOS")
+        print("=" * 80)
+        print()
+        for result in results.values():
+            print(f"   {_describe(result)}")
+        print()
+        print(f"   Puertos: {len(results)}  Con equipo: {found}  Tiempo: {elapsed:.2f} s")
+        if args.endpoints:
+            print(f"📝 Endpoints: {args.endpoints}")
+    return 0 if results else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,572 @@
+#!/usr/bin/env python3
+"""
+Aprovisionamiento de punta a punta en flujo: llaves -> KCV -> envoltura
+con la KEK -> perfil -> frames -> inyección o exportación.
+
+Hoy la cadena es manual (generar_llaves_completas.py, importar en la app,
+generar_perfil_inyeccion.py, importar el perfil, inyectar) y entre cada
+paso se escribe un JSON completo. Acá las etapas se conectan con colas
+acotadas y cada una tiene su propio pool de workers:
+
+    lotes -> [keygen] -> [kcv] -> [wrap] -> [profile] -> [frames] -> [inject | export]
+
+- keygen, kcv, wrap, profile y frames trabajan por lotes de dispositivos
+  (--batch-size) en un pool de procesos por etapa (--workers, o por
+  etapa con --stage-workers kcv=2); con 0 workers la etapa corre en el
+  event loop. wrap solo existe con --wrap-kek.
+- inject: un worker por puerto (--port/--endpoints, como inject_profile.py);
+  cada dispositivo se inyecta en el primer puerto libre. Sin puertos, la
+  etapa final es export y solo escribe el resultado.
+- Las colas tienen capacidad fija (--queue-size lotes; la de la etapa
+  final, dos dispositivos por worker): cuando la inyección es lenta las
+  colas se llenan, los put() esperan y la generación se frena sola. La
+  memoria depende de las capacidades, no de la cantidad de dispositivos.
+
+Cada dispositivo recibe las llaves de la especificación (mismo formato
+que generar_llaves_completas.py --spec, con count = llaves por
+dispositivo). La KEK_STORAGE del dispositivo es la KTK de su perfil, como
+en generar_perfil_inyeccion.py. Con --wrap-kek las llaves se exportan
+envueltas con la KEK_STORAGE de almacenamiento (key_wrap.py) y las llaves
+en claro se descartan apenas se arman los frames.
+
+Uso:
+    python3 provisioning_pipeline.py --devices 10000 --output aprovisionamiento.jsonl
+    python3 provisioning_pipeline.py --devices 10000 --spec dispositivo.json --wrap-kek llaves_kek.json --workers 2
+    python3 provisioning_pipeline.py --devices 500 --endpoints endpoints.json --window 4 --stats-interval 2
+
+Salida (--output, JSON Lines, en el orden en que termina cada dispositivo):
+    {"deviceId", "profile", "keys", ...}; con inyección además "port",
+    "serialNumber", "ok", "error" y "seconds"
+
+Se informa por etapa: dispositivos, dispositivos/s, ocupación de los
+workers y profundidad de la cola de entrada (media, máxima y capacidad).
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import resource
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, TextIO, Tuple
+
+from generar_llaves_completas import FUTUREX_CODE, KEY_SIZES, generate_key_bytes, load_spec
+from generar_perfil_inyeccion import build_profile
+from inject_profile import (
+    DEFAULT_RETRIES, DeviceResult, PlannedFrame, build_injection_plan, inject_device, load_endpoints,
+)
+from kcv import calculate_kcvs
+from key_index import KeyIndex
+from key_wrap import KEK_KEY_TYPE, aes_key_wrap_many, load_kek, wrapped_fields
+from keyreceiver_sim import raise_fd_limit
+from serial_link import DEFAULT_BAUD_RATE, DEFAULT_TIMEOUT
+
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_QUEUE_SIZE = 4  # Lotes por cola entre etapas
+DEFAULT_WORKERS = 1
+SAMPLE_INTERVAL = 0.1  # Segundos entre muestras de profundidad de las colas
+CPU_STAGES = ("keygen", "kcv", "wrap", "profile", "frames")
+
+# Juego por dispositivo sin --spec: KTK (KEK_STORAGE) y una llave de trabajo por uso
+DEFAULT_DEVICE_KEYS = [
+    (KEK_KEY_TYPE, "AES-256", "KEK del dispositivo (KTK del perfil)", 1),
+    ("WORKING_PIN_KEY", "AES-128", "Llave de PIN", 1),
+    ("WORKING_MAC_KEY", "AES-128", "Llave de MAC", 1),
+    ("WORKING_DATA_KEY", "AES-128", "Llave de datos", 1),
+]
+
+class PipelineError(ValueError):
+    """Especificación inválida o corrida que no puede continuar."""
+
+# ========== DATOS EN TRÁNSITO ==========
+
+@dataclass
+class DeviceKey:
+    key_type: str
+    algorithm: str
+    description: str
+    key: bytes
+    kcv: str = ""
+    wrapped: bytes = b""
+
+@dataclass
+class DeviceWork:
+    """Un dispositivo a medida que pasa por las etapas."""
+    device_id: str
+    keys: List[DeviceKey] = field(default_factory=list)
+    profile: Optional[dict] = None
+    plan: List[PlannedFrame] = field(default_factory=list)
+    error: str = ""
+
+    def key_records(self, kek_kcv: str = "", plaintext: bool = False) -> List[dict]:
+        """Registros de llave (formato de generar_llaves_completas.py), envueltos si hay KEK."""
+        records = []
+        for key in self.keys:
+            if key.wrapped and not plaintext:
+                material = wrapped_fields(key.wrapped, kek_kcv)
+            else:
+                material = {"keyHex": key.key.hex().upper()}
+            records.append({
+                "keyType": key.key_type, "algorithm": key.algorithm, "description": key.description,
+                "futurexCode": FUTUREX_CODE, **material, "kcv": key.kcv, "bytes": KEY_SIZES[key.algorithm],
+            })
+        return records
+
+@dataclass
+class WorkBatch:
+    start: int
+    devices: List[DeviceWork]
+
+@dataclass
+class PipelineConfig:
+    """Lo que necesitan las etapas; se copia una vez a cada proceso."""
+    items: List[Tuple[str, str, str, int]]
+    kek: Optional[Tuple[bytes, str]] = None
+    device_prefix: str = "DEV"
+    id_width: int = 6
+
+def load_device_spec(path: Optional[str]) -> List[Tuple[str, str, str, int]]:
+    """
+    Llaves por dispositivo: la especificación de generar_llaves_completas.py
+    o DEFAULT_DEVICE_KEYS.
+
+    Raises:
+        PipelineError: si no hay exactamente una KEK_STORAGE (la KTK del perfil)
+    """
+    items = load_spec(path)[1] if path else list(DEFAULT_DEVICE_KEYS)
+    keks = [count for key_type, _, _, count in items if key_type == KEK_KEY_TYPE]
+    if keks != [1]:
+        raise PipelineError(f"Cada dispositivo necesita exactamente una {KEK_KEY_TYPE} (la KTK del perfil)")
+    return items
+
+# ========== ETAPAS ==========
+
+# Configuración del proceso (la fija _init_stage al crear cada pool)
+_CONFIG: Optional[PipelineConfig] = None
+
+def _init_stage(config: PipelineConfig):
+    global _CONFIG
+    _CONFIG = config
+
+def generate_stage(task: Tuple[int, int]) -> WorkBatch:
+    """(primer índice, cantidad) -> lote de dispositivos con sus llaves en claro."""
+    start, count = task
+    devices = [DeviceWork(f"{_CONFIG.device_prefix}{start + i:0{_CONFIG.id_width}d}") for i in range(count)]
+    for key_type, algorithm, description, per_device in _CONFIG.items:
+        # Todas las llaves del algoritmo para el lote de una vez
+        keys = generate_key_bytes(algorithm, count * per_device)
+        for index, device in enumerate(devices):
+            for key in keys[index * per_device:(index + 1) * per_device]:
+                device.keys.append(DeviceKey(key_type, algorithm, description, key))
+    return WorkBatch(start, devices)
+
+def kcv_stage(batch: WorkBatch) -> WorkBatch:
+    keys = [key for device in batch.devices for key in device.keys]
+    kcvs = calculate_kcvs(((key.key, key.algorithm) for key in keys), chunk_size=max(1, len(keys)))
+    for key, kcv in zip(keys, kcvs):
+        key.kcv = kcv
+    return batch
+
+def wrap_stage(batch: WorkBatch) -> WorkBatch:
+    keys = [key for device in batch.devices for key in device.keys]
+    for key, wrapped in zip(keys, aes_key_wrap_many(_CONFIG.kek[0], [key.key for key in keys])):
+        key.wrapped = wrapped
+    return batch
+
+def profile_stage(batch: WorkBatch) -> WorkBatch:
+    for device in batch.devices:
+        records = device.key_records(plaintext=True)
+        ktk_kcv = next(record["kcv"] for record in records if record["keyType"] == KEK_KEY_TYPE)
+        device.profile = build_profile(records, ktk_kcv, device.device_id)
+        device.profile["name"] = f"Perfil de Inyección - {device.device_id}"
+    return batch
+
+def frames_stage(batch: WorkBatch) -> WorkBatch:
+    """Frames del comando 02 de cada perfil; con KEK, después se descartan las llaves en claro."""
+    for device in batch.devices:
+        try:
+            device.plan = build_injection_plan(device.profile, KeyIndex(device.key_records(plaintext=True)))
+        except ValueError as e:
+            device.error = str(e)
+        if _CONFIG.kek:
+            for key in device.keys:
+                key.key = b""
+    return batch
+
+STAGE_FUNCTIONS = {
+    "keygen": generate_stage,
+    "kcv": kcv_stage,
+    "wrap": wrap_stage,
+    "profile": profile_stage,
+    "frames": frames_stage,
+}
+
+# ========== ESTADÍSTICAS ==========
+
+@dataclass
+class StageStats:
+    name: str
+    workers: int
+    queue_size: int
+    batches: int = 0
+    devices: int = 0
+    failed: int = 0
+    busy_seconds: float = 0.0
+    queue_depth: int = 0
+    queue_max: int = 0
+    depth_total: int = 0
+    samples: int = 0
+
+    def sample(self, depth: int):
+        self.queue_depth = depth
+        self.queue_max = max(self.queue_max, depth)
+        self.depth_total += depth
+        self.samples += 1
+
+    def as_dict(self, seconds: float) -> dict:
+        return {
+            "stage": self.name,
+            "workers": self.workers,
+            "batches": self.batches,
+            "devices": self.devices,
+            "failed": self.failed,
+            "devicesPerSecond": round(self.devices / seconds, 1) if seconds > 0 else 0.0,
+            "utilization": round(self.busy_seconds / (seconds * max(1, self.workers)), 3) if seconds > 0 else 0.0,
+            "queueSize": self.queue_size,
+            "queueMean": round(self.depth_total / self.samples, 2) if self.samples else 0.0,
+            "queueMax": self.queue_max,
+        }
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB en Linux
+
+# ========== EJECUCIÓN ==========
+
+_DONE = object()  # Fin de la cola; cada worker lo vuelve a poner para el siguiente
+
+class _Stage:
+    def __init__(self, name: str, workers: int, queue_size: int, config: PipelineConfig):
+        self.name = name
+        self.function = STAGE_FUNCTIONS.get(name)
+        self.inbox: asyncio.Queue = asyncio.Queue(queue_size)
+        self.stats = StageStats(name, workers, queue_size)
+        self.executor: Optional[Executor] = None
+        if self.function is not None and workers > 0:
+            self.executor = ProcessPoolExecutor(workers, initializer=_init_stage, initargs=(config,))
+
+    async def get(self):
+        item = await self.inbox.get()
+        if item is _DONE:
+            self.inbox.put_nowait(_DONE)  # Se acaba de liberar un lugar
+        return item
+
+    def shutdown(self, cancel: bool = False):
+        if self.executor is not None:
+            self.executor.shutdown(wait=not cancel, cancel_futures=cancel)
+
+async def _run_cpu_stage(stage: _Stage, outbox: asyncio.Queue, flatten: bool):
+    """Workers de una etapa por lotes; al terminar todos, marca el fin de la cola siguiente."""
+    loop = asyncio.get_running_loop()
+
+    async def worker():
+        while True:
+            item = await stage.get()
+            if item is _DONE:
+                return
+            started = time.perf_counter()
+            if stage.executor is not None:
+                batch = await loop.run_in_executor(stage.executor, stage.function, item)
+            else:
+                batch = stage.function(item)
+            stage.stats.busy_seconds += time.perf_counter() - started
+            stage.stats.batches += 1
+            stage.stats.devices += len(batch.devices)
+            stage.stats.failed += sum(1 for device in batch.devices if device.error)
+            if flatten:
+                for device in batch.devices:
+                    await outbox.put(device)
+            else:
+                await outbox.put(batch)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, stage.stats.workers))))
+    await outbox.put(_DONE)
+
+class _Sink:
+    """Etapa final: inyecta (un worker por puerto) o solo exporta, y escribe cada dispositivo."""
+
+    def __init__(self, stage: _Stage, output: Optional[TextIO], ports: Sequence[str],
+                 kek: Optional[Tuple[bytes, str]], include_frames: bool, inject_options: dict):
+        self.stage = stage
+        self.output = output
+        self.ports = list(ports)
+        self.kek_kcv = kek[1] if kek else ""
+        self.include_frames = include_frames
+        self.inject_options = inject_options
+        self.ok = 0
+        self.failed = 0
+        self.dead_ports: List[str] = []
+        self._retry: collections.deque = collections.deque()  # Dispositivos de puertos que no abrieron
+
+    def write(self, device: DeviceWork, port: str = "", result: Optional[DeviceResult] = None):
+        error = device.error or (result.error if result else "")
+        if error:
+            self.failed += 1
+        else:
+            self.ok += 1
+        if self.output is None:
+            return
+        line = {"deviceId": device.device_id}
+        if result is not None:
+            line.update({"port": port, "serialNumber": result.serial_number, "ok": not error,
+                         "error": error, "seconds": round(result.seconds, 3)})
+        elif error:
+            line.update({"ok": False, "error": error})
+        line["profile"] = device.profile
+        line["keys"] = device.key_records(self.kek_kcv)
+        if self.include_frames:
+            line["frames"] = [{"label": planned.label, "frame": planned.frame.hex().upper()}
+                              for planned in device.plan]
+        self.output.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+    async def _export_worker(self):
+        while True:
+            device = await self.stage.get()
+            if device is _DONE:
+                return
+            started = time.perf_counter()
+            self.write(device)
+            self.stage.stats.busy_seconds += time.perf_counter() - started
+            self.stage.stats.devices += 1
+
+    async def _inject_worker(self, port: str):
+        stats = self.stage.stats
+        while True:
+            device = self._retry.popleft() if self._retry else await self.stage.get()
+            if device is _DONE:
+                if self._retry:
+                    continue
+                return
+            if device.error:
+                self.write(device, port, DeviceResult(port, error=device.error))
+                stats.devices += 1
+                stats.failed += 1
+                continue
+            started = time.perf_counter()
+            result = await inject_device(port, device.plan, **self.inject_options)
+            stats.busy_seconds += time.perf_counter() - started
+            if not result.keys and result.error:
+                # El puerto no abre: se retira y el dispositivo pasa a otro puerto
+                self.dead_ports.append(port)
+                if len(self.dead_ports) == len(self.ports):
+                    raise PipelineError(f"Ningún puerto disponible ({result.error})")
+                self._retry.append(device)
+                return
+            self.write(device, port, result)
+            stats.devices += 1
+            stats.failed += 0 if result.ok else 1
+
+    async def run(self):
+        if self.ports:
+            live = self.ports
+            while live:
+                await asyncio.gather(*(self._inject_worker(port) for port in live))
+                # Un puerto que se retiró después de que los demás terminaran deja pendientes
+                live = [port for port in self.ports if port not in self.dead_ports] if self._retry else []
+        else:
+            await self._export_worker()
+
+def _progress_line(stages: Sequence[_Stage], elapsed: float) -> str:
+    parts = [f"{stage.name} {stage.stats.devices} (cola {stage.inbox.qsize()}/{stage.stats.queue_size})"
+             for stage in stages]
+    return f"📊 {elapsed:7.1f} s  " + " | ".join(parts)
+
+async def _monitor(stages: Sequence[_Stage], started: float, stats_interval: float):
+    """Muestrea la profundidad de las colas y, con stats_interval, imprime el avance."""
+    next_print = started + stats_interval
+    while True:
+        for stage in stages:
+            stage.stats.sample(stage.inbox.qsize())
+        now = time.perf_counter()
+        if stats_interval and now >= next_print:
+            print(_progress_line(stages, now - started), file=sys.stderr, flush=True)
+            next_print = now + stats_interval
+        await asyncio.sleep(SAMPLE_INTERVAL)
+
+async def run_pipeline(config: PipelineConfig, devices: int, batch_size: int = DEFAULT_BATCH_SIZE,
+                       workers: Optional[Dict[str, int]] = None, queue_size: int = DEFAULT_QUEUE_SIZE,
+                       ports: Sequence[str] = (), output: Optional[TextIO] = None,
+                       include_frames: bool = False, stats_interval: float = 0.0,
+                       **inject_options) -> dict:
+    """
+    Corre el pipeline completo.
+
+    Args:
+        config: Llaves por dispositivo, KEK de exportación y formato de los IDs
+        devices: Cantidad de dispositivos
+        batch_size: Dispositivos por lote en las etapas de CPU
+        workers: Etapa -> procesos (0 = en el event loop); las que faltan usan DEFAULT_WORKERS
+        queue_size: Capacidad en lotes de cada cola entre etapas
+        ports: Puertos de inyección; sin puertos se exporta
+        output: Archivo JSON Lines donde se escribe cada dispositivo
+        include_frames: Incluir los frames en la salida
+        stats_interval: Segundos entre líneas de avance por stderr (0 = no imprimir)
+        inject_options: baud_rate, timeout, retries y window de inject_profile.inject_device
+
+    Returns:
+        Reporte con el resumen y las estadísticas por etapa
+
+    Raises:
+        PipelineError: si ningún puerto de inyección abre
+    """
+    workers = workers or {}
+    names = [name for name in CPU_STAGES if name != "wrap" or config.kek]
+    _init_stage(config)  # Para las etapas que corren en el event loop
+    stages = [_Stage(name, workers.get(name, DEFAULT_WORKERS), queue_size, config) for name in names]
+    sink_name = "inject" if ports else "export"
+    sink_workers = max(1, len(ports))
+    stages.append(_Stage(sink_name, sink_workers, 2 * sink_workers, config))
+    sink = _Sink(stages[-1], output, ports, config.kek, include_frames, inject_options)
+    if ports:
+        raise_fd_limit(len(ports) + 64)
+
+    async def produce():
+        for start in range(0, devices, batch_size):
+            await stages[0].inbox.put((start, min(batch_size, devices - start)))
+        await stages[0].inbox.put(_DONE)
+
+    started = time.perf_counter()
+    tasks = [asyncio.ensure_future(produce())]
+    for position, stage in enumerate(stages[:-1]):
+        flatten = position == len(stages) - 2
+        tasks.append(asyncio.ensure_future(_run_cpu_stage(stage, stages[position + 1].inbox, flatten)))
+    tasks.append(asyncio.ensure_future(sink.run()))
+    monitor = asyncio.ensure_future(_monitor(stages, started, stats_interval))
+    completed = False
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if task.exception() is not None:
+                for other in pending:
+                    other.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                raise task.exception()
+        completed = True
+    finally:
+        monitor.cancel()
+        for stage in stages:
+            stage.shutdown(cancel=not completed)
+    seconds = time.perf_counter() - started
+
+    return {
+        "mode": sink_name,
+        "devices": devices,
+        "ok": sink.ok,
+        "failed": sink.failed,
+        "seconds": round(seconds, 3),
+        "devicesPerSecond": round(devices / seconds, 1) if seconds > 0 else 0.0,
+        "batchSize": batch_size,
+        "peakRssMb": round(_peak_rss_mb(), 1),
+        "deadPorts": sink.dead_ports,
+        "stages": [stage.stats.as_dict(seconds) for stage in stages],
+    }
+
+# ========== FUNCIÓN PRINCIPAL ==========
+
+def parse_stage_workers(values: Sequence[str]) -> Dict[str, int]:
+    """["kcv=2", "wrap=0"] -> {"kcv": 2, "wrap": 0}."""
+    workers = {}
+    for value in values:
+        name, _, count = value.partition("=")
+        if name not in CPU_STAGES or not count.isdigit():
+            raise PipelineError(f"--stage-workers inválido: '{value}' (ETAPA=N, etapas: {', '.join(CPU_STAGES)})")
+        workers[name] = int(count)
+    return workers
+
+def print_report(report: dict):
+    print("=" * 80)
+    print("🏭 PIPELINE DE APROVISIONAMIENTO")
+    print("=" * 80)
+    print()
+    print(f"   Dispositivos: {report['devices']}  ✅ {report['ok']}  ❌ {report['failed']}  ({report['mode']})")
+    print(f"   Tiempo total: {report['seconds']} s ({report['devicesPerSecond']} dispositivos/s)")
+    print(f"   Memoria máxima: {report['peakRssMb']} MB  Lote: {report['batchSize']} dispositivos")
+    if report["deadPorts"]:
+        print(f"   Puertos que no abrieron: {', '.join(report['deadPorts'])}")
+    print()
+    print(f"   {'Etapa':10s} {'Workers':>7s} {'Disp.':>8s} {'Disp/s':>9s} {'Ocupación':>10s}  Cola (media / máx / capacidad)")
+    for stage in report["stages"]:
+        print(f"   {stage['stage']:10s} {stage['workers']:7d} {stage['devices']:8d} {stage['devicesPerSecond']:9.1f} "
+              f"{stage['utilization'] * 100:9.1f}%  {stage['queueMean']:.2f} / {stage['queueMax']} / {stage['queueSize']}")
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Pipeline de aprovisionamiento: llaves, KCV, envoltura, perfil, frames e inyección")
+    parser.add_argument("--devices", type=int, required=True, help="Cantidad de dispositivos")
+    parser.add_argument("--spec", help="Llaves por dispositivo (formato de generar_llaves_completas.py --spec)")
+    parser.add_argument("--device-prefix", default="DEV", help="Prefijo de los IDs de dispositivo")
+    parser.add_argument("--wrap-kek", action="append", metavar="ARCHIVO",
+                        help="Exportar las llaves envueltas con la KEK_STORAGE de este archivo (AES Key Wrap, repetible)")
+    parser.add_argument("--output", help="JSON Lines de salida (por defecto aprovisionamiento_<fecha>.jsonl)")
+    parser.add_argument("--frames", action="store_true",
+                        help="Incluir los frames en la salida (el de la KTK va en claro)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Dispositivos por lote")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="Lotes por cola entre etapas")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Procesos por etapa de CPU (0 = en el event loop)")
+    parser.add_argument("--stage-workers", action="append", default=[], metavar="ETAPA=N",
+                        help=f"Procesos de una etapa ({', '.join(CPU_STAGES)}); se puede repetir")
+    parser.add_argument("--port", action="append", default=[], help="Puerto de inyección (se puede repetir)")
+    parser.add_argument("--endpoints", help="JSON con la lista de puertos (simulador o port_prober.py)")
+    parser.add_argument("--baud", type=int, default=DEFAULT_BAUD_RATE, help="Velocidad del puerto")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Timeout por frame (segundos)")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help="Reintentos por frame")
+    parser.add_argument("--window", type=int, default=1, help="Frames en vuelo por dispositivo (1 = stop-and-wait)")
+    parser.add_argument("--stats-interval", type=float, default=0, help="Imprimir el avance cada N segundos")
+    parser.add_argument("--report", help="Guardar el reporte en este JSON")
+    parser.add_argument("--json", action="store_true", help="Imprimir el reporte como JSON")
+    args = parser.parse_args(argv)
+
+    if args.devices < 1 or args.batch_size < 1 or args.queue_size < 1:
+        parser.error("--devices, --batch-size y --queue-size deben ser positivos")
+    ports = list(args.port)
+    try:
+        if args.endpoints:
+            ports += load_endpoints(args.endpoints)
+        workers = {name: args.workers for name in CPU_STAGES}
+        workers.update(parse_stage_workers(args.stage_workers))
+        config = PipelineConfig(load_device_spec(args.spec), load_kek(args.wrap_kek) if args.wrap_kek else None,
+                                args.device_prefix, max(6, len(str(args.devices - 1))))
+    except (OSError, ValueError, KeyError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    output = args.output or f"aprovisionamiento_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+    try:
+        with open(output, "w", encoding="utf-8") as f:
+            report = asyncio.run(run_pipeline(
+                config, args.devices, args.batch_size, workers, args.queue_size, ports, f, args.frames,
+                args.stats_interval, baud_rate=args.baud, timeout=args.timeout, retries=args.retries,
+                window=args.window))
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    report["output"] = output
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+        print()
+        print(f"📝 Salida: {output}")
+        if args.report:
+            print(f"📝 Reporte: {args.report}")
+    return 0 if report["failed"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+MAC de mensajes para las llaves MAC de DUKPT.
+
+    - Retail MAC (ISO 9797-1 algoritmo 3 / ANSI X9.19) con llave TDES de
+      16 bytes: CBC con DES simple y la mitad izquierda, y el último bloque
+      además descifrado con la mitad derecha y cifrado con la izquierda.
+    - AES-CMAC (NIST SP 800-38B) para las llaves MAC de DUKPT AES.
+
+Los MAC se suelen transmitir truncados (4 bytes en X9.19); verify_mac
+compara solo los bytes recibidos.
+"""
+
+import hmac
+
+from cryptography.hazmat.primitives import cmac
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.backends import default_backend
+
+from cipher_cache import ecb_decrypt, ecb_encrypt
+from generate_dukpt_keys import _triple_des
+
+MIN_MAC_LENGTH = 4
+
+def pad_iso9797(data: bytes, method: int = 1, block_size: int = 8) -> bytes:
+    """
+    Relleno ISO 9797-1.
+
+    Args:
+        method: 1 = ceros hasta completar el bloque (un bloque si no hay datos),
+            2 = 0x80 y luego ceros
+    """
+    if method == 2:
+        data = data + b"\x80"
+    elif method != 1:
+        raise ValueError(f"Método de relleno no soportado: {method}")
+    if not data or len(data) % block_size:
+        data = data + b"\x00" * (block_size - len(data) % block_size)
+    return data
+
+def retail_mac(key: bytes, data: bytes, padding: int = 1) -> bytes:
+    """
+    Retail MAC (ISO 9797-1 algoritmo 3) de 8 bytes.
+
+    Args:
+        key: Llave TDES de 16 bytes (p. ej. la llave MAC de DUKPT TDES)
+        data: Mensaje
+        padding: Método de relleno ISO 9797-1 (1 o 2)
+    """
+    if len(key) != 16:
+        raise ValueError("El Retail MAC requiere una llave TDES de 16 bytes")
+    left, right = key[:8], key[8:]
+    chained = Cipher(_triple_des(left), modes.CBC(bytes(8)), backend=default_backend()).encryptor()
+    last = chained.update(pad_iso9797(data, padding))[-8:]
+    return ecb_encrypt("TDES", left, ecb_decrypt("TDES", right, last))
+
+def aes_cmac(key: bytes, data: bytes) -> bytes:
+    """AES-CMAC de 16 bytes."""
+    mac = cmac.CMAC(algorithms.AES(key), backend=default_backend())
+    mac.update(data)
+    return mac.finalize()
+
+def message_mac(key: bytes, data: bytes, algorithm: str) -> bytes:
+    """MAC completo según el algoritmo de la llave ("3DES" → Retail MAC, "AES" → CMAC)."""
+    return aes_cmac(key, data) if algorithm.upper().startswith("AES") else retail_mac(key, data)
+
+def verify_mac(received: bytes, computed: bytes) -> bool:
+    """Compara un MAC recibido (posiblemente truncado) con el calculado, en tiempo constante."""
+    if not MIN_MAC_LENGTH <= len(received) <= len(computed):
+        return False
+    return hmac.compare_digest(received, computed[:len(received)])
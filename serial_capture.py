@@ -0,0 +1,587 @@
+#!/usr/bin/env python3
+"""
+Capturas binarias indexadas del tráfico serial/USB.
+
+Reproducir un problema de campo implica volver a pasar horas de tráfico
+capturado, y los volcados hex en texto son lentos de parsear y no se
+pueden recorrer salteado. Una captura es un archivo de solo agregado con
+un registro por lectura o escritura del puerto, y un índice disperso al
+lado (captura.scap.idx) para saltar directo a un registro o a un instante:
+
+    with CaptureWriter("campo.scap") as capture:
+        capture.write(TX, frame)
+        capture.write(RX, respuesta, timestamp_ns)
+
+    with CaptureReader("campo.scap") as capture:
+        record = capture.record(120000)      # sin recorrer los anteriores
+        for record in capture.iter_records(capture.seek_time(t_ns)):
+            ...
+
+Uso:
+    python3 serial_capture.py convert logcat.txt commlog.jsonl --output campo.scap
+    python3 serial_capture.py info campo.scap
+    python3 serial_capture.py show campo.scap --record 120000 --count 20
+    python3 serial_capture.py replay campo.scap --from 120000 --speed 10 --link /tmp/kr/replay
+
+Formato (little endian):
+    Archivo:  "SCAP" | versión (u16) | reservado (u16) | creación (i64, ns)
+              registro*: timestamp (i64, ns desde epoch) | dirección (u8, 0=TX 1=RX) | largo (u32) | datos
+    Índice:   "SCIX" | versión (u16) | reservado (u16) | intervalo (u32)
+              entrada*: número de registro (u64) | timestamp (i64) | offset (u64)
+
+Hay una entrada de índice cada `intervalo` registros (1024 por defecto), así
+que llegar a cualquier registro cuesta una búsqueda binaria y recorrer como
+mucho intervalo - 1 encabezados. La lectura usa mmap: los datos de cada
+registro son un memoryview sobre el archivo, sin copias.
+
+Tras una caída, un registro cortado al final se descarta (el escritor
+trunca el archivo al reabrirlo) y el índice se corrige con lo que falte o
+sobre; si el índice no existe se reconstruye recorriendo la captura.
+"""
+
+import argparse
+import bisect
+import mmap
+import os
+import select
+import struct
+import sys
+import time
+import tty
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+MAGIC = b"SCAP"
+INDEX_MAGIC = b"SCIX"
+VERSION = 1
+INDEX_INTERVAL = 1024  # Registros por entrada de índice
+INDEX_SUFFIX = ".idx"
+READ_SIZE = 4096
+
+FILE_HEADER = struct.Struct("<4sHHq")  # magic, versión, reservado, creación (ns)
+RECORD_HEADER = struct.Struct("<qBI")  # timestamp (ns), dirección, largo
+INDEX_HEADER = struct.Struct("<4sHHI")  # magic, versión, reservado, intervalo
+INDEX_ENTRY = struct.Struct("<QqQ")  # registro, timestamp (ns), offset
+
+TX = "TX"
+RX = "RX"
+DIRECTION_NAMES = (TX, RX)  # Código en el archivo -> dirección
+DIRECTION_CODES = {name: code for code, name in enumerate(DIRECTION_NAMES)}
+
+IndexEntry = Tuple[int, int, int]  # (registro, timestamp ns, offset)
+
+class CaptureError(ValueError):
+    """Archivo que no es una captura válida o registro inválido."""
+
+@dataclass
+class CaptureRecord:
+    """
+    Registro de la captura.
+
+    `data` es un memoryview sobre el mmap del lector: solo es válido
+    mientras la captura esté abierta (usar bytes(record.data) para guardarlo).
+    """
+    index: int
+    timestamp_ns: int
+    direction: str
+    data: memoryview
+
+# ========== FUNCIONES AUXILIARES ==========
+
+def index_path(path: str) -> str:
+    return path + INDEX_SUFFIX
+
+def _scan(buffer, offset: int, end: int) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    Recorre los encabezados de registro desde `offset`.
+
+    Yields:
+        (offset, timestamp ns, código de dirección, largo); se detiene en el
+        primer registro cortado o inválido
+    """
+    header_size = RECORD_HEADER.size
+    while offset + header_size <= end:
+        timestamp, code, length = RECORD_HEADER.unpack_from(buffer, offset)
+        stop = offset + header_size + length
+        if code >= len(DIRECTION_NAMES) or stop > end:
+            return
+        yield offset, timestamp, code, length
+        offset = stop
+
+def _read_index(path: str) -> Tuple[Optional[int], List[IndexEntry]]:
+    """Intervalo y entradas del índice, o (None, []) si no existe o no es válido."""
+    try:
+        with open(index_path(path), "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None, []
+    if len(data) < INDEX_HEADER.size:
+        return None, []
+    magic, version, _, interval = INDEX_HEADER.unpack_from(data)
+    if magic != INDEX_MAGIC or version != VERSION or interval < 1:
+        return None, []
+    usable = (len(data) - INDEX_HEADER.size) // INDEX_ENTRY.size * INDEX_ENTRY.size
+    return interval, list(INDEX_ENTRY.iter_unpack(data[INDEX_HEADER.size:INDEX_HEADER.size + usable]))
+
+def _recover(buffer, size: int, entries: List[IndexEntry], interval: int) -> Tuple[List[IndexEntry], int, int, bool]:
+    """
+    Valida el índice contra los datos y completa lo que falte.
+
+    Returns:
+        (entradas válidas, cantidad de registros, fin del último registro
+        completo, True si el índice cambió)
+    """
+    valid: List[IndexEntry] = []
+    for position, entry in enumerate(entries):
+        # Las entradas van en los registros 0, intervalo, 2·intervalo...
+        if entry[0] != position * interval or entry[2] >= size:
+            break
+        valid.append(entry)
+    count, end = (valid[-1][0], valid[-1][2]) if valid else (0, FILE_HEADER.size)
+    if valid:
+        # La última entrada pudo quedar escrita sin su registro
+        first = next(_scan(buffer, end, size), None)
+        if first is None:
+            valid.pop()
+            count, end = (valid[-1][0], valid[-1][2]) if valid else (0, FILE_HEADER.size)
+    for offset, timestamp, _, length in _scan(buffer, end, size):
+        if count % interval == 0 and (not valid or valid[-1][0] < count):
+            valid.append((count, timestamp, offset))
+        count += 1
+        end = offset + RECORD_HEADER.size + length
+    return valid, count, end, valid != entries
+
+def _write_index(path: str, interval: int, entries: Iterable[IndexEntry]):
+    with open(index_path(path), "wb") as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, VERSION, 0, interval))
+        f.writelines(INDEX_ENTRY.pack(*entry) for entry in entries)
+
+def _check_header(buffer, path: str):
+    if len(buffer) < FILE_HEADER.size:
+        raise CaptureError(f"{path}: archivo demasiado corto para ser una captura")
+    magic, version, _, _ = FILE_HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise CaptureError(f"{path}: no es una captura (falta {MAGIC.decode()})")
+    if version != VERSION:
+        raise CaptureError(f"{path}: versión de captura no soportada: {version}")
+
+# ========== ESCRITURA ==========
+
+class CaptureWriter:
+    """
+    Agrega registros a una captura (la crea si no existe).
+
+    Al reabrir una captura existente se descarta un registro cortado al
+    final y se corrige el índice, así que se puede seguir agregando después
+    de una caída.
+    """
+
+    def __init__(self, path: str, interval: int = INDEX_INTERVAL):
+        if interval < 1:
+            raise ValueError("El intervalo del índice debe ser al menos 1")
+        self.path = path
+        self.interval = interval
+        self.count = 0
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self._offset = self._reopen()
+        else:
+            with open(path, "wb") as f:
+                f.write(FILE_HEADER.pack(MAGIC, VERSION, 0, time.time_ns()))
+            _write_index(path, interval, [])
+            self._offset = FILE_HEADER.size
+        self._file = open(path, "ab")
+        self._index = open(index_path(path), "ab")
+
+    def _reopen(self) -> int:
+        existing_interval, entries = _read_index(self.path)
+        if existing_interval is not None:
+            self.interval = existing_interval
+        with open(self.path, "r+b") as f:
+            size = os.fstat(f.fileno()).st_size
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                _check_header(buffer, self.path)
+                entries, self.count, end, changed = _recover(buffer, size, entries, self.interval)
+            if end < size:
+                f.truncate(end)
+        if changed or existing_interval is None:
+            _write_index(self.path, self.interval, entries)
+        return end
+
+    def __enter__(self) -> "CaptureWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write(self, direction: str, data: bytes, timestamp_ns: Optional[int] = None):
+        """
+        Agrega un registro.
+
+        Args:
+            direction: TX o RX
+            data: Bytes leídos o escritos en el puerto
+            timestamp_ns: Instante (ns desde epoch); por defecto, ahora
+        """
+        code = DIRECTION_CODES.get(direction)
+        if code is None:
+            raise CaptureError(f"Dirección inválida: {direction}")
+        if timestamp_ns is None:
+            timestamp_ns = time.time_ns()
+        self._file.write(RECORD_HEADER.pack(timestamp_ns, code, len(data)))
+        self._file.write(data)
+        if self.count % self.interval == 0:
+            self._index.write(INDEX_ENTRY.pack(self.count, timestamp_ns, self._offset))
+        self._offset += RECORD_HEADER.size + len(data)
+        self.count += 1
+
+    def flush(self, sync: bool = False):
+        """Escribe lo pendiente; con `sync` además lo sincroniza a disco (fsync)."""
+        for f in (self._file, self._index):
+            f.flush()
+            if sync:
+                os.fsync(f.fileno())
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush(sync=True)
+        self._file.close()
+        self._index.close()
+
+# ========== LECTURA ==========
+
+class CaptureReader:
+    """Acceso aleatorio a una captura mediante mmap y el índice disperso."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+            _check_header(self._buffer, path)
+        except (OSError, ValueError):
+            self._file.close()
+            raise
+        self.created_ns = FILE_HEADER.unpack_from(self._buffer)[3]
+        interval, entries = _read_index(path)
+        self.interval = interval or INDEX_INTERVAL
+        # Sin índice (o con uno viejo) se reconstruye en memoria
+        self._entries, self.count, self._end, _ = _recover(self._buffer, size, entries, self.interval)
+        self._times = [entry[1] for entry in self._entries]
+        self._view = memoryview(self._buffer)
+
+    def __enter__(self) -> "CaptureReader":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._view.release()
+        if isinstance(self._buffer, mmap.mmap):
+            try:
+                self._buffer.close()
+            except BufferError:
+                # Quedan registros vivos: el mmap se libera junto con ellos
+                pass
+        self._file.close()
+
+    def _locate(self, index: int) -> int:
+        """Offset del registro `index`: entrada de índice anterior y recorrido de encabezados."""
+        if not 0 <= index < self.count:
+            raise IndexError(f"Registro fuera de rango: {index} (la captura tiene {self.count})")
+        position = bisect.bisect_right(self._entries, (index, float("inf"), 0)) - 1
+        record, _, offset = self._entries[position]
+        for offset, _, _, _ in _scan(self._buffer, offset, self._end):
+            if record == index:
+                return offset
+            record += 1
+        raise CaptureError(f"Índice inconsistente con la captura en el registro {index}")
+
+    def record(self, index: int) -> CaptureRecord:
+        """Registro `index` (0 = el primero)."""
+        offset = self._locate(index)
+        timestamp, code, length = RECORD_HEADER.unpack_from(self._buffer, offset)
+        start = offset + RECORD_HEADER.size
+        return CaptureRecord(index, timestamp, DIRECTION_NAMES[code], self._view[start:start + length])
+
+    def seek_time(self, timestamp_ns: int) -> int:
+        """Número del primer registro con timestamp >= `timestamp_ns` (len(self) si no hay)."""
+        position = max(bisect.bisect_left(self._times, timestamp_ns) - 1, 0)
+        if not self._entries:
+            return 0
+        record, _, offset = self._entries[position]
+        for _, timestamp, _, _ in _scan(self._buffer, offset, self._end):
+            if timestamp >= timestamp_ns:
+                return record
+            record += 1
+        return self.count
+
+    def iter_records(self, start: int = 0, stop: Optional[int] = None,
+                     directions: Optional[Sequence[str]] = None) -> Iterator[CaptureRecord]:
+        """
+        Recorre los registros desde `start` hasta `stop` (excluido).
+
+        Args:
+            directions: Solo estas direcciones (por defecto, todas)
+        """
+        stop = self.count if stop is None else min(stop, self.count)
+        if start >= stop:
+            return
+        codes = None if directions is None else {DIRECTION_CODES[d] for d in directions}
+        view, index = self._view, start
+        for offset, timestamp, code, length in _scan(self._buffer, self._locate(start), self._end):
+            if index >= stop:
+                return
+            if codes is None or code in codes:
+                data_start = offset + RECORD_HEADER.size
+                yield CaptureRecord(index, timestamp, DIRECTION_NAMES[code], view[data_start:data_start + length])
+            index += 1
+
+    def info(self) -> dict:
+        """Cantidad de registros y bytes por dirección, y el rango de tiempo."""
+        records, data = [0, 0], [0, 0]
+        first = last = None
+        for _, timestamp, code, length in _scan(self._buffer, FILE_HEADER.size, self._end):
+            records[code] += 1
+            data[code] += length
+            if first is None:
+                first = timestamp
+            last = timestamp
+        return {
+            "records": self.count,
+            "txRecords": records[0],
+            "rxRecords": records[1],
+            "txBytes": data[0],
+            "rxBytes": data[1],
+            "firstNs": first,
+            "lastNs": last,
+            "durationSeconds": round((last - first) / 1e9, 3) if first is not None else 0,
+            "indexEntries": len(self._entries),
+            "indexInterval": self.interval,
+        }
+
+def reindex(path: str, interval: Optional[int] = None) -> int:
+    """
+    Reconstruye el índice recorriendo toda la captura; devuelve la cantidad de registros.
+
+    Sin `interval` se conserva el del índice actual (o el de por defecto si
+    no hay índice válido).
+    """
+    if interval is not None and interval < 1:
+        raise ValueError("El intervalo del índice debe ser al menos 1")
+    with CaptureReader(path) as capture:
+        interval = interval or capture.interval
+        entries, count, _, _ = _recover(capture._buffer, capture._end, [], interval)
+    _write_index(path, interval, entries)
+    return count
+
+# ========== CONVERSIÓN ==========
+
+def convert_logs(paths: Sequence[str], output: str, year: Optional[int] = None) -> int:
+    """
+    Convierte logs de texto (los formatos de comm_log_analyzer.py) en una captura.
+
+    Cada línea con bytes TX/RX en hex pasa a ser un registro con la hora de
+    la línea. Si `output` ya existe, los registros se agregan al final.
+
+    Returns:
+        Cantidad de registros agregados
+    """
+    from comm_log_analyzer import parse_log_line, traffic_data
+
+    added = 0
+    with CaptureWriter(output) as capture:
+        for path in paths:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    entry = parse_log_line(line, year)
+                    traffic = traffic_data(entry.message) if entry else None
+                    if traffic:
+                        capture.write(traffic[0], traffic[1], entry.timestamp_ms * 1_000_000)
+                        added += 1
+    return added
+
+# ========== REPRODUCCIÓN ==========
+
+def replay_to_pty(capture: CaptureReader, start: int = 0, count: Optional[int] = None, speed: float = 1.0,
+                  directions: Sequence[str] = (TX,), link: Optional[str] = None, wait: float = 0.0,
+                  on_ready=None) -> dict:
+    """
+    Reproduce registros de la captura en el lado maestro de un pty.
+
+    El programa bajo prueba abre el lado esclavo (o el symlink `link`) como
+    si fuera el puerto. Lo que escriba se lee y se descarta también mientras
+    se escribe (el maestro no bloquea), así que un programa que responde o
+    hace eco no se traba aunque se reproduzca sin esperas o con atraso.
+
+    Args:
+        start: Primer registro
+        count: Cantidad de registros (por defecto, hasta el final)
+        speed: 1 = tiempos originales, 10 = diez veces más rápido, 0 = sin esperas
+        directions: Direcciones a reproducir (por defecto TX: lo que recibió el equipo)
+        link: Symlink al lado esclavo (como --link-dir de keyreceiver_sim.py)
+        wait: Segundos de espera antes del primer registro (para abrir el
+            puerto) y después del último (para que lea lo que quedó)
+        on_ready: Se llama con la ruta del esclavo antes de empezar
+
+    Returns:
+        Registros y bytes escritos, bytes recibidos del programa, duración y
+        máximo atraso respecto de los tiempos originales
+    """
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    os.set_blocking(master, False)
+    path = os.ttyname(slave)
+    if link:
+        if os.path.islink(link):
+            os.unlink(link)
+        os.symlink(path, link)
+    stats = {"records": 0, "bytes": 0, "responseBytes": 0, "seconds": 0.0, "maxLagMs": 0.0}
+
+    def receive():
+        try:
+            stats["responseBytes"] += len(os.read(master, READ_SIZE))
+        except OSError:
+            pass
+
+    def drain(timeout: float):
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            readable, _, _ = select.select([master], [], [], max(remaining, 0))
+            if readable:
+                receive()
+            if remaining <= 0:
+                return
+
+    def send(data: memoryview):
+        # Si el programa no lee, el pty se llena; mientras tanto se sigue
+        # leyendo lo que él escribe para que tampoco quede bloqueado
+        while data:
+            readable, writable, _ = select.select([master], [master], [])
+            if readable:
+                receive()
+            if writable:
+                try:
+                    data = data[os.write(master, data):]
+                except BlockingIOError:
+                    pass
+
+    try:
+        if on_ready:
+            on_ready(link or path)
+        if wait > 0:
+            drain(wait)
+        stop = None if count is None else start + count
+        started = time.monotonic()
+        base = None
+        for record in capture.iter_records(start, stop, directions):
+            if base is None:
+                base = record.timestamp_ns
+            if speed > 0:
+                due = (record.timestamp_ns - base) / 1e9 / speed
+                ahead = due - (time.monotonic() - started)
+                if ahead > 0:
+                    drain(ahead)
+                else:
+                    stats["maxLagMs"] = max(stats["maxLagMs"], -ahead * 1000)
+            send(record.data)
+            stats["records"] += 1
+            stats["bytes"] += len(record.data)
+        stats["seconds"] = round(time.monotonic() - started, 3)
+        drain(wait)
+        stats["maxLagMs"] = round(stats["maxLagMs"], 3)
+    finally:
+        if link and os.path.islink(link):
+            os.unlink(link)
+        os.close(master)
+        os.close(slave)
+    return stats
+
+# ========== FUNCIÓN PRINCIPAL ==========
+
+def _print_records(capture: CaptureReader, start: int, count: int):
+    from futurex import FrameError, decode_frame
+
+    if not len(capture):
+        return
+    base = capture.record(0).timestamp_ns
+    for record in capture.iter_records(start, start + count):
+        seconds = (record.timestamp_ns - base) / 1e9
+        try:
+            frame = f"  (comando {decode_frame(record.data).command_code})"
+        except (FrameError, ValueError):
+            frame = ""
+        print(f"#{record.index:<10d} {seconds:+14.6f} s  {record.direction}  {len(record.data):5d}B  "
+              f"{bytes(record.data).hex(' ').upper()}{frame}")
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Capturas binarias indexadas del tráfico serial")
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert = commands.add_parser("convert", help="Logs de texto (logcat, CommLog, trazas) -> captura")
+    convert.add_argument("logs", nargs="+", help="Logs a convertir, en orden")
+    convert.add_argument("--output", required=True, help="Captura de salida (se agrega si ya existe)")
+    convert.add_argument("--year", type=int, help="Año de los logs de logcat (que no lo incluyen)")
+    info = commands.add_parser("info", help="Resumen de la captura")
+    info.add_argument("capture")
+    show = commands.add_parser("show", help="Mostrar registros en hex")
+    show.add_argument("capture")
+    position = show.add_mutually_exclusive_group()
+    position.add_argument("--record", type=int, default=0, help="Primer registro")
+    position.add_argument("--at", type=float, help="Segundos desde el primer registro")
+    show.add_argument("--count", type=int, default=20, help="Cantidad de registros")
+    replay = commands.add_parser("replay", help="Reproducir la captura en un pty")
+    replay.add_argument("capture")
+    replay.add_argument("--from", dest="start", type=int, default=0, help="Primer registro")
+    replay.add_argument("--count", type=int, help="Cantidad de registros")
+    replay.add_argument("--speed", type=float, default=1.0, help="Velocidad (1 = original, 0 = sin esperas)")
+    replay.add_argument("--direction", choices=["tx", "rx", "both"], default="tx",
+                        help="Qué dirección reproducir (tx: lo que recibió el equipo)")
+    replay.add_argument("--link", help="Symlink al puerto (por ejemplo /tmp/kr/replay)")
+    replay.add_argument("--wait", type=float, default=2.0,
+                        help="Segundos para abrir el puerto antes de empezar (y de gracia al terminar)")
+    rebuild = commands.add_parser("reindex", help="Reconstruir el índice")
+    rebuild.add_argument("capture")
+    rebuild.add_argument("--interval", type=int,
+                         help=f"Registros por entrada (por defecto el del índice actual, o {INDEX_INTERVAL})")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "convert":
+            started = time.perf_counter()
+            added = convert_logs(args.logs, args.output, args.year)
+            print(f"✅ {added} registros agregados a {args.output} en {time.perf_counter() - started:.2f} s")
+        elif args.command == "reindex":
+            print(f"✅ Índice reconstruido: {reindex(args.capture, args.interval)} registros")
+        else:
+            with CaptureReader(args.capture) as capture:
+                if args.command == "info":
+                    for name, value in capture.info().items():
+                        print(f"   {name:18s} {value}")
+                elif args.command == "show":
+                    start = args.record
+                    if args.at is not None and len(capture):
+                        start = capture.seek_time(capture.record(0).timestamp_ns + int(args.at * 1e9))
+                    _print_records(capture, start, args.count)
+                else:
+                    directions = (TX, RX) if args.direction == "both" else (args.direction.upper(),)
+                    stats = replay_to_pty(capture, args.start, args.count, args.speed, directions, args.link,
+                                          args.wait, lambda path: print(f"🔌 Puerto: {path}", flush=True))
+                    print(f"✅ {stats['records']} registros ({stats['bytes']} bytes) en {stats['seconds']} s,"
+                          f" atraso máx. {stats['maxLagMs']} ms, {stats['responseBytes']} bytes de respuesta")
+    except (OSError, ValueError, IndexError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 130
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Puerto serial asíncrono para hablar Futurex desde el host.
+
+Abre un puerto real (/dev/ttyUSB0 con el cable CH340) o el lado esclavo de
+un pty del simulador (keyreceiver_sim.py), lo deja en modo raw a la
+velocidad pedida y lo atiende desde el event loop de asyncio, sin hilos.
+Los bytes recibidos pasan por FrameStreamParser y los frames completos
+quedan en una cola.
+
+Uso:
+    async with SerialLink("/dev/ttyUSB0", 115200) as link:
+        response = await link.transact(format_message("03", ("01",)), timeout=3.0)
+        print(response.message())
+"""
+
+import asyncio
+import os
+import termios
+import time
+import tty
+from dataclasses import dataclass
+from typing import Optional
+
+from frame_stream import FrameStreamParser
+from futurex import Buffer, parse_payload
+
+DEFAULT_BAUD_RATE = 115200
+DEFAULT_TIMEOUT = 3.0  # FuturexProtocol: tiempo de espera de respuesta
+READ_SIZE = 4096
+
+# ========== CONFIGURACIÓN DEL PUERTO ==========
+
+def baud_rate_constant(baud_rate: int) -> int:
+    """Constante termios para una velocidad (B9600, B115200, ...)."""
+    constant = getattr(termios, f"B{baud_rate}", None)
+    if constant is None:
+        raise ValueError(f"Velocidad no soportada: {baud_rate}")
+    return constant
+
+def configure_port(fd: int, baud_rate: int = DEFAULT_BAUD_RATE):
+    """Deja el puerto en modo raw 8N1, sin control de flujo, a la velocidad pedida."""
+    tty.setraw(fd)
+    attributes = termios.tcgetattr(fd)
+    speed = baud_rate_constant(baud_rate)
+    attributes[2] = (attributes[2] & ~(termios.CSTOPB | termios.PARENB | termios.CRTSCTS)) \
+        | termios.CLOCAL | termios.CREAD
+    attributes[4] = attributes[5] = speed
+    termios.tcsetattr(fd, termios.TCSANOW, attributes)
+    termios.tcflush(fd, termios.TCIOFLUSH)
+
+# ========== ENLACE ==========
+
+@dataclass
+class ReceivedFrame:
+    """Frame recibido (copia del payload, ya fuera del buffer del parser)."""
+    payload: bytes
+    lrc_ok: bool
+    received_ns: int
+
+    def message(self):
+        """Mensaje Futurex decodificado (ParseError/UnknownCommand si no se reconoce)."""
+        return parse_payload(self.payload)
+
+class SerialLink:
+    """
+    Puerto serial atendido por el event loop.
+
+    Los frames con LRC incorrecto también se entregan (lrc_ok=False) para
+    que quien llama decida si reintenta.
+    """
+
+    def __init__(self, path: str, baud_rate: int = DEFAULT_BAUD_RATE):
+        self.path = path
+        self.baud_rate = baud_rate
+        self.parser = FrameStreamParser(include_invalid=True)
+        self.bytes_out = 0
+        self._fd = -1
+        self._frames: "asyncio.Queue[ReceivedFrame]" = asyncio.Queue()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._fd >= 0
+
+    def open(self):
+        self._loop = asyncio.get_running_loop()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            configure_port(self._fd, self.baud_rate)
+        except (termios.error, ValueError):
+            os.close(self._fd)
+            self._fd = -1
+            raise
+        self._loop.add_reader(self._fd, self._on_readable)
+
+    def set_baud_rate(self, baud_rate: int):
+        """Cambia la velocidad del puerto abierto y descarta lo recibido hasta ahora."""
+        configure_port(self._fd, baud_rate)
+        self.baud_rate = baud_rate
+        self.parser.reset()
+        self.discard_pending()
+
+    def close(self):
+        if self._fd < 0:
+            return
+        self._loop.remove_reader(self._fd)
+        self._loop.remove_writer(self._fd)
+        os.close(self._fd)
+        self._fd = -1
+
+    async def __aenter__(self) -> "SerialLink":
+        self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._fd, READ_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            # El dispositivo desapareció (cable desconectado)
+            self._loop.remove_reader(self._fd)
+            return
+        now = time.perf_counter_ns()
+        for frame in self.parser.feed(data):
+            self._frames.put_nowait(ReceivedFrame(bytes(frame.payload), frame.lrc_ok, now))
+
+    async def _writable(self):
+        future = self._loop.create_future()
+
+        def ready():
+            self._loop.remove_writer(self._fd)
+            if not future.done():
+                future.set_result(None)
+
+        self._loop.add_writer(self._fd, ready)
+        try:
+            await future
+        finally:
+            self._loop.remove_writer(self._fd)
+
+    async def write(self, data: Buffer):
+        """Escribe el buffer completo, esperando al puerto si se llena."""
+        view = memoryview(data)
+        while view:
+            try:
+                written = os.write(self._fd, view)
+            except BlockingIOError:
+                written = 0
+            self.bytes_out += written
+            view = view[written:]
+            if view:
+                await self._writable()
+
+    async def read_frame(self, timeout: Optional[float] = DEFAULT_TIMEOUT) -> ReceivedFrame:
+        """
+        Espera el siguiente frame.
+
+        Raises:
+            asyncio.TimeoutError: si no llega nada en `timeout` segundos
+        """
+        return await asyncio.wait_for(self._frames.get(), timeout)
+
+    def discard_pending(self) -> int:
+        """Descarta frames ya recibidos y no leídos (respuestas tardías)."""
+        discarded = 0
+        while not self._frames.empty():
+            self._frames.get_nowait()
+            discarded += 1
+        return discarded
+
+    async def transact(self, frame: Buffer, timeout: Optional[float] = DEFAULT_TIMEOUT) -> ReceivedFrame:
+        """Envía un frame y espera la respuesta (stop-and-wait)."""
+        self.discard_pending()
+        await self.write(frame)
+        return await self.read_frame(timeout)
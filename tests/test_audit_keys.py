@@ -0,0 +1,39 @@
+import json
+
+from audit_keys import ISSUE_KCV_MISMATCH, ISSUE_PARITY, audit_key_file, main
+from kcv import calculate_kcv
+
+NO_PARITY = "00112233445566778899AABBCCDDEEFF"  # 0x00 tiene paridad par
+
+def _record(key_type, key_hex, algorithm="DES_DOUBLE", kcv=None):
+    return {"keyType": key_type, "algorithm": algorithm, "keyHex": key_hex, "bytes": len(key_hex) // 2,
+            "kcv": kcv if kcv is not None else calculate_kcv(bytes.fromhex(key_hex), algorithm)}
+
+def _write(path, records):
+    path.write_text(json.dumps({"keys": records}))
+    return str(path)
+
+def test_parity_is_checked_only_on_non_derived_des_keys(tmp_path):
+    path = _write(tmp_path / "llaves.json", [_record("MASTER_KEY", NO_PARITY), _record("DUKPT_IPEK", NO_PARITY),
+                                            _record("DUKPT_INITIAL_KEY", NO_PARITY)])
+    issues = [result["issues"] for result in audit_key_file(path)]
+    assert issues == [[ISSUE_PARITY], [], []]
+    assert [result["issues"] for result in audit_key_file(path, check_parity=False)] == [[], [], []]
+
+def test_kcv_mismatch_and_short_kcv(tmp_path):
+    aes = "000102030405060708090A0B0C0D0E0F"
+    kcv = calculate_kcv(bytes.fromhex(aes), "AES-128")
+    path = _write(tmp_path / "llaves.json", [_record("WORKING_PIN_KEY", aes, "AES-128", kcv[:4]),
+                                            _record("WORKING_PIN_KEY", aes, "AES-128", "000000")])
+    assert [result["issues"] for result in audit_key_file(path)] == [[], [ISSUE_KCV_MISMATCH]]
+
+def test_report_is_written_only_when_requested(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    path = _write(tmp_path / "llaves.json", [_record("DUKPT_IPEK", NO_PARITY)])
+    assert main([path]) == 0
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["llaves.json"]
+
+    bad = _write(tmp_path / "malas.json", [_record("MASTER_KEY", NO_PARITY, kcv="000000")])
+    assert main([bad, "--report", "reporte.jsonl"]) == 1
+    lines = (tmp_path / "reporte.jsonl").read_text().splitlines()
+    assert json.loads(lines[0])["issues"] == [ISSUE_PARITY, ISSUE_KCV_MISMATCH]
@@ -0,0 +1,20 @@
+from benchmark_crypto import COLD_KEYS, CASE_GROUPS, compare, ipek_cases, kcv_cases, measure
+from cipher_cache import DEFAULT_CACHE_SIZE
+
+def test_case_names_are_unique():
+    names = [case.name for group in CASE_GROUPS.values() for case in group()]
+    assert len(names) == len(set(names))
+
+def test_single_cases_have_a_cold_counterpart():
+    names = {case.name for case in ipek_cases() + kcv_cases()}
+    singles = {name for name in names if ".single." in name}
+    assert singles and {name.replace(".single.", ".cold.") for name in singles} <= names
+    assert COLD_KEYS > DEFAULT_CACHE_SIZE
+
+def test_measure_and_compare():
+    case = next(case for case in kcv_cases() if case.name.startswith("kcv.cold."))
+    result = measure(case, repeat=1, min_time=0.001)
+    assert result["name"] == case.name and result["medianUs"] > 0
+    slower = dict(result, medianUs=result["medianUs"] * 2)
+    (change,) = compare([slower], [result], 10.0)
+    assert change["regression"] and change["changePercent"] == 100.0
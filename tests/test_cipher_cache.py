@@ -0,0 +1,45 @@
+import pytest
+from Crypto.Cipher import DES, DES3
+
+from cipher_cache import CipherCache, ecb_decrypt, ecb_encrypt
+
+# FIPS-197 apéndice C.1
+AES_KEY = bytes.fromhex("000102030405060708090A0B0C0D0E0F")
+AES_PLAIN = bytes.fromhex("00112233445566778899AABBCCDDEEFF")
+AES_CIPHER = bytes.fromhex("69C4E0D86A7B0430D8CDB78070B4C55A")
+TDES_KEY = bytes.fromhex("0123456789ABCDEFFEDCBA9876543210")
+
+def test_aes_fips197_and_round_trip():
+    assert ecb_encrypt("AES", AES_KEY, AES_PLAIN) == AES_CIPHER
+    assert ecb_decrypt("AES", AES_KEY, AES_CIPHER * 2) == AES_PLAIN * 2
+
+def test_tdes_key_lengths_match_reference():
+    block = bytes(range(16))
+    assert ecb_encrypt("TDES", TDES_KEY, block) == DES3.new(TDES_KEY, DES3.MODE_ECB).encrypt(block)
+    single = TDES_KEY[:8]
+    assert ecb_encrypt("TDES", single, block) == DES.new(single, DES.MODE_ECB).encrypt(block)
+
+def test_hits_misses_and_lru_eviction_zeroizes():
+    cache = CipherCache(max_size=2)
+    cache.encrypt("AES", AES_KEY, AES_PLAIN)
+    cache.encrypt("AES", AES_KEY, AES_PLAIN)
+    copy = next(iter(cache._entries.values()))[1]
+    cache.encrypt("TDES", TDES_KEY, bytes(8))
+    cache.decrypt("AES", AES_KEY, AES_CIPHER)  # otra dirección, otra entrada
+    assert cache.stats() == {"size": 2, "maxSize": 2, "hits": 1, "misses": 3, "evicted": 1}
+    assert copy == bytes(len(AES_KEY))
+    cache.clear()
+    assert len(cache) == 0
+
+def test_errors():
+    cache = CipherCache()
+    with pytest.raises(ValueError, match="múltiplo"):
+        cache.encrypt("AES", AES_KEY, AES_PLAIN[:15])
+    with pytest.raises(ValueError):
+        cache.encrypt("AES", AES_KEY[:10], AES_PLAIN)
+    with pytest.raises(ValueError, match="no soportado"):
+        cache.encrypt("RC4", AES_KEY, AES_PLAIN)
+    with pytest.raises(ValueError):
+        CipherCache(0)
+    # Un error no deja entradas a medio armar
+    assert len(cache) == 0
@@ -0,0 +1,48 @@
+from comm_log_analyzer import RX, TX, LogAnalyzer, analyze_log_file, parse_log_line, traffic_data
+from futurex import format_message
+
+READ_SERIAL = format_message("03", ("01",))
+RESPONSE = format_message("03", ("00", "SN12345678901234"))
+
+def _hex(data: bytes) -> str:
+    return " ".join(f"0x{byte:02X}" for byte in data)
+
+def test_line_formats():
+    logcat = parse_log_line("10-17 12:34:56.789  1234  5678 I PollingService: TX POLL (12B, write=12): 0x02 0x30",
+                            2025)
+    commlog = parse_log_line("2025-10-17 12:34:56.789 [I] PollingService: RX 2B: 0x02 0x30")
+    jsonl = parse_log_line('{"timestampMs": 1760700000000, "level": "W", "tag": "Futurex", "message": "x"}')
+    trace = parse_log_line("RX [1760700000000]: HEX(0230) ASCII('.0')")
+    assert logcat.timestamp_ms == commlog.timestamp_ms
+    assert (logcat.tag, logcat.level) == ("PollingService", "I")
+    assert traffic_data(logcat.message) == (TX, b"\x02\x30")
+    assert traffic_data(commlog.message) == (RX, b"\x02\x30")
+    assert (jsonl.timestamp_ms, jsonl.tag) == (1760700000000, "Futurex")
+    assert traffic_data(trace.message) == (RX, b"\x02\x30")
+    assert parse_log_line("basura") is None
+
+def test_pairing_retries_and_timeouts(tmp_path):
+    log = tmp_path / "log.txt"
+    split = len(RESPONSE) // 2
+    log.write_text("\n".join([
+        f"2025-10-17 12:00:00.000 [I] Futurex: TX 6B: {_hex(READ_SERIAL)}",
+        f"2025-10-17 12:00:00.500 [I] Futurex: TX 6B: {_hex(READ_SERIAL)}",
+        f"2025-10-17 12:00:00.540 [I] Futurex: RX: {_hex(RESPONSE[:split])}",
+        f"2025-10-17 12:00:00.541 [I] Futurex: RX: {_hex(RESPONSE[split:])}",
+        f"2025-10-17 12:00:01.000 [I] Futurex: TX 6B: {_hex(READ_SERIAL)}",
+        "2025-10-17 12:00:05.000 [W] Futurex: Timeout esperando respuesta",
+    ]) + "\n")
+    analysis = analyze_log_file(str(log), timeout=3)
+    stats = analysis.commands["03"]
+    assert (stats.requests, stats.retries, stats.responses, stats.timeouts) == (3, 1, 1, 1)
+    assert stats.latency_max_ms == 41
+    assert (analysis.timeout_events, analysis.unanswered, analysis.span_ms) == (1, 0, 5000)
+
+def test_bad_lrc_response_counts_against_request():
+    damaged = bytearray(RESPONSE)
+    damaged[-1] ^= 0xFF
+    analyzer = LogAnalyzer()
+    analyzer.feed_line(f"2025-10-17 12:00:00.000 [I] Futurex: TX: {_hex(READ_SERIAL)}")
+    analyzer.feed_line(f"2025-10-17 12:00:00.020 [I] Futurex: RX: {_hex(bytes(damaged))}")
+    analysis = analyzer.finish()
+    assert (analysis.bad_lrc_rx, analysis.commands["03"].bad_lrc, analysis.unanswered) == (1, 1, 0)
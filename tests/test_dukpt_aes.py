@@ -0,0 +1,46 @@
+import pytest
+
+from dukpt_aes import AesDukptEngine, derive_initial_key, futurex_ksn_to_aes, normalize_ksn, split_ksn
+
+# ANSI X9.24-3-2017, vectores de prueba AES-128
+BDK = bytes.fromhex("FEDCBA9876543210F1F1F1F1F1F1F1F1")
+INITIAL_KEY_ID = bytes.fromhex("1234567890123456")
+INITIAL_KEY = bytes.fromhex("1273671EA26AC29AFA4D1084127652A1")
+PIN_KEY_COUNTER_1 = bytes.fromhex("AF8CB133A78F8DC2D1359F18527593FB")
+
+def test_initial_key_vector():
+    assert derive_initial_key(BDK, INITIAL_KEY_ID) == INITIAL_KEY
+
+def test_from_bdk_uses_x9_24_3_initial_key():
+    engine = AesDukptEngine.from_bdk(BDK, INITIAL_KEY_ID + bytes(4))
+    assert engine.initial_key == INITIAL_KEY
+    assert engine.pin_key(INITIAL_KEY_ID + (1).to_bytes(4, "big")) == PIN_KEY_COUNTER_1
+
+def test_cached_and_uncached_derivations_match():
+    engine = AesDukptEngine(INITIAL_KEY, INITIAL_KEY_ID)
+    keys = [engine.pin_key(counter) for counter in (1, 2, 3, 0xFFFF, 0x10000)]
+    engine.clear_cache()
+    assert keys[::-1] == [engine.pin_key(counter) for counter in (0x10000, 0xFFFF, 3, 2, 1)]
+    assert engine.pin_key(1) == PIN_KEY_COUNTER_1
+
+def test_futurex_ksn_keeps_device_bits_out_of_counter():
+    # BDK ID FFFF987654 | Device ID 0x7FFFF | contador 1
+    ksn = ((0xFFFF987654 << 40) | (0x7FFFF << 21) | 1).to_bytes(10, "big")
+    initial_key_id, counter = split_ksn(ksn)
+    assert counter == 1
+    assert initial_key_id == ((0xFFFF987654 << 19) | 0x7FFFF).to_bytes(8, "big")
+    assert normalize_ksn(ksn) == futurex_ksn_to_aes(ksn)
+
+def test_futurex_ksn_with_full_device_id_derives():
+    ksn = ((0xFFFF987654 << 40) | (0x7FFFF << 21) | 3).to_bytes(10, "big")
+    engine = AesDukptEngine.from_bdk(BDK, ksn)
+    assert len(engine.pin_key(ksn)) == 16
+
+def test_invalid_ksn_length_rejected():
+    with pytest.raises(ValueError):
+        normalize_ksn(bytes(11))
+
+def test_counter_with_too_many_one_bits_rejected():
+    engine = AesDukptEngine(INITIAL_KEY, INITIAL_KEY_ID)
+    with pytest.raises(ValueError):
+        engine.derivation_key(0x1FFFF)
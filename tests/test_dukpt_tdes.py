@@ -0,0 +1,72 @@
+import builtins
+import csv
+
+import pytest
+
+import dukpt_tdes
+from cipher_cache import ecb_encrypt
+from dukpt_tdes import (
+    STATUS_OK, STATUS_UNKNOWN_BDK, PinBlockVerifier, TdesDukptEngine, TdesDukptOriginator,
+    verify_pin_block_file, write_sample_transactions,
+)
+from pin_block import encode_pin_block
+
+# ANSI X9.24-1, anexo A
+BDK = bytes.fromhex("0123456789ABCDEFFEDCBA9876543210")
+KSN = bytes.fromhex("FFFF9876543210E00000")
+IPEK = "6AC292FAA1315B4D858AB3A3D7D5933A"
+PIN_KEY_1 = "042666B49184CF5C68DE9628D0397B36"
+PIN_BLOCK_1 = "1B9C1845EB993A7A"  # PIN 1234, PAN 4012345678909
+PAN = "4012345678909"
+
+def test_x924_vectors():
+    engine = TdesDukptEngine.from_bdk(BDK, KSN)
+    assert engine.ipek.hex().upper() == IPEK
+    key = engine.pin_key(1)
+    assert key.hex().upper() == PIN_KEY_1
+    assert ecb_encrypt("TDES", key, encode_pin_block("1234", 0, PAN)).hex().upper() == PIN_BLOCK_1
+
+def test_originator_and_engine_agree():
+    engine = TdesDukptEngine.from_bdk(BDK, KSN)
+    originator = TdesDukptOriginator(bytes.fromhex(IPEK), KSN)
+    for _ in range(40):
+        ksn, pin_block = originator.encrypt_pin("4321", PAN)
+        assert PinBlockVerifier({"FFFF987654": BDK}).verify(ksn.hex(), pin_block.hex(), PAN, "4321") == \
+            (STATUS_OK, "4321")
+        assert engine.pin_key(ksn) == TdesDukptEngine.from_bdk(BDK, ksn).pin_key(ksn)
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_verify_file(tmp_path, processes):
+    bdks = {"FFFF987654": BDK, "FFFF000001": bytes.fromhex("FEDCBA98765432100123456789ABCDEF")}
+    source, result = tmp_path / "tx.csv", tmp_path / "out.csv"
+    rows = write_sample_transactions(str(source), bdks, devices=3, transactions=5)
+    with open(source, "a", newline="") as f:
+        csv.writer(f).writerow(["AAAA0000010000000001", "0000000000000000", PAN, "1234"])
+    summary = verify_pin_block_file(str(source), str(result), bdks, processes)
+    assert summary == {STATUS_OK: rows, STATUS_UNKNOWN_BDK: 1}
+    with open(result, newline="") as f:
+        assert len(list(csv.DictReader(f))) == rows + 1
+
+def test_partition_files_are_closed_on_error(tmp_path, monkeypatch):
+    bdks = {"FFFF987654": BDK, "FFFF000001": bytes.fromhex("FEDCBA98765432100123456789ABCDEF")}
+    source = tmp_path / "tx.csv"
+    write_sample_transactions(str(source), bdks, devices=2, transactions=3)
+    handles = []
+
+    def tracking_open(*args, **kwargs):
+        handle = builtins.open(*args, **kwargs)
+        handles.append(handle)
+        return handle
+
+    def failing_rows(path):
+        with builtins.open(path, newline="") as f:
+            for line, row in enumerate(csv.DictReader(f), start=2):
+                yield line, row
+        raise OSError("disco lleno")
+
+    monkeypatch.setattr(dukpt_tdes, "open", tracking_open, raising=False)
+    monkeypatch.setattr(dukpt_tdes, "_numbered_rows", failing_rows)
+    with pytest.raises(OSError, match="disco lleno"):
+        verify_pin_block_file(str(source), str(tmp_path / "out.csv"), bdks, processes=2)
+    assert len(handles) == 3
+    assert all(handle.closed for handle in handles)
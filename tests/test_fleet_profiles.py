@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from dukpt_tdes import TdesDukptEngine
+from fleet_profiles import check_serial, generate_fleet, resolve_templates
+from key_index import KeyIndex
+
+BDK = "0123456789ABCDEFFEDCBA9876543210"
+TEMPLATES = {"templates": {"retail": {"keys": [
+    {"bdkHex": BDK, "dukptType": "3DES", "bdkId": "FFFF987654", "deviceIdStart": 7},
+    {"keyType": "MASTER_KEY", "selectedKey": "D52453"},
+]}}}
+
+def _fleet(tmp_path, serials, **options):
+    manifest = tmp_path / "flota.csv"
+    manifest.write_text("serialNumber,template\n" + "".join(f"{serial},retail\n" for serial in serials))
+    templates = resolve_templates(TEMPLATES, KeyIndex.from_files([]))
+    return generate_fleet(str(manifest), templates, **options)
+
+def test_bundle_has_one_ipek_per_terminal(tmp_path):
+    bundle = tmp_path / "flota.jsonl"
+    assert _fleet(tmp_path, ["SN-001", "SN_002"], bundle=str(bundle)) == 2
+    lines = [json.loads(line) for line in bundle.read_text().splitlines()]
+    assert [line["serialNumber"] for line in lines] == ["SN-001", "SN_002"]
+    ksns = []
+    for line in lines:
+        dukpt, static = line["profile"]["keyConfigurations"]
+        (key,) = line["keys"]
+        assert (dukpt["slot"], static["slot"], static["selectedKey"]) == ("01", "02", "D52453")
+        assert dukpt["selectedKey"] == key["kcv"] and dukpt["ksn"] == key["ksn"]
+        engine = TdesDukptEngine.from_bdk(bytes.fromhex(BDK), bytes.fromhex(key["ksn"]))
+        assert engine.ipek.hex().upper() == key["keyHex"]
+        ksns.append(key["ksn"])
+    assert ksns[0] != ksns[1] and all(ksn.startswith("FFFF987654") for ksn in ksns)
+
+def test_output_dir_files(tmp_path):
+    output = tmp_path / "perfiles"
+    assert _fleet(tmp_path, ["A1"], output_dir=str(output)) == 1
+    assert sorted(p.name for p in output.iterdir()) == ["llaves_A1.json", "perfil_A1.json"]
+
+@pytest.mark.parametrize("serial", ["../fuera", "a/b", "SN 1", "..", "ñ1"])
+def test_unsafe_serials_are_rejected(tmp_path, serial):
+    with pytest.raises(ValueError, match="serie"):
+        check_serial(serial)
+    output = tmp_path / "perfiles"
+    with pytest.raises(ValueError, match="fila 1"):
+        _fleet(tmp_path, [serial], output_dir=str(output))
+    assert list(output.iterdir()) == []
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["flota.csv", "perfiles"]
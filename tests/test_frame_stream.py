@@ -0,0 +1,66 @@
+from frame_stream import FrameStreamParser, format_legacy_message, replay_capture
+from futurex import ReadSerialCommand, format_message
+
+FIRST = format_message("03", ("01",))
+SECOND = format_message("04", ("00",))
+
+def test_frames_split_across_reads():
+    parser = FrameStreamParser()
+    stream = b"\xff" + FIRST + SECOND
+    payloads = [bytes(frame.payload) for byte in range(len(stream))
+                for frame in parser.feed(stream[byte:byte + 1])]
+    assert payloads == [b"0301", b"0400"]
+    assert parser.stats.discarded_bytes == 1 and parser.pending == 0
+
+def test_feed_consumes_bytes_even_if_result_is_ignored():
+    parser = FrameStreamParser()
+    parser.feed(FIRST)
+    parser.feed(SECOND[:3])
+    frames = parser.feed(SECOND[3:])
+    assert [bytes(frame.payload) for frame in frames] == [b"0400"]
+    assert parser.stats.frames == 2
+
+def test_bad_lrc_and_truncated_frames_resync():
+    broken = bytearray(FIRST)
+    broken[-1] ^= 0xFF
+    parser = FrameStreamParser(include_invalid=True)
+    frames = parser.feed(bytes(broken) + FIRST[:3] + SECOND)
+    assert [(bytes(frame.payload), frame.lrc_ok) for frame in frames] == [(b"0301", False), (b"0400", True)]
+    assert (parser.stats.bad_lrc, parser.stats.truncated) == (1, 1)
+    assert isinstance(FrameStreamParser().feed(FIRST)[0].message(), ReadSerialCommand)
+
+def test_chunk_larger_than_buffer_keeps_every_payload():
+    frames = [format_message("03", (f"{n % 100:02d}",)) for n in range(3000)]
+    parser = FrameStreamParser(capacity=1024, max_frame_size=256)
+    result = parser.feed(b"".join(frames))
+    assert [bytes(frame.payload) for frame in result] == [frame[1:-2] for frame in frames]
+    assert [frame.offset for frame in result[:2]] == [0, len(frames[0])]
+
+def test_oversized_frame_is_discarded():
+    parser = FrameStreamParser(capacity=1024, max_frame_size=64)
+    assert parser.feed(b"\x02" + b"A" * 100) == []
+    assert [bytes(frame.payload) for frame in parser.feed(FIRST)] == [b"0301"]
+    assert parser.stats.oversized == 1
+
+def test_legacy_frames():
+    parser = FrameStreamParser("legacy")
+    message = parser.feed(format_legacy_message("0100", ["POLL"]))[0].message()
+    assert (message.command, message.fields) == ("0100", ["POLL"])
+
+def test_replay_capture_summary():
+    chunks = [(FIRST + SECOND) * 50]
+    summary = replay_capture(iter(chunks), decode=True)
+    assert (summary["frames"], summary["parseErrors"], summary["pendingBytes"]) == (100, 0, 0)
+
+def test_noise_keeps_arrivals_bounded():
+    parser = FrameStreamParser()
+    for _ in range(100000):
+        assert parser.feed(b"garbage!") == []
+    assert len(parser._arrivals) == 1
+    assert parser.stats.discarded_bytes == 800000
+    frame = format_message("03", ("01",))
+    for byte in frame[:-1]:
+        parser.feed(bytes([byte]))
+    assert len(parser._arrivals) <= len(frame)
+    assert [f.payload.tobytes() for f in parser.feed(frame[-1:])] == [b"0301"]
+    assert len(parser._arrivals) == 1
@@ -0,0 +1,74 @@
+import functools
+
+import pytest
+
+from futurex import (
+    SUCCESSFUL, FrameEncoder, FrameError, InjectSymmetricKeyCommand, InjectSymmetricKeyResponse,
+    ParseError, ReadSerialCommand, ReadSerialResponse, WriteSerialCommand, WriteSerialResponse,
+    calculate_lrc, decode_frame, decrypt_with_kek, encrypt_with_kek, find_frame, format_message,
+)
+
+def test_lrc_matches_bytewise_xor():
+    for data in (b"", b"\x03", b"0301\x03", bytes(range(256)) * 3):
+        assert calculate_lrc(data) == functools.reduce(lambda a, b: a ^ b, data, 0)
+
+def test_format_message_frame_layout():
+    frame = format_message("03", ("01",))
+    assert frame[:-1] == b"\x020301\x03"
+    assert frame[-1] == calculate_lrc(b"0301\x03")
+
+def test_inject_command_round_trip():
+    encoder = FrameEncoder(16)
+    key_hex = "0123456789ABCDEFFEDCBA9876543210"
+    frame = bytes(encoder.inject_symmetric_key(5, key_hex, "08d7b4", ktk_slot=1, key_type="05",
+                                               encryption_type="02", key_algorithm="01",
+                                               total_keys=3, current_key_index=2))
+    message = decode_frame(frame)
+    assert isinstance(message, InjectSymmetricKeyCommand)
+    assert (message.key_slot, message.ktk_slot, message.key_type, message.key_checksum) == (5, 1, "05", "08D7")
+    assert message.key_bytes() == bytes.fromhex(key_hex)
+    assert (message.total_keys, message.current_key_index) == (3, 2)
+
+def test_inject_response_round_trip():
+    frame = bytes(FrameEncoder().inject_symmetric_key_response(SUCCESSFUL, "08D7", "SN12345678901234", "N910"))
+    message = decode_frame(frame)
+    assert isinstance(message, InjectSymmetricKeyResponse)
+    assert message.is_successful and message.device_serial == "SN12345678901234"
+
+@pytest.mark.parametrize("frame, expected", [
+    (FrameEncoder().read_serial(), ReadSerialCommand),
+    (FrameEncoder().read_serial_response(SUCCESSFUL, "SN12345678901234"), ReadSerialResponse),
+    (FrameEncoder().read_serial_response(SUCCESSFUL), ReadSerialResponse),
+    (FrameEncoder().read_serial_response("05"), ReadSerialResponse),
+    (FrameEncoder().write_serial("SN12345678901234"), WriteSerialCommand),
+    (FrameEncoder().write_serial_response(SUCCESSFUL), WriteSerialResponse),
+])
+def test_serial_commands_and_responses(frame, expected):
+    assert type(decode_frame(bytes(frame))) is expected
+
+def test_empty_serial_response_fields():
+    message = decode_frame(bytes(FrameEncoder().read_serial_response(SUCCESSFUL)))
+    assert (message.response_code, message.serial_number) == (SUCCESSFUL, "")
+
+def test_bad_frames():
+    frame = bytearray(format_message("03", ("01",)))
+    frame[-1] ^= 0xFF
+    with pytest.raises(FrameError):
+        decode_frame(bytes(frame))
+    assert isinstance(decode_frame(bytes(frame), check_lrc=False), ReadSerialCommand)
+    assert isinstance(decode_frame(format_message("02", ("01",))), ParseError)
+
+def test_find_frame_in_stream():
+    first, second = format_message("03", ("01",)), format_message("04", ("00",))
+    data = b"ruido" + first + second[:-1]
+    start, end, lrc_ok = find_frame(data)
+    assert data[start:end] == first and lrc_ok
+    assert find_frame(data, end) is None
+
+@pytest.mark.parametrize("kek_length", [16, 24, 32])
+def test_kek_round_trip(kek_length):
+    kek = bytes(range(1, kek_length + 1))
+    key = bytes.fromhex("00112233445566778899AABBCCDDEEFF0011")
+    encrypted = encrypt_with_kek(key, kek)
+    assert len(encrypted) % (16 if kek_length == 32 else 8) == 0
+    assert decrypt_with_kek(encrypted, kek, len(key)) == key
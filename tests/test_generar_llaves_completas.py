@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from generar_llaves_completas import generate_from_spec, generate_key_bytes, load_spec, main
+from kcv import calculate_kcv
+from key_files import iter_key_records
+from key_wrap import aes_key_unwrap_many
+
+SPEC = {"description": "Ceremonia", "keys": [
+    {"keyType": "MASTER_KEY", "algorithm": "3DES-16", "count": 7},
+    {"keyType": "DUKPT_BDK", "algorithm": "AES-256", "count": 3, "description": "BDK"},
+]}
+
+def _write_spec(tmp_path, spec=SPEC) -> str:
+    path = tmp_path / "spec.json"
+    path.write_text(json.dumps(spec), encoding="utf-8")
+    return str(path)
+
+def test_des_keys_have_odd_parity_and_distinct_halves():
+    for key in generate_key_bytes("3DES-24", 200):
+        assert len(key) == 24
+        assert all(bin(b).count("1") % 2 == 1 for b in key)
+        assert key[:8] != key[8:16] and key[8:16] != key[16:]
+
+def test_load_spec_rejects_bad_entries(tmp_path):
+    description, items = load_spec(_write_spec(tmp_path))
+    assert description == "Ceremonia"
+    assert items[1] == ("DUKPT_BDK", "AES-256", "BDK", 3)
+    with pytest.raises(ValueError, match="Entrada 1"):
+        load_spec(_write_spec(tmp_path, [{"keyType": "MASTER_KEY", "algorithm": "DES-8"}]))
+    with pytest.raises(ValueError, match="cantidad"):
+        load_spec(_write_spec(tmp_path, [{"keyType": "MASTER_KEY", "algorithm": "AES-128", "count": -1}]))
+
+@pytest.mark.parametrize("name,processes", [("llaves.json", 1), ("llaves.jsonl", 2)])
+def test_generate_from_spec(tmp_path, name, processes):
+    output = str(tmp_path / name)
+    assert generate_from_spec(_write_spec(tmp_path), output, processes=processes, chunk_size=2) == 10
+    records = list(iter_key_records(output))
+    assert [record["keyType"] for record in records] == ["MASTER_KEY"] * 7 + ["DUKPT_BDK"] * 3
+    for record in records:
+        assert record["kcv"] == calculate_kcv(bytes.fromhex(record["keyHex"]), record["algorithm"])
+
+def test_generate_wrapped(tmp_path):
+    kek = bytes(range(32))
+    kek_kcv = calculate_kcv(kek, "AES-256")
+    output = str(tmp_path / "envueltas.jsonl")
+    generate_from_spec(_write_spec(tmp_path), output, kek=(kek, kek_kcv))
+    records = list(iter_key_records(output))
+    assert all("keyHex" not in record and record["kekKcv"] == kek_kcv for record in records)
+    keys = aes_key_unwrap_many(kek, [bytes.fromhex(record["wrappedKeyHex"]) for record in records])
+    assert [calculate_kcv(key, record["algorithm"]) for key, record in zip(keys, records)] == \
+        [record["kcv"] for record in records]
+
+def test_main_wrap_kek_once_per_file(tmp_path):
+    kek = bytes(range(32))
+    keks = tmp_path / "llaves_kek.jsonl"
+    keks.write_text(json.dumps({"keyType": "KEK_STORAGE", "algorithm": "AES-256", "keyHex": kek.hex().upper(),
+                                "kcv": calculate_kcv(kek, "AES-256")}), encoding="utf-8")
+    others = tmp_path / "otras.jsonl"
+    others.write_text(json.dumps({"keyType": "MASTER_KEY", "algorithm": "AES-128", "keyHex": "00" * 16}),
+                      encoding="utf-8")
+    output = tmp_path / "envueltas.jsonl"
+    assert main(["--wrap-kek", str(keks), "--spec", _write_spec(tmp_path), "--wrap-kek", str(others),
+                 "--output", str(output)]) == 0
+    records = list(iter_key_records(str(output)))
+    assert len(records) == 10 and all("wrappedKeyHex" in record for record in records)
@@ -0,0 +1,92 @@
+import csv
+import json
+
+import pytest
+
+from dukpt_aes import AesDukptEngine, derive_initial_key, futurex_ksn_to_aes
+from futurex import SUCCESSFUL, decode_frame, format_message
+from generate_dukpt_keys import (
+    IpekBatchDeriver, build_ksn, derive_ipek_3des, derive_ipek_aes, derive_ipek_batch, dukpt_type_params,
+    ipek_injection_fields, iter_device_csv, iter_ksn_range, parse_args, write_ipek_batch,
+)
+from kcv import calculate_kcv
+from key_wrap import aes_key_unwrap_many
+from keyreceiver_sim import VirtualKeyReceiver
+
+BDK_3DES = bytes.fromhex("0123456789ABCDEFFEDCBA9876543210")
+KSN = bytes.fromhex("FFFF9876543210E00000")
+BDK_ID = bytes.fromhex("FFFF987654")
+
+def _aes_reference(bdk: bytes, ksn: bytes) -> bytes:
+    return derive_initial_key(bdk, futurex_ksn_to_aes(ksn)[:8])
+
+def test_3des_ipek_x924_vector():
+    assert derive_ipek_3des(BDK_3DES, KSN).hex().upper() == "6AC292FAA1315B4D858AB3A3D7D5933A"
+    # El contador no cambia la IPEK
+    assert derive_ipek_3des(BDK_3DES, bytes.fromhex("FFFF9876543210E00012")) == derive_ipek_3des(BDK_3DES, KSN)
+
+@pytest.mark.parametrize("size", [16, 24, 32])
+def test_aes_ipek_matches_reference(size):
+    bdk = bytes(range(size))
+    ksns = list(iter_ksn_range(build_ksn(BDK_ID, 5), 20))
+    expected = [_aes_reference(bdk, ksn) for ksn in ksns]
+    assert IpekBatchDeriver(bdk, "AES").derive_many(ksns) == expected
+    assert derive_ipek_aes(bdk, ksns[3]) == expected[3]
+    assert [ipek for _, ipek in derive_ipek_batch(bdk, "AES", iter(ksns), chunk_size=7)] == expected
+    assert all(len(ipek) == size for ipek in expected)
+
+@pytest.mark.parametrize("size", [16, 24, 32])
+def test_aes_ipek_matches_host_engine(size):
+    bdk = bytes(range(size))
+    ksn = build_ksn(BDK_ID, 1)
+    assert derive_ipek_aes(bdk, ksn) == AesDukptEngine.from_bdk(bdk, ksn).initial_key
+    # El contador no cambia la IPEK
+    assert derive_ipek_aes(bdk, bytes.fromhex("FFFF9876540000200007")) == derive_ipek_aes(bdk, ksn)
+
+def test_ksn_layout():
+    assert build_ksn(BDK_ID, 1).hex().upper() == "FFFF9876540000200000"
+    assert list(iter_ksn_range(build_ksn(BDK_ID, 0), 3))[2] == build_ksn(BDK_ID, 2)
+    with pytest.raises(ValueError):
+        build_ksn(BDK_ID, 1 << 19)
+    with pytest.raises(ValueError):
+        IpekBatchDeriver(bytes(24), "3DES")
+
+def test_device_csv_and_batch_output(tmp_path):
+    devices = tmp_path / "devices.csv"
+    devices.write_text("deviceId,ksn\n7,\n,FFFF9876543210E00000\n")
+    rows = list(iter_device_csv(str(devices), BDK_ID))
+    assert rows == [("7", build_ksn(BDK_ID, 7)), ("FFFF9876543210E00000", KSN)]
+
+    output = tmp_path / "ipeks.csv"
+    assert write_ipek_batch(BDK_3DES, "3DES", rows, str(output), chunk_size=1) == 2
+    with open(output, newline="") as f:
+        written = list(csv.DictReader(f))
+    assert written[1]["keyHex"] == "6AC292FAA1315B4D858AB3A3D7D5933A"
+    assert written[1]["kcv"] == calculate_kcv(bytes.fromhex(written[1]["keyHex"]), "3DES")
+
+def test_wrapped_batch_output(tmp_path):
+    kek = bytes(range(32))
+    output = tmp_path / "ipeks.jsonl"
+    write_ipek_batch(BDK_3DES, "3DES", [("1", KSN)], str(output), kek=(kek, "ABCDEF"))
+    record = json.loads(output.read_text())
+    assert "keyHex" not in record and record["kekKcv"] == "ABCDEF"
+    assert aes_key_unwrap_many(kek, [bytes.fromhex(record["wrappedKeyHex"])])[0] == derive_ipek_3des(BDK_3DES, KSN)
+
+@pytest.mark.parametrize("dukpt_type,algorithm_code", [
+    ("3DES", "00"), ("AES128", "02"), ("AES192", "03"), ("AES256", "04"),
+])
+def test_ipek_frame_accepted_by_receiver(dukpt_type, algorithm_code):
+    key_size, algorithm = dukpt_type_params(dukpt_type)
+    bdk = BDK_3DES if algorithm == "3DES" else bytes(range(key_size))
+    ipek = IpekBatchDeriver(bdk, algorithm).derive_many([KSN])[0]
+    frame = format_message("02", ipek_injection_fields(ipek, calculate_kcv(ipek, algorithm), KSN.hex(), algorithm))
+    command = decode_frame(frame)
+    assert command.key_algorithm == algorithm_code
+    assert len(command.key_bytes()) == len(ipek) == key_size
+    assert decode_frame(VirtualKeyReceiver("SN1").handle(command).tobytes()).response_code == SUCCESSFUL
+
+def test_wrap_kek_takes_one_file_per_flag():
+    args = parse_args(["--bdk", BDK_3DES.hex(), "--wrap-kek", "a.json", "--ksn-start", KSN.hex(),
+                       "--wrap-kek", "b.kvlt"])
+    assert args.wrap_kek == ["a.json", "b.kvlt"]
+    assert args.ksn_start == KSN.hex()
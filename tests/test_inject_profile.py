@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from futurex import SUCCESSFUL, decode_frame
+from inject_profile import (
+    DUKPT_PLAINTEXT_ENCRYPTION, KTK_ENCRYPTION, build_injection_plan, inject_all, parse_slot, profile_ksn,
+)
+from kcv import calculate_kcv
+from key_index import KeyIndex
+from keyreceiver_sim import KeyReceiverSimulator
+
+KTK = bytes.fromhex("0123456789ABCDEFFEDCBA9876543210")
+PIN_KEY = bytes.fromhex("00112233445566778899AABBCCDDEEFF")
+IPEK = bytes.fromhex("6AC292FAA1315B4D858AB3A3D7D5933A")
+
+def _record(key: bytes, key_type: str) -> dict:
+    return {"keyHex": key.hex().upper(), "kcv": calculate_kcv(key, "DES_DOUBLE"),
+            "keyType": key_type, "algorithm": "DES_DOUBLE"}
+
+KEYS = KeyIndex([_record(KTK, "KTK"), _record(PIN_KEY, "WORKING_PIN_KEY"), _record(IPEK, "DUKPT_IPEK")])
+
+def _profile(**overrides) -> dict:
+    profile = {
+        "useKTK": True,
+        "selectedKTKKcv": calculate_kcv(KTK, "DES_DOUBLE"),
+        "keyConfigurations": [
+            {"slot": "01", "keyType": "WORKING_PIN_KEY", "selectedKey": calculate_kcv(PIN_KEY, "DES_DOUBLE")},
+            {"slot": "0A", "keyType": "DUKPT_IPEK", "selectedKey": calculate_kcv(IPEK, "DES_DOUBLE"),
+             "ksn": "FFFF9876543210E00000"},
+        ],
+    }
+    profile.update(overrides)
+    return profile
+
+def test_parse_slot_accepts_decimal_and_hex():
+    assert parse_slot("09") == 9
+    assert parse_slot("0A") == 10
+    assert parse_slot(12) == 12
+
+def test_profile_ksn_derived_from_kcv_and_slot():
+    assert profile_ksn({"ksn": "ffff9876543210e00000"}, "08D7B4", 1) == "FFFF9876543210E00000"
+    assert profile_ksn({}, "08d7b4", 10) == "08D7B40000000000000A"
+
+def test_plan_sends_ktk_first_and_dukpt_in_plaintext():
+    plan = build_injection_plan(_profile(), KEYS)
+    assert [(planned.label, planned.slot) for planned in plan] == \
+        [("KTK", 0), ("01:WORKING_PIN_KEY", 1), ("10:DUKPT_IPEK", 10)]
+    commands = [decode_frame(planned.frame) for planned in plan]
+    assert commands[1].encryption_type == KTK_ENCRYPTION
+    assert commands[2].encryption_type == DUKPT_PLAINTEXT_ENCRYPTION
+    assert commands[2].key_hex.upper() == IPEK.hex().upper()
+
+def test_plan_errors():
+    with pytest.raises(ValueError, match="KTK es obligatoria"):
+        build_injection_plan(_profile(useKTK=False), KEYS)
+    with pytest.raises(ValueError, match="La llave 1"):
+        build_injection_plan(_profile(keyConfigurations=[{"slot": "01", "keyType": "WORKING_PIN_KEY",
+                                                          "selectedKey": "FFFFFF"}]), KEYS)
+
+def test_inject_all_against_simulator():
+    plan = build_injection_plan(_profile(), KEYS)
+
+    async def run():
+        async with KeyReceiverSimulator(3, serial_prefix="T") as simulator:
+            devices = await inject_all(simulator.paths, plan, concurrency=2, timeout=2)
+            return devices, [terminal.receiver.state() for terminal in simulator.terminals]
+
+    devices, states = asyncio.run(run())
+    assert all(device.ok for device in devices)
+    assert [key.response_code for key in devices[0].keys] == [SUCCESSFUL] * 3
+    assert devices[2].serial_number == "T000000000000002"
+    assert [slot["kcv"] for slot in states[1]["slots"]] == [key.kcv for key in plan]
+
+def test_window_injects_whole_plan():
+    plan = build_injection_plan(_profile(), KEYS)
+
+    async def run():
+        async with KeyReceiverSimulator(2, serial_prefix="T") as simulator:
+            return await inject_all(simulator.paths, plan, timeout=2, window=4)
+
+    devices = asyncio.run(run())
+    assert all(device.ok and not device.fallback for device in devices)
+    assert [(key.response_code, key.attempts) for key in devices[1].keys] == [(SUCCESSFUL, 1)] * 3
+
+def test_window_falls_back_to_stop_and_wait_on_rejection():
+    wrong = dict(_record(PIN_KEY, "WORKING_PIN_KEY"), kcv="ABCDEF")
+    keys = KeyIndex([_record(KTK, "KTK"), wrong, _record(IPEK, "DUKPT_IPEK")])
+    profile = _profile()
+    profile["keyConfigurations"][0]["selectedKey"] = "ABCDEF"
+    plan = build_injection_plan(profile, keys)
+
+    async def run():
+        async with KeyReceiverSimulator(1) as simulator:
+            return (await inject_all(simulator.paths, plan, timeout=2, window=4))[0]
+
+    device = asyncio.run(run())
+    assert device.fallback
+    assert [key.ok for key in device.keys] == [True, False]
+    assert device.error.startswith("01:WORKING_PIN_KEY")
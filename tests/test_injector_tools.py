@@ -0,0 +1,53 @@
+import importlib
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from injector_tools import COMMANDS, main
+
+ROOT = Path(__file__).resolve().parent.parent
+
+@pytest.fixture(autouse=True)
+def _restore_argv(monkeypatch):
+    # main() reescribe sys.argv para los mensajes de uso de cada script
+    monkeypatch.setattr(sys, "argv", ["injector_tools.py"])
+
+def test_frame_build_and_decode(capsys):
+    assert main(["frame", "build", "03", "01"]) == 0
+    frame = capsys.readouterr().out.strip()
+    assert frame == "02303330310301"
+    assert main(["frame", "decode", frame]) == 0
+    decoded = json.loads(capsys.readouterr().out)
+    assert (decoded["message"], decoded["version"]) == ("ReadSerialCommand", "01")
+
+def test_frame_decode_bad_lrc(capsys):
+    assert main(["frame", "decode", "02303330310300"]) == 1
+    assert "❌" in capsys.readouterr().err
+    assert main(["frame", "decode", "--no-lrc", "02303330310300"]) == 0
+
+def test_missing_command():
+    with pytest.raises(SystemExit) as error:
+        main(["--timing"])
+    assert error.value.code == 2
+
+@pytest.mark.parametrize("command", list(COMMANDS))
+def test_every_command_has_main(command):
+    assert callable(importlib.import_module(COMMANDS[command][0]).main)
+
+def test_frame_does_not_import_crypto():
+    code = ("import sys, injector_tools; injector_tools.main(['frame', 'build', '03', '01']); "
+            "print(sorted(m for m in sys.modules if m.split('.')[0] in ('cryptography', 'Crypto')))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.splitlines()[-1] == "[]"
+
+def test_timing_counts_frame_imports():
+    # futurex y frame_stream se importan con el subcomando, dentro de la medición
+    code = ("import sys, injector_tools; injector_tools.main(['--timing', 'frame', 'build', '03', '01']); "
+            "print('futurex' in sys.modules, 'frame_stream' in sys.modules)")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.splitlines()[-1] == "True True"
+    milliseconds = float(result.stderr.split("importación ")[1].split(" ms")[0])
+    assert milliseconds > 0.0
@@ -0,0 +1,30 @@
+import pytest
+
+from kcv import KCV_ERROR, KCV_UNKNOWN, calculate_kcv, calculate_kcvs, normalize_algorithm
+
+TDES_KEY = bytes.fromhex("0123456789ABCDEFFEDCBA9876543210")
+AES_ZERO = bytes(16)
+
+def test_known_values():
+    assert calculate_kcv(TDES_KEY, "3DES-16") == "08D7B4"
+    assert calculate_kcv(TDES_KEY + TDES_KEY[:8], "DES_TRIPLE") == "08D7B4"
+    assert calculate_kcv(AES_ZERO, "AES-128") == "66E94B"  # AES(0, 0) = 66E94BD4...
+
+@pytest.mark.parametrize("name, expected", [
+    ("AES", "AES"), ("aes-256", "AES"), ("3DES-16", "TDES"), ("DES_DOUBLE", "TDES"), ("RSA", None),
+])
+def test_normalize_algorithm(name, expected):
+    assert normalize_algorithm(name) == expected
+
+def test_invalid_inputs():
+    assert calculate_kcv(bytes(5), "AES") == KCV_ERROR
+    assert calculate_kcv(AES_ZERO, "RSA") == KCV_UNKNOWN
+
+@pytest.mark.parametrize("processes, chunk_size", [(1, 3), (2, 4)])
+def test_bulk_keeps_input_order(processes, chunk_size):
+    items = [(bytes([n]) * 16, "AES-128" if n % 2 else "3DES-16") for n in range(1, 21)]
+    items.append((bytes(5), "AES"))
+    items.append((AES_ZERO, "RSA"))
+    expected = [calculate_kcv(key, algorithm) for key, algorithm in items]
+    assert calculate_kcvs(iter(items), processes, chunk_size) == expected
+    assert expected[-2:] == [KCV_ERROR, KCV_UNKNOWN]
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from key_index import (
+    ISSUE_AMBIGUOUS, ISSUE_COLLISION, ISSUE_NOT_FOUND, KeyIndex, KeyLookupError, main, resolve_profile,
+)
+
+MASTER = {"keyHex": "0123456789ABCDEFFEDCBA9876543210", "kcv": "08D7B4", "keyType": "MASTER_KEY",
+          "algorithm": "3DES-16"}
+# Misma KCV que MASTER con otra llave: colisión
+COLLIDING = {"keyHex": "00112233445566778899AABBCCDDEEFF", "kcv": "08d7b4", "keyType": "DUKPT_BDK",
+             "algorithm": "3DES-16"}
+OTHER = {"keyHex": "11111111111111111111111111111111", "kcv": "AABBCC", "keyType": "MASTER_KEY",
+         "algorithm": "AES-128"}
+
+def test_resolve_and_duplicates():
+    index = KeyIndex([MASTER, dict(MASTER), OTHER])
+    assert index.resolve("08d7b4") is MASTER
+    assert "aabbcc" in index and "FFFFFF" not in index
+    assert index.duplicates() == 1
+    assert index.collisions() == {}
+
+def test_collision_narrowed_by_type_or_algorithm():
+    index = KeyIndex([MASTER, COLLIDING])
+    assert set(index.collisions()) == {"08D7B4"}
+    assert index.resolve("08D7B4", key_type="DUKPT_BDK") is COLLIDING
+    assert index.resolve("08D7B4", "master_key", "3des-16") is MASTER
+    # Un tipo que no coincide con ningún candidato se ignora
+    with pytest.raises(KeyLookupError) as error:
+        index.resolve("08D7B4", key_type="WORKING_PIN_KEY")
+    assert error.value.issue == ISSUE_AMBIGUOUS and len(error.value.candidates) == 2
+    with pytest.raises(KeyLookupError) as error:
+        index.resolve("FFFFFF")
+    assert error.value.issue == ISSUE_NOT_FOUND
+
+def test_resolve_profile_reports_issues():
+    profile = {"useKTK": True, "selectedKTKKcv": "AABBCC", "keyConfigurations": [
+        {"slot": "01", "keyType": "MASTER_KEY", "selectedKey": "08D7B4"},
+        {"slot": "02", "keyType": "MASTER_KEY", "selectedKey": "123456"},
+    ]}
+    resolution = resolve_profile(profile, KeyIndex([MASTER, COLLIDING, OTHER]))
+    assert resolution.ktk is OTHER
+    assert resolution.keys == [MASTER, None]
+    assert [issue["issue"] for issue in resolution.issues] == [ISSUE_COLLISION, ISSUE_NOT_FOUND]
+    assert not resolution.ok
+
+def test_main_collisions(tmp_path, capsys):
+    keys = tmp_path / "llaves.jsonl"
+    keys.write_text("\n".join(json.dumps(record) for record in (MASTER, COLLIDING, OTHER)), encoding="utf-8")
+    assert main(["--collisions", "--json", str(keys)]) == 1
+    result = json.loads(capsys.readouterr().out)
+    assert result["keys"] == 3 and list(result["collisions"]) == ["08D7B4"]
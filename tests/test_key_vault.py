@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from kcv import calculate_kcv
+from key_vault import KeyVault, VaultError, json_to_vault, vault_to_json, write_vault
+
+AES_256 = "000102030405060708090A0B0C0D0E0F101112131415161718191A1B1C1D1E1F"
+TDES = "0123456789ABCDEFFEDCBA9876543210"
+
+def _record(key_hex, algorithm="AES_256", key_type="WORKING_PIN_KEY", description="", kcv=None):
+    return {"keyType": key_type, "algorithm": algorithm, "keyHex": key_hex,
+            "kcv": kcv if kcv is not None else calculate_kcv(bytes.fromhex(key_hex), algorithm),
+            "description": description, "futurexCode": "05"}
+
+def test_json_round_trip(tmp_path):
+    source = tmp_path / "llaves.json"
+    records = [_record(AES_256, description="AES"), _record(TDES, "DES_TRIPLE", "MASTER_KEY", "TDES")]
+    source.write_text(json.dumps({"generated": "2026-01-01", "totalKeys": 2, "keys": records}))
+    assert json_to_vault(str(source), str(tmp_path / "b.kvlt")) == 2
+    assert vault_to_json(str(tmp_path / "b.kvlt"), str(tmp_path / "out.json")) == 2
+    result = json.loads((tmp_path / "out.json").read_text())
+    assert result["generated"] == "2026-01-01"
+    assert [(k["keyHex"], k["algorithm"], k["keyType"], k["description"], k["kcv"]) for k in result["keys"]] == \
+        [(r["keyHex"], r["algorithm"], r["keyType"], r["description"], r["kcv"]) for r in records]
+
+def test_find_by_kcv_and_prefix(tmp_path):
+    path = str(tmp_path / "b.kvlt")
+    write_vault(path, iter([_record(AES_256), _record(TDES, "DES_TRIPLE")]))
+    kcv = calculate_kcv(bytes.fromhex(TDES), "DES_TRIPLE")
+    with KeyVault(path) as vault:
+        assert vault.find(kcv).key.hex().upper() == TDES
+        assert kcv[:4] in vault
+        assert vault.find("000000" if kcv != "000000" else "FFFFFF") is None
+        with pytest.raises(VaultError):
+            vault.find("XYZ")
+
+def test_many_descriptions_do_not_exhaust_algorithm_index(tmp_path):
+    path = str(tmp_path / "b.kvlt")
+    records = [_record(TDES, "DES_TRIPLE", description=f"llave {n}") for n in range(300)]
+    records.append(_record(AES_256, description="última"))
+    assert write_vault(path, iter(records)) == 301
+    with KeyVault(path) as vault:
+        last = vault.record(300)
+        assert (last.algorithm, last.description, last.key.hex().upper()) == ("AES_256", "última", AES_256)
+        assert vault.record(299).description == "llave 299"
+
+def test_too_many_algorithms_is_rejected(tmp_path):
+    records = (_record(AES_256, algorithm=f"ALG{n}", kcv="000000") for n in range(257))
+    with pytest.raises(VaultError, match="algorithm"):
+        write_vault(str(tmp_path / "b.kvlt"), records)
+
+def test_short_kcv_is_recomputed(tmp_path):
+    path = str(tmp_path / "b.kvlt")
+    write_vault(path, iter([_record(AES_256, kcv="ABCD")]))
+    with KeyVault(path) as vault:
+        assert vault.record(0).kcv == calculate_kcv(bytes.fromhex(AES_256), "AES_256")
+
+def test_invalid_files(tmp_path):
+    (tmp_path / "x.kvlt").write_bytes(b"no es un contenedor" * 4)
+    with pytest.raises(VaultError):
+        KeyVault(str(tmp_path / "x.kvlt"))
+    with pytest.raises(VaultError):
+        write_vault(str(tmp_path / "b.kvlt"), iter([_record("00" * 33, kcv="000000")]))
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from key_wrap import KeyWrapError, aes_key_unwrap_many, aes_key_wrap_many, main
+
+KEK_128 = bytes.fromhex("000102030405060708090A0B0C0D0E0F")
+KEK_192 = bytes.fromhex("000102030405060708090A0B0C0D0E0F1011121314151617")
+KEK_256 = bytes.fromhex("000102030405060708090A0B0C0D0E0F101112131415161718191A1B1C1D1E1F")
+KEY_128 = bytes.fromhex("00112233445566778899AABBCCDDEEFF")
+KEY_192 = bytes.fromhex("00112233445566778899AABBCCDDEEFF0001020304050607")
+KEY_256 = bytes.fromhex("00112233445566778899AABBCCDDEEFF000102030405060708090A0B0C0D0E0F")
+
+# RFC 3394, sección 4
+VECTORS = [
+    (KEK_128, KEY_128, "1FA68B0A8112B447AEF34BD8FB5A7B829D3E862371D2CFE5"),
+    (KEK_256, KEY_128, "64E8C3F9CE0F5BA263E9777905818A2A93C8191E7D6E8AE7"),
+    (KEK_192, KEY_192, "031D33264E15D33268F24EC260743EDCE1C6C7DDEE725A936BA814915C6762D2"),
+    (KEK_256, KEY_256, "28C9F404C4B810F4CBCCB35CFB87F8263F5786E2D80ED326CBC7F0E71A99F43BFB988B9B7A02DD21"),
+]
+
+@pytest.mark.parametrize("kek, key, expected", VECTORS)
+def test_rfc3394_vectors(kek, key, expected):
+    assert aes_key_wrap_many(kek, [key])[0].hex().upper() == expected
+    assert aes_key_unwrap_many(kek, [bytes.fromhex(expected)]) == [key]
+
+def test_batch_of_mixed_lengths_keeps_order():
+    keys = [KEY_128, KEY_256, KEY_192, KEY_128[::-1]]
+    wrapped = aes_key_wrap_many(KEK_256, keys)
+    assert wrapped[1].hex().upper() == VECTORS[3][2]
+    assert aes_key_unwrap_many(KEK_256, wrapped) == keys
+
+def test_tampered_or_wrong_kek_is_rejected():
+    wrapped = bytearray(aes_key_wrap_many(KEK_128, [KEY_128])[0])
+    with pytest.raises(KeyWrapError):
+        aes_key_unwrap_many(KEK_256, [bytes(wrapped)])
+    wrapped[-1] ^= 1
+    with pytest.raises(KeyWrapError):
+        aes_key_unwrap_many(KEK_128, [bytes(wrapped)])
+    with pytest.raises(KeyWrapError):
+        aes_key_wrap_many(bytes(8), [KEY_128])
+
+def test_cli_kek_before_positional_input(tmp_path):
+    kek_file = tmp_path / "kek.json"
+    kek_file.write_text(json.dumps({"keys": [{"keyType": "KEK_STORAGE", "algorithm": "AES_128",
+                                              "keyHex": KEK_128.hex().upper()}]}))
+    wrapped = tmp_path / "envueltas.jsonl"
+    wrapped.write_text(json.dumps({"keyType": "WORKING_PIN_KEY", "wrappedKeyHex": VECTORS[0][2],
+                                   "wrapAlgorithm": "AES-KW"}) + "\n")
+    output = tmp_path / "llaves.jsonl"
+    assert main(["unwrap", "--kek", str(kek_file), str(wrapped), "--output", str(output)]) == 0
+    record = json.loads(output.read_text())
+    assert record == {"keyType": "WORKING_PIN_KEY", "keyHex": KEY_128.hex().upper()}
@@ -0,0 +1,55 @@
+import asyncio
+
+from futurex import (
+    BAD_LRC, INVALID_KEY_CHECKSUM, INVALID_KEY_ENCRYPTION_TYPE, INVALID_KSN, INVALID_KTK_CHECKSUM, MISSING_KTK,
+    SUCCESSFUL, FrameEncoder, decode_frame, encrypt_with_kek, format_message,
+)
+from kcv import calculate_kcv
+from keyreceiver_sim import KeyReceiverSimulator, VirtualKeyReceiver
+from serial_link import SerialLink
+
+MASTER = bytes.fromhex("0123456789ABCDEFFEDCBA9876543210")
+WORKING = bytes.fromhex("00112233445566778899AABBCCDDEEFF")
+MASTER_KCV = calculate_kcv(MASTER, "DES_DOUBLE")
+WORKING_KCV = calculate_kcv(WORKING, "DES_DOUBLE")
+
+def _inject(receiver, key_hex, key_checksum, **options) -> str:
+    frame = bytes(FrameEncoder().inject_symmetric_key(options.pop("slot", 1), key_hex, key_checksum, **options))
+    return decode_frame(receiver.handle(decode_frame(frame)).tobytes()).response_code
+
+def test_master_then_working_key_under_ktk():
+    receiver = VirtualKeyReceiver("SN1")
+    assert _inject(receiver, MASTER.hex(), MASTER_KCV, key_type="01") == SUCCESSFUL
+    wrapped = encrypt_with_kek(WORKING, MASTER).hex()
+    assert _inject(receiver, wrapped, WORKING_KCV, slot=2, ktk_slot=1, key_type="05", key_sub_type="01",
+                   encryption_type="02", ktk_checksum=MASTER_KCV) == SUCCESSFUL
+    slots = receiver.state()["slots"]
+    assert [(slot["slot"], slot["keyType"], slot["kcv"]) for slot in slots] == \
+        [(1, "MASTER_KEY", MASTER_KCV), (2, "WORKING_PIN_KEY", WORKING_KCV)]
+
+def test_validation_errors():
+    receiver = VirtualKeyReceiver("SN1")
+    assert _inject(receiver, MASTER.hex(), "0000", key_type="01") == INVALID_KEY_CHECKSUM
+    assert _inject(receiver, WORKING.hex(), WORKING_KCV, key_type="05", key_sub_type="01") == \
+        INVALID_KEY_ENCRYPTION_TYPE
+    assert _inject(receiver, WORKING.hex(), WORKING_KCV, key_type="05", key_sub_type="01",
+                   encryption_type="02", ktk_slot=9) == MISSING_KTK
+    _inject(receiver, MASTER.hex(), MASTER_KCV, key_type="01")
+    assert _inject(receiver, WORKING.hex(), WORKING_KCV, key_type="05", key_sub_type="01",
+                   encryption_type="02", ktk_slot=1, ktk_checksum="FFFF") == INVALID_KTK_CHECKSUM
+    assert _inject(receiver, WORKING.hex(), WORKING_KCV, key_type="08", encryption_type="05") == INVALID_KSN
+
+def test_serial_commands_and_bad_lrc_over_pty():
+    async def run():
+        async with KeyReceiverSimulator(2, serial_prefix="T") as simulator:
+            async with SerialLink(simulator.paths[1]) as link:
+                serial = (await link.transact(format_message("03", ("01",)), timeout=2)).message()
+                damaged = bytearray(format_message("03", ("01",)))
+                damaged[-1] ^= 0xFF
+                error = (await link.transact(bytes(damaged), timeout=2)).message()
+            return serial, error, simulator.summary()
+
+    serial, error, summary = asyncio.run(run())
+    assert (serial.response_code, serial.serial_number) == (SUCCESSFUL, "T000000000000001")
+    assert error.response_code == BAD_LRC
+    assert (summary["frames"], summary["badLrc"]) == (1, 1)
@@ -0,0 +1,51 @@
+import pytest
+
+from generate_dukpt_keys import build_ksn
+from ksn_allocator import DEVICE_ID_LIMIT, KsnAllocationError, KsnAllocator
+
+BDK_ID = bytes.fromhex("FFFF987654")
+
+def test_sequential_ids_and_one_reservation_per_block(tmp_path):
+    with KsnAllocator(str(tmp_path / "ksn.log"), block_size=8) as allocator:
+        assert [allocator.allocate(BDK_ID) for _ in range(10)] == list(range(10))
+        assert allocator.reservations == 2
+        assert allocator.allocate_ksn(BDK_ID) == build_ksn(BDK_ID, 10)
+        assert allocator.allocate_many(BDK_ID, 20) == range(11, 31)
+
+def test_release_on_close_and_reload(tmp_path):
+    path = str(tmp_path / "ksn.log")
+    with KsnAllocator(path, block_size=100) as allocator:
+        allocator.allocate_many(BDK_ID, 5)
+    with KsnAllocator(path, block_size=100) as allocator:
+        assert allocator.allocate(BDK_ID) == 5
+        assert allocator.status()["FFFF987654"]["reserved"] == 105
+
+def test_no_release_after_error_and_truncated_line(tmp_path):
+    path = tmp_path / "ksn.log"
+    with pytest.raises(RuntimeError):
+        with KsnAllocator(str(path), block_size=100) as allocator:
+            allocator.allocate(BDK_ID)
+            raise RuntimeError("caída")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"op": "reserve", "bdkId": "FFFF9')
+    with KsnAllocator(str(path), block_size=100) as allocator:
+        assert allocator.allocate(BDK_ID) == 100
+    assert path.read_text(encoding="utf-8").count("\n") == 3
+
+def test_shared_log_never_repeats(tmp_path):
+    path = str(tmp_path / "ksn.log")
+    first = KsnAllocator(path, block_size=4)
+    second = KsnAllocator(path, block_size=4)
+    ids = [allocator.allocate(BDK_ID) for _ in range(6) for allocator in (first, second)]
+    first.close()
+    second.close()
+    assert len(set(ids)) == len(ids)
+
+def test_start_and_exhaustion():
+    allocator = KsnAllocator(None, block_size=16)
+    assert allocator.allocate(BDK_ID, start=DEVICE_ID_LIMIT - 2) == DEVICE_ID_LIMIT - 2
+    assert allocator.allocate(BDK_ID) == DEVICE_ID_LIMIT - 1
+    with pytest.raises(KsnAllocationError, match="No quedan Device IDs"):
+        allocator.allocate(BDK_ID)
+    with pytest.raises(ValueError):
+        allocator.allocate(b"\x01\x02")
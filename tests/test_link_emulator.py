@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+import pytest
+
+from futurex import SUCCESSFUL, format_message
+from keyreceiver_sim import KeyReceiverSimulator
+from link_emulator import LinkEmulator, LinkProfile
+from serial_link import SerialLink
+
+READ_SERIAL = format_message("03", ("01",))
+
+def test_profile_wire_time_and_validation():
+    assert LinkProfile(baud_rate=9600).wire_time(96) == pytest.approx(0.1)
+    assert LinkProfile(byte_latency=0.001).wire_time(10) == pytest.approx(0.01)
+    assert LinkProfile().wire_time(1000) == 0.0
+    with pytest.raises(ValueError):
+        LinkProfile(drop_rate=1.0)
+    with pytest.raises(ValueError):
+        LinkProfile(latency=-1)
+
+def _transact(profile: LinkProfile):
+    async def run():
+        async with KeyReceiverSimulator(1, serial_prefix="T") as simulator:
+            async with LinkEmulator(profile, device=simulator.paths[0], seed=1) as emulator:
+                async with SerialLink(emulator.path) as link:
+                    started = time.perf_counter()
+                    message = (await link.transact(READ_SERIAL, timeout=3)).message()
+                    seconds = time.perf_counter() - started
+                await asyncio.sleep(0.05)
+                return message, seconds, emulator.stats()
+
+    return asyncio.run(run())
+
+def test_bandwidth_and_latency_through_simulator():
+    profile = LinkProfile(baud_rate=9600, latency=0.01)
+    message, seconds, stats = _transact(profile)
+    assert (message.response_code, message.serial_number) == (SUCCESSFUL, "T000000000000000")
+    request, response = stats["hostToPeer"], stats["peerToHost"]
+    assert request["bytesOut"] == request["bytesIn"] == len(READ_SERIAL)
+    assert seconds >= profile.wire_time(request["bytesIn"] + response["bytesIn"]) + 2 * profile.latency
+
+def test_fragmentation_keeps_frames_whole():
+    message, _, stats = _transact(LinkProfile(fragment_size=2, jitter=0.002))
+    assert message.response_code == SUCCESSFUL
+    assert stats["peerToHost"]["chunksOut"] > stats["peerToHost"]["chunksIn"]
+    assert stats["peerToHost"]["droppedBytes"] == 0
+
+def test_drop_rate_loses_bytes():
+    async def run():
+        async with LinkEmulator(LinkProfile(drop_rate=0.5), seed=7) as emulator:
+            async with SerialLink(emulator.path) as link:
+                await link.write(bytes(200))
+                await asyncio.sleep(0.1)
+            return emulator.stats()["hostToPeer"]
+
+    stats = asyncio.run(run())
+    assert stats["bytesIn"] == 200
+    assert 0 < stats["droppedBytes"] < 200
+    assert stats["bytesOut"] == 200 - stats["droppedBytes"]
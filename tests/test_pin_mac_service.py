@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+import pytest
+
+from dukpt_aes import AesDukptEngine
+from generate_dukpt_keys import IpekBatchDeriver, build_ksn
+from pin_block import encrypt_pin_block_format4
+from retail_mac import aes_cmac
+from pin_mac_service import (
+    STATUS_INTERNAL_ERROR, STATUS_INVALID_REQUEST, BatchDispatcher, VerificationServer,
+    VerificationService, build_load_requests, load_bdks, parse_ksn,
+)
+
+BDKS = ["FFFF987654=0123456789ABCDEFFEDCBA9876543210", "FFFF000001=AES:FEDCBA9876543210F1F1F1F1F1F1F1F1"]
+PAN = "4012345678909"
+
+def _service() -> VerificationService:
+    return VerificationService(load_bdks(BDKS))
+
+def test_load_requests_verify_ok():
+    bdks = load_bdks(BDKS)
+    service = VerificationService(bdks)
+    responses = service.process_batch(build_load_requests(bdks, 200, terminals=5))
+    assert {response["status"] for response in responses} == {"OK"}
+
+def test_non_string_pan_is_invalid_request():
+    request = build_load_requests(load_bdks(BDKS), 1, terminals=1, mac_ratio=0.0)[0]
+    request["pan"] = int(PAN)
+    assert _service().process(request)["status"] == STATUS_INVALID_REQUEST
+
+def test_wrong_field_types_are_invalid_requests():
+    service = _service()
+    for request in ({"op": "pin", "ksn": 123, "pinBlock": "00"},
+                    {"op": "mac", "ksn": "FFFF9876540000200001", "data": ["x"], "mac": "00"},
+                    {"op": "mac", "ksn": "FFFF9876540000200001", "data": "00", "mac": "00", "response": "no"},
+                    {"op": "pin", "ksn": "FFFF9876540000200001", "pinBlock": "00" * 8, "pin": 1234}):
+        assert service.process(request)["status"] == STATUS_INVALID_REQUEST
+
+def test_any_12_byte_ksn_is_accepted():
+    assert parse_ksn("123456789012345600000001") == bytes.fromhex("123456789012345600000001")
+
+def test_aes_12_byte_ksn_round_trip():
+    bdk = bytes.fromhex("FEDCBA9876543210F1F1F1F1F1F1F1F1")
+    ksn = bytes.fromhex("123456789012345600000005")
+    key = AesDukptEngine.from_bdk(bdk, ksn).pin_key(ksn)
+    service = VerificationService(load_bdks([f"12345678=AES:{bdk.hex()}"]))
+    status, pin = service.verify_pin(ksn.hex(), encrypt_pin_block_format4(key, "4321", PAN).hex(), PAN)
+    assert (status, pin) == ("OK", "4321")
+
+def test_pipelined_batch_with_bad_request_resolves_every_future():
+    async def run():
+        bdks = load_bdks(BDKS)
+        requests = build_load_requests(bdks, 3, terminals=1, mac_ratio=0.0)
+        requests[1]["pan"] = int(PAN)
+        dispatcher = BatchDispatcher(bdks, batch_window=0.001)
+        try:
+            futures = [dispatcher.submit(request) for request in requests]
+            return await asyncio.wait_for(asyncio.gather(*futures), 2)
+        finally:
+            dispatcher.close()
+
+    statuses = [response["status"] for response in asyncio.run(run())]
+    assert statuses[1] == STATUS_INVALID_REQUEST
+    assert statuses[0] == statuses[2] == "OK"
+
+def test_failed_batch_fails_futures_and_server_still_answers(monkeypatch):
+    def broken(self, requests):
+        raise RuntimeError("falla del lote")
+
+    monkeypatch.setattr(VerificationService, "process_batch", broken)
+
+    async def run():
+        bdks = load_bdks(BDKS)
+        dispatcher = BatchDispatcher(bdks, batch_window=0.001)
+        try:
+            future = dispatcher.submit({"id": 9, "op": "pin", "ksn": "FFFF9876540000200001"})
+            try:
+                await asyncio.wait_for(future, 2)
+            except RuntimeError:
+                failed = True
+            else:
+                failed = False
+            async with VerificationServer(dispatcher, port=0) as server:
+                reader, writer = await asyncio.open_connection(server.host, server.port)
+                for number in range(3):
+                    writer.write(json.dumps({"id": number, "op": "pin", "ksn": "FFFF9876540000200001"}).encode() + b"\n")
+                await writer.drain()
+                lines = [json.loads(await asyncio.wait_for(reader.readline(), 2)) for _ in range(3)]
+                writer.close()
+            return failed, lines
+        finally:
+            dispatcher.close()
+
+    failed, lines = asyncio.run(run())
+    assert failed
+    assert sorted(line["id"] for line in lines) == [0, 1, 2]
+    assert {line["status"] for line in lines} == {STATUS_INTERNAL_ERROR}
+
+@pytest.mark.parametrize("bdk_hex", ["FEDCBA9876543210F1F1F1F1F1F1F1F1", "00" * 16 + "FF" * 16])
+def test_terminal_injected_by_generator_verifies(bdk_hex):
+    # El terminal solo conoce la IPEK que le inyectó generate_dukpt_keys.py
+    bdk_id = bytes.fromhex("FFFF000001")
+    ksns = [build_ksn(bdk_id, device) for device in (3, 4)]
+    ipeks = IpekBatchDeriver(bytes.fromhex(bdk_hex), "AES").derive_many(ksns)
+    service = VerificationService(load_bdks([f"FFFF000001=AES:{bdk_hex}"]))
+    for ksn0, ipek in zip(ksns, ipeks):
+        terminal = AesDukptEngine(ipek, ksn0)
+        ksn = (int.from_bytes(ksn0, "big") | 5).to_bytes(10, "big")
+        pin_block = encrypt_pin_block_format4(terminal.pin_key(ksn), "4321", PAN)
+        assert service.verify_pin(ksn.hex(), pin_block.hex(), PAN, "4321") == ("OK", "4321")
+        data = b"0200|000000012345"
+        mac = aes_cmac(terminal.mac_key(ksn), data)[:8]
+        assert service.verify_mac(ksn.hex(), data, mac.hex()) == "OK"
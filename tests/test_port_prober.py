@@ -0,0 +1,58 @@
+import asyncio
+import dataclasses
+import os
+
+from keyreceiver_sim import KeyReceiverSimulator
+from port_prober import (
+    PROTOCOL_FUTUREX, PROTOCOL_LEGACY, ProbeCache, ProbeResult, _recognize, port_identity, probe_ports,
+)
+
+def test_recognize_legacy_poll_and_ignore_other_protocol():
+    assert _recognize(PROTOCOL_LEGACY, b"0110|ACK") == ("ACK", "")
+    assert _recognize(PROTOCOL_LEGACY, b"0100|POLL") is None
+    assert _recognize(PROTOCOL_LEGACY, b"\xff\xfe") is None
+    assert _recognize(PROTOCOL_FUTUREX, b"0110|ACK") is None
+
+def test_probe_simulator_ports_and_cache(tmp_path):
+    cache_path = str(tmp_path / "puertos.json")
+    missing = str(tmp_path / "ttyUSB9")
+
+    async def run():
+        async with KeyReceiverSimulator(2, serial_prefix="T") as simulator:
+            cache = ProbeCache(cache_path)
+            first = await probe_ports([*simulator.paths, missing], baud_rates=(9600, 115200),
+                                      timeout=0.5, cache=cache)
+            cache.save()
+            second = await probe_ports(simulator.paths, baud_rates=(9600,), cache=ProbeCache(cache_path))
+            return simulator.paths, first, second
+
+    paths, first, second = asyncio.run(run())
+    results = [first[path] for path in paths]
+    assert [(r.protocol, r.baud_rate, r.serial_number, r.attempts) for r in results] == \
+        [(PROTOCOL_FUTUREX, 9600, "T000000000000000", 1), (PROTOCOL_FUTUREX, 9600, "T000000000000001", 1)]
+    assert first[missing].error == "El puerto no existe"
+    assert all(result.cached for result in second.values())
+    assert second[paths[1]].serial_number == "T000000000000001"
+
+def test_silent_port_tries_every_rate_and_is_not_cached():
+    master, slave = os.openpty()
+    try:
+        path = os.ttyname(slave)
+        cache = ProbeCache(None)
+        result = asyncio.run(probe_ports([path], baud_rates=(9600, 19200), timeout=0.05, cache=cache))[path]
+    finally:
+        os.close(master)
+        os.close(slave)
+    assert (result.protocol, result.attempts, result.error) == ("", 4, "")
+    assert cache.entries == {}
+
+def test_cache_entry_dropped_when_node_recreated(tmp_path):
+    port = str(tmp_path / "ttyUSB0")
+    open(port, "w").close()
+    identity = port_identity(port)
+    cache = ProbeCache(None)
+    cache.store(identity, ProbeResult(port, identity.usb_path, protocol=PROTOCOL_FUTUREX, baud_rate=9600))
+    assert cache.get(identity)["baudRate"] == 9600
+    recreated = dataclasses.replace(identity, created_ns=identity.created_ns + 1)
+    assert cache.get(recreated) is None
+    assert cache.preferred_baud(identity) is None
@@ -0,0 +1,87 @@
+import asyncio
+import io
+import json
+
+import pytest
+
+from kcv import calculate_kcv
+from keyreceiver_sim import KeyReceiverSimulator
+from key_wrap import aes_key_unwrap_many
+from provisioning_pipeline import (
+    CPU_STAGES, DEFAULT_DEVICE_KEYS, PipelineConfig, PipelineError, load_device_spec, main, parse_stage_workers,
+    run_pipeline,
+)
+
+IN_LOOP = {name: 0 for name in CPU_STAGES}
+KEK = bytes(range(32))
+KEK_KCV = calculate_kcv(KEK, "AES-256")
+
+def _lines(output: io.StringIO) -> list:
+    return [json.loads(line) for line in output.getvalue().splitlines()]
+
+def test_export_in_event_loop():
+    output = io.StringIO()
+    report = asyncio.run(run_pipeline(PipelineConfig(list(DEFAULT_DEVICE_KEYS)), 10, batch_size=4,
+                                      workers=IN_LOOP, output=output, include_frames=True))
+    assert (report["mode"], report["ok"], report["failed"]) == ("export", 10, 0)
+    lines = _lines(output)
+    assert sorted(line["deviceId"] for line in lines) == [f"DEV{i:06d}" for i in range(10)]
+    for line in lines:
+        assert [key["keyType"] for key in line["keys"]] == [item[0] for item in DEFAULT_DEVICE_KEYS]
+        for key in line["keys"]:
+            assert key["kcv"] == calculate_kcv(bytes.fromhex(key["keyHex"]), key["algorithm"])
+        assert line["frames"][0]["label"] == "KTK" and len(line["frames"]) == 4
+
+def test_export_wrapped_with_process_pools():
+    output = io.StringIO()
+    report = asyncio.run(run_pipeline(PipelineConfig(list(DEFAULT_DEVICE_KEYS), kek=(KEK, KEK_KCV)), 5,
+                                      batch_size=2, output=output))
+    assert [(stage["stage"], stage["devices"]) for stage in report["stages"]] == \
+        [(name, 5) for name in (*CPU_STAGES, "export")]
+    keys = [key for line in _lines(output) for key in line["keys"]]
+    assert len(keys) == 20 and all("keyHex" not in key and key["kekKcv"] == KEK_KCV for key in keys)
+    unwrapped = aes_key_unwrap_many(KEK, [bytes.fromhex(key["wrappedKeyHex"]) for key in keys])
+    assert [calculate_kcv(key, record["algorithm"]) for key, record in zip(unwrapped, keys)] == \
+        [record["kcv"] for record in keys]
+
+def test_inject_into_simulator_skipping_dead_port(tmp_path):
+    output = io.StringIO()
+
+    async def run():
+        async with KeyReceiverSimulator(2, serial_prefix="T") as simulator:
+            ports = [str(tmp_path / "ttyUSB9"), *simulator.paths]
+            return await run_pipeline(PipelineConfig(list(DEFAULT_DEVICE_KEYS)), 6, batch_size=2,
+                                      workers=IN_LOOP, ports=ports, output=output, timeout=2)
+
+    report = asyncio.run(run())
+    assert (report["mode"], report["ok"], report["failed"]) == ("inject", 6, 0)
+    assert report["deadPorts"] == [str(tmp_path / "ttyUSB9")]
+    assert {line["serialNumber"] for line in _lines(output)} == {"T000000000000000", "T000000000000001"}
+
+def test_no_open_port_fails():
+    with pytest.raises(PipelineError, match="Ningún puerto"):
+        asyncio.run(run_pipeline(PipelineConfig(list(DEFAULT_DEVICE_KEYS)), 2, workers=IN_LOOP,
+                                 ports=["/nonexistent/ttyUSB0"]))
+
+def test_spec_and_stage_worker_validation(tmp_path):
+    spec = tmp_path / "dispositivo.json"
+    spec.write_text(json.dumps([{"keyType": "WORKING_PIN_KEY", "algorithm": "AES-128"}]), encoding="utf-8")
+    with pytest.raises(PipelineError, match="KEK_STORAGE"):
+        load_device_spec(str(spec))
+    assert parse_stage_workers(["kcv=2", "wrap=0"]) == {"kcv": 2, "wrap": 0}
+    with pytest.raises(PipelineError):
+        parse_stage_workers(["inject=1"])
+
+def test_main_wrap_kek_once_per_file(tmp_path, capsys):
+    keks = tmp_path / "llaves_kek.jsonl"
+    keks.write_text(json.dumps({"keyType": "KEK_STORAGE", "algorithm": "AES-256", "keyHex": KEK.hex().upper(),
+                                "kcv": KEK_KCV}), encoding="utf-8")
+    others = tmp_path / "otras.jsonl"
+    others.write_text(json.dumps({"keyType": "MASTER_KEY", "algorithm": "AES-128", "keyHex": "00" * 16}),
+                      encoding="utf-8")
+    output = tmp_path / "salida.jsonl"
+    assert main(["--devices", "3", "--wrap-kek", str(keks), "--workers", "0", "--wrap-kek", str(others),
+                 "--output", str(output), "--json"]) == 0
+    assert json.loads(capsys.readouterr().out)["ok"] == 3
+    lines = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert all(key["kekKcv"] == KEK_KCV for line in lines for key in line["keys"])
@@ -0,0 +1,40 @@
+import pytest
+
+from retail_mac import aes_cmac, message_mac, pad_iso9797, retail_mac, verify_mac
+
+# ISO/IEC 9797-1 anexo B: K = 0123456789ABCDEF, K' = FEDCBA9876543210
+RETAIL_KEY = bytes.fromhex("0123456789ABCDEFFEDCBA9876543210")
+RETAIL_DATA = b"Now is the time for all "
+RETAIL_MAC = "A1C72E74EA3FA9B6"
+
+# RFC 4493 sección 4
+CMAC_KEY = bytes.fromhex("2B7E151628AED2A6ABF7158809CF4F3C")
+CMAC_VECTORS = [
+    ("", "BB1D6929E95937287FA37D129B756746"),
+    ("6BC1BEE22E409F96E93D7E117393172A", "070A16B46B4D4144F79BDD9DD04A287C"),
+]
+
+def test_retail_mac_iso9797_vector():
+    assert retail_mac(RETAIL_KEY, RETAIL_DATA).hex().upper() == RETAIL_MAC
+    assert message_mac(RETAIL_KEY, RETAIL_DATA, "3DES").hex().upper() == RETAIL_MAC
+    with pytest.raises(ValueError):
+        retail_mac(RETAIL_KEY[:8], RETAIL_DATA)
+
+@pytest.mark.parametrize("message,tag", CMAC_VECTORS)
+def test_aes_cmac_rfc4493(message, tag):
+    assert aes_cmac(CMAC_KEY, bytes.fromhex(message)).hex().upper() == tag
+    assert message_mac(CMAC_KEY, bytes.fromhex(message), "AES-128").hex().upper() == tag
+
+def test_padding():
+    assert pad_iso9797(b"") == bytes(8)
+    assert pad_iso9797(b"A" * 8) == b"A" * 8
+    assert pad_iso9797(b"A" * 8, 2) == b"A" * 8 + b"\x80" + bytes(7)
+    with pytest.raises(ValueError):
+        pad_iso9797(b"A", 3)
+
+def test_verify_truncated_mac():
+    computed = bytes.fromhex(RETAIL_MAC)
+    assert verify_mac(computed[:4], computed)
+    assert verify_mac(computed, computed)
+    assert not verify_mac(computed[:3], computed)
+    assert not verify_mac(b"\x00" * 4, computed)
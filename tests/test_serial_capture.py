@@ -0,0 +1,86 @@
+import os
+import threading
+
+from serial_capture import (
+    RX, TX, CaptureReader, CaptureWriter, index_path, reindex, replay_to_pty,
+)
+
+def _write(path, count, interval=4):
+    with CaptureWriter(path, interval) as capture:
+        for number in range(count):
+            capture.write(TX if number % 2 == 0 else RX, bytes([number % 256]) * (number % 7 + 1),
+                          1_000_000_000 + number * 1000)
+
+def test_random_access_and_seek_time(tmp_path):
+    path = str(tmp_path / "c.scap")
+    _write(path, 50)
+    with CaptureReader(path) as capture:
+        assert len(capture) == 50
+        record = capture.record(37)
+        assert (record.direction, bytes(record.data)) == (RX, bytes([37]) * 3)
+        assert capture.seek_time(1_000_000_000 + 20 * 1000) == 20
+        assert capture.seek_time(1_000_000_000 + 20 * 1000 + 1) == 21
+        assert [r.index for r in capture.iter_records(10, 16, (TX,))] == [10, 12, 14]
+
+def test_truncated_record_is_dropped_on_reopen(tmp_path):
+    path = str(tmp_path / "c.scap")
+    _write(path, 10)
+    with open(path, "ab") as f:
+        f.write(b"\x01\x02\x03")
+    with CaptureWriter(path) as capture:
+        assert capture.count == 10
+        capture.write(TX, b"nuevo")
+    with CaptureReader(path) as capture:
+        assert len(capture) == 11
+        assert bytes(capture.record(10).data) == b"nuevo"
+
+def test_reindex_keeps_custom_interval(tmp_path):
+    path = str(tmp_path / "c.scap")
+    _write(path, 30, interval=7)
+    assert reindex(path) == 30
+    with CaptureReader(path) as capture:
+        assert capture.info()["indexInterval"] == 7
+        assert capture.info()["indexEntries"] == 5
+    reindex(path, 10)
+    with CaptureReader(path) as capture:
+        assert capture.interval == 10
+    os.remove(index_path(path))
+    with CaptureReader(path) as capture:
+        assert bytes(capture.record(29).data) == bytes([29]) * 2
+
+def test_replay_without_delays_into_echoing_program(tmp_path):
+    path = str(tmp_path / "c.scap")
+    block = bytes(range(256)) * 4
+    with CaptureWriter(path) as capture:
+        for number in range(512):
+            capture.write(TX, block, number)
+    echoed = []
+
+    def echo(slave_path):
+        # Como `cat` sobre el puerto: devuelve todo lo que recibe
+        def run():
+            fd = os.open(slave_path, os.O_RDWR | os.O_NOCTTY)
+            total = 0
+            try:
+                while total < len(block) * 512:
+                    data = os.read(fd, 4096)
+                    os.write(fd, data)
+                    total += len(data)
+            finally:
+                echoed.append(total)
+                os.close(fd)
+        threading.Thread(target=run, daemon=True).start()
+
+    result = {}
+
+    def replay():
+        with CaptureReader(path) as capture:
+            result.update(replay_to_pty(capture, speed=0, wait=0.5, on_ready=echo))
+
+    worker = threading.Thread(target=replay, daemon=True)
+    worker.start()
+    worker.join(20)
+    assert not worker.is_alive(), "la reproducción quedó bloqueada"
+    assert result["bytes"] == len(block) * 512
+    assert echoed == [len(block) * 512]
+    assert result["responseBytes"] == len(block) * 512